@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Backfill the active-nudge index (GSI4) for nudges sent before it existed
+
+The sender now writes GSI4PK/GSI4SK on every new nudge and the detector
+removes them on DONE. Nudges that were already SENT or REMINDED at upgrade
+time have no index keys, so a DONE reply to them would find nothing. Run
+this once after deploying; it is safe to re-run.
+
+Usage:
+    python scripts/backfill-active-nudges.py --table agrinexus-data
+    python scripts/backfill-active-nudges.py --table agrinexus-data --dry-run
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'src' / 'nudge'))
+
+import active_nudges  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--table', default='agrinexus-data')
+    parser.add_argument('--region', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='only count the nudges to index')
+    args = parser.parse_args()
+
+    import boto3
+    table = boto3.resource('dynamodb', region_name=args.region).Table(args.table)
+
+    scan = {
+        'FilterExpression': 'begins_with(SK, :sk) AND #status IN (:sent, :reminded) '
+                            'AND attribute_not_exists(GSI4PK)',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {':sk': 'NUDGE#', ':sent': 'SENT', ':reminded': 'REMINDED'},
+        'ProjectionExpression': 'PK, SK'
+    }
+    indexed = 0
+    while True:
+        response = table.scan(**scan)
+        for item in response.get('Items', []):
+            phone_number = item['PK'].replace('USER#', '')
+            keys = active_nudges.index_keys(phone_number, item['SK'].replace('NUDGE#', ''))
+            if not args.dry_run:
+                try:
+                    # Skip nudges completed since the scan read them
+                    table.update_item(
+                        Key={'PK': item['PK'], 'SK': item['SK']},
+                        UpdateExpression='SET GSI4PK = :pk, GSI4SK = :sk',
+                        ConditionExpression='#status IN (:sent, :reminded)',
+                        ExpressionAttributeNames={'#status': 'status'},
+                        ExpressionAttributeValues={':pk': keys['GSI4PK'], ':sk': keys['GSI4SK'],
+                                                   ':sent': 'SENT', ':reminded': 'REMINDED'}
+                    )
+                except table.meta.client.exceptions.ConditionalCheckFailedException:
+                    continue
+            indexed += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"{'Would index' if args.dry_run else 'Indexed'} {indexed} open nudges in {args.table}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Move nudges from the old single GSI2 partition onto the sharded timeline keys
+
+Nudges sent before write sharding carry GSI2PK = 'NUDGE', which
+nudge_timeline.query() never reads. This rewrites their GSI2PK/GSI2SK to
+NUDGE#{date}#{shard}. Run once after deploying with the same
+NUDGE_TIMELINE_SHARDS as the sender; it is safe to re-run.
+
+Usage:
+    python scripts/backfill-nudge-timeline.py --table agrinexus-data
+    python scripts/backfill-nudge-timeline.py --table agrinexus-data --dry-run
+"""
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'src' / 'nudge'))
+
+import nudge_timeline  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--table', default='agrinexus-data')
+    parser.add_argument('--region', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='only count the nudges to move')
+    args = parser.parse_args()
+
+    import boto3
+    table = boto3.resource('dynamodb', region_name=args.region).Table(args.table)
+
+    query = {
+        'IndexName': nudge_timeline.INDEX_NAME,
+        'KeyConditionExpression': 'GSI2PK = :pk',
+        'ExpressionAttributeValues': {':pk': 'NUDGE'},
+        'ProjectionExpression': 'PK, SK, GSI2SK'
+    }
+    moved = 0
+    while True:
+        response = table.query(**query)
+        for item in response.get('Items', []):
+            phone_number = item['PK'].replace('USER#', '')
+            keys = nudge_timeline.index_keys(phone_number, datetime.fromisoformat(item['GSI2SK']))
+            if not args.dry_run:
+                table.update_item(
+                    Key={'PK': item['PK'], 'SK': item['SK']},
+                    UpdateExpression='SET GSI2PK = :pk, GSI2SK = :sk',
+                    ExpressionAttributeValues={':pk': keys['GSI2PK'], ':sk': keys['GSI2SK']}
+                )
+            moved += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"{'Would move' if args.dry_run else 'Moved'} {moved} nudges to sharded timeline keys in {args.table}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
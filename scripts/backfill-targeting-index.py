@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Backfill the nudge targeting index (GSI5) for profiles created before it existed
+
+The processor now writes GSI5PK/GSI5SK when a farmer who consented finishes
+onboarding, and the sender reads only that index. Profiles completed before
+the upgrade have no keys, so they would stop receiving nudges. Run this once
+after deploying; it is safe to re-run.
+
+Usage:
+    python scripts/backfill-targeting-index.py --table agrinexus-data
+    python scripts/backfill-targeting-index.py --table agrinexus-data --dry-run
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'src' / 'nudge'))
+
+import targeting  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--table', default='agrinexus-data')
+    parser.add_argument('--region', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='only count the profiles to index')
+    args = parser.parse_args()
+
+    import boto3
+    table = boto3.resource('dynamodb', region_name=args.region).Table(args.table)
+
+    scan = {
+        'FilterExpression': 'SK = :sk AND consent = :yes AND onboarding_complete = :yes '
+                            'AND attribute_not_exists(GSI5PK)',
+        'ExpressionAttributeValues': {':sk': 'PROFILE', ':yes': True},
+        'ProjectionExpression': 'PK, phone_number, dialect, #location, crop, consent, onboarding_complete',
+        'ExpressionAttributeNames': {'#location': 'location'}
+    }
+    indexed = 0
+    while True:
+        response = table.scan(**scan)
+        for item in response.get('Items', []):
+            keys = targeting.index_keys({'phone_number': item['PK'].replace('USER#', ''), **item})
+            if not keys:
+                continue
+            if not args.dry_run:
+                try:
+                    # Skip farmers who reopened onboarding since the scan read them
+                    table.update_item(
+                        Key={'PK': item['PK'], 'SK': 'PROFILE'},
+                        UpdateExpression='SET GSI5PK = :pk, GSI5SK = :sk, language_code = :lang',
+                        ConditionExpression='onboarding_complete = :yes AND consent = :yes',
+                        ExpressionAttributeValues={':pk': keys['GSI5PK'], ':sk': keys['GSI5SK'],
+                                                   ':lang': keys['language_code'], ':yes': True}
+                    )
+                except table.meta.client.exceptions.ConditionalCheckFailedException:
+                    continue
+            indexed += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"{'Would index' if args.dry_run else 'Indexed'} {indexed} nudgeable profiles in {args.table}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
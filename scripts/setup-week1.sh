@@ -104,18 +104,19 @@ response = table.get_item(
 print(f"✓ GetItem successful - User: {response['Item']['userId']}")
 EOF
 
-# Step 4: Upload FAO PDFs
+# Step 4: Chunk and upload the KB documents (pre-chunked data source)
 echo ""
-echo "Step 4: Uploading FAO PDFs..."
-bash scripts/upload-fao-pdfs.sh $STACK_NAME
+echo "Step 4: Uploading KB chunks..."
+pip3 install -q -r src/kb/requirements.txt
+python3 src/kb/ingest.py --bucket $KB_BUCKET
 
 # Step 5: Start KB ingestion
 echo ""
 echo "Step 5: Starting Knowledge Base ingestion..."
-DATA_SOURCE_ID=$(aws bedrock-agent list-data-sources \
-  --knowledge-base-id $KB_ID \
+DATA_SOURCE_ID=$(aws cloudformation describe-stacks \
+  --stack-name $STACK_NAME \
   --region $REGION \
-  --query 'dataSourceSummaries[0].dataSourceId' \
+  --query 'Stacks[0].Outputs[?OutputKey==`ChunkedDataSourceId`].OutputValue' \
   --output text)
 
 INGESTION_JOB_ID=$(aws bedrock-agent start-ingestion-job \
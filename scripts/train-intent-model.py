@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Train the processor's intent model (src/processor/intents.py)
+
+Examples come from the labelled seed set (data/intents/seed.jsonl) plus,
+optionally, message logs: MSG# items exported from the DynamoDB table as JSON
+lines (--logs) or scanned directly (--table). Logged messages are labelled
+weakly:
+- whatever the intent rules already decide (greeting, thanks, help, ...)
+- off_topic when the saved reply was a farming-only refusal
+- agronomy when RAG answered it
+Replies written by the router itself (source_citation "intent:...") and
+image analyses are skipped, so the model does not learn from its own output.
+
+Usage:
+    python scripts/train-intent-model.py
+    python scripts/train-intent-model.py --logs msg-export.jsonl
+    python scripts/train-intent-model.py --table agrinexus-data --region us-east-1
+"""
+import argparse
+import json
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'src' / 'processor'))
+
+import intents  # noqa: E402
+
+SEED = ROOT / 'data' / 'intents' / 'seed.jsonl'
+OUT = ROOT / 'src' / 'processor' / 'intent_model.json'
+
+# Refusals from the RAG prompt / our own off-topic template
+OFF_TOPIC_MARKERS = ['I can only help with farming questions', 'मैं केवल खेती', 'मी फक्त शेती', 'నేను వ్యవసాయ']
+
+
+def read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def scan_messages(table_name: str, region: str) -> Iterator[Dict[str, Any]]:
+    import boto3
+    from boto3.dynamodb.conditions import Attr
+
+    table = boto3.resource('dynamodb', region_name=region).Table(table_name)
+    kwargs = {'FilterExpression': Attr('SK').begins_with('MSG#')}
+    while True:
+        page = table.scan(**kwargs)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def label_from_log(item: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(text, weak label) for one logged message, or None when it teaches nothing"""
+    message = item.get('message') or {}
+    text = (message.get('text') or {}).get('body', '').strip()
+    source = str(item.get('source_citation') or '')
+    if not text or source == 'vision_analysis' or source.startswith('intent:'):
+        return None
+    ruled = intents.rule_intent(text)
+    if ruled:
+        return text, ruled.label
+    response = str(item.get('response') or '')
+    if not response:
+        return None
+    if any(marker in response for marker in OFF_TOPIC_MARKERS):
+        return text, intents.OFF_TOPIC
+    return text, intents.AGRONOMY
+
+
+def holdout_accuracy(examples: List[Tuple[str, str]], fraction: float = 0.2, seed: int = 0) -> float:
+    shuffled = list(examples)
+    random.Random(seed).shuffle(shuffled)
+    cut = max(1, int(len(shuffled) * fraction))
+    model = intents.train(shuffled[cut:])
+    held_out = shuffled[:cut]
+    return sum(intents.classify(text, model).label == label for text, label in held_out) / len(held_out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Train the processor intent model')
+    parser.add_argument('--seed-file', type=Path, default=SEED)
+    parser.add_argument('--logs', type=Path, help='JSON lines of exported MSG# items')
+    parser.add_argument('--table', help='scan MSG# items from this DynamoDB table')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--out', type=Path, default=OUT)
+    args = parser.parse_args(argv)
+
+    examples = [(row['text'], row['label']) for row in read_jsonl(args.seed_file)]
+    logged: Iterable[Dict[str, Any]] = []
+    if args.logs:
+        logged = read_jsonl(args.logs)
+    elif args.table:
+        logged = scan_messages(args.table, args.region)
+    examples += [labelled for labelled in map(label_from_log, logged) if labelled]
+
+    print(f"{len(examples)} examples: {dict(Counter(label for _, label in examples))}")
+    print(f"holdout accuracy: {holdout_accuracy(examples):.2%}")
+
+    model = intents.train(examples)
+    args.out.write_text(json.dumps(model.to_dict(), ensure_ascii=False, sort_keys=True) + '\n', encoding='utf-8')
+    print(f"model {model.version}: {len(model.weights)} features -> {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
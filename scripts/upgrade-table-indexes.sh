@@ -0,0 +1,51 @@
+#!/bin/bash
+# Add GSI3, GSI4 and GSI5 to an existing agrinexus-data table, one per stack
+# update (DynamoDB rejects a table update that creates more than one GSI),
+# then backfill the index keys that items written before the upgrade lack.
+#
+# Run before deploying the Week 2 functions that read these indexes, then
+# re-run the backfills after that deploy (they are idempotent) to pick up
+# items the old functions wrote in between:
+#   bash scripts/upgrade-table-indexes.sh agrinexus-week1 us-east-1
+#   bash scripts/deploy-week2.sh
+#   bash scripts/upgrade-table-indexes.sh agrinexus-week1 us-east-1 --backfill-only
+
+set -e
+
+STACK_NAME=${1:-agrinexus-week1}
+REGION=${2:-us-east-1}
+TABLE_NAME=agrinexus-data
+
+echo "=========================================="
+echo "AgriNexus AI - Table Index Upgrade"
+echo "Stack: $STACK_NAME"
+echo "Region: $REGION"
+echo "=========================================="
+
+if [ "$3" != "--backfill-only" ]; then
+  sam build
+  # GSI3 reminder queue, GSI4 active nudges, GSI5 targeting; sam deploy waits
+  # for each index to finish building before the next update starts
+  for STAGE in 3 4 5; do
+    echo ""
+    echo "Adding GSI$STAGE..."
+    sam deploy \
+      --stack-name $STACK_NAME \
+      --region $REGION \
+      --capabilities CAPABILITY_NAMED_IAM \
+      --parameter-overrides Environment=dev TableIndexStage=$STAGE \
+      --resolve-s3 \
+      --no-fail-on-empty-changeset
+  done
+fi
+
+# GSI3 needs no backfill: only REMINDER# items queued by the new sender carry GSI3 keys.
+# GSI4 and GSI5 are sparse, so existing open nudges and completed profiles need their keys
+echo ""
+echo "Backfilling index keys..."
+python3 scripts/backfill-active-nudges.py --table $TABLE_NAME --region $REGION
+python3 scripts/backfill-targeting-index.py --table $TABLE_NAME --region $REGION
+python3 scripts/backfill-nudge-timeline.py --table $TABLE_NAME --region $REGION
+
+echo ""
+echo "✓ Table indexes upgraded"
@@ -1,5 +1,6 @@
 #!/bin/bash
 # Upload FAO PDF manuals to S3 for Bedrock Knowledge Base
+# Superseded by src/kb/ingest.py (incremental chunk sync); kept for downloading the FAO manuals
 
 set -e
 
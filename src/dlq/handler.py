@@ -4,14 +4,16 @@ Handles failed messages with dialect-aware error responses
 """
 import json
 import os
-import boto3
 from typing import Dict, Any
 
-dynamodb = boto3.resource('dynamodb')
-secrets = boto3.client('secretsmanager')
+import clients
+import profiles
+
+dynamodb = clients.resource('dynamodb')
+secrets = clients.client('secretsmanager')
 
 TABLE_NAME = os.environ['TABLE_NAME']
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
 
 ERROR_MESSAGES = {
     'hi': 'माफ कीजिए, सिस्टम में तकलीफ है। कृपया थोड़ी देर बाद फिर से कोशिश करें।',
@@ -24,13 +26,7 @@ ERROR_MESSAGES = {
 def get_user_dialect(phone_number: str) -> str:
     """Get user's preferred dialect"""
     try:
-        response = table.get_item(
-            Key={
-                'PK': f'USER#{phone_number}',
-                'SK': 'PROFILE'
-            }
-        )
-        profile = response.get('Item', {})
+        profile = profiles.get(table, phone_number) or {}
         return profile.get('dialect', 'hi')
     except:
         return 'hi'
@@ -96,8 +92,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if not from_number:
             continue
         
-        # Get user's dialect
-        dialect = get_user_dialect(from_number)
+        # Get user's dialect (from the webhook's profile snapshot when present)
+        dialect = (body.get('profile') or {}).get('dialect') or get_user_dialect(from_number)
         
         # Send error message
         send_error_message(from_number, dialect)
@@ -0,0 +1,72 @@
+"""
+Local KB Index Builder
+Builds the offline retrieval index (local_kb.py) from the KB source documents
+
+Chunks exactly as ingest.py does (same chunker, metadata and chunk keys), so
+local results point at the same `s3://<bucket>/chunks/...` objects Bedrock
+retrieves.
+
+Usage:
+    python src/kb/build_local_index.py                      # -> src/processor/kb_index/
+    python src/kb/build_local_index.py --query "aphid ETL cotton"
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import ingest
+import local_kb
+
+DEFAULT_OUT = Path(__file__).resolve().parents[1] / 'processor' / 'kb_index'
+DEFAULT_BUCKET = 'agrinexus-kb'
+
+
+def iter_chunks(root: Path, bucket: str, pages=ingest.iter_pages) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(text, s3 uri, metadata) for every chunk, one document in memory at a time; unreadable documents are skipped"""
+    for document in ingest.discover_documents(root):
+        print(f"Indexing {document.name}")
+        try:
+            chunks = list(ingest.chunk_pages(pages(document.path)))
+        except Exception as e:
+            print(f"Skipping {document.name}: {e}")
+            continue
+        seen = set()
+        for chunk in chunks:
+            metadata = ingest.chunk_metadata(document, chunk)
+            key = ingest.chunk_key(document, chunk, metadata)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield chunk.text, f's3://{bucket}/{key}', metadata
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Build the offline BM25 + dense KB index')
+    parser.add_argument('--root', type=Path, default=ingest.SOURCE_ROOT)
+    parser.add_argument('--out', type=Path, default=DEFAULT_OUT)
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET, help='bucket name used in result URIs')
+    parser.add_argument('--query', help='run a test query against the built index')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest = local_kb.build_index(iter_chunks(args.root, args.bucket), str(args.out))
+    print(f"{manifest['chunks']} chunks, {manifest['terms']} terms -> {args.out} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    if args.query:
+        started = time.perf_counter()
+        kb = local_kb.LocalKnowledgeBase(str(args.out))
+        loaded = time.perf_counter()
+        results = kb.retrieve(retrievalQuery={'text': args.query})['retrievalResults']
+        print(f"load {(loaded - started) * 1000:.1f} ms, query {(time.perf_counter() - loaded) * 1000:.1f} ms")
+        for result in results:
+            print(json.dumps({'score': result['score'], 'uri': result['location']['s3Location']['uri'],
+                              'text': result['content']['text'][:160]}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
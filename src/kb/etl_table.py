@@ -0,0 +1,218 @@
+"""
+ETL Threshold Table
+Precomputed economic threshold levels (ETLs), indexed by crop, pest and region
+
+src/kb/extract_etl.py pulls the ETL tables out of the KB source documents
+(ICAR-CICR, Rajendran, PAU, ...) into a versioned JSON table:
+
+    {
+      "version": "<sha256 of the thresholds, 12 hex>",
+      "sources": {"<document>": {"title", "year", "url", "region", "sha256"}},
+      "thresholds": {
+        "cotton|whitefly|india": [
+          {"pest", "label", "threshold", "document", "title", "year", "url", "page"}, ...
+        ]
+      }
+    }
+
+The processor answers "how many whiteflies per leaf before I spray" straight
+from this table (a dict lookup) and only calls RAG for open-ended questions. Pest names
+below are matched in the table rows (English, as printed) and in farmers'
+questions (hi/mr/te/en).
+
+NOTE: This module is copied into the processor and kb packages. Keep the
+copies identical.
+"""
+import json
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+# canonical pest -> row heading as printed in ETL tables, and names farmers use
+PESTS = {
+    'pink_bollworm': {
+        'row': r'Pink\s+bollworm',
+        'names': {
+            'en': ['pink bollworm', 'pbw'],
+            'hi': ['गुलाबी सुंडी', 'गुलाबी इल्ली'],
+            'mr': ['गुलाबी बोंडअळी'],
+            'te': ['గులాబీ రంగు పురుగు', 'గులాబీ పురుగు'],
+        },
+    },
+    'bollworm': {
+        'row': r'American\s+spotted\s+bollworm|Bollworms?\s*\(\s*American\s*&\s*Spotted\s*\)\s*bollworms?',
+        'names': {
+            'en': ['american bollworm', 'spotted bollworm', 'helicoverpa', 'bollworm'],
+            'hi': ['अमेरिकन सुंडी', 'चितकबरी सुंडी', 'सुंडी'],
+            'mr': ['अमेरिकन बोंडअळी', 'ठिपक्याची बोंडअळी', 'बोंडअळी'],
+            'te': ['కాయ తొలుచు పురుగు'],
+        },
+    },
+    'whitefly': {
+        'row': r'Whitefly',
+        'names': {
+            'en': ['whitefly', 'whiteflies', 'white fly'],
+            'hi': ['सफेद मक्खी', 'सफ़ेद मक्खी'],
+            'mr': ['पांढरी माशी'],
+            'te': ['తెల్ల దోమ', 'తెల్లదోమ'],
+        },
+    },
+    'jassid': {
+        'row': r'Jassids?',
+        'names': {
+            'en': ['jassid', 'leafhopper', 'leaf hopper'],
+            'hi': ['जैसिड', 'हरा तेला'],
+            'mr': ['तुडतुडे', 'तुडतुडा'],
+            'te': ['పచ్చ దోమ', 'పచ్చదోమ'],
+        },
+    },
+    'thrips': {
+        'row': r'Thrips',
+        'names': {
+            'en': ['thrips'],
+            'hi': ['थ्रिप्स'],
+            'mr': ['फुलकिडे'],
+            'te': ['తామర పురుగు'],
+        },
+    },
+    'aphid': {
+        'row': r'Aphids?',
+        'names': {
+            'en': ['aphid'],
+            'hi': ['माहू', 'चेपा', 'एफिड'],
+            'mr': ['मावा'],
+            'te': ['పేను బంక'],
+        },
+    },
+    'mealybug': {
+        'row': r'Mealybugs?',
+        'names': {
+            'en': ['mealybug', 'mealy bug'],
+            'hi': ['मिलीबग'],
+            'mr': ['पिठ्या ढेकूण', 'मिलीबग'],
+            'te': ['పిండి నల్లి'],
+        },
+    },
+    'mirid': {
+        'row': r'Mirid\s+bugs?',
+        'names': {
+            'en': ['mirid'],
+            'hi': ['मिरिड'],
+            'mr': ['मिरीड'],
+            'te': ['మిరిడ్'],
+        },
+    },
+    'spodoptera': {
+        'row': r'Spodoptera',
+        'names': {
+            'en': ['spodoptera', 'tobacco caterpillar', 'armyworm'],
+            'hi': ['स्पोडोप्टेरा', 'तंबाकू इल्ली'],
+            'mr': ['स्पोडोप्टेरा', 'तंबाखूवरील अळी'],
+            'te': ['పొగాకు లద్దె పురుగు'],
+        },
+    },
+}
+
+# Crops as named in kb_manifest.csv / the profile, and by farmers
+CROPS = {
+    'Cotton': {'en': ['cotton'], 'hi': ['कपास'], 'mr': ['कापूस'], 'te': ['పత్తి']},
+    'Wheat': {'en': ['wheat'], 'hi': ['गेहूं', 'गेहूँ'], 'mr': ['गहू'], 'te': ['గోధుమ']},
+    'Soybean': {'en': ['soybean', 'soya'], 'hi': ['सोयाबीन'], 'mr': ['सोयाबीन'], 'te': ['సోయాబీన్']},
+    'Maize': {'en': ['maize', 'corn'], 'hi': ['मक्का'], 'mr': ['मका'], 'te': ['మొక్కజొన్న']},
+}
+
+# A threshold question names the threshold itself, or asks how many of a named pest
+# ("how many whiteflies", "सफेद मक्खी कितनी", "whitefly per leaf"). "When should I spray for
+# whitefly" alone may want a product or a schedule, so it goes to RAG
+THRESHOLD_TERMS = ['etl', 'threshold', 'ईटीएल', 'आर्थिक क्षति स्तर', 'आर्थिक दहलीज', 'आर्थिक नुकसान पातळी',
+                   'ఆర్థిక నష్ట స్థాయి']
+COUNT_TERMS = ['how many', 'कितने', 'कितनी', 'किती', 'ఎన్ని']  # only next to the pest name
+PER_UNIT_TERMS = ['per leaf', 'per trap', 'प्रति पत्ती', 'प्रति पान', 'ఆకుకు']
+
+
+def normalize(text: str) -> str:
+    """NFC, lower-cased, single-spaced: Devanagari nukta forms compare equal"""
+    return ' '.join(unicodedata.normalize('NFC', text).lower().split())
+
+
+def _name_patterns(candidates: Dict[str, Dict[str, List[str]]]) -> List[Tuple[Pattern, str]]:
+    """(name pattern, key), longest name first (pink bollworm before bollworm)"""
+    names = {(normalize(name), key) for key, by_language in candidates.items()
+             for language_names in by_language.values() for name in language_names}
+    return [(re.compile(rf'(?<!\w){re.escape(name)}'), key)
+            for name, key in sorted(names, key=lambda item: (-len(item[0]), item))]
+
+
+_PEST_PATTERNS = _name_patterns({pest: entry['names'] for pest, entry in PESTS.items()})
+_CROP_PATTERNS = _name_patterns(CROPS)
+_THRESHOLD_TERMS = [normalize(term) for term in THRESHOLD_TERMS]
+_COUNT_TERMS = tuple(normalize(term) for term in COUNT_TERMS)
+_PER_UNIT_TERMS = [normalize(term) for term in PER_UNIT_TERMS]
+_WORD_REST = re.compile(r'[^\s?!.,]*')  # rest of a pest name's word ("whitefl|ies", "मक्खि|याँ")
+
+
+def _first_match(text: str, patterns: List[Tuple[Pattern, str]]) -> Optional[str]:
+    return next((key for pattern, key in patterns if pattern.search(text)), None)
+
+
+def find_pest(text: str) -> Optional[str]:
+    return _first_match(normalize(text), _PEST_PATTERNS)
+
+
+def find_crop(text: str) -> Optional[str]:
+    return _first_match(normalize(text), _CROP_PATTERNS)
+
+
+def _asks_pest_count(text: str) -> bool:
+    """A count word directly before or after a pest name"""
+    for pattern, _ in _PEST_PATTERNS:
+        for match in pattern.finditer(text):
+            after = text[_WORD_REST.match(text, match.end()).end():].lstrip()
+            if text[:match.start()].rstrip().endswith(_COUNT_TERMS) or after.startswith(_COUNT_TERMS):
+                return True
+    return False
+
+
+def is_threshold_question(text: str) -> bool:
+    text = normalize(text)
+    if any(term in text for term in _THRESHOLD_TERMS):
+        return True
+    if _first_match(text, _PEST_PATTERNS) is None:
+        return False
+    return any(term in text for term in _PER_UNIT_TERMS) or _asks_pest_count(text)
+
+
+def pest_name(pest: str, language: str) -> str:
+    names = PESTS[pest]['names']
+    return (names.get(language) or names['en'])[0]
+
+
+def crop_name(crop: str, language: str) -> str:
+    names = CROPS.get(crop)
+    return (names.get(language) or names['en'])[0] if names else crop
+
+
+def table_key(crop: str, pest: str, region: str) -> str:
+    return f'{crop}|{pest}|{region}'.lower()
+
+
+class ETLTable:
+    """Loaded threshold table; lookups are a few dict probes"""
+
+    def __init__(self, table: Dict[str, Any]):
+        self.version = table.get('version')
+        self.sources = table.get('sources', {})
+        self.thresholds = table.get('thresholds', {})
+
+    @classmethod
+    def load(cls, path: str) -> 'ETLTable':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, crop: str, pest: str, regions: Iterable[str]) -> List[Dict[str, Any]]:
+        """Rows for the first region (most specific first) that has any"""
+        for region in regions:
+            rows = self.thresholds.get(table_key(crop, pest, region))
+            if rows:
+                return rows
+        return []
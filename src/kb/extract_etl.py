@@ -0,0 +1,164 @@
+"""
+ETL Threshold Extraction
+Pulls the economic threshold level (ETL) tables out of the KB source documents
+
+Only documents whose kb_manifest.csv `etl_thresholds` note mentions ETLs are
+read. In each, a table starts at an "Economic threshold levels (ETLs)" heading
+and rows start at a pest name as printed (etl_table.PESTS); a row runs until
+the next pest, a lettered section heading ("E. ADVISORY ...") or the end of the
+page. A table that breaks across a page carries on if the next page's first
+lines open with a pest row.
+
+The result is written as the versioned table etl_table.py loads (default
+src/processor/etl_thresholds.json, packaged with the processor). The version
+is a hash of the thresholds, so re-running on unchanged documents is a no-op.
+
+Usage:
+    python src/kb/extract_etl.py
+    python src/kb/extract_etl.py --check      # exit 1 if the packaged table is stale
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import etl_table
+import ingest
+
+DEFAULT_OUT = Path(__file__).resolve().parents[1] / 'processor' / 'etl_thresholds.json'
+
+TABLE_HEADING = re.compile(r'economic\s+threshold\s+levels\s*\(ETLs\)', re.IGNORECASE)
+SECTION_HEADING = re.compile(r'^\s*[A-Z]\.\s+[A-Z]{3,}', re.MULTILINE)
+# Running page heads inside a table ("11 Insect Pests of Cotton")
+RUNNING_HEAD = re.compile(r'^\s*\d+\s+[A-Z][a-z]+(?:\s+(?:[A-Z][a-z]+|of|and|in|the))+\s*$', re.MULTILINE)
+ROW = re.compile('|'.join(rf'(?P<{pest}>\b(?:{entry["row"]})\b)' for pest, entry in etl_table.PESTS.items()))
+CONTINUATION_LINES = 3
+MIN_ROWS = 3
+
+
+def _rows(text: str, page: int) -> List[Dict[str, Any]]:
+    text = RUNNING_HEAD.sub('', text)
+    matches = list(ROW.finditer(text))
+    rows = []
+    for match, following in zip(matches, matches[1:] + [None]):
+        threshold = ' '.join(text[match.end():following.start() if following else len(text)].split())
+        if threshold:
+            rows.append({'pest': match.lastgroup, 'label': ' '.join(match.group().split()),
+                         'threshold': threshold, 'page': page})
+    return rows
+
+
+def _table_text(text: str) -> str:
+    end = SECTION_HEADING.search(text)
+    return text[:end.start()] if end else text
+
+
+def _continuation(text: str) -> Optional[str]:
+    """The table rows at the top of the next page, if the table carries on there"""
+    text = '\n'.join(line for line in text.splitlines() if line.strip())
+    row = ROW.search(text)
+    if not row or text.count('\n', 0, row.start()) >= CONTINUATION_LINES:
+        return None
+    if row.start() and text[row.start() - 1] != '\n':  # a pest named mid-sentence
+        return None
+    return _table_text(text[row.start():])
+
+
+def extract_rows(pages: Iterable[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """ETL rows (pest, label, threshold, page) from every ETL table in a document"""
+    rows: List[Dict[str, Any]] = []
+    in_table = False
+    for page, text in pages:
+        if in_table:
+            continued = _continuation(text)
+            if continued:
+                rows.extend(_rows(continued, page))
+            in_table = False
+        heading = TABLE_HEADING.search(text)
+        if not heading:
+            continue
+        table = _table_text(text[heading.end():])
+        found = _rows(table, page)
+        if len({row['pest'] for row in found}) >= MIN_ROWS:
+            rows.extend(found)
+            in_table = len(table) == len(text) - heading.end()  # ran to the end of the page
+    return rows
+
+
+def has_etl_tables(document: ingest.Document) -> bool:
+    return 'ETL' in (document.metadata.get('etl_thresholds') or '')
+
+
+def build_table(documents: Iterable[ingest.Document], pages=ingest.iter_pages) -> Dict[str, Any]:
+    """Versioned threshold table keyed crop|pest|region; newest source first"""
+    sources: Dict[str, Dict[str, Any]] = {}
+    thresholds: Dict[str, List[Dict[str, Any]]] = {}
+    for document in documents:
+        if not has_etl_tables(document):
+            continue
+        try:
+            rows = extract_rows(pages(document.path))
+        except Exception as e:
+            print(f"Skipping {document.name}: {e}")
+            continue
+        print(f"{document.name}: {len(rows)} ETL rows")
+        if not rows:
+            continue
+        metadata = document.metadata
+        sources[document.name] = {
+            'title': metadata.get('title'),
+            'year': metadata.get('year'),
+            'url': metadata.get('source_url'),
+            'region': metadata.get('region'),
+            'sha256': ingest.file_sha256(document.path),
+        }
+        for row in rows:
+            key = etl_table.table_key(metadata.get('crop', ''), row['pest'], metadata.get('region', ''))
+            thresholds.setdefault(key, []).append({
+                **row,
+                'document': document.name,
+                'title': metadata.get('title'),
+                'year': metadata.get('year'),
+                'url': metadata.get('source_url'),
+            })
+
+    for rows in thresholds.values():
+        rows.sort(key=lambda row: (-(row['year'] or 0), row['document'], row['page']))
+    thresholds = dict(sorted(thresholds.items()))
+    version = hashlib.sha256(json.dumps(thresholds, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return {'version': version, 'sources': sources, 'thresholds': thresholds}
+
+
+def render(table: Dict[str, Any]) -> str:
+    return json.dumps(table, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Extract ETL tables from the KB documents')
+    parser.add_argument('--root', type=Path, default=ingest.SOURCE_ROOT)
+    parser.add_argument('--out', type=Path, default=DEFAULT_OUT)
+    parser.add_argument('--check', action='store_true', help='fail if the table at --out is out of date')
+    args = parser.parse_args(argv)
+
+    table = build_table(ingest.discover_documents(args.root))
+    rendered = render(table)
+    print(f"{sum(len(rows) for rows in table['thresholds'].values())} thresholds, "
+          f"{len(table['thresholds'])} keys, version {table['version']}")
+
+    if args.check:
+        current = args.out.read_text(encoding='utf-8') if args.out.exists() else ''
+        if current != rendered:
+            print(f"{args.out} is out of date; run src/kb/extract_etl.py")
+            return 1
+        return 0
+
+    args.out.write_text(rendered, encoding='utf-8')
+    print(f"-> {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,370 @@
+"""
+Knowledge Base Ingestion
+Incremental, hash-based chunking and upload of the KB source documents
+
+Replaces the wholesale `aws s3 sync` in scripts/upload-fao-pdfs.sh:
+
+1. Every document under the source root (PDF, .txt, .md) is fingerprinted by
+   a streamed SHA-256 of the file plus its manifest metadata. Unchanged
+   documents are skipped without being opened.
+2. Changed documents are read page by page (only the current page and the
+   chunk being built are held in memory), chunked on paragraph boundaries
+   with a small overlap, and each chunk is tagged with metadata from
+   kb_manifest.csv (crop, pests, ETL notes, region, year, ...).
+3. Chunk keys are content-addressed (`chunks/<lang>/<doc>/<sha>.txt`), so
+   only new chunks are uploaded and only vanished ones deleted, each with a
+   Bedrock `.metadata.json` sidecar for filtered retrieval.
+4. If anything changed, one Bedrock ingestion job is started; Bedrock only
+   re-embeds the S3 objects that changed.
+
+The chunk index (document fingerprint -> chunk keys) lives next to the
+chunks at `kb-index/chunks.json`, outside the data source prefix.
+
+The Bedrock data source must point at `chunks/` with chunking strategy NONE
+(ChunkedDataSource in template.yaml), since documents arrive pre-chunked.
+
+Usage:
+    python src/kb/ingest.py --bucket <kb-bucket> --knowledge-base-id <id> --data-source-id <id>
+    python src/kb/ingest.py --bucket <kb-bucket> --dry-run
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import clients
+
+s3 = clients.client('s3')
+bedrock_agent = clients.client('bedrock-agent')
+
+SOURCE_ROOT = Path(__file__).resolve().parents[2] / 'data' / 'fao-pdfs'
+CHUNK_PREFIX = 'chunks/'
+INDEX_KEY = 'kb-index/chunks.json'
+DOCUMENT_SUFFIXES = ('.pdf', '.txt', '.md')
+
+CHUNK_CHARS = int(os.environ.get('KB_CHUNK_CHARS', '1500'))
+CHUNK_OVERLAP_CHARS = int(os.environ.get('KB_CHUNK_OVERLAP_CHARS', '200'))
+HASH_BLOCK_BYTES = 1024 * 1024
+TEXT_PAGE_CHARS = 4000
+
+# Documents missing from every kb_manifest.csv stay visible to crop/region-filtered retrieval
+UNLISTED_METADATA = {'crop': 'Multiple Crops', 'region': 'Global'}
+
+# Economic threshold mentions ("ETL", "economic threshold", "5 aphids per leaf")
+ETL_PATTERN = re.compile(r'\bETL\b|economic threshold|\b\d+(?:\.\d+)?\s*(?:%|per\s+(?:leaf|plant|trap))', re.IGNORECASE)
+
+
+@dataclass
+class Document:
+    path: Path
+    name: str
+    language: str
+    metadata: Dict[str, Any]
+
+
+@dataclass
+class Chunk:
+    text: str
+    page_start: int
+    page_end: int
+
+
+@dataclass
+class SyncResult:
+    documents: int = 0
+    skipped: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    uploaded: int = 0
+    deleted: int = 0
+    unchanged_chunks: int = 0
+    ingestion_job_id: Optional[str] = None
+
+
+# ============================================================================
+# Manifest and discovery
+# ============================================================================
+
+def load_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    """kb_manifest.csv rows by filename, as Bedrock metadata attributes (comment rows skipped)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.DictReader(line for line in f if not line.startswith('#'))
+        manifest = {}
+        for row in rows:
+            if not row.get('filename'):
+                continue
+            year = (row.get('year') or '').strip()
+            manifest[row['filename'].strip()] = {
+                'title': row.get('title', '').strip(),
+                'source_url': row.get('source_url', '').strip(),
+                'year': int(year) if year.isdigit() else None,
+                'license': row.get('license', '').strip(),
+                'region': row.get('region', '').strip(),
+                'crop': row.get('crop', '').strip(),
+                'pests': [pest.strip() for pest in (row.get('pests') or '').split(';') if pest.strip()],
+                'etl_thresholds': row.get('etl_thresholds', '').strip(),
+            }
+    return manifest
+
+
+def discover_documents(root: Path = SOURCE_ROOT) -> List[Document]:
+    """Every document under root; the first directory level is the language (en/...)"""
+    root = Path(root)
+    manifest = {}
+    for manifest_path in sorted(root.rglob('kb_manifest.csv')):
+        manifest.update(load_manifest(manifest_path))
+
+    documents = []
+    for path in sorted(root.rglob('*')):
+        if not path.is_file() or path.suffix.lower() not in DOCUMENT_SUFFIXES:
+            continue
+        relative = path.relative_to(root)
+        language = relative.parts[0] if len(relative.parts) > 1 else 'en'
+        metadata = manifest.get(path.name) or {'title': path.stem.replace('-', ' ').title(), **UNLISTED_METADATA}
+        documents.append(Document(path, relative.as_posix(), language, {**metadata, 'language': language}))
+    return documents
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def document_fingerprint(document: Document) -> str:
+    """Changes when the file, its manifest metadata or the chunking parameters change"""
+    settings = json.dumps([document.metadata, CHUNK_CHARS, CHUNK_OVERLAP_CHARS], sort_keys=True)
+    return hashlib.sha256((file_sha256(document.path) + settings).encode()).hexdigest()
+
+
+# ============================================================================
+# Streaming extraction and chunking
+# ============================================================================
+
+def iter_pages(path: Path) -> Iterator[Tuple[int, str]]:
+    """(page number, text) one page at a time"""
+    if path.suffix.lower() == '.pdf':
+        from pypdf import PdfReader  # only needed when a PDF actually changed
+        logging.getLogger('pypdf').setLevel(logging.ERROR)  # font-encoding warnings on every page
+        with open(path, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                raise ValueError('not a PDF (an HTML error page from a failed download?)')
+        reader = PdfReader(str(path))
+        for number, page in enumerate(reader.pages, start=1):
+            yield number, page.extract_text() or ''
+        return
+
+    # Text documents: paragraph-aligned pseudo pages of ~TEXT_PAGE_CHARS
+    with open(path, encoding='utf-8') as f:
+        number, lines, size = 1, [], 0
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            if size >= TEXT_PAGE_CHARS and not line.strip():
+                yield number, ''.join(lines)
+                number, lines, size = number + 1, [], 0
+        if lines:
+            yield number, ''.join(lines)
+
+
+def _paragraphs(text: str, limit: int) -> Iterator[str]:
+    """Paragraphs with whitespace normalised; over-long ones split on sentence, then word boundaries"""
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = ' '.join(paragraph.split())
+        while len(paragraph) > limit:
+            cut = max(paragraph.rfind('. ', 0, limit), paragraph.rfind(' ', 0, limit))
+            cut = cut + 1 if cut > 0 else limit
+            yield paragraph[:cut].strip()
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            yield paragraph
+
+
+def _overlap_tail(text: str, size: int) -> str:
+    if size <= 0 or len(text) <= size:
+        return ''
+    tail = text[-size:]
+    space = tail.find(' ')
+    return tail[space + 1:] if space >= 0 else tail
+
+
+def chunk_pages(pages: Iterable[Tuple[int, str]], chunk_chars: int = CHUNK_CHARS,
+                overlap_chars: int = CHUNK_OVERLAP_CHARS) -> Iterator[Chunk]:
+    """Paragraph-packed chunks of up to chunk_chars; chunks may span pages and start with the previous chunk's tail"""
+    parts: List[str] = []
+    size, page_start, page_end = 0, None, None
+    for number, text in pages:
+        for paragraph in _paragraphs(text, chunk_chars - overlap_chars):
+            if parts and size + len(paragraph) + 1 > chunk_chars:
+                chunk = ' '.join(parts)
+                yield Chunk(chunk, page_start, page_end)
+                tail = _overlap_tail(chunk, overlap_chars)
+                parts, size, page_start = ([tail], len(tail), page_end) if tail else ([], 0, None)
+            parts.append(paragraph)
+            size += len(paragraph) + 1
+            page_start = number if page_start is None else page_start
+            page_end = number
+    if parts:
+        yield Chunk(' '.join(parts), page_start, page_end)
+
+
+def chunk_metadata(document: Document, chunk: Chunk) -> Dict[str, Any]:
+    """Bedrock metadataAttributes for one chunk (None/empty values dropped)"""
+    attributes = {
+        **document.metadata,
+        'document': document.name,
+        'page_start': chunk.page_start,
+        'page_end': chunk.page_end,
+        'has_etl': bool(ETL_PATTERN.search(chunk.text)),
+    }
+    return {key: value for key, value in attributes.items() if value not in (None, '', [])}
+
+
+def chunk_key(document: Document, chunk: Chunk, metadata: Dict[str, Any]) -> str:
+    digest = hashlib.sha256((chunk.text + json.dumps(metadata, sort_keys=True)).encode('utf-8')).hexdigest()[:20]
+    stem = document.name.rsplit('.', 1)[0].split('/', 1)[-1]
+    return f'{CHUNK_PREFIX}{document.language}/{stem}/{digest}.txt'
+
+
+# ============================================================================
+# S3 sync
+# ============================================================================
+
+def load_index(bucket: str) -> Dict[str, Any]:
+    try:
+        body = s3.get_object(Bucket=bucket, Key=INDEX_KEY)['Body'].read()
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return {'documents': {}}
+        raise
+    return json.loads(body)
+
+
+def save_index(bucket: str, index: Dict[str, Any]):
+    s3.put_object(Bucket=bucket, Key=INDEX_KEY, Body=json.dumps(index, indent=2, sort_keys=True).encode('utf-8'),
+                  ContentType='application/json')
+
+
+def _upload_chunk(bucket: str, key: str, chunk: Chunk, metadata: Dict[str, Any]):
+    s3.put_object(Bucket=bucket, Key=key, Body=chunk.text.encode('utf-8'), ContentType='text/plain; charset=utf-8')
+    s3.put_object(Bucket=bucket, Key=f'{key}.metadata.json',
+                  Body=json.dumps({'metadataAttributes': metadata}, ensure_ascii=False).encode('utf-8'),
+                  ContentType='application/json')
+
+
+def _delete_chunk(bucket: str, key: str):
+    s3.delete_object(Bucket=bucket, Key=key)
+    s3.delete_object(Bucket=bucket, Key=f'{key}.metadata.json')
+
+
+def sync_document(bucket: str, document: Document, previous: Optional[Dict[str, Any]], fingerprint: str,
+                  result: SyncResult, dry_run: bool = False, pages=iter_pages) -> Dict[str, Any]:
+    """Upload the document's new chunks and delete its vanished ones; returns its index entry"""
+    old_keys = set(previous['chunks']) if previous else set()
+    keys = []
+    for chunk in chunk_pages(pages(document.path)):
+        metadata = chunk_metadata(document, chunk)
+        key = chunk_key(document, chunk, metadata)
+        if key in keys:
+            continue  # identical chunk repeated within the document
+        keys.append(key)
+        if key in old_keys:
+            result.unchanged_chunks += 1
+            continue
+        if not dry_run:
+            _upload_chunk(bucket, key, chunk, metadata)
+        result.uploaded += 1
+
+    for key in old_keys.difference(keys):
+        if not dry_run:
+            _delete_chunk(bucket, key)
+        result.deleted += 1
+    return {'fingerprint': fingerprint, 'chunks': keys}
+
+
+def start_ingestion(knowledge_base_id: str, data_source_id: str) -> str:
+    response = bedrock_agent.start_ingestion_job(
+        knowledgeBaseId=knowledge_base_id,
+        dataSourceId=data_source_id,
+        description='Incremental chunk sync (src/kb/ingest.py)'
+    )
+    return response['ingestionJob']['ingestionJobId']
+
+
+def sync(bucket: str, root: Path = SOURCE_ROOT, knowledge_base_id: Optional[str] = None,
+         data_source_id: Optional[str] = None, prune: bool = True, dry_run: bool = False,
+         pages=iter_pages) -> SyncResult:
+    """Bring the bucket's chunks in line with the documents under root"""
+    index = load_index(bucket)
+    documents = discover_documents(root)
+    result = SyncResult(documents=len(documents))
+
+    for document in documents:
+        previous = index['documents'].get(document.name)
+        fingerprint = document_fingerprint(document)
+        if previous and previous['fingerprint'] == fingerprint:
+            result.skipped.append(document.name)
+            result.unchanged_chunks += len(previous['chunks'])
+            continue
+        print(f"Chunking {document.name} ({'changed' if previous else 'new'})")
+        try:
+            index['documents'][document.name] = sync_document(bucket, document, previous, fingerprint, result,
+                                                               dry_run, pages)
+        except Exception as e:
+            # Keep the previous index entry: the document is retried on the next run
+            print(f"Skipping {document.name}: {e}")
+            result.failed.append(document.name)
+            continue
+        result.changed.append(document.name)
+
+    if prune:
+        present = {document.name for document in documents}
+        for name in [name for name in index['documents'] if name not in present]:
+            for key in index['documents'].pop(name)['chunks']:
+                if not dry_run:
+                    _delete_chunk(bucket, key)
+                result.deleted += 1
+            result.removed.append(name)
+
+    if dry_run or not (result.uploaded or result.deleted):
+        return result
+    save_index(bucket, index)
+    if knowledge_base_id and data_source_id:
+        result.ingestion_job_id = start_ingestion(knowledge_base_id, data_source_id)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Incremental Knowledge Base chunk sync')
+    parser.add_argument('--bucket', required=True, help='KB source bucket (stack output KnowledgeBaseBucketName)')
+    parser.add_argument('--root', type=Path, default=SOURCE_ROOT, help='document root (first level = language)')
+    parser.add_argument('--knowledge-base-id', help='start an ingestion job when chunks changed')
+    parser.add_argument('--data-source-id')
+    parser.add_argument('--keep-removed', action='store_true', help="don't delete chunks of removed documents")
+    parser.add_argument('--dry-run', action='store_true', help='report what would change; no S3 writes')
+    args = parser.parse_args(argv)
+
+    result = sync(args.bucket, args.root, args.knowledge_base_id, args.data_source_id,
+                  prune=not args.keep_removed, dry_run=args.dry_run)
+    print(f"{result.documents} documents: {len(result.changed)} changed, {len(result.skipped)} unchanged, "
+          f"{len(result.removed)} removed; chunks {result.uploaded} uploaded, {result.deleted} deleted, "
+          f"{result.unchanged_chunks} unchanged")
+    if result.failed:
+        print(f"Failed to read: {', '.join(result.failed)}")
+    if result.ingestion_job_id:
+        print(f"Started ingestion job {result.ingestion_job_id}")
+    return 1 if result.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Local Knowledge Base Retriever
+Offline hybrid retrieval (BM25 + dense vectors) over the KB chunks
+
+Serves the same request and response shape as bedrock-agent-runtime
+`retrieve` (retrievalQuery, vectorSearchConfiguration.numberOfResults /
+filter / overrideSearchType -> retrievalResults), so callers can swap it in
+for local testing, benchmarks, or as a degraded mode when Bedrock throttles.
+
+The index is built offline by src/kb/build_local_index.py into a directory of
+flat files that load memory-mapped:
+
+    manifest.json       counts, BM25 parameters, embedder settings
+    vocab.json          term -> [document frequency, postings offset]
+    postings_docs.npy   int32 chunk ids, grouped by term
+    postings_tf.npy     uint16 term frequencies, parallel to postings_docs
+    doc_len.npy         float32 chunk lengths in tokens
+    vectors.npy         float16 L2-normalised chunk embeddings (n x dim)
+    texts.bin           UTF-8 chunk texts, concatenated
+    text_offsets.npy    int64 byte offsets into texts.bin (n + 1)
+    chunks.json         S3 URI and metadata attributes per chunk
+
+Dense vectors come from HashingEmbedder: signed feature hashing of character
+n-grams. It needs no model or network and copes with Devanagari/Telugu
+spelling variants, but it is a lexical-semantic approximation, not a neural
+embedding.
+
+NOTE: This module is copied into the processor and kb packages. Keep the
+copies identical.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+CANDIDATES = 50
+DEFAULT_RESULTS = 5
+MASK_CACHE_SIZE = 64
+
+# Words plus Devanagari/Telugu combining marks (\w alone splits words at vowel signs)
+_TOKEN_RE = re.compile(r'[\w\u0900-\u097F\u0C00-\u0C7F]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize('NFC', text).casefold()
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS and len(token) > 1]
+
+
+class HashingEmbedder:
+    """Signed feature hashing of character n-grams into a fixed-size, L2-normalised vector"""
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def settings(self) -> Dict[str, Any]:
+        return {'type': 'hashing', 'dim': self.dim, 'ngram_range': list(self.ngram_range)}
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        low, high = self.ngram_range
+        for token in tokenize(text):
+            padded = f' {token} '
+            for n in range(low, high + 1):
+                for start in range(max(1, len(padded) - n + 1)):
+                    digest = hashlib.blake2b(padded[start:start + n].encode('utf-8'), digest_size=8).digest()
+                    value = int.from_bytes(digest, 'little')
+                    vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+# ============================================================================
+# Metadata filters (Bedrock RetrievalFilter subset)
+# ============================================================================
+
+def matches_filter(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """equals / notEquals / in / notIn / listContains / andAll / orAll, as in Bedrock retrieval filters"""
+    if not metadata_filter:
+        return True
+    (operator, operand), = metadata_filter.items()
+    if operator == 'andAll':
+        return all(matches_filter(metadata, condition) for condition in operand)
+    if operator == 'orAll':
+        return any(matches_filter(metadata, condition) for condition in operand)
+
+    value = metadata.get(operand['key'])
+    expected = operand['value']
+    if operator == 'equals':
+        return value == expected
+    if operator == 'notEquals':
+        return value != expected
+    if operator == 'in':
+        return value in expected
+    if operator == 'notIn':
+        return value not in expected
+    if operator == 'listContains':
+        return isinstance(value, list) and expected in value
+    raise ValueError(f'Unsupported filter operator: {operator}')
+
+
+# ============================================================================
+# Build
+# ============================================================================
+
+def build_index(chunks: Iterable[Tuple[str, str, Dict[str, Any]]], out_dir: str,
+                embedder: Optional[HashingEmbedder] = None) -> Dict[str, Any]:
+    """Write the index files for (text, s3 uri, metadata) chunks; returns the manifest"""
+    embedder = embedder or HashingEmbedder()
+    os.makedirs(out_dir, exist_ok=True)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_lengths, vectors, records, offsets = [], [], [], [0]
+    with open(os.path.join(out_dir, 'texts.bin'), 'wb') as texts:
+        for chunk_id, (text, uri, metadata) in enumerate(chunks):
+            tokens = tokenize(text)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((chunk_id, min(tf, 65535)))
+            doc_lengths.append(len(tokens))
+            vectors.append(embedder.embed(text).astype(np.float16))
+            records.append({'uri': uri, 'metadata': metadata})
+            encoded = text.encode('utf-8')
+            texts.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+
+    vocab, docs, tfs = {}, [], []
+    for term in sorted(postings):
+        vocab[term] = [len(postings[term]), len(docs)]
+        for chunk_id, tf in postings[term]:
+            docs.append(chunk_id)
+            tfs.append(tf)
+
+    count = len(records)
+    np.save(os.path.join(out_dir, 'postings_docs.npy'), np.asarray(docs, dtype=np.int32))
+    np.save(os.path.join(out_dir, 'postings_tf.npy'), np.asarray(tfs, dtype=np.uint16))
+    np.save(os.path.join(out_dir, 'doc_len.npy'), np.asarray(doc_lengths, dtype=np.float32))
+    np.save(os.path.join(out_dir, 'vectors.npy'),
+            np.vstack(vectors) if vectors else np.zeros((0, embedder.dim), dtype=np.float16))
+    np.save(os.path.join(out_dir, 'text_offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(out_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False, separators=(',', ':'))
+    with open(os.path.join(out_dir, 'chunks.json'), 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, separators=(',', ':'))
+
+    manifest = {
+        'version': INDEX_VERSION,
+        'chunks': count,
+        'terms': len(vocab),
+        'avg_doc_len': float(sum(doc_lengths) / count) if count else 0.0,
+        'bm25': {'k1': BM25_K1, 'b': BM25_B},
+        'embedder': embedder.settings(),
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ============================================================================
+# Query
+# ============================================================================
+
+class LocalKnowledgeBase:
+    """Memory-mapped hybrid index with a bedrock-agent-runtime compatible `retrieve`"""
+
+    def __init__(self, index_dir: str):
+        def path(name: str) -> str:
+            return os.path.join(index_dir, name)
+
+        with open(path('manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest['version'] != INDEX_VERSION:
+            raise ValueError(f"Local KB index version {self.manifest['version']}, expected {INDEX_VERSION}")
+        with open(path('vocab.json'), encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        with open(path('chunks.json'), encoding='utf-8') as f:
+            self.chunks = json.load(f)
+
+        self.postings_docs = np.load(path('postings_docs.npy'), mmap_mode='r')
+        self.postings_tf = np.load(path('postings_tf.npy'), mmap_mode='r')
+        self.doc_len = np.load(path('doc_len.npy'), mmap_mode='r')
+        self.vectors = np.load(path('vectors.npy'), mmap_mode='r')
+        self.text_offsets = np.load(path('text_offsets.npy'), mmap_mode='r')
+        self.texts = np.memmap(path('texts.bin'), dtype=np.uint8, mode='r') if self.text_offsets[-1] else None
+
+        settings = self.manifest['embedder']
+        self.embedder = HashingEmbedder(settings['dim'], tuple(settings['ngram_range']))
+        self.size = self.manifest['chunks']
+        self._vectors32 = None
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def text(self, chunk_id: int) -> str:
+        start, end = int(self.text_offsets[chunk_id]), int(self.text_offsets[chunk_id + 1])
+        return bytes(self.texts[start:end]).decode('utf-8') if end > start else ''
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        k1, b = self.manifest['bm25']['k1'], self.manifest['bm25']['b']
+        length_norm = k1 * (1 - b + b * np.asarray(self.doc_len) / max(self.manifest['avg_doc_len'], 1e-9))
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            df, offset = entry
+            docs = self.postings_docs[offset:offset + df]
+            tf = self.postings_tf[offset:offset + df].astype(np.float32)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (k1 + 1) / (tf + length_norm[docs])
+        return scores
+
+    def dense_scores(self, query: str) -> np.ndarray:
+        if not self.size:
+            return np.zeros(0, dtype=np.float32)
+        if self._vectors32 is None:
+            # float16 on disk, float32 for the matmul (numpy has no fast float16 kernels); converted once
+            self._vectors32 = np.asarray(self.vectors, dtype=np.float32)
+        return self._vectors32 @ self.embedder.embed(query)
+
+    def filter_mask(self, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of chunks matching a filter; profiles repeat the same few filters, so masks are cached"""
+        key = json.dumps(metadata_filter, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches_filter(chunk['metadata'], metadata_filter) for chunk in self.chunks),
+                               dtype=bool, count=self.size)
+            if len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+    def search(self, query: str, top_k: int = DEFAULT_RESULTS, metadata_filter: Optional[Dict[str, Any]] = None,
+               search_type: str = 'HYBRID') -> List[Tuple[int, float]]:
+        """(chunk id, score) best first; HYBRID fuses BM25 and dense rankings (reciprocal rank fusion)"""
+        if not self.size:
+            return []
+        allowed = None
+        if metadata_filter:
+            allowed = self.filter_mask(metadata_filter)
+            if not allowed.any():
+                return []
+
+        # (scores, lexical): chunks without any query term get no BM25 rank; dense always ranks
+        # every allowed chunk, like a vector store returning its nearest neighbours
+        rankings = [(self.dense_scores(query), False)]
+        if search_type == 'HYBRID':
+            rankings.append((self.bm25_scores(query), True))
+
+        fused: Dict[int, float] = {}
+        for scores, lexical in rankings:
+            if allowed is not None:
+                scores = np.where(allowed, scores, -np.inf)
+            candidates = min(CANDIDATES, self.size)
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            ranked = [int(i) for i in top[np.argsort(-scores[top])] if np.isfinite(scores[i])]
+            for rank, chunk_id in enumerate(ranked):
+                if lexical and scores[chunk_id] <= 0:
+                    break
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+
+    def retrieve(self, retrievalQuery: Dict[str, str], knowledgeBaseId: Optional[str] = None,
+                 retrievalConfiguration: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """Same request/response shape as bedrock-agent-runtime retrieve (knowledgeBaseId is ignored)"""
+        search = (retrievalConfiguration or {}).get('vectorSearchConfiguration', {})
+        hits = self.search(retrievalQuery['text'], search.get('numberOfResults', DEFAULT_RESULTS),
+                           search.get('filter'), search.get('overrideSearchType', 'HYBRID'))
+        return {'retrievalResults': [{
+            'content': {'text': self.text(chunk_id), 'type': 'TEXT'},
+            'location': {'type': 'S3', 's3Location': {'uri': self.chunks[chunk_id]['uri']}},
+            'score': round(score, 6),
+            'metadata': self.chunks[chunk_id]['metadata'],
+        } for chunk_id, score in hits]}
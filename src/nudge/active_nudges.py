@@ -0,0 +1,73 @@
+"""
+Active Nudges
+Sparse GSI4 over NUDGE# items that are still SENT or REMINDED
+
+The sender sets the index keys when it writes a nudge and completing the
+nudge removes them in the same update, so the index holds only open nudges,
+newest first per farmer:
+
+    GSI4PK: ACTIVE#{phone}
+    GSI4SK: {nudge_id}        (ISO timestamp#activity)
+
+Finding the nudge a DONE reply refers to is one Limit=1 query, however many
+seasons of nudge history the farmer has. The index is KEYS_ONLY.
+"""
+from typing import Any, Dict, List, Optional
+
+INDEX_NAME = 'GSI4'
+ACTIVE_STATUSES = ('SENT', 'REMINDED')
+
+
+def index_keys(phone_number: str, nudge_id: str) -> Dict[str, str]:
+    """GSI4 attributes for a newly sent nudge"""
+    return {'GSI4PK': f'ACTIVE#{phone_number}', 'GSI4SK': nudge_id}
+
+
+def latest(table, phone_number: str) -> Optional[Dict[str, Any]]:
+    """Newest open nudge for the farmer (PK/SK only), or None"""
+    response = table.query(
+        IndexName=INDEX_NAME,
+        KeyConditionExpression='GSI4PK = :pk',
+        ExpressionAttributeValues={':pk': f'ACTIVE#{phone_number}'},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    return items[0] if items else None
+
+
+def open_since(table, phone_number: str, since: str) -> List[Dict[str, Any]]:
+    """Open nudges whose id sorts at or after `since` (e.g. today's date)"""
+    response = table.query(
+        IndexName=INDEX_NAME,
+        KeyConditionExpression='GSI4PK = :pk AND GSI4SK >= :since',
+        ExpressionAttributeValues={':pk': f'ACTIVE#{phone_number}', ':since': since}
+    )
+    return response.get('Items', [])
+
+
+def complete(table, key: Dict[str, str], completed_at: str) -> bool:
+    """
+    Mark the nudge DONE and drop it from the index in one conditional update
+
+    Returns False when the nudge was no longer open (already DONE, or the
+    index read was stale).
+    """
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET #status = :done, completedAt = :completed REMOVE GSI4PK, GSI4SK',
+            ConditionExpression='#status IN (:sent, :reminded)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':done': 'DONE',
+                ':completed': completed_at,
+                ':sent': ACTIVE_STATUSES[0],
+                ':reminded': ACTIVE_STATUSES[1]
+            }
+        )
+        return True
+    except Exception as e:
+        if 'ConditionalCheckFailed' in type(e).__name__ or 'ConditionalCheckFailed' in str(e):
+            return False
+        raise
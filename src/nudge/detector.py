@@ -1,33 +1,44 @@
 """
 Response Detector
-Detects DONE/NOT YET keywords in messages via DynamoDB Streams
+Detects DONE/NOT YET keywords in messages
+
+Replies arrive two ways. The webhook publishes recognised DONE/NOT YET
+messages to the nudge reply queue (sub-second path), and the DynamoDB Stream
+delivers every new MSG# text message as a backstop. Whichever path reaches a
+message first claims it on its MSG# record, so each message is acted on once.
+
+The stream's event source mapping filters down to MSG# inserts with a text
+body (see FilterCriteria in template-week2.yaml); classify() repeats the
+check so unfiltered batches are still safe.
+
+The filter also keeps PROFILE changes away, so the detector never drops
+cached profiles. It only reads them for the reply dialect, and a dialect
+change reaches it when its cache entry expires (PROFILE_CACHE_TTL_SECONDS).
 """
 import json
 import os
-import boto3
-from typing import Dict, Any, List
-import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
-dynamodb = boto3.resource('dynamodb')
-scheduler = boto3.client('scheduler')
-secrets = boto3.client('secretsmanager')
-cloudwatch = boto3.client('cloudwatch')
+import active_nudges
+import clients
+import profiles
+from keywords import match_keyword, NOT_YET, KeywordMatch
 
-TABLE_NAME = os.environ['TABLE_NAME']
-table = dynamodb.Table(TABLE_NAME)
+dynamodb = clients.resource('dynamodb')
+secrets = clients.client('secretsmanager')
+cloudwatch = clients.client('cloudwatch')
 
-# DONE keywords by dialect
-DONE_KEYWORDS = {
-    'hi': ['हो गया', 'कर दिया', 'हो गया है', 'कर लिया', 'done', 'completed'],
-    'mr': ['झाला', 'केला', 'पूर्ण झाला', 'done'],
-    'te': ['అయ్యింది', 'చేశాను', 'పూర్తయింది', 'done']
-}
+TABLE_NAME = os.environ['TABLE_NAME']
+table = clients.table(TABLE_NAME)
+REPLY_WORKERS = int(os.environ.get('DETECTOR_WORKERS', '16'))
+SECRET_CACHE_TTL = float(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
 
-NOT_YET_KEYWORDS = {
-    'hi': ['अभी नहीं', 'बाद में', 'नहीं किया', 'not yet', 'later'],
-    'mr': ['नाही झाला', 'नंतर', 'अजून नाही', 'not yet'],
-    'te': ['ఇంకా లేదు', 'తర్వాత', 'చేయలేదు', 'not yet']
-}
+# secret_id -> (expires_at, value)
+_secret_cache: Dict[str, Tuple[float, str]] = {}
 
 # Confirmation messages by dialect
 CONFIRMATION_MESSAGES = {
@@ -44,19 +55,23 @@ NOT_YET_MESSAGES = {
 }
 
 
+def get_secret(secret_id: str) -> str:
+    """Retrieve a secret, cached for SECRET_CACHE_TTL_SECONDS (shared by concurrent sends)"""
+    now = time.monotonic()
+    cached = _secret_cache.get(secret_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    value = secrets.get_secret_value(SecretId=secret_id)['SecretString']
+    _secret_cache[secret_id] = (now + SECRET_CACHE_TTL, value)
+    return value
+
+
 def send_whatsapp_message(phone_number: str, message: str):
     """Send message via WhatsApp Business API"""
     import requests
-    import time
     
-    access_token_secret = os.environ.get('ACCESS_TOKEN_SECRET', 'agrinexus/whatsapp/access-token')
-    phone_id_secret = os.environ.get('PHONE_NUMBER_ID_SECRET', 'agrinexus/whatsapp/phone-number-id')
-    
-    access_token_response = secrets.get_secret_value(SecretId=access_token_secret)
-    access_token = access_token_response['SecretString']
-    
-    phone_id_response = secrets.get_secret_value(SecretId=phone_id_secret)
-    phone_number_id = phone_id_response['SecretString']
+    access_token = get_secret(os.environ.get('ACCESS_TOKEN_SECRET', 'agrinexus/whatsapp/access-token'))
+    phone_number_id = get_secret(os.environ.get('PHONE_NUMBER_ID_SECRET', 'agrinexus/whatsapp/phone-number-id'))
     
     url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
     headers = {
@@ -106,157 +121,180 @@ def emit_metric(name: str, value: float = 1.0):
         print(f"Failed to emit metric {name}: {e}")
 
 
-def detect_keyword(text: str, keywords: List[str]) -> bool:
-    """Check if text contains any of the keywords"""
-    text_lower = text.lower()
-    return any(keyword.lower() in text_lower for keyword in keywords)
+class NudgeReply(NamedTuple):
+    """A DONE/NOT YET message found in the stream"""
+    phone_number: str
+    message_sk: str
+    match: KeywordMatch
+    snapshot_dialect: Optional[str]
 
 
-def get_active_nudges(phone_number: str) -> List[Dict[str, Any]]:
-    """Get active nudges for user"""
-    response = table.query(
-        KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
-        ExpressionAttributeValues={
-            ':pk': f'USER#{phone_number}',
-            ':sk': 'NUDGE#'
-        }
-    )
+def classify(record: Dict[str, Any]) -> Optional[NudgeReply]:
+    """NudgeReply for a new text message containing a DONE/NOT YET keyword, else None"""
+    if record.get('eventName') != 'INSERT':
+        return None
+    new_image = record.get('dynamodb', {}).get('NewImage', {})
+    sk = new_image.get('SK', {}).get('S', '')
+    if not sk.startswith('MSG#'):
+        return None
+    
+    # The 'message' field is a Map (M) in DynamoDB Streams, not a String (S)
+    text = new_image.get('message', {}).get('M', {}).get('text', {}).get('M', {}).get('body', {}).get('S', '')
+    if not text:
+        return None
+    
+    # One pass over the text; NOT YET takes precedence over DONE
+    keyword_match = match_keyword(text)
+    if keyword_match is None:
+        return None
     
-    # Filter for SENT or REMINDED status
-    return [
-        item for item in response.get('Items', [])
-        if item.get('status') in ['SENT', 'REMINDED']
-    ]
+    return NudgeReply(
+        phone_number=new_image.get('PK', {}).get('S', '').replace('USER#', ''),
+        message_sk=sk,
+        match=keyword_match,
+        # Reply language fallback: the webhook's profile snapshot
+        snapshot_dialect=new_image.get('profile', {}).get('M', {}).get('dialect', {}).get('S')
+    )
+
+
+def classify_queued(record: Dict[str, Any]) -> Optional[NudgeReply]:
+    """NudgeReply for a message the webhook published to the nudge reply queue"""
+    body = json.loads(record['body'])
+    keyword_match = match_keyword(body.get('text', ''))
+    if keyword_match is None:
+        return None
+    return NudgeReply(
+        phone_number=body['from'],
+        message_sk=body['message_sk'],
+        match=keyword_match,
+        snapshot_dialect=(body.get('profile') or {}).get('dialect')
+    )
 
 
-def get_user_dialect(phone_number: str) -> str:
-    """Get user's dialect from profile"""
+def claim_reply(phone_number: str, message_sk: str) -> bool:
+    """Mark the MSG# record handled; False when the other path already acted on it"""
     try:
-        response = table.get_item(
-            Key={
-                'PK': f'USER#{phone_number}',
-                'SK': 'PROFILE'
-            }
+        table.update_item(
+            Key={'PK': f'USER#{phone_number}', 'SK': message_sk},
+            UpdateExpression='SET reply_handled_at = :now',
+            ConditionExpression='attribute_not_exists(reply_handled_at)',
+            ExpressionAttributeValues={':now': datetime.utcnow().isoformat()}
         )
-        return response.get('Item', {}).get('dialect', 'hi')
-    except:
-        return 'hi'  # Default to Hindi
+        return True
+    except Exception as e:
+        if 'ConditionalCheckFailed' in type(e).__name__ or 'ConditionalCheckFailed' in str(e):
+            return False
+        raise
 
 
-def delete_scheduled_reminders(nudge_id: str):
-    """Delete EventBridge Scheduler reminders"""
-    # Apply same transformation as sender: replace : and # with -
-    safe_nudge_id = nudge_id.replace(':', '-').replace('#', '-')
-    
+def release_reply(phone_number: str, message_sk: str):
+    """Undo claim_reply so a redelivery can act on the message again"""
     try:
-        schedule_name = f'reminder-{safe_nudge_id}-24h'
-        scheduler.delete_schedule(Name=schedule_name)
-        print(f"Deleted schedule: {schedule_name}")
+        table.update_item(
+            Key={'PK': f'USER#{phone_number}', 'SK': message_sk},
+            UpdateExpression='REMOVE reply_handled_at'
+        )
     except Exception as e:
-        print(f"Failed to delete 24h schedule: {e}")
+        print(f"Failed to release reply {message_sk} from {phone_number}: {e}")
+
+
+def resolve_dialects(replies: List[NudgeReply]) -> Dict[str, str]:
+    """Reply dialect per user: keyword, then snapshot, then one batched profile read"""
+    dialects = {}
+    for reply in replies:
+        dialect = reply.match.dialect or reply.snapshot_dialect
+        if dialect and reply.phone_number not in dialects:
+            dialects[reply.phone_number] = dialect
     
-    try:
-        schedule_name = f'reminder-{safe_nudge_id}-48h'
-        scheduler.delete_schedule(Name=schedule_name)
-        print(f"Deleted schedule: {schedule_name}")
-    except Exception as e:
-        print(f"Failed to delete 48h schedule: {e}")
+    unknown = [reply.phone_number for reply in replies if reply.phone_number not in dialects]
+    if unknown:
+        try:
+            for phone_number, profile in profiles.get_many(dynamodb, TABLE_NAME, unknown).items():
+                dialects[phone_number] = (profile or {}).get('dialect', 'hi')
+        except Exception as e:
+            print(f"Profile lookup failed, defaulting to Hindi: {e}")
+    return dialects
 
 
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Process DynamoDB Stream events"""
-    print(f"Received {len(event['Records'])} records")
+def act_on_reply(phone_number: str, reply: NudgeReply, dialect: str) -> int:
+    """Acknowledge NOT YET or complete the newest open nudge; returns nudges completed"""
+    reply_dialect = reply.match.dialect or dialect
     
-    for record in event['Records']:
-        print(f"Processing record: eventName={record['eventName']}")
-        
-        if record['eventName'] != 'INSERT':
-            print(f"Skipping non-INSERT event: {record['eventName']}")
-            continue
-        
-        new_image = record['dynamodb']['NewImage']
-        
-        # Only process message records
-        sk = new_image.get('SK', {}).get('S', '')
-        print(f"Record SK: {sk}")
-        
-        if not sk.startswith('MSG#'):
-            print(f"Skipping non-message record: {sk}")
-            continue
-        
-        pk = new_image.get('PK', {}).get('S', '')
-        phone_number = pk.replace('USER#', '')
-        print(f"Processing message for user: {phone_number}")
-        
-        # Extract message text from DynamoDB Stream format
-        # The 'message' field is a Map (M) in DynamoDB Streams, not a String (S)
-        message_map = new_image.get('message', {}).get('M', {})
-        text_map = message_map.get('text', {}).get('M', {})
-        text = text_map.get('body', {}).get('S', '')
-        print(f"Message text: {text}")
-        
-        if not text:
-            print("No text found in message")
+    if reply.match.intent == NOT_YET:
+        # Send acknowledgment message (reminders will continue)
+        acknowledgment = NOT_YET_MESSAGES.get(reply_dialect, NOT_YET_MESSAGES['hi'])
+        send_whatsapp_message(phone_number, acknowledgment)
+        return 0
+    
+    # DONE: newest open nudge, one Limit=1 read on the active index
+    latest_nudge = active_nudges.latest(table, phone_number)
+    if not latest_nudge:
+        return 0
+    nudge_sk = latest_nudge['SK']
+    nudge_id = nudge_sk.replace('NUDGE#', '')
+    
+    # DONE and out of the index in one conditional update; this also cancels its queued reminders
+    completed_at = reply.message_sk.replace('MSG#', '')
+    key = {'PK': f'USER#{phone_number}', 'SK': nudge_sk}
+    if not active_nudges.complete(table, key, completed_at):
+        print(f"Nudge {nudge_id} already completed for {phone_number}")
+        return 0
+    
+    print(f"Marked nudge {nudge_id} as DONE for {phone_number}")
+    
+    # Send confirmation message
+    confirmation = CONFIRMATION_MESSAGES.get(reply_dialect, CONFIRMATION_MESSAGES['hi'])
+    send_whatsapp_message(phone_number, confirmation)
+    return 1
+
+
+def handle_replies(phone_number: str, replies: List[NudgeReply], dialect: str) -> int:
+    """Act on one farmer's replies in arrival order; returns nudges completed"""
+    completed = 0
+    for reply in replies:
+        if not claim_reply(phone_number, reply.message_sk):
+            print(f"Reply {reply.message_sk} from {phone_number} already handled")
             continue
-        
-        # Check for NOT YET keywords FIRST (more specific than DONE)
-        all_not_yet_keywords = []
-        for keywords in NOT_YET_KEYWORDS.values():
-            all_not_yet_keywords.extend(keywords)
-        
-        # Check for DONE keywords
-        all_done_keywords = []
-        for keywords in DONE_KEYWORDS.values():
-            all_done_keywords.extend(keywords)
-        
-        print(f"Checking keywords in: {text}")
-        
-        # Check NOT YET first (more specific)
-        if detect_keyword(text, all_not_yet_keywords):
-            print(f"NOT YET keyword detected!")
-            
-            # Send acknowledgment message (reminders will continue)
-            dialect = get_user_dialect(phone_number)
-            acknowledgment = NOT_YET_MESSAGES.get(dialect, NOT_YET_MESSAGES['hi'])
-            send_whatsapp_message(phone_number, acknowledgment)
-        
-        # Only check DONE if NOT YET wasn't detected
-        elif detect_keyword(text, all_done_keywords):
-            print(f"DONE keyword detected!")
-            
-            # Get active nudges
-            active_nudges = get_active_nudges(phone_number)
-            print(f"Found {len(active_nudges)} active nudges")
-            
-            # Mark most recent nudge as DONE
-            if active_nudges:
-                latest_nudge = active_nudges[0]
-                nudge_sk = latest_nudge['SK']
-                nudge_id = nudge_sk.replace('NUDGE#', '')
-                
-                # Update status to DONE
-                table.update_item(
-                    Key={
-                        'PK': pk,
-                        'SK': nudge_sk
-                    },
-                    UpdateExpression='SET #status = :status, completedAt = :completed',
-                    ExpressionAttributeNames={'#status': 'status'},
-                    ExpressionAttributeValues={
-                        ':status': 'DONE',
-                        ':completed': new_image.get('SK', {}).get('S', '').replace('MSG#', '')
-                    }
-                )
-                
-                # Delete scheduled reminders
-                delete_scheduled_reminders(nudge_id)
-                
-                print(f"Marked nudge {nudge_id} as DONE for {phone_number}")
-                
-                # Send confirmation message
-                dialect = get_user_dialect(phone_number)
-                confirmation = CONFIRMATION_MESSAGES.get(dialect, CONFIRMATION_MESSAGES['hi'])
-                send_whatsapp_message(phone_number, confirmation)
-                emit_metric('NudgesCompleted', 1)
+        try:
+            completed += act_on_reply(phone_number, reply, dialect)
+        except Exception:
+            # The batch fails and is redelivered; a claim left behind would make the retry skip it
+            release_reply(phone_number, reply.message_sk)
+            raise
+    return completed
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Process nudge reply queue messages or DynamoDB Stream events"""
+    records = event['Records']
+    
+    # Pre-classify the batch; group replies per farmer to keep their order
+    by_user: Dict[str, List[NudgeReply]] = defaultdict(list)
+    for record in records:
+        reply = classify_queued(record) if record.get('eventSource') == 'aws:sqs' else classify(record)
+        if reply:
+            by_user[reply.phone_number].append(reply)
+    
+    replies = sum(len(user_replies) for user_replies in by_user.values())
+    print(f"Received {len(records)} records, {replies} nudge replies from {len(by_user)} users")
+    if not by_user:
+        return {'statusCode': 200}
+    
+    dialects = resolve_dialects([reply for user_replies in by_user.values() for reply in user_replies])
+    
+    # Farmers are independent: confirm concurrently
+    def run(item):
+        phone_number, user_replies = item
+        try:
+            return handle_replies(phone_number, user_replies, dialects.get(phone_number, 'hi'))
+        except Exception as e:
+            print(f"Failed to handle replies from {phone_number}: {e}")
+            raise
+    
+    with ThreadPoolExecutor(max_workers=min(REPLY_WORKERS, len(by_user))) as pool:
+        completed = sum(pool.map(run, by_user.items()))
+    
+    if completed:
+        emit_metric('NudgesCompleted', completed)
     
     return {'statusCode': 200}
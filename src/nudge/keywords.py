@@ -0,0 +1,130 @@
+"""
+Keyword Matcher
+Single-pass DONE / NOT YET detection for farmer replies
+
+All keywords are normalised and compiled into one trie-structured regex at
+import time, so matching costs one scan of the text (each position is tried
+against the trie, bounded by the longest keyword, not by the keyword count).
+
+Normalisation (applied to keywords and text alike):
+- NFC, then drop nukta (U+093C Devanagari, U+0C3C Telugu)
+- chandrabindu -> anusvara (नहीँ == नहीं, Telugu U+0C01 -> U+0C02)
+- strip ZWJ / ZWNJ, casefold, collapse whitespace
+
+NOTE: This module is copied into each Lambda package that needs it
+(webhook, nudge, processor). Keep the copies identical.
+"""
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional
+
+DONE = 'DONE'
+NOT_YET = 'NOT_YET'
+
+# DONE keywords by dialect
+DONE_KEYWORDS = {
+    'hi': ['हो गया', 'कर दिया', 'हो गया है', 'कर लिया', 'done', 'completed'],
+    'mr': ['झाला', 'केला', 'पूर्ण झाला', 'done'],
+    'te': ['అయ్యింది', 'చేశాను', 'పూర్తయింది', 'done']
+}
+
+NOT_YET_KEYWORDS = {
+    'hi': ['अभी नहीं', 'बाद में', 'नहीं किया', 'not yet', 'later'],
+    'mr': ['नाही झाला', 'नंतर', 'अजून नाही', 'not yet'],
+    'te': ['ఇంకా లేదు', 'తర్వాత', 'చేయలేదు', 'not yet']
+}
+
+_CHAR_MAP = {
+    '\u093C': '',        # Devanagari nukta
+    '\u0C3C': '',        # Telugu nukta
+    '\u200C': '',        # ZWNJ
+    '\u200D': '',        # ZWJ
+    '\u0901': '\u0902',  # Devanagari chandrabindu -> anusvara
+    '\u0C01': '\u0C02',  # Telugu chandrabindu -> anusvara
+}
+_CHAR_RE = re.compile('[' + ''.join(_CHAR_MAP) + ']')
+
+# Letters and combining marks of Latin/Devanagari/Telugu (dandas excluded).
+# Python's \b treats matras as non-word characters, so it cannot be used here.
+_WORD_CHARS = r'\w\u0900-\u0963\u0966-\u097F\u0C00-\u0C7F'
+
+
+class KeywordMatch(NamedTuple):
+    intent: str                # DONE or NOT_YET
+    dialect: Optional[str]     # None when the keyword does not identify a dialect (e.g. 'done')
+    keyword: str               # normalised keyword that matched
+
+
+def normalize(text: str) -> str:
+    """Normalise text for keyword matching"""
+    text = unicodedata.normalize('NFC', text)
+    if _CHAR_RE.search(text):
+        text = _CHAR_RE.sub(lambda m: _CHAR_MAP[m.group(0)], text)
+    return ' '.join(text.casefold().split())
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Regex alternation structured as a trie (shared prefixes are matched once)"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict], after_first: str = '') -> str:
+        branches = []
+        optional = '' in node
+        for char in sorted(k for k in node if k):
+            branches.append(re.escape(char) + after_first + build(node[char]))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if optional:
+            body = '(?:' + body + ')?'
+        return body
+
+    # The start-of-word check sits after the first character ("the char before this
+    # one is not a letter") so the pattern begins with a literal set, which lets the
+    # regex engine skip ahead to candidate positions instead of trying every offset.
+    return build(trie, rf'(?<![{_WORD_CHARS}].)')
+
+
+def _build_index():
+    index: Dict[str, KeywordMatch] = {}
+    for intent, table in ((NOT_YET, NOT_YET_KEYWORDS), (DONE, DONE_KEYWORDS)):
+        for dialect, keywords in table.items():
+            for keyword in keywords:
+                key = normalize(keyword)
+                existing = index.get(key)
+                if existing and existing.intent != intent:
+                    raise ValueError(f"Keyword '{keyword}' is both {existing.intent} and {intent}")
+                # Latin-script keywords ('done', 'later') say nothing about the dialect
+                same_dialect = existing is None or existing.dialect == dialect
+                index[key] = KeywordMatch(intent, dialect if same_dialect and not key.isascii() else None, key)
+    pattern = re.compile(
+        rf'{_trie_pattern(list(index))}(?![{_WORD_CHARS}])', re.DOTALL
+    )
+    return index, pattern
+
+
+_INDEX, _PATTERN = _build_index()
+
+
+def match_keyword(text: str) -> Optional[KeywordMatch]:
+    """
+    Find the DONE / NOT YET intent of a reply in one scan
+
+    NOT YET wins over DONE when both appear ("अभी नहीं, कल हो गया" is not done);
+    otherwise the first keyword in the text wins. Returns None if nothing matches.
+    """
+    if not text:
+        return None
+    first_done = None
+    for found in _PATTERN.finditer(normalize(text)):
+        match = _INDEX[found.group(0)]
+        if match.intent == NOT_YET:
+            return match
+        if first_done is None:
+            first_done = match
+    return first_done
@@ -0,0 +1,71 @@
+"""
+Nudge Timeline
+Write-sharded GSI2 over NUDGE# items, for ops and analytics reads
+
+Every nudge used to carry GSI2PK = 'NUDGE', so a district fan-out wrote all
+of its index entries to one partition key. The key now spreads each day's
+nudges over NUDGE_TIMELINE_SHARDS partitions by phone number:
+
+    GSI2PK: NUDGE#2026-10-20#5
+    GSI2SK: 2026-10-20T06:17:42.123456   (send timestamp)
+
+Readers use query(), which reads every shard of every day in the range in
+parallel and merges the results back into timestamp order.
+"""
+import heapq
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+SHARDS = int(os.environ.get('NUDGE_TIMELINE_SHARDS', '8'))
+QUERY_WORKERS = int(os.environ.get('NUDGE_TIMELINE_WORKERS', '16'))
+
+INDEX_NAME = 'GSI2'
+
+
+def shard_of(phone_number: str) -> int:
+    return zlib.crc32(phone_number.encode('utf-8')) % SHARDS
+
+
+def index_keys(phone_number: str, sent_at: datetime) -> Dict[str, str]:
+    """GSI2 attributes for a nudge sent at `sent_at`"""
+    return {
+        'GSI2PK': f"NUDGE#{sent_at.strftime('%Y-%m-%d')}#{shard_of(phone_number)}",
+        'GSI2SK': sent_at.isoformat()
+    }
+
+
+def partition_keys(start: datetime, end: datetime) -> List[str]:
+    """Every GSI2PK holding nudges sent between `start` and `end`"""
+    keys, day = [], start.date()
+    while day <= end.date():
+        keys.extend(f"NUDGE#{day.isoformat()}#{shard}" for shard in range(SHARDS))
+        day += timedelta(days=1)
+    return keys
+
+
+def query(table, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Nudges sent between `start` and `end` (inclusive), oldest first"""
+    bounds = {':start': start.isoformat(), ':end': end.isoformat()}
+
+    def read_partition(partition_key: str) -> List[Dict[str, Any]]:
+        items, kwargs = [], {}
+        while True:
+            response = table.query(
+                IndexName=INDEX_NAME,
+                KeyConditionExpression='GSI2PK = :pk AND GSI2SK BETWEEN :start AND :end',
+                ExpressionAttributeValues={':pk': partition_key, **bounds},
+                **kwargs
+            )
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs = {'ExclusiveStartKey': response['LastEvaluatedKey']}
+
+    partitions = partition_keys(start, end)
+    with ThreadPoolExecutor(max_workers=min(QUERY_WORKERS, len(partitions))) as pool:
+        shards = list(pool.map(read_partition, partitions))
+    # Each shard comes back sorted on GSI2SK; merge rather than re-sort
+    return list(heapq.merge(*shards, key=lambda item: (item['GSI2SK'], item['PK'])))
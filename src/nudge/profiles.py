@@ -0,0 +1,135 @@
+"""
+Profile Cache
+Per-container cache of USER#<phone>/PROFILE items
+
+Only completed profiles are cached: onboarding profiles change on every
+message, so they are always read fresh. Entries expire after
+PROFILE_CACHE_TTL_SECONDS; writers in the same container call put() or
+invalidate(). Other containers are not told about a write: their copy lives
+until it expires, and the version check below keeps it out of new messages.
+
+Every profile write stamps a new profile_version (new_version()). The
+webhook attaches snapshot(profile) to queued messages so downstream Lambdas
+can skip the read entirely (see from_snapshot()), and it checks the cached
+version in the same transaction that records the message (version_check()).
+A profile changed by another container since it was cached is re-read, so
+a snapshot never carries a completed profile the farmer has since reopened.
+
+NOTE: This module is copied into each Lambda package that needs it
+(webhook, processor, voice, nudge, dlq). Keep the copies identical.
+"""
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL_SECONDS', '60'))
+PROFILE_CACHE_MAX = int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '5000'))
+
+# Fields downstream stages need; keep small (it travels in every SQS body)
+SNAPSHOT_FIELDS = ('dialect', 'crop', 'location', 'onboarding_complete', 'onboarding_state', 'voicePreference',
+                   'profile_version')
+VERSION_FIELD = 'profile_version'
+
+BATCH_GET_LIMIT = 100  # BatchGetItem maximum keys per request
+
+# phone_number -> (expires_at, profile)
+_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _key(phone_number: str) -> Dict[str, str]:
+    return {'PK': f'USER#{phone_number}', 'SK': 'PROFILE'}
+
+
+def get(table, phone_number: str) -> Optional[Dict[str, Any]]:
+    """Return the profile, from cache when fresh (None if the user has no profile)"""
+    now = time.monotonic()
+    cached = _cache.get(phone_number)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    profile = table.get_item(Key=_key(phone_number)).get('Item')
+    put(phone_number, profile)
+    return profile
+
+
+def get_many(dynamodb, table_name: str, phone_numbers: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Profiles for several users: cached entries, then BatchGetItem for the rest"""
+    now = time.monotonic()
+    profiles: Dict[str, Optional[Dict[str, Any]]] = {}
+    missing: List[str] = []
+    for phone_number in dict.fromkeys(phone_numbers):
+        cached = _cache.get(phone_number)
+        if cached and cached[0] > now:
+            profiles[phone_number] = cached[1]
+        else:
+            profiles[phone_number] = None
+            missing.append(phone_number)
+
+    for start in range(0, len(missing), BATCH_GET_LIMIT):
+        request = {table_name: {'Keys': [_key(phone) for phone in missing[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for profile in response.get('Responses', {}).get(table_name, []):
+                phone_number = profile['PK'].replace('USER#', '')
+                profiles[phone_number] = profile
+                put(phone_number, profile)
+            request = response.get('UnprocessedKeys') or None
+    return profiles
+
+
+def put(phone_number: str, profile: Optional[Dict[str, Any]]):
+    """Cache a profile we just read or wrote (ignored unless onboarding is complete)"""
+    if not profile or not profile.get('onboarding_complete'):
+        _cache.pop(phone_number, None)
+        return
+    if len(_cache) >= PROFILE_CACHE_MAX:
+        _cache.clear()
+    _cache[phone_number] = (time.monotonic() + PROFILE_CACHE_TTL, profile)
+
+
+def invalidate(phone_number: Optional[str] = None):
+    """Drop one user's entry, or everything"""
+    if phone_number is None:
+        _cache.clear()
+    else:
+        _cache.pop(phone_number, None)
+
+
+def new_version() -> int:
+    """profile_version for a profile write (only ever compared for equality)"""
+    return time.time_ns()
+
+
+def version_check(table_name: str, phone_number: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """TransactWriteItems ConditionCheck: the stored profile still has `profile`'s version"""
+    check = {
+        'TableName': table_name,
+        'Key': _key(phone_number),
+        'ExpressionAttributeNames': {'#version': VERSION_FIELD}
+    }
+    if profile.get(VERSION_FIELD) is None:
+        # Written before versioning; any versioned write since makes it stale
+        check['ConditionExpression'] = 'attribute_not_exists(#version)'
+    else:
+        check['ConditionExpression'] = '#version = :version'
+        check['ExpressionAttributeValues'] = {':version': profile[VERSION_FIELD]}
+    return {'ConditionCheck': check}
+
+
+def snapshot(profile: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Compact copy of the fields downstream stages need"""
+    if not profile:
+        return None
+    return {field: profile[field] for field in SNAPSHOT_FIELDS if field in profile}
+
+
+def from_snapshot(phone_number: str, snap: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Profile rebuilt from a snapshot, or None when a fresh read is required
+
+    Snapshots taken during onboarding are never trusted: the state may have
+    moved on by the time the message is processed.
+    """
+    if not snap or not snap.get('onboarding_complete'):
+        return None
+    return {'phone_number': phone_number, **snap}
@@ -1,17 +1,28 @@
 """
 Reminder Sender
-Sends T+24h and T+48h reminders if task not completed
+Sweeps due T+24h and T+48h reminders and sends those whose task is not completed
 """
-import json
 import os
-import boto3
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 
-dynamodb = boto3.resource('dynamodb')
-secrets = boto3.client('secretsmanager')
+import clients
+import reminder_queue
+
+dynamodb = clients.resource('dynamodb')
+secrets = clients.client('secretsmanager')
 
 TABLE_NAME = os.environ['TABLE_NAME']
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
+SEND_WORKERS = int(os.environ.get('REMINDER_WORKERS', '16'))
+BATCH_GET_LIMIT = 100  # BatchGetItem maximum keys per request
+SECRET_CACHE_TTL = float(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+
+# secret_id -> (expires_at, value)
+_secret_cache: Dict[str, Tuple[float, str]] = {}
 
 REMINDER_TEMPLATES = {
     'hi': {
@@ -29,13 +40,168 @@ REMINDER_TEMPLATES = {
 }
 
 
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Send reminder if task not completed"""
+def get_secret(secret_id: str) -> str:
+    """Retrieve a secret, cached for SECRET_CACHE_TTL_SECONDS (shared by concurrent sends)"""
+    now = time.monotonic()
+    cached = _secret_cache.get(secret_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    value = secrets.get_secret_value(SecretId=secret_id)['SecretString']
+    _secret_cache[secret_id] = (now + SECRET_CACHE_TTL, value)
+    return value
+
+
+def sweep_time(event: Dict[str, Any]) -> datetime:
+    """Scheduled events carry their trigger time; fall back to now"""
+    try:
+        return datetime.strptime(event['time'], '%Y-%m-%dT%H:%M:%SZ')
+    except (KeyError, TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def read_watermark() -> Optional[str]:
+    """Bucket the last completed sweep reached, or None (lookback only)"""
+    try:
+        item = table.get_item(Key=reminder_queue.WATERMARK_KEY, ConsistentRead=True).get('Item')
+    except Exception as e:
+        print(f"Failed to read reminder sweep watermark, using the lookback only: {e}")
+        return None
+    return (item or {}).get('swept_to')
+
+
+def advance_watermark(bucket: str):
+    """Record that every bucket before `bucket` has been swept (never moves back)"""
+    try:
+        table.update_item(
+            Key=reminder_queue.WATERMARK_KEY,
+            UpdateExpression='SET swept_to = :bucket',
+            ConditionExpression='attribute_not_exists(swept_to) OR swept_to < :bucket',
+            ExpressionAttributeValues={':bucket': bucket}
+        )
+    except Exception as e:
+        if 'ConditionalCheckFailed' in type(e).__name__ or 'ConditionalCheckFailed' in str(e):
+            return
+        print(f"Failed to advance reminder sweep watermark: {e}")
+
+
+def query_due_reminders(now: datetime, swept_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All REMINDER# items due by `now`, reading the bucket shards in parallel"""
+    due_by = now.strftime('%Y-%m-%dT%H:%M:%S') + '#~'  # '~' sorts after any phone number
+
+    def read_partition(partition_key: str) -> List[Dict[str, Any]]:
+        items, kwargs = [], {}
+        while True:
+            response = table.query(
+                IndexName=reminder_queue.INDEX_NAME,
+                KeyConditionExpression='GSI3PK = :pk AND GSI3SK <= :due',
+                ExpressionAttributeValues={':pk': partition_key, ':due': due_by},
+                **kwargs
+            )
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs = {'ExclusiveStartKey': response['LastEvaluatedKey']}
+
+    partitions = reminder_queue.partition_keys(now, swept_to)
+    with ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(partitions))) as pool:
+        return [item for items in pool.map(read_partition, partitions) for item in items]
+
+
+def get_nudge_statuses(reminders: List[Dict[str, Any]]) -> Dict[tuple, Optional[str]]:
+    """(PK, SK) of each reminder's nudge -> status, BATCH_GET_LIMIT keys per call"""
+    keys = list({(item['PK'], f"NUDGE#{item['nudge_id']}") for item in reminders})
+    statuses = {key: None for key in keys}
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {TABLE_NAME: {
+            'Keys': [{'PK': pk, 'SK': sk} for pk, sk in keys[start:start + BATCH_GET_LIMIT]],
+            'ProjectionExpression': 'PK, SK, #status',
+            'ExpressionAttributeNames': {'#status': 'status'}
+        }}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for nudge in response.get('Responses', {}).get(TABLE_NAME, []):
+                statuses[(nudge['PK'], nudge['SK'])] = nudge.get('status')
+            request = response.get('UnprocessedKeys') or None
+    return statuses
+
+
+def claim_reminder(reminder: Dict[str, Any]) -> bool:
+    """Delete the REMINDER# item; False if an overlapping sweep already took it"""
+    try:
+        table.delete_item(
+            Key={'PK': reminder['PK'], 'SK': reminder['SK']},
+            ConditionExpression='attribute_exists(PK)'
+        )
+        return True
+    except Exception as e:
+        if 'ConditionalCheckFailed' in type(e).__name__ or 'ConditionalCheckFailed' in str(e):
+            return False
+        raise
+
+
+def reminder_text(reminder_type: str, dialect: str) -> str:
+    template = REMINDER_TEMPLATES.get(dialect, REMINDER_TEMPLATES['hi'])
+    return template.get(reminder_type, template['T+24h'])
+
+
+def mark_reminded(phone_number: str, nudge_id: str, reminder_type: str) -> bool:
+    """Mark the nudge REMINDED; False when it went DONE (e.g. the farmer replied during the sweep)"""
+    try:
+        table.update_item(
+            Key={
+                'PK': f'USER#{phone_number}',
+                'SK': f'NUDGE#{nudge_id}'
+            },
+            UpdateExpression='SET #status = :status, lastReminder = :reminder',
+            ConditionExpression='#status <> :done',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':status': 'REMINDED',
+                ':reminder': reminder_type,
+                ':done': 'DONE'
+            }
+        )
+        return True
+    except Exception as e:
+        if 'ConditionalCheckFailed' in type(e).__name__ or 'ConditionalCheckFailed' in str(e):
+            return False
+        raise
+
+
+def requeue_reminder(reminder: Dict[str, Any], now: datetime):
+    """Put a claimed reminder back in the current bucket so the next sweep retries it"""
+    item = reminder_queue.retry_item(reminder, now)
+    try:
+        table.put_item(Item=item)
+        print(f"Reminder {item['SK']} for {item['phone_number']} requeued")
+    except Exception as e:
+        print(f"Failed to requeue reminder {item['SK']} for {item['phone_number']}: {e}")
+
+
+def process_reminder(reminder: Dict[str, Any], now: datetime) -> bool:
+    """Claim, mark REMINDED and send one reminder; a failed send is requeued"""
+    if not claim_reminder(reminder):
+        return False
+    phone_number, nudge_id = reminder['phone_number'], reminder['nudge_id']
+    try:
+        if not mark_reminded(phone_number, nudge_id, reminder['reminder_type']):
+            print(f"Nudge {nudge_id} completed during the sweep - reminder dropped")
+            return False
+        sent = send_whatsapp_message(phone_number, reminder_text(reminder['reminder_type'],
+                                                                 reminder.get('dialect', 'hi')))
+    except Exception:
+        requeue_reminder(reminder, now)
+        raise
+    if not sent:
+        requeue_reminder(reminder, now)
+    return sent
+
+
+def send_scheduled_reminder(event: Dict[str, Any]) -> Dict[str, Any]:
+    """One reminder from a per-nudge EventBridge schedule created before the reminder queue"""
     phone_number = event['phone_number']
     nudge_id = event['nudge_id']
-    reminder_type = event['reminder_type']
-    dialect = event.get('dialect', 'hi')
-    
+
     # Check nudge status
     response = table.get_item(
         Key={
@@ -43,85 +209,97 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'SK': f'NUDGE#{nudge_id}'
         }
     )
-    
+
     nudge = response.get('Item')
     if not nudge:
         return {'statusCode': 404, 'message': 'Nudge not found'}
-    
-    status = nudge.get('status')
-    
+
     # Only send reminder if not completed
-    if status != 'DONE':
-        template = REMINDER_TEMPLATES.get(dialect, REMINDER_TEMPLATES['hi'])
-        message = template.get(reminder_type, template['T+24h'])
-        
-        # Send WhatsApp message
-        send_whatsapp_message(phone_number, message)
-        
-        # Update nudge record
-        table.update_item(
-            Key={
-                'PK': f'USER#{phone_number}',
-                'SK': f'NUDGE#{nudge_id}'
-            },
-            UpdateExpression='SET #status = :status, lastReminder = :reminder',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': 'REMINDED',
-                ':reminder': reminder_type
-            }
-        )
-        
-        return {'statusCode': 200, 'message': 'Reminder sent'}
-    else:
+    if nudge.get('status') == 'DONE' or not mark_reminded(phone_number, nudge_id, event['reminder_type']):
         return {'statusCode': 200, 'message': 'Task already completed'}
 
+    if not send_whatsapp_message(phone_number, reminder_text(event['reminder_type'], event.get('dialect', 'hi'))):
+        # Fail the invocation so the schedule's retry policy tries again
+        raise RuntimeError(f"Reminder for nudge {nudge_id} not delivered")
+    return {'statusCode': 200, 'message': 'Reminder sent'}
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Sweep the due reminder buckets and send reminders for nudges not yet DONE"""
+    if 'nudge_id' in event:
+        return send_scheduled_reminder(event)
+
+    now = sweep_time(event)
+    swept_to = read_watermark()
+    if swept_to:
+        missed = reminder_queue.buckets_since(now, swept_to) - reminder_queue.MAX_CATCHUP_BUCKETS
+        if missed > 0:
+            # Reminders in these buckets are never sent
+            print(f"WARNING: reminder sweep is {missed} buckets past the catch-up window; "
+                  f"skipping buckets from {swept_to}")
+    due = query_due_reminders(now, swept_to)
+    statuses = get_nudge_statuses(due) if due else {}
+
+    pending, cancelled = [], 0
+    for reminder in due:
+        status = statuses.get((reminder['PK'], f"NUDGE#{reminder['nudge_id']}"))
+        if status in (None, 'DONE'):
+            # Completed (or expired) nudge: drop the reminder without sending
+            claim_reminder(reminder)
+            cancelled += 1
+        else:
+            pending.append(reminder)
+
+    sent = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(pending))) as pool:
+            sent = sum(pool.map(partial(process_reminder, now=now), pending))
 
-def send_whatsapp_message(phone_number: str, message: str):
-    """Send message via WhatsApp Business API"""
+    # Only a sweep that got this far moves the watermark; a failed one is re-read next time
+    advance_watermark(reminder_queue.bucket_of(now))
+    print(f"Reminder sweep at {now.isoformat()}: {len(due)} due, {sent} sent, {cancelled} cancelled")
+    return {'statusCode': 200, 'due': len(due), 'sent': sent, 'cancelled': cancelled}
+
+
+def send_whatsapp_message(phone_number: str, message: str) -> bool:
+    """Send message via WhatsApp Business API; True once WhatsApp accepted it"""
     import requests
-    import time
-    
-    # Get WhatsApp credentials
-    access_token_secret = os.environ.get('ACCESS_TOKEN_SECRET', 'agrinexus/whatsapp/access-token')
-    phone_id_secret = os.environ.get('PHONE_NUMBER_ID_SECRET', 'agrinexus/whatsapp/phone-number-id')
     
     try:
-        access_token_response = secrets.get_secret_value(SecretId=access_token_secret)
-        access_token = access_token_response['SecretString']
-        
-        phone_id_response = secrets.get_secret_value(SecretId=phone_id_secret)
-        phone_number_id = phone_id_response['SecretString']
-        
-        # Send via WhatsApp Business API
-        url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": phone_number,
-            "type": "text",
-            "text": {"body": message}
-        }
-        
-        print(f"Sending reminder to {phone_number}: {message[:50]}...")
-        response = None
-        for attempt in range(3):
-            try:
-                response = requests.post(url, headers=headers, json=payload, timeout=5)
-                if response.status_code < 500 and response.status_code != 429:
-                    break
-            except requests.RequestException as e:
-                print(f"WhatsApp reminder request error (attempt {attempt + 1}): {e}")
-            time.sleep(0.5 * (2 ** attempt))
-        
-        if response and response.status_code == 200:
-            print(f"Reminder sent successfully: {response.json()}")
-        else:
-            status = response.status_code if response else 'no_response'
-            text = response.text if response else 'no_response_body'
-            print(f"Failed to send reminder: {status} - {text}")
+        access_token = get_secret(os.environ.get('ACCESS_TOKEN_SECRET', 'agrinexus/whatsapp/access-token'))
+        phone_number_id = get_secret(os.environ.get('PHONE_NUMBER_ID_SECRET', 'agrinexus/whatsapp/phone-number-id'))
     except Exception as e:
-        print(f"Exception sending reminder to {phone_number}: {str(e)}")
+        print(f"Exception reading WhatsApp credentials for {phone_number}: {str(e)}")
+        return False
+    
+    # Send via WhatsApp Business API
+    url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": phone_number,
+        "type": "text",
+        "text": {"body": message}
+    }
+    
+    print(f"Sending reminder to {phone_number}: {message[:50]}...")
+    response = None
+    for attempt in range(3):
+        try:
+            response = requests.post(url, headers=headers, json=payload, timeout=5)
+            if response.status_code < 500 and response.status_code != 429:
+                break
+        except requests.RequestException as e:
+            print(f"WhatsApp reminder request error (attempt {attempt + 1}): {e}")
+        time.sleep(0.5 * (2 ** attempt))
+    
+    if response is not None and response.status_code == 200:
+        print(f"Reminder sent successfully: {response.json()}")
+        return True
+    status = response.status_code if response is not None else 'no_response'
+    text = response.text if response is not None else 'no_response_body'
+    print(f"Failed to send reminder: {status} - {text}")
+    return False
@@ -0,0 +1,118 @@
+"""
+Reminder Queue
+Due-time-bucketed REMINDER# items swept by reminder.py
+
+Each nudge writes its T+24h/T+48h reminders as items under the farmer's
+partition. GSI3 groups them by due bucket (REMINDER_BUCKET_MINUTES wide),
+spread over REMINDER_SHARDS keys so a 50k-farmer fan-out does not land on a
+single index partition:
+
+    PK:     USER#{phone}
+    SK:     REMINDER#{nudge_id}#T+24h
+    GSI3PK: REMINDER#2026-10-20T06:15#3
+    GSI3SK: 2026-10-20T06:17:42#+9198...#T+24h
+
+A sweep only reads the buckets that are due; cancelling a reminder is the
+DONE status update on the nudge itself. Each completed sweep records the
+bucket it reached in a watermark item, and the next sweep reads every bucket
+from there (at most MAX_CATCHUP_BUCKETS), so a sweeper outage longer than the
+lookback does not strand reminders.
+"""
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+BUCKET_MINUTES = int(os.environ.get('REMINDER_BUCKET_MINUTES', '5'))
+SHARDS = int(os.environ.get('REMINDER_SHARDS', '4'))
+# Buckets re-read on every sweep, so a missed or late sweep catches up
+LOOKBACK_BUCKETS = int(os.environ.get('REMINDER_LOOKBACK_BUCKETS', '12'))
+# Oldest bucket a sweep will go back to after an outage (default: one day)
+MAX_CATCHUP_BUCKETS = int(os.environ.get('REMINDER_MAX_CATCHUP_BUCKETS', '288'))
+REMINDER_OFFSETS_H = (24, 48)
+REMINDER_TTL_DAYS = 7
+
+INDEX_NAME = 'GSI3'
+WATERMARK_KEY = {'PK': 'REMINDER_SWEEP', 'SK': 'WATERMARK'}
+BUCKET_FORMAT = '%Y-%m-%dT%H:%M'
+
+
+def reminder_type(hours_offset: int) -> str:
+    return f'T+{hours_offset}h'
+
+
+def bucket_of(due: datetime) -> str:
+    """Start of the BUCKET_MINUTES window containing `due` (minute precision)"""
+    minute = due.minute - due.minute % BUCKET_MINUTES
+    return due.replace(minute=minute, second=0, microsecond=0).strftime(BUCKET_FORMAT)
+
+
+def shard_of(phone_number: str) -> int:
+    return zlib.crc32(phone_number.encode('utf-8')) % SHARDS
+
+
+def buckets_since(now: datetime, swept_to: str) -> int:
+    """Buckets from the watermark bucket `swept_to` up to the one containing `now`"""
+    step = timedelta(minutes=BUCKET_MINUTES)
+    return (datetime.strptime(bucket_of(now), BUCKET_FORMAT) - datetime.strptime(swept_to, BUCKET_FORMAT)) // step
+
+
+def due_buckets(now: datetime, swept_to: Optional[str] = None) -> List[str]:
+    """
+    Current bucket plus the ones before it, oldest first
+
+    Goes back to the watermark bucket `swept_to` (capped at
+    MAX_CATCHUP_BUCKETS), and never fewer than LOOKBACK_BUCKETS.
+    """
+    step = timedelta(minutes=BUCKET_MINUTES)
+    depth = LOOKBACK_BUCKETS
+    if swept_to:
+        depth = max(depth, min(buckets_since(now, swept_to), MAX_CATCHUP_BUCKETS))
+    return [bucket_of(now - step * back) for back in range(depth, -1, -1)]
+
+
+def partition_keys(now: datetime, swept_to: Optional[str] = None) -> List[str]:
+    """Every GSI3PK a sweep at `now` has to query"""
+    return [f'REMINDER#{bucket}#{shard}' for bucket in due_buckets(now, swept_to) for shard in range(SHARDS)]
+
+
+def reminder_item(phone_number: str, nudge_id: str, hours_offset: int, dialect: str,
+                  sent_at: datetime) -> Dict[str, Any]:
+    """REMINDER# item due `hours_offset` hours after the nudge was sent"""
+    due = sent_at + timedelta(hours=hours_offset)
+    kind = reminder_type(hours_offset)
+    due_at = due.strftime('%Y-%m-%dT%H:%M:%S')
+    return {
+        'PK': f'USER#{phone_number}',
+        'SK': f'REMINDER#{nudge_id}#{kind}',
+        'GSI3PK': f'REMINDER#{bucket_of(due)}#{shard_of(phone_number)}',
+        'GSI3SK': f'{due_at}#{phone_number}#{kind}',
+        'phone_number': phone_number,
+        'nudge_id': nudge_id,
+        'reminder_type': kind,
+        'dialect': dialect,
+        'due_at': due_at,
+        'ttl': int((due + timedelta(days=REMINDER_TTL_DAYS)).timestamp())
+    }
+
+
+def retry_item(reminder: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """
+    A claimed reminder put back for the next sweep: same SK and due time, in
+    the bucket containing `now` (older buckets may be past the lookback).
+    Rebuilt from the GSI3 projection, so due_at and ttl come from GSI3SK.
+    """
+    due_at = reminder['GSI3SK'].split('#', 1)[0]
+    due = datetime.strptime(due_at, '%Y-%m-%dT%H:%M:%S')
+    return {
+        'PK': reminder['PK'],
+        'SK': reminder['SK'],
+        'GSI3PK': f"REMINDER#{bucket_of(now)}#{shard_of(reminder['phone_number'])}",
+        'GSI3SK': reminder['GSI3SK'],
+        'phone_number': reminder['phone_number'],
+        'nudge_id': reminder['nudge_id'],
+        'reminder_type': reminder['reminder_type'],
+        'dialect': reminder.get('dialect', 'hi'),
+        'due_at': due_at,
+        'ttl': int((due + timedelta(days=REMINDER_TTL_DAYS)).timestamp())
+    }
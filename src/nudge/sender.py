@@ -1,21 +1,24 @@
 """
 Nudge Sender
-Sends behavioral nudges and schedules reminders
+Sends behavioral nudges and queues their reminders
 """
-import json
 import os
-import boto3
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
 from typing import Dict, Any
 
-dynamodb = boto3.resource('dynamodb')
-scheduler = boto3.client('scheduler')
-secrets = boto3.client('secretsmanager')
-cloudwatch = boto3.client('cloudwatch')
+import active_nudges
+import clients
+import nudge_timeline
+import reminder_queue
+import targeting
+
+dynamodb = clients.resource('dynamodb')
+secrets = clients.client('secretsmanager')
+cloudwatch = clients.client('cloudwatch')
 
 TABLE_NAME = os.environ['TABLE_NAME']
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
 NUDGE_TEMPLATE_NAME = os.environ.get('NUDGE_TEMPLATE_NAME', '').strip()
 USE_NUDGE_TEMPLATE = os.environ.get('USE_NUDGE_TEMPLATE', 'true').lower() == 'true'
 
@@ -47,29 +50,10 @@ def convert_floats_to_decimal(obj):
     return obj
 
 
-def create_reminder_schedule(phone_number: str, nudge_id: str, hours_offset: int, dialect: str):
-    """Create EventBridge Scheduler for reminder"""
-    schedule_time = datetime.utcnow() + timedelta(hours=hours_offset)
-    
-    # Create valid schedule name (alphanumeric, hyphens, underscores only)
-    safe_nudge_id = nudge_id.replace(':', '-').replace('#', '-')
-    schedule_name = f'reminder-{safe_nudge_id}-{hours_offset}h'
-    
-    scheduler.create_schedule(
-        Name=schedule_name,
-        ScheduleExpression=f'at({schedule_time.strftime("%Y-%m-%dT%H:%M:%S")})',
-        Target={
-            'Arn': os.environ['REMINDER_LAMBDA_ARN'],
-            'RoleArn': os.environ['SCHEDULER_ROLE_ARN'],
-            'Input': json.dumps({
-                'phone_number': phone_number,
-                'nudge_id': nudge_id,
-                'reminder_type': f'T+{hours_offset}h',
-                'dialect': dialect
-            })
-        },
-        FlexibleTimeWindow={'Mode': 'OFF'}
-    )
+def queue_reminders(phone_number: str, nudge_id: str, dialect: str, sent_at: datetime):
+    """Write the T+24h and T+48h REMINDER# items picked up by the reminder sweeper"""
+    for hours_offset in reminder_queue.REMINDER_OFFSETS_H:
+        table.put_item(Item=reminder_queue.reminder_item(phone_number, nudge_id, hours_offset, dialect, sent_at))
 
 
 def send_whatsapp_message(phone_number: str, message: str):
@@ -194,47 +178,29 @@ def has_pending_nudge(phone_number: str, activity: str) -> bool:
     """Check if user has a pending nudge for this activity today"""
     today = datetime.utcnow().date().isoformat()
     
-    # Query nudges for this user
-    response = table.query(
-        KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
-        ExpressionAttributeValues={
-            ':pk': f'USER#{phone_number}',
-            ':sk': 'NUDGE#'
-        }
-    )
-    
-    # Check if any nudge is pending and from today
-    for item in response.get('Items', []):
+    # Only open (SENT or REMINDED) nudges are in the active index
+    for item in active_nudges.open_since(table, phone_number, today):
         nudge_id = item.get('SK', '').replace('NUDGE#', '')
         nudge_date = nudge_id.split('T')[0] if 'T' in nudge_id else ''
         nudge_activity = nudge_id.split('#')[-1] if '#' in nudge_id else ''
-        status = item.get('status', 'SENT')  # Default to SENT if not set
         
-        # Check if it's today's nudge for this activity and still pending (SENT or REMINDED, not DONE)
-        if nudge_date == today and nudge_activity == activity and status in ['SENT', 'REMINDED']:
-            print(f"Found existing pending {activity} nudge for {phone_number}: {nudge_id} (status: {status})")
+        if nudge_date == today and nudge_activity == activity:
+            print(f"Found existing pending {activity} nudge for {phone_number}: {nudge_id}")
             return True
     
     return False
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Send nudge and schedule reminders"""
+    """Send nudge and queue reminders"""
     location = event.get('location')
     weather = convert_floats_to_decimal(event.get('weather', {}))
     activity = event.get('activity', 'spray')
+    crop = event.get('crop')
     
-    # Query farmers in this location
-    response = table.query(
-        IndexName='GSI1',
-        KeyConditionExpression='GSI1PK = :location',
-        ExpressionAttributeValues={
-            ':location': f'LOCATION#{location}'
-        }
-    )
-    
-    farmers = response.get('Items', [])
-    print(f"Found {len(farmers)} farmers in {location}")
+    # Consented, onboarded farmers in this location (optionally one crop)
+    farmers = targeting.farmers(table, location, crop)
+    print(f"Found {len(farmers)} farmers in {location}" + (f" growing {crop}" if crop else ''))
     
     nudges_sent = 0
     nudges_skipped = 0
@@ -256,7 +222,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         message += '\n\n' + template['done_prompt']
         
         # Create nudge record in DynamoDB
-        timestamp = datetime.utcnow().isoformat()
+        sent_at = datetime.utcnow()
+        timestamp = sent_at.isoformat()
         nudge_id = f"{timestamp}#{activity}"
         ttl = int(datetime.utcnow().timestamp()) + (180 * 24 * 60 * 60)  # 180 days
         
@@ -264,34 +231,28 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             Item={
                 'PK': f'USER#{phone_number}',
                 'SK': f'NUDGE#{nudge_id}',
-                'GSI2PK': 'NUDGE',
-                'GSI2SK': timestamp,
                 'status': 'SENT',
                 'activity': activity,
                 'weather': weather,
                 'message': message,
-                'ttl': ttl
+                'ttl': ttl,
+                **nudge_timeline.index_keys(phone_number, sent_at),
+                **active_nudges.index_keys(phone_number, nudge_id)
             }
         )
         
         # Send WhatsApp message (template if configured)
         sent = False
         if USE_NUDGE_TEMPLATE and NUDGE_TEMPLATE_NAME:
-            language_code = {
-                'hi': 'hi',
-                'mr': 'mr',
-                'te': 'te',
-                'en': 'en'
-            }.get(dialect, 'hi')
+            language_code = farmer.get('language_code') or targeting.language_code(dialect)
             sent = send_whatsapp_template(phone_number, NUDGE_TEMPLATE_NAME, language_code)
         if not sent:
             send_whatsapp_message(phone_number, message)
 
         emit_metric('NudgesSent', 1)
         
-        # Schedule reminders at T+24h and T+48h
-        create_reminder_schedule(phone_number, nudge_id, 24, dialect)
-        create_reminder_schedule(phone_number, nudge_id, 48, dialect)
+        # Reminders at T+24h and T+48h (cancelled by the nudge going DONE)
+        queue_reminders(phone_number, nudge_id, dialect, sent_at)
         
         nudges_sent += 1
     
@@ -0,0 +1,64 @@
+"""
+Nudge Targeting
+Sparse GSI5 over PROFILE items of farmers who can be nudged
+
+Only completed profiles with consent carry the index keys, so the nudge
+sender reads nobody it must skip:
+
+    GSI5PK: TARGET#{location}
+    GSI5SK: CROP#{crop}#{phone}
+
+The index projects just what a nudge needs (phone_number, dialect, crop,
+language_code), and the sort key lets one query target a single crop.
+Reopening onboarding removes the keys; completing it writes them again.
+
+NOTE: This module is copied into each Lambda package that needs it
+(processor, nudge). Keep the copies identical.
+"""
+from typing import Any, Dict, List, Optional
+
+INDEX_NAME = 'GSI5'
+INDEX_ATTRIBUTES = ('GSI5PK', 'GSI5SK')
+
+# WhatsApp template language per dialect
+LANGUAGE_CODES = {'hi': 'hi', 'mr': 'mr', 'te': 'te', 'en': 'en'}
+
+
+def language_code(dialect: Optional[str]) -> str:
+    return LANGUAGE_CODES.get(dialect, 'hi')
+
+
+def index_keys(profile: Dict[str, Any]) -> Dict[str, str]:
+    """GSI5 attributes for a profile, or {} when the farmer must not be nudged"""
+    if not (profile.get('consent') and profile.get('onboarding_complete')):
+        return {}
+    location, crop = profile.get('location'), profile.get('crop')
+    if not location or not crop:
+        return {}
+    return {
+        'GSI5PK': f'TARGET#{location}',
+        'GSI5SK': f"CROP#{crop}#{profile['phone_number']}",
+        'language_code': language_code(profile.get('dialect'))
+    }
+
+
+def farmers(table, location: str, crop: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Nudgeable farmers in `location`, optionally growing `crop`"""
+    condition = 'GSI5PK = :pk'
+    values = {':pk': f'TARGET#{location}'}
+    if crop:
+        condition += ' AND begins_with(GSI5SK, :crop)'
+        values[':crop'] = f'CROP#{crop}#'
+
+    items, kwargs = [], {}
+    while True:
+        response = table.query(
+            IndexName=INDEX_NAME,
+            KeyConditionExpression=condition,
+            ExpressionAttributeValues=values,
+            **kwargs
+        )
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs = {'ExclusiveStartKey': response['LastEvaluatedKey']}
@@ -4,9 +4,10 @@ Processes messages from SQS: Onboarding state machine + Bedrock RAG queries
 """
 import json
 import os
-import boto3
+import time
 from typing import Dict, Any, Optional
 from datetime import datetime
+from decimal import Decimal
 
 # Import voice output module
 from output import text_to_speech, should_send_voice_response
@@ -14,16 +15,27 @@ from output import text_to_speech, should_send_voice_response
 # Import vision module
 from analyzer import process_image_message
 
-dynamodb = boto3.resource('dynamodb')
-bedrock_agent = boto3.client('bedrock-agent-runtime')
-secrets = boto3.client('secretsmanager')
+import bedrock_client
+import clients
+import etl_table
+import intents
+import model_router
+import profiles
+import targeting
+from tracing import stage, timed, start_trace, emit_reply_latency, emit_model_call
+
+# Built on first use: an onboarding button never constructs the Bedrock client
+dynamodb = clients.resource('dynamodb')
+bedrock_agent = bedrock_client.wrap(clients.client('bedrock-agent-runtime'))
+secrets = clients.client('secretsmanager')
+sqs = clients.client('sqs')
 
 TABLE_NAME = os.environ['TABLE_NAME']
 KB_ID = os.environ['KNOWLEDGE_BASE_ID']
 GUARDRAIL_ID = os.environ['GUARDRAIL_ID']
 GUARDRAIL_VERSION = os.environ['GUARDRAIL_VERSION']
 
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
 
 # Onboarding configuration
 VALID_DISTRICTS = ['Aurangabad', 'Jalna', 'Nagpur']
@@ -31,12 +43,67 @@ VALID_CROPS = ['Cotton', 'Wheat', 'Soybean', 'Maize']
 VALID_LANGUAGES = ['Hindi', 'Marathi', 'Telugu', 'English']
 
 # District -> coordinates (approximate; for geo-based nudges)
+# Decimal: stored on the profile, and DynamoDB rejects floats
 DISTRICT_COORDS = {
-    'Aurangabad': {'lat': 19.8762, 'lon': 75.3433},
-    'Jalna': {'lat': 19.8347, 'lon': 75.8816},
-    'Nagpur': {'lat': 21.1458, 'lon': 79.0882}
+    'Aurangabad': {'lat': Decimal('19.8762'), 'lon': Decimal('75.3433')},
+    'Jalna': {'lat': Decimal('19.8347'), 'lon': Decimal('75.8816')},
+    'Nagpur': {'lat': Decimal('21.1458'), 'lon': Decimal('79.0882')}
+}
+
+# KB retrieval filters built from the farmer's profile, matched against the chunk
+# metadata written by src/kb/ingest.py (kb_manifest.csv crop/region fields)
+RETRIEVAL_FILTERS = os.environ.get('RETRIEVAL_FILTERS', 'true').lower() == 'true'
+
+# District -> state, as used in the manifest `region` column
+DISTRICT_REGION = {
+    'Aurangabad': 'Maharashtra',
+    'Jalna': 'Maharashtra',
+    'Nagpur': 'Maharashtra'
+}
+
+# Documents tagged with these apply to every region / every crop
+GENERAL_REGIONS = ['India', 'Global']
+GENERAL_CROPS = ['Multiple Crops']
+
+# Offline hybrid index packaged with the function (src/kb/build_local_index.py);
+# answers come from it when Bedrock throttles
+LOCAL_KB_DIR = os.environ.get('LOCAL_KB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kb_index'))
+LOCAL_KB_RESULTS = 3
+LOCAL_EXCERPT_CHARS = 350
+
+# Bedrock capacity waits (bedrock_client.py) end at the message deadline: at most
+# MESSAGE_DEADLINE_S after the message is picked up, and early enough to answer
+# before the Lambda times out. A message still throttled then goes back on the
+# queue (up to MAX_REQUEUES times) instead of failing the batch into the DLQ.
+MESSAGE_DEADLINE_S = float(os.environ.get('MESSAGE_DEADLINE_S', '30'))
+ANSWER_RESERVE_S = float(os.environ.get('ANSWER_RESERVE_S', '25'))
+MAX_REQUEUES = int(os.environ.get('MAX_REQUEUES', '5'))
+QUEUE_URL = os.environ.get('QUEUE_URL')
+# Spoken DONE/NOT YET replies go to the response detector (typed ones never reach us)
+NUDGE_REPLY_QUEUE_URL = os.environ.get('NUDGE_REPLY_QUEUE_URL', '')
+
+LOCAL_ANSWER_INTRO = {
+    'hi': 'अभी सेवा व्यस्त है। हमारी मार्गदर्शिकाओं से संबंधित जानकारी (अंग्रेज़ी में):',
+    'mr': 'सध्या सेवा व्यस्त आहे. आमच्या मार्गदर्शिकांमधील संबंधित माहिती (इंग्रजीत):',
+    'te': 'ప్రస్తుతం సేవ బిజీగా ఉంది. మా మార్గదర్శకాల నుండి సంబంధిత సమాచారం (ఆంగ్లంలో):',
+    'en': 'The service is busy right now. Relevant guidance from our sources:'
 }
 
+_local_kb = None
+
+# Precomputed ETL table (src/kb/extract_etl.py): exact threshold questions are
+# answered from it before RAG
+ETL_TABLE_PATH = os.environ.get('ETL_TABLE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'etl_thresholds.json'))
+ETL_ANSWER = {
+    'hi': '{crop} में {pest} का आर्थिक क्षति स्तर (ETL) — कीट इस स्तर को पार करे तभी छिड़काव करें:',
+    'mr': '{crop} पिकातील {pest} ची आर्थिक नुकसान पातळी (ETL) — कीड ही पातळी ओलांडल्यावरच फवारणी करा:',
+    'te': '{crop}లో {pest} ఆర్థిక నష్ట స్థాయి (ETL) — పురుగు ఈ స్థాయి దాటినప్పుడే పిచికారీ చేయండి:',
+    'en': 'Economic threshold level (ETL) for {pest} in {crop} — spray only once the pest crosses it:'
+}
+ETL_SOURCE = {'hi': 'स्रोत', 'mr': 'स्रोत', 'te': 'మూలం', 'en': 'Source'}
+
+_etl_table = None
+
 # Onboarding messages by dialect
 ONBOARDING_MESSAGES = {
     'welcome': {
@@ -71,23 +138,169 @@ ONBOARDING_MESSAGES = {
     }
 }
 
+HELP_MESSAGES = {
+    'hi': '''🌾 AgriNexus AI - मदद
+
+मैं आपकी खेती में मदद कर सकता हूं:
+
+📝 सवाल पूछें:
+• "कपास में कीट कैसे नियंत्रित करें?"
+• "गेहूं में खाद कब डालें?"
+• "मौसम के अनुसार क्या करें?"
+
+📸 फोटो भेजें:
+• पत्तियों की फोटो
+• कीट/रोग की फोटो
+• मैं पहचान करूंगा और सलाह दूंगा
+
+🎤 आवाज़ में पूछें:
+• वॉइस नोट भेजें
+• मैं समझूंगा और जवाब दूंगा
+
+बस अपना सवाल टाइप करें या फोटो भेजें!''',
+    'mr': '''🌾 AgriNexus AI - मदत
 
+मी तुमच्या शेतीत मदत करू शकतो:
+
+📝 प्रश्न विचारा:
+• "कापसात किडे कसे नियंत्रित करावे?"
+• "गहूमध्ये खत कधी घालावे?"
+• "हवामानानुसार काय करावे?"
+
+📸 फोटो पाठवा:
+• पानांचा फोटो
+• किडे/रोगाचा फोटो
+• मी ओळखेन आणि सल्ला देईन
+
+🎤 आवाजात विचारा:
+• व्हॉइस नोट पाठवा
+• मी समजेन आणि उत्तर देईन
+
+फक्त तुमचा प्रश्न टाइप करा किंवा फोटो पाठवा!''',
+    'te': '''🌾 AgriNexus AI - సహాయం
+
+నేను మీ వ్యవసాయంలో సహాయం చేయగలను:
+
+📝 ప్రశ్నలు అడగండి:
+• "పత్తిలో పురుగులను ఎలా నియంత్రించాలి?"
+• "గోధుమలో ఎరువులు ఎప్పుడు వేయాలి?"
+• "వాతావరణం ప్రకారం ఏమి చేయాలి?"
+
+📸 ఫోటో పంపండి:
+• ఆకుల ఫోటో
+• పురుగు/వ్యాధి ఫోటో
+• నేను గుర్తించి సలహా ఇస్తాను
+
+🎤 వాయిస్‌లో అడగండి:
+• వాయిస్ నోట్ పంపండి
+• నేను అర్థం చేసుకుని సమాధానం ఇస్తాను
+
+మీ ప్రశ్న టైప్ చేయండి లేదా ఫోటో పంపండి!''',
+    'en': '''🌾 AgriNexus AI - Help
+
+I can help you with your farming:
+
+📝 Ask Questions:
+• "How to control cotton pests?"
+• "When to apply fertilizer to wheat?"
+• "What to do based on weather?"
+
+📸 Send Photos:
+• Leaf photos
+• Pest/disease photos
+• I'll identify and advise
+
+🎤 Ask by Voice:
+• Send voice note
+• I'll understand and respond
+
+Just type your question or send a photo!'''
+}
+
+# Templated replies for routed intents (intents.py); HELP and onboarding
+# corrections reuse the help text and the onboarding prompts
+INTENT_MODEL_PATH = os.environ.get('INTENT_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_model.json'))
+INTENT_REPLIES = {
+    intents.GREETING: {
+        'hi': 'नमस्ते! 🌾 खेती से जुड़ा कोई भी सवाल पूछें, या फसल की फोटो भेजें।',
+        'mr': 'नमस्कार! 🌾 शेतीविषयी कोणताही प्रश्न विचारा, किंवा पिकाचा फोटो पाठवा.',
+        'te': 'నమస్కారం! 🌾 వ్యవసాయానికి సంబంధించిన ఏ ప్రశ్నైనా అడగండి, లేదా పంట ఫోటో పంపండి.',
+        'en': 'Hello! 🌾 Ask me any farming question, or send a photo of your crop.'
+    },
+    intents.THANKS: {
+        'hi': 'आपका स्वागत है! 🙏 कोई और सवाल हो तो पूछें।',
+        'mr': 'आपले स्वागत आहे! 🙏 आणखी काही प्रश्न असल्यास विचारा.',
+        'te': 'స్వాగతం! 🙏 ఇంకేమైనా ప్రశ్నలు ఉంటే అడగండి.',
+        'en': "You're welcome! 🙏 Ask me anytime."
+    },
+    intents.OFF_TOPIC: {
+        'hi': 'मैं केवल खेती से जुड़े सवालों में मदद कर सकता हूं। कृपया फसल, कीट, खाद या खेत प्रबंधन के बारे में पूछें।',
+        'mr': 'मी फक्त शेतीविषयक प्रश्नांमध्ये मदत करू शकतो. कृपया पीक, कीड, खत किंवा शेती व्यवस्थापनाबद्दल विचारा.',
+        'te': 'నేను వ్యవసాయ ప్రశ్నలకు మాత్రమే సహాయం చేయగలను. దయచేసి పంటలు, పురుగులు, ఎరువులు లేదా వ్యవసాయ నిర్వహణ గురించి అడగండి.',
+        'en': 'I can only help with farming questions. Please ask about crops, pests, fertilizers, or farm management.'
+    },
+    intents.NUDGE_REPLY: {
+        'hi': 'धन्यवाद! रिमाइंडर का जवाब देने के लिए "हो गया" या "अभी नहीं" लिखें।',
+        'mr': 'धन्यवाद! रिमाइंडरला उत्तर देण्यासाठी "झाला" किंवा "अजून नाही" लिहा.',
+        'te': 'ధన్యవాదాలు! రిమైండర్‌కు జవాబుగా "అయ్యింది" లేదా "ఇంకా లేదు" అని పంపండి.',
+        'en': 'Thanks! To answer a reminder, reply "DONE" or "NOT YET".'
+    }
+}
+
+# Profile field -> onboarding state that asks for it again
+CORRECTION_STATES = {'dialect': 'language', 'location': 'location', 'crop': 'crop'}
+
+# Corrections are confirmed with buttons before onboarding is reopened
+CORRECTION_FIELD_NAMES = {
+    'crop': {'hi': 'फसल', 'mr': 'पीक', 'te': 'పంట', 'en': 'crop'},
+    'location': {'hi': 'जिला', 'mr': 'जिल्हा', 'te': 'జిల్లా', 'en': 'district'},
+    'dialect': {'hi': 'भाषा', 'mr': 'भाषा', 'te': 'భాష', 'en': 'language'}
+}
+CORRECTION_CONFIRM = {
+    'hi': 'क्या आप प्रोफ़ाइल में {field} बदलना चाहते हैं?',
+    'mr': 'तुम्हाला प्रोफाइलमधील {field} बदलायचे आहे का?',
+    'te': 'మీ ప్రొఫైల్‌లో {field} మార్చాలనుకుంటున్నారా?',
+    'en': 'Do you want to change the {field} in your profile?'
+}
+# First button confirms; WhatsApp button titles are at most 20 characters
+CORRECTION_BUTTONS = {
+    'hi': ['हाँ, बदलें', 'नहीं'],
+    'mr': ['होय, बदला', 'नाही'],
+    'te': ['అవును, మార్చండి', 'వద్దు'],
+    'en': ['Yes, change it', 'No']
+}
+CORRECTION_KEPT = {
+    'hi': 'ठीक है, आपकी प्रोफ़ाइल नहीं बदली। 👍',
+    'mr': 'ठीक आहे, तुमची प्रोफाइल बदलली नाही. 👍',
+    'te': 'సరే, మీ ప్రొఫైల్ మార్చలేదు. 👍',
+    'en': 'OK, your profile is unchanged. 👍'
+}
+
+_intent_model = None
+
+
+@timed('profile_read')
 def get_user_profile(phone_number: str) -> Optional[Dict[str, Any]]:
-    """Retrieve user profile from DynamoDB"""
-    response = table.get_item(
-        Key={
-            'PK': f'USER#{phone_number}',
-            'SK': 'PROFILE'
-        }
-    )
-    return response.get('Item')
+    """Retrieve user profile from DynamoDB (cached per container once onboarding is complete)"""
+    return profiles.get(table, phone_number)
 
 
 def update_user_profile(phone_number: str, updates: Dict[str, Any]):
-    """Update user profile in DynamoDB"""
-    update_expr = 'SET ' + ', '.join([f'#{k} = :{k}' for k in updates.keys()])
+    """Update user profile in DynamoDB (a None value removes the attribute)"""
+    updates = {**updates, profiles.VERSION_FIELD: profiles.new_version()}
+    sets = {k: v for k, v in updates.items() if v is not None}
+    removes = [f'#{k}' for k, v in updates.items() if v is None]
     expr_names = {f'#{k}': k for k in updates.keys()}
-    expr_values = {f':{k}': v for k, v in updates.items()}
+    expr_values = {f':{k}': v for k, v in sets.items()}
+    if updates.get('onboarding_complete') is False:
+        # Reopened onboarding: out of the nudge targeting index until it completes again
+        removes.extend(targeting.INDEX_ATTRIBUTES)
+    clauses = []
+    if sets:
+        clauses.append('SET ' + ', '.join([f'#{k} = :{k}' for k in sets.keys()]))
+    if removes:
+        clauses.append('REMOVE ' + ', '.join(removes))
+    update_expr = ' '.join(clauses)
     
     table.update_item(
         Key={
@@ -98,26 +311,28 @@ def update_user_profile(phone_number: str, updates: Dict[str, Any]):
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values
     )
+    profiles.invalidate(phone_number)
 
 
 def create_user_profile(phone_number: str, dialect: str, location: str, crop: str, consent: bool):
-    """Create complete user profile"""
-    table.put_item(
-        Item={
-            'PK': f'USER#{phone_number}',
-            'SK': 'PROFILE',
-            'phone_number': phone_number,
-            'dialect': dialect,
-            'location': location,
-            'location_coords': DISTRICT_COORDS.get(location),
-            'crop': crop,
-            'consent': consent,
-            'onboarding_complete': True,
-            'created_at': datetime.utcnow().isoformat(),
-            'GSI1PK': f'LOCATION#{location}',
-            'GSI1SK': f'CROP#{crop}'
-        }
-    )
+    """Create complete user profile (in the nudge targeting index if the farmer consented)"""
+    profile = {
+        'PK': f'USER#{phone_number}',
+        'SK': 'PROFILE',
+        'phone_number': phone_number,
+        'dialect': dialect,
+        'location': location,
+        'location_coords': DISTRICT_COORDS.get(location),
+        'crop': crop,
+        'consent': consent,
+        'onboarding_complete': True,
+        'created_at': datetime.utcnow().isoformat(),
+        profiles.VERSION_FIELD: profiles.new_version(),
+        'GSI1PK': f'LOCATION#{location}',
+        'GSI1SK': f'CROP#{crop}'
+    }
+    table.put_item(Item={**profile, **targeting.index_keys(profile)})
+    profiles.invalidate(phone_number)
 
 
 def handle_onboarding(phone_number: str, message_text: str, profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
@@ -134,7 +349,8 @@ def handle_onboarding(phone_number: str, message_text: str, profile: Optional[Di
                 'SK': 'PROFILE',
                 'phone_number': phone_number,
                 'onboarding_state': 'language',
-                'onboarding_complete': False
+                'onboarding_complete': False,
+                profiles.VERSION_FIELD: profiles.new_version()
             }
         )
         # Send welcome message with language selection buttons
@@ -325,26 +541,221 @@ Please choose your language / कृपया अपनी भाषा चु
     }
 
 
-def save_message(phone_number: str, wamid: str, message_data: Dict[str, Any], response_text: str, source_citation: str):
-    """Save message to DynamoDB with TTL"""
-    timestamp = datetime.utcnow().isoformat()
-    ttl = int(datetime.utcnow().timestamp()) + (90 * 24 * 60 * 60)  # 90 days
+def save_message(phone_number: str, wamid: str, message_data: Dict[str, Any], response_text: str,
+                 source_citation: str, message_sk: Optional[str] = None,
+                 trace: Optional[Dict[str, Any]] = None):
+    """
+    Add the reply to the message's MSG# record, extending its TTL to 90 days
+
+    The webhook wrote the record at ingestion (message_sk in the queue body);
+    this is an UpdateItem on it, so each message is stored and streamed once.
+    Bodies queued without message_sk get a record of their own.
+    """
+    now = datetime.utcnow()
+    ttl = int(now.timestamp()) + (90 * 24 * 60 * 60)  # 90 days
     
-    table.put_item(
-        Item={
-            'PK': f'USER#{phone_number}',
-            'SK': f'MSG#{timestamp}',
-            'wamid': wamid,
-            'message': message_data,
-            'response': response_text,
-            'source_citation': source_citation,
-            'ttl': ttl
+    updates = [
+        'wamid = if_not_exists(wamid, :wamid)',
+        '#message = if_not_exists(#message, :message)',
+        '#response = :response',
+        'source_citation = :citation',
+        'responded_at = :responded_at',
+        '#ttl = :ttl'
+    ]
+    values = {
+        ':wamid': wamid,
+        ':message': message_data,
+        ':response': response_text,
+        ':citation': source_citation,
+        ':responded_at': now.isoformat(),
+        ':ttl': ttl
+    }
+    if message_data.get('_source') == 'voice':
+        # The record holds the audio message; keep what Transcribe heard next to it
+        updates.append('transcript = :transcript')
+        values[':transcript'] = message_data.get('text', {}).get('body', '')
+    if trace and trace.get('received_at'):
+        updates.append('response_ms = :response_ms')
+        values[':response_ms'] = int((time.time() - float(trace['received_at'])) * 1000)
+    
+    with stage('message_write'):
+        table.update_item(
+            Key={'PK': f'USER#{phone_number}', 'SK': message_sk or f'MSG#{now.isoformat()}'},
+            UpdateExpression='SET ' + ', '.join(updates),
+            ExpressionAttributeNames={'#message': 'message', '#response': 'response', '#ttl': 'ttl'},
+            ExpressionAttributeValues=values
+        )
+
+
+def retrieval_filter(profile: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Bedrock vector search filter for the farmer's crop and region
+
+    Crop-general and India/Global documents always stay in the candidate set;
+    a typed-in district we can't map to a state adds no region condition.
+    """
+    if not RETRIEVAL_FILTERS or not profile:
+        return None
+
+    conditions = []
+    crop = profile.get('crop')
+    if crop in VALID_CROPS:
+        conditions.append({'in': {'key': 'crop', 'value': [crop] + GENERAL_CROPS}})
+    region = DISTRICT_REGION.get(profile.get('location'))
+    if region:
+        conditions.append({'in': {'key': 'region', 'value': [region] + GENERAL_REGIONS}})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'andAll': conditions}
+
+
+def _has_references(response: Dict[str, Any]) -> bool:
+    return any(citation.get('retrievedReferences') for citation in response.get('citations', []))
+
+
+def get_local_kb():
+    """Local KB index, loaded (memory-mapped) on first use; None when none is packaged"""
+    global _local_kb
+    if _local_kb is None and os.path.exists(os.path.join(LOCAL_KB_DIR, 'manifest.json')):
+        from local_kb import LocalKnowledgeBase  # numpy is only imported in degraded mode
+        _local_kb = LocalKnowledgeBase(LOCAL_KB_DIR)
+    return _local_kb
+
+
+def _excerpt(text: str) -> str:
+    if len(text) <= LOCAL_EXCERPT_CHARS:
+        return text
+    return text[:LOCAL_EXCERPT_CHARS].rsplit(' ', 1)[0] + '…'
+
+
+@timed('local_kb_retrieve')
+def answer_from_local_kb(query: str, dialect: str, metadata_filter: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Degraded answer: top local KB excerpts, shaped like a RetrieveAndGenerate result"""
+    kb = get_local_kb()
+    if kb is None:
+        return None
+    search = {'numberOfResults': LOCAL_KB_RESULTS}
+    if metadata_filter:
+        search['filter'] = metadata_filter
+    results = kb.retrieve(retrievalQuery={'text': query},
+                          retrievalConfiguration={'vectorSearchConfiguration': search})['retrievalResults']
+    if not results and metadata_filter:
+        return answer_from_local_kb(query, dialect)
+    if not results:
+        return None
+
+    excerpts = '\n\n'.join(f"• {_excerpt(result['content']['text'])}" for result in results)
+    return {
+        'text': f"{LOCAL_ANSWER_INTRO.get(dialect, LOCAL_ANSWER_INTRO['hi'])}\n\n{excerpts}",
+        'citations': [{'retrievedReferences': results}]
+    }
+
+
+def get_intent_model() -> Optional[intents.IntentModel]:
+    """Intent model, loaded on first use; None (rules only) when none is packaged"""
+    global _intent_model
+    if _intent_model is None and os.path.exists(INTENT_MODEL_PATH):
+        _intent_model = intents.IntentModel.load(INTENT_MODEL_PATH)
+    return _intent_model
+
+
+@timed('intent_classify')
+def classify_intent(text: str) -> intents.Intent:
+    return intents.classify(text, get_intent_model())
+
+
+def intent_reply(phone_number: str, intent: intents.Intent, dialect: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reply for a non-agronomy intent, shaped like handle_onboarding's
+    ({'type': 'text'|'buttons', 'content': str, 'buttons': list})
+
+    An onboarding correction only asks the farmer to confirm; the profile is
+    reopened by confirm_correction() when they tap "yes".
+    """
+    if intent.label == intents.ONBOARDING_CORRECTION and intent.field in CORRECTION_STATES:
+        update_user_profile(phone_number, {'pending_correction': intent.field})
+        names = CORRECTION_FIELD_NAMES[intent.field]
+        return {
+            'type': 'buttons',
+            'content': CORRECTION_CONFIRM.get(dialect, CORRECTION_CONFIRM['hi']).format(field=names.get(dialect, names['hi'])),
+            'buttons': CORRECTION_BUTTONS.get(dialect, CORRECTION_BUTTONS['hi'])
         }
-    )
+    if intent.label in INTENT_REPLIES:
+        replies = INTENT_REPLIES[intent.label]
+        return {'type': 'text', 'content': replies.get(dialect, replies['hi'])}
+    return {'type': 'text', 'content': HELP_MESSAGES.get(dialect, HELP_MESSAGES['hi'])}
+
+
+def confirm_correction(phone_number: str, answer: str, dialect: str) -> Optional[Dict[str, Any]]:
+    """
+    Reply to the correction confirmation buttons (None if no correction is pending)
+
+    "Yes" reopens onboarding at the field to change; the remaining steps run
+    as usual and complete the profile again. Any other answer keeps it.
+    """
+    # Read fresh: the pending correction was written after the webhook's snapshot may have been cached
+    profile = table.get_item(Key={'PK': f'USER#{phone_number}', 'SK': 'PROFILE'},
+                             ConsistentRead=True).get('Item') or {}
+    field = profile.get('pending_correction')
+    if field not in CORRECTION_STATES:
+        return None
+    if answer not in {buttons[0] for buttons in CORRECTION_BUTTONS.values()}:
+        update_user_profile(phone_number, {'pending_correction': None})
+        return {'type': 'text', 'content': CORRECTION_KEPT.get(dialect, CORRECTION_KEPT['hi'])}
+    state = CORRECTION_STATES[field]
+    update_user_profile(phone_number, {'onboarding_state': state, 'onboarding_complete': False,
+                                       'pending_correction': None})
+    return handle_onboarding(phone_number, '', {**profile, 'onboarding_state': state})
+
+
+def get_etl_table() -> Optional[etl_table.ETLTable]:
+    """ETL table, loaded on first use; None when none is packaged"""
+    global _etl_table
+    if _etl_table is None and os.path.exists(ETL_TABLE_PATH):
+        _etl_table = etl_table.ETLTable.load(ETL_TABLE_PATH)
+    return _etl_table
+
+
+def _etl_regions(profile: Optional[Dict[str, Any]]) -> list:
+    region = DISTRICT_REGION.get((profile or {}).get('location'))
+    return ([region] if region else []) + GENERAL_REGIONS
+
+
+@timed('etl_lookup')
+def answer_from_etl_table(query: str, dialect: str = 'hi', profile: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Answer an exact threshold question ("how many whiteflies per leaf before I spray")
+    from the ETL table, with citations; None sends the question to RAG
+    """
+    thresholds = get_etl_table()
+    if thresholds is None or not etl_table.is_threshold_question(query):
+        return None
+    pest = etl_table.find_pest(query)
+    crop = etl_table.find_crop(query) or (profile or {}).get('crop')
+    if not pest or not crop:
+        return None
+    rows = thresholds.lookup(crop, pest, _etl_regions(profile))
+    if not rows:
+        return None
 
+    language = dialect if dialect in ETL_ANSWER else 'hi'
+    intro = ETL_ANSWER[language].format(crop=etl_table.crop_name(crop, language),
+                                        pest=etl_table.pest_name(pest, language))
+    lines = [f"• {row['threshold']}\n  {ETL_SOURCE[language]}: {row['title']} ({row['year']}), p. {row['page']}"
+             for row in rows]
+    references = [{
+        'content': {'text': f"{row['label']}: {row['threshold']}"},
+        'location': {'type': 'WEB', 'webLocation': {'url': row['url']}},
+        'metadata': {'document': row['document'], 'page': row['page'], 'etl_table_version': thresholds.version}
+    } for row in rows]
+    print(f"Answered from ETL table {thresholds.version}: {crop}/{pest}")
+    return {'text': intro + '\n\n' + '\n'.join(lines), 'citations': [{'retrievedReferences': references}]}
 
-def query_bedrock(query: str, dialect: str = 'hi') -> Dict[str, Any]:
-    """Query Bedrock Knowledge Base with RAG"""
+
+@timed('bedrock_retrieve_generate')
+def query_bedrock(query: str, dialect: str = 'hi', profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Query Bedrock Knowledge Base with RAG, filtered to the farmer's crop and region when known"""
     # Map dialect to language instruction
     language_instructions = {
         'hi': 'Respond in Hindi (Devanagari script). Use simple, practical language.',
@@ -383,24 +794,78 @@ Provide actionable farming advice with source references.'''
             'guardrailVersion': GUARDRAIL_VERSION
         }
     
-    response = bedrock_agent.retrieve_and_generate(
-        input={'text': query},
-        retrieveAndGenerateConfiguration={
-            'type': 'KNOWLEDGE_BASE',
-            'knowledgeBaseConfiguration': {
-                'knowledgeBaseId': KB_ID,
-                'modelArn': 'arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-sonnet-20240229-v1:0',
-                'generationConfiguration': generation_config
-            }
-        }
-    )
-    
+    kb_config = {
+        'knowledgeBaseId': KB_ID,
+        'generationConfiguration': generation_config
+    }
+    metadata_filter = retrieval_filter(profile)
+    tier = model_router.choose_tier(query)
+
+    try:
+        response = generate_answer(query, kb_config, metadata_filter, tier)
+
+        # A fast-tier answer that fails validation is regenerated on the full model
+        problem = tier == model_router.FAST and model_router.validate_answer(
+            response['output']['text'], dialect, response.get('citations'))
+        if problem:
+            print(f"Fast-tier answer failed validation ({problem}); escalating to the full model")
+            tier = model_router.FULL
+            response = generate_answer(query, kb_config, metadata_filter, tier, escalated=problem)
+    except Exception as e:
+        if not bedrock_client.is_throttle(e):
+            raise
+        local = answer_from_local_kb(query, dialect, metadata_filter)
+        if local is None:
+            raise
+        print(f"Bedrock throttled ({e}); answered from the local KB index")
+        return local
+
     return {
         'text': response['output']['text'],
-        'citations': response.get('citations', [])
+        'citations': response.get('citations', []),
+        'model_tier': tier
     }
 
 
+def _record_model_call(tier: str, started: float, prompt: str, response: Dict[str, Any], **fields):
+    """Latency, estimated tokens and cost of one RetrieveAndGenerate call"""
+    context = ' '.join(reference.get('content', {}).get('text', '')
+                       for citation in response.get('citations', [])
+                       for reference in citation.get('retrievedReferences', []))
+    input_tokens = model_router.estimate_tokens(prompt + context)
+    output_tokens = model_router.estimate_tokens(response['output']['text'])
+    emit_model_call(tier, model_router.model_id(tier), (time.perf_counter() - started) * 1000,
+                    input_tokens, output_tokens, model_router.call_cost(tier, input_tokens, output_tokens), **fields)
+
+
+def generate_answer(query: str, kb_config: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]],
+                    tier: str, escalated: Optional[str] = None) -> Dict[str, Any]:
+    """RetrieveAndGenerate on one model tier, falling back to the unfiltered KB when the filter matches nothing"""
+    kb_config = {**kb_config, 'modelArn': model_router.model_arn(tier)}
+    prompt = kb_config['generationConfiguration']['promptTemplate']['textPromptTemplate'].replace('$query$', query)
+    if metadata_filter:
+        kb_config['retrievalConfiguration'] = {'vectorSearchConfiguration': {'filter': metadata_filter}}
+
+    started = time.perf_counter()
+    response = bedrock_agent.retrieve_and_generate(
+        input={'text': query},
+        retrieveAndGenerateConfiguration={'type': 'KNOWLEDGE_BASE', 'knowledgeBaseConfiguration': kb_config}
+    )
+    _record_model_call(tier, started, prompt, response, escalated=escalated, filtered=bool(metadata_filter))
+
+    # Nothing matched the filter (e.g. no documents for this crop yet): answer from the whole KB
+    if metadata_filter and not _has_references(response):
+        print(f"No KB matches for filter {json.dumps(metadata_filter)}; retrying unfiltered")
+        kb_config.pop('retrievalConfiguration')
+        started = time.perf_counter()
+        response = bedrock_agent.retrieve_and_generate(
+            input={'text': query},
+            retrieveAndGenerateConfiguration={'type': 'KNOWLEDGE_BASE', 'knowledgeBaseConfiguration': kb_config}
+        )
+        _record_model_call(tier, started, prompt, response, escalated=escalated, filtered=False)
+    return response
+
+
 def send_whatsapp_message(phone_number: str, message: str, audio_url: Optional[str] = None):
     """
     Send message via WhatsApp Business API
@@ -541,18 +1006,79 @@ def send_whatsapp_buttons(phone_number: str, body_text: str, buttons: list):
         print(f"Failed to send buttons: {status} - {text}")
 
 
+def message_deadline(context: Any) -> float:
+    """Latest time (epoch seconds) the current message may start a Bedrock call"""
+    deadline = time.time() + MESSAGE_DEADLINE_S
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = min(deadline, time.time() + context.get_remaining_time_in_millis() / 1000 - ANSWER_RESERVE_S)
+    return deadline
+
+
+def requeue_throttled(record: Dict[str, Any], error: Exception):
+    """
+    Put a message Bedrock could not take before its deadline back on the queue
+
+    The copy carries a `requeues` count (so the ack is not sent twice) and its
+    own deduplication ID; past MAX_REQUEUES the error is raised and the message
+    takes the normal retry/DLQ path.
+    """
+    body = json.loads(record['body'])
+    requeues = int(body.get('requeues', 0)) + 1
+    if not QUEUE_URL or requeues > MAX_REQUEUES:
+        raise error
+    with stage('requeue', requeues=requeues):
+        sqs.send_message(
+            QueueUrl=QUEUE_URL,
+            MessageBody=json.dumps({**body, 'requeues': requeues}),
+            MessageGroupId=body['from'],
+            MessageDeduplicationId=f"{body['wamid']}#requeue{requeues}"
+        )
+    print(f"Bedrock busy ({error}); requeued {body['wamid']} (requeue {requeues})")
+
+
+def forward_nudge_reply(record: Dict[str, Any], text: str) -> bool:
+    """
+    Hand a transcribed DONE/NOT YET reply to the response detector
+
+    The detector reads typed replies from the MSG# stream, but a voice note's
+    record holds the audio message, so the transcript is sent on explicitly.
+    """
+    body = json.loads(record['body'])
+    if not NUDGE_REPLY_QUEUE_URL or not body.get('message_sk'):
+        return False
+    with stage('sqs_enqueue', queue='nudge_replies'):
+        sqs.send_message(
+            QueueUrl=NUDGE_REPLY_QUEUE_URL,
+            MessageBody=json.dumps({
+                'wamid': body['wamid'],
+                'from': body['from'],
+                'message_sk': body['message_sk'],
+                'text': text,
+                'profile': body.get('profile'),
+                'trace': body.get('trace')
+            }),
+            MessageGroupId=body['from'],
+            MessageDeduplicationId=body['wamid']
+        )
+    return True
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Process messages from SQS"""
     for record in event['Records']:
-        body = json.loads(record['body'])
+        # parse_float=Decimal: voice-transcribed messages carry a float _confidence,
+        # which DynamoDB rejects when the message is saved
+        body = json.loads(record['body'], parse_float=Decimal)
         
         wamid = body['wamid']
         from_number = body['from']
         message_type = body['type']
         message = body['message']
+        trace = start_trace(body)
+        bedrock_client.set_deadline(message_deadline(context))
         
-        # Get user profile
-        profile = get_user_profile(from_number)
+        # Get user profile (the webhook's snapshot saves a read once onboarding is complete)
+        profile = profiles.from_snapshot(from_number, body.get('profile')) or get_user_profile(from_number)
         
         # Check if onboarding is complete
         if not profile or not profile.get('onboarding_complete', False):
@@ -582,106 +1108,49 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if message_type == 'text':
             text = message.get('text', {}).get('body', '')
             
-            # Check for HELP command
-            if text.strip().upper() in ['HELP', 'मदद', 'मदत', 'సహాయం']:
-                help_messages = {
-                    'hi': '''🌾 AgriNexus AI - मदद
-
-मैं आपकी खेती में मदद कर सकता हूं:
-
-📝 सवाल पूछें:
-• "कपास में कीट कैसे नियंत्रित करें?"
-• "गेहूं में खाद कब डालें?"
-• "मौसम के अनुसार क्या करें?"
-
-📸 फोटो भेजें:
-• पत्तियों की फोटो
-• कीट/रोग की फोटो
-• मैं पहचान करूंगा और सलाह दूंगा
-
-🎤 आवाज़ में पूछें:
-• वॉइस नोट भेजें
-• मैं समझूंगा और जवाब दूंगा
-
-बस अपना सवाल टाइप करें या फोटो भेजें!''',
-                    'mr': '''🌾 AgriNexus AI - मदत
-
-मी तुमच्या शेतीत मदत करू शकतो:
-
-📝 प्रश्न विचारा:
-• "कापसात किडे कसे नियंत्रित करावे?"
-• "गहूमध्ये खत कधी घालावे?"
-• "हवामानानुसार काय करावे?"
-
-📸 फोटो पाठवा:
-• पानांचा फोटो
-• किडे/रोगाचा फोटो
-• मी ओळखेन आणि सल्ला देईन
-
-🎤 आवाजात विचारा:
-• व्हॉइस नोट पाठवा
-• मी समजेन आणि उत्तर देईन
-
-फक्त तुमचा प्रश्न टाइप करा किंवा फोटो पाठवा!''',
-                    'te': '''🌾 AgriNexus AI - సహాయం
-
-నేను మీ వ్యవసాయంలో సహాయం చేయగలను:
-
-📝 ప్రశ్నలు అడగండి:
-• "పత్తిలో పురుగులను ఎలా నియంత్రించాలి?"
-• "గోధుమలో ఎరువులు ఎప్పుడు వేయాలి?"
-• "వాతావరణం ప్రకారం ఏమి చేయాలి?"
-
-📸 ఫోటో పంపండి:
-• ఆకుల ఫోటో
-• పురుగు/వ్యాధి ఫోటో
-• నేను గుర్తించి సలహా ఇస్తాను
-
-🎤 వాయిస్‌లో అడగండి:
-• వాయిస్ నోట్ పంపండి
-• నేను అర్థం చేసుకుని సమాధానం ఇస్తాను
-
-మీ ప్రశ్న టైప్ చేయండి లేదా ఫోటో పంపండి!''',
-                    'en': '''🌾 AgriNexus AI - Help
-
-I can help you with your farming:
-
-📝 Ask Questions:
-• "How to control cotton pests?"
-• "When to apply fertilizer to wheat?"
-• "What to do based on weather?"
-
-📸 Send Photos:
-• Leaf photos
-• Pest/disease photos
-• I'll identify and advise
-
-🎤 Ask by Voice:
-• Send voice note
-• I'll understand and respond
+            # Greetings, thanks, HELP, off-topic, profile corrections and nudge replies
+            # get a templated reply in milliseconds; only agronomy questions go on to RAG
+            intent = classify_intent(text)
+            if (intent.label == intents.NUDGE_REPLY and message.get('_source') == 'voice'
+                    and forward_nudge_reply(record, text)):
+                print(f"Forwarded spoken nudge reply {wamid} to the response detector")
+                continue
+            if intent.label != intents.AGRONOMY:
+                reply = intent_reply(from_number, intent, dialect, profile)
+                save_message(from_number, wamid, message, reply['content'], f'intent:{intent.label}',
+                             body.get('message_sk'), trace)
+                with stage('whatsapp_send', kind='text'):
+                    if reply['type'] == 'buttons':
+                        send_whatsapp_buttons(from_number, reply['content'], reply['buttons'])
+                    else:
+                        send_whatsapp_message(from_number, reply['content'])
+                emit_reply_latency(trace, message_type='text', dialect=dialect, intent=intent.label)
+                continue
 
-Just type your question or send a photo!'''
+            # Exact threshold questions come straight from the ETL table (no ack needed)
+            result = answer_from_etl_table(text, dialect, profile)
+            if result is None:
+                # Send immediate acknowledgment (improves perceived response time)
+                ack_messages = {
+                    'hi': '✓ आपका सवाल मिल गया। जवाब तैयार कर रहे हैं...',
+                    'mr': '✓ तुमचा प्रश्न मिळाला. उत्तर तयार करत आहे...',
+                    'te': '✓ మీ ప్రశ్న అందింది. సమాధానం తయారు చేస్తున్నాము...',
+                    'en': '✓ Question received. Preparing answer...'
                 }
-                send_whatsapp_message(from_number, help_messages.get(dialect, help_messages['hi']))
-                continue
-            
-            # Check for DONE/NOT YET keywords (handled by response detector)
-            # Just process as normal query
-            
-            # Send immediate acknowledgment (improves perceived response time)
-            ack_messages = {
-                'hi': '✓ आपका सवाल मिल गया। जवाब तैयार कर रहे हैं...',
-                'mr': '✓ तुमचा प्रश्न मिळाला. उत्तर तयार करत आहे...',
-                'te': '✓ మీ ప్రశ్న అందింది. సమాధానం తయారు చేస్తున్నాము...',
-                'en': '✓ Question received. Preparing answer...'
-            }
-            send_whatsapp_message(from_number, ack_messages.get(dialect, ack_messages['hi']))
-            
-            # Query Bedrock (this takes ~13 seconds)
-            result = query_bedrock(text, dialect)
+                if not body.get('requeues'):
+                    with stage('ack_send'):
+                        send_whatsapp_message(from_number, ack_messages.get(dialect, ack_messages['hi']))
+
+                # Query Bedrock (this takes ~13 seconds)
+                try:
+                    result = query_bedrock(text, dialect, profile)
+                except bedrock_client.BedrockThrottled as e:
+                    requeue_throttled(record, e)
+                    continue
             
             # Save to DynamoDB
-            save_message(from_number, wamid, message, result['text'], str(result['citations']))
+            save_message(from_number, wamid, message, result['text'], str(result['citations']),
+                         body.get('message_sk'), trace)
             
             # Check if user wants voice response (Hindi, Marathi, English supported)
             send_voice = (dialect in ['hi', 'mr', 'en'] and 
@@ -690,15 +1159,18 @@ Just type your question or send a photo!'''
             if send_voice:
                 # Generate voice output
                 audio_url = text_to_speech(result['text'], dialect, from_number)
-                if audio_url:
-                    # Send voice message
-                    send_whatsapp_message(from_number, result['text'], audio_url=audio_url)
-                else:
-                    # Fallback to text if voice generation fails
-                    send_whatsapp_message(from_number, result['text'])
+                with stage('whatsapp_send', kind='audio' if audio_url else 'text'):
+                    if audio_url:
+                        # Send voice message
+                        send_whatsapp_message(from_number, result['text'], audio_url=audio_url)
+                    else:
+                        # Fallback to text if voice generation fails
+                        send_whatsapp_message(from_number, result['text'])
             else:
                 # Send text response
-                send_whatsapp_message(from_number, result['text'])
+                with stage('whatsapp_send', kind='text'):
+                    send_whatsapp_message(from_number, result['text'])
+            emit_reply_latency(trace, message_type='text', dialect=dialect, model_tier=result.get('model_tier'))
         
         elif message_type == 'image':
             # Process image with Claude Vision
@@ -711,16 +1183,37 @@ Just type your question or send a photo!'''
                 'te': '✓ ఫోటో అందింది. విశ్లేషిస్తున్నాము...',
                 'en': '✓ Photo received. Analyzing...'
             }
-            send_whatsapp_message(from_number, ack_messages.get(dialect, ack_messages['hi']))
+            if not body.get('requeues'):
+                with stage('ack_send'):
+                    send_whatsapp_message(from_number, ack_messages.get(dialect, ack_messages['hi']))
             
             # Analyze image
-            analysis = process_image_message(message, profile)
+            try:
+                analysis = process_image_message(message, profile)
+            except bedrock_client.BedrockThrottled as e:
+                requeue_throttled(record, e)
+                continue
             
             # Save to DynamoDB
-            save_message(from_number, wamid, message, analysis, 'vision_analysis')
+            save_message(from_number, wamid, message, analysis, 'vision_analysis', body.get('message_sk'), trace)
             
             # Send response (text only - no voice for image responses)
-            send_whatsapp_message(from_number, analysis)
+            with stage('whatsapp_send', kind='text'):
+                send_whatsapp_message(from_number, analysis)
+            emit_reply_latency(trace, message_type='image', dialect=dialect)
+        
+        elif message_type == 'interactive':
+            # Button taps from onboarded farmers answer a correction confirmation
+            title = message.get('interactive', {}).get('button_reply', {}).get('title', '')
+            reply = confirm_correction(from_number, title, dialect)
+            if reply is None:
+                print(f"Button reply '{title}' from {from_number} with no pending correction - ignored")
+                continue
+            with stage('whatsapp_send', kind='text'):
+                if reply['type'] == 'buttons':
+                    send_whatsapp_buttons(from_number, reply['content'], reply['buttons'])
+                else:
+                    send_whatsapp_message(from_number, reply['content'])
         
         elif message_type == 'audio':
             # Audio messages are handled by VoiceProcessor Lambda
@@ -0,0 +1,335 @@
+"""
+Intent Router
+Classifies farmer texts so only agronomy questions reach RAG
+
+Two layers, both in-process:
+
+1. Rules for the unambiguous cases: HELP words, emoji-only messages, messages
+   made only of greeting/thanks words, short explicit profile corrections
+   ("change my crop", "मेरी फसल बदलो"), and DONE / NOT YET replies
+   (keywords.py).
+2. A linear model (multinomial logistic regression) over hashed character
+   2-4-grams and words for everything else, trained by
+   scripts/train-intent-model.py on labelled seed examples plus weakly
+   labelled message logs. Weights are stored sparsely (feature -> one weight
+   per label), so scoring a message is one dict probe per feature.
+
+Anything the model is not confident about is treated as an agronomy question:
+a misrouted question costs a farmer an answer, a misrouted "thanks" only
+costs one RAG call. The seed set is small, so greetings and thanks come from
+the rules only, and the model may call a message off-topic only when it is
+very sure and the text names no crop, pest or disease.
+"""
+import json
+import math
+import random
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import etl_table
+import keywords
+
+GREETING = 'greeting'
+THANKS = 'thanks'
+HELP = 'help'
+OFF_TOPIC = 'off_topic'
+ONBOARDING_CORRECTION = 'onboarding_correction'
+NUDGE_REPLY = 'nudge_reply'
+AGRONOMY = 'agronomy'
+LABELS = [AGRONOMY, GREETING, THANKS, HELP, OFF_TOPIC, ONBOARDING_CORRECTION, NUDGE_REPLY]
+
+HELP_WORDS = ['help', 'मदद', 'मदत', 'సహాయం']
+GREETING_WORDS = ['hi', 'hello', 'hey', 'hii', 'namaste', 'namaskar', 'good morning', 'good evening', 'नमस्ते',
+                  'नमस्कार', 'राम राम', 'जय किसान', 'सुप्रभात', 'శుభోదయం', 'నమస్కారం', 'నమస్తే', 'హలో']
+THANKS_WORDS = ['thanks', 'thank you', 'thank u', 'thx', 'ok', 'okay', 'dhanyavad', 'shukriya', 'धन्यवाद',
+                'शुक्रिया', 'आभार', 'ठीक है', 'बरं', 'ధన్యవాదాలు', 'సరే']
+# Words that may pad a greeting or thanks ("hello sir", "thank you ji")
+FILLER_WORDS = ['sir', 'ji', 'madam', 'bhai', 'जी', 'सर', 'भाई', 'साहब', 'गारू', 'very', 'much', 'so']
+THANKS_EMOJI = '🙏👍👌❤♥😊🙂✅'
+
+CHANGE_WORDS = ['change', 'update', 'wrong', 'galat', 'बदल', 'बदला', 'गलत', 'चुकीचा', 'चुकीची', 'మార్చ', 'తప్పు']
+CORRECTION_FIELDS = {
+    'crop': ['crop', 'फसल', 'पीक', 'పంట'],
+    'location': ['district', 'location', 'village', 'जिला', 'जिले', 'जिल्हा', 'गाव', 'जगह', 'జిల్లా', 'ఊరు'],
+    'dialect': ['language', 'भाषा', 'భాష'],
+}
+# A correction names the farmer's own field ("my crop", "मेरी फसल") in a short
+# statement; "wrong pesticide on my crop, what should I do?" is a question
+POSSESSIVE_WORDS = ['my', 'mera', 'meri', 'mere', 'मेरा', 'मेरी', 'मेरे', 'माझा', 'माझी', 'माझे', 'నా']
+QUESTION_WORDS = ['what', 'how', 'which', 'why', 'when', 'should', 'kya', 'kaise', 'क्या', 'कैसे', 'कौन', 'कब',
+                  'क्यों', 'काय', 'कसे', 'कोणते', 'ఏమి', 'ఎలా', 'ఏది', 'ఎందుకు']
+CORRECTION_MAX_WORDS = 6
+
+# Farming words beyond etl_table's crop and pest names (code-mixed spellings included);
+# a message that names one is never off-topic
+FARMING_WORDS = [
+    # crops
+    'crop', 'fasal', 'kheti', 'gehu', 'gehun', 'kapas', 'soyabean', 'makka', 'dhan', 'paddy', 'rice', 'chawal',
+    'potato', 'aloo', 'alu', 'tomato', 'tamatar', 'onion', 'pyaz', 'kanda', 'mango', 'aam', 'banana', 'kela',
+    'chana', 'gram', 'tur', 'arhar', 'moong', 'urad', 'sugarcane', 'ganna', 'chilli', 'mirchi', 'groundnut',
+    'mungfali', 'brinjal', 'baingan', 'vangi', 'jowar', 'bajra', 'mustard', 'sarson', 'grapes', 'pomegranate',
+    'फसल', 'खेती', 'धान', 'चावल', 'आलू', 'टमाटर', 'प्याज', 'आम', 'केला', 'चना', 'अरहर', 'तुअर', 'गन्ना',
+    'मिर्च', 'मूंगफली', 'बैंगन', 'ज्वार', 'बाजरा', 'सरसों', 'पीक', 'भात', 'बटाटा', 'कांदा', 'हरभरा', 'ऊस',
+    'मिरची', 'भुईमूग', 'वांगी', 'डाळिंब', 'द्राक्ष', 'పంట', 'వరి', 'టమాటా', 'ఉల్లి', 'మామిడి', 'అరటి',
+    'మిర్చి', 'వేరుశనగ', 'చెరకు', 'కంది',
+    # pests
+    'pest', 'insect', 'keeda', 'keede', 'kida', 'illi', 'sundi', 'worm', 'fruit fly', 'borer', 'mite', 'caterpillar',
+    'locust', 'कीड़ा', 'कीड़े', 'कीट', 'इल्ली', 'अळी', 'कीड', 'टिड्डी', 'పురుగు', 'దోమ',
+    # diseases
+    'disease', 'blight', 'rust', 'wilt', 'rot', 'mildew', 'leaf curl', 'mosaic', 'virus', 'fungus', 'fungal',
+    'canker', 'smut', 'rog', 'रोग', 'झुलसा', 'गेरुआ', 'उकठा', 'सड़न', 'फफूंद', 'करपा', 'बुरशी', 'मर रोग',
+    'తెగులు', 'వైరస్', 'బూజు',
+]
+
+# Nudge replies are short statements: "हो गया", "not yet, tomorrow"; longer
+# texts or questions that merely contain "later" or "done" are questions
+NUDGE_REPLY_MAX_WORDS = 5
+
+NGRAM_RANGE = (2, 4)
+BUCKETS = 1 << 18
+MIN_CONFIDENCE = 0.6
+OFF_TOPIC_MIN_CONFIDENCE = 0.85
+
+_WORD_RE = re.compile(r'[\wऀ-ॣ०-ॿఀ-౿]+')
+
+
+class Intent(NamedTuple):
+    label: str
+    confidence: float
+    source: str                  # rule, model or default
+    field: Optional[str] = None  # profile field for onboarding corrections
+
+
+def normalize(text: str) -> str:
+    return ' '.join(unicodedata.normalize('NFC', text).casefold().split())
+
+
+def words(text: str) -> List[str]:
+    return _WORD_RE.findall(normalize(text))
+
+
+def _phrases(phrases: Iterable[str]) -> List[List[str]]:
+    return sorted((words(phrase) for phrase in phrases), key=len, reverse=True)
+
+
+_GREETINGS = _phrases(GREETING_WORDS)
+_THANKS = _phrases(THANKS_WORDS)
+_FILLER = set(FILLER_WORDS)
+_HELP = set(normalize(word) for word in HELP_WORDS)
+_POSSESSIVE = set(normalize(word) for word in POSSESSIVE_WORDS)
+_QUESTION = set(normalize(word) for word in QUESTION_WORDS)
+_FARMING_WORDS = [normalize(word) for word in FARMING_WORDS if ' ' not in word]
+_FARMING_PHRASES = [normalize(phrase) for phrase in FARMING_WORDS if ' ' in phrase]
+
+
+def _only(tokens: List[str], phrases: List[List[str]], also: Sequence[List[str]] = ()) -> Tuple[bool, bool]:
+    """(every token is one of phrases/also/filler, any phrase from `phrases` seen)"""
+    i, seen = 0, False
+    while i < len(tokens):
+        if tokens[i] in _FILLER:
+            i += 1
+            continue
+        for phrase in phrases:
+            if tokens[i:i + len(phrase)] == phrase:
+                i, seen = i + len(phrase), True
+                break
+        else:
+            for phrase in also:
+                if tokens[i:i + len(phrase)] == phrase:
+                    i += len(phrase)
+                    break
+            else:
+                return False, seen
+    return True, seen
+
+
+def correction_field(text: str) -> Optional[str]:
+    text = normalize(text)
+    for field, terms in CORRECTION_FIELDS.items():
+        if any(normalize(term) in text for term in terms):
+            return field
+    return None
+
+
+def correction_shaped(text: str) -> bool:
+    """Short statement, not a question: the only shape a profile correction takes"""
+    tokens = words(text)
+    return '?' not in text and len(tokens) <= CORRECTION_MAX_WORDS and not any(token in _QUESTION for token in tokens)
+
+
+def explicit_correction(text: str) -> Optional[str]:
+    """Field named by a short "change my <field>" statement, else None"""
+    if not correction_shaped(text):
+        return None
+    tokens = words(text)
+    if not any(normalize(word) in token for token in tokens for word in CHANGE_WORDS):
+        return None
+    for owner, term in zip(tokens, tokens[1:]):
+        if owner in _POSSESSIVE:
+            for field, terms in CORRECTION_FIELDS.items():
+                if any(term.startswith(normalize(name)) for name in terms):
+                    return field
+    return None
+
+
+def mentions_farming(text: str) -> bool:
+    """Names a crop, pest or disease ("gehu me rust", "tomato me blight")"""
+    if etl_table.find_crop(text) or etl_table.find_pest(text):
+        return True
+    if any(phrase in normalize(text) for phrase in _FARMING_PHRASES):
+        return True
+    return any(token.startswith(word) for token in words(text) for word in _FARMING_WORDS)
+
+
+def rule_intent(text: str) -> Optional[Intent]:
+    """Intent for unambiguous messages, else None"""
+    tokens = words(text)
+    if not tokens:
+        # Emoji / punctuation only: 🙏 and 👍 are thanks, anything else a greeting
+        return Intent(THANKS if any(char in THANKS_EMOJI for char in text) else GREETING, 1.0, 'rule')
+    if normalize(text).strip(' .!?') in _HELP:
+        return Intent(HELP, 1.0, 'rule')
+
+    only, seen = _only(tokens, _THANKS, _GREETINGS)
+    if only and seen:
+        return Intent(THANKS, 1.0, 'rule')
+    only, seen = _only(tokens, _GREETINGS)
+    if only and seen:
+        return Intent(GREETING, 1.0, 'rule')
+
+    field = explicit_correction(text)
+    if field:
+        return Intent(ONBOARDING_CORRECTION, 1.0, 'rule', field)
+
+    if len(tokens) <= NUDGE_REPLY_MAX_WORDS and '?' not in text and keywords.match_keyword(text):
+        return Intent(NUDGE_REPLY, 1.0, 'rule')
+    return None
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode('utf-8')) % BUCKETS
+
+
+def features(text: str) -> Dict[int, float]:
+    """L2-normalised hashed character n-gram and word counts"""
+    text = normalize(text)
+    padded = f' {text} '
+    counts: Counter = Counter()
+    low, high = NGRAM_RANGE
+    for n in range(low, high + 1):
+        for start in range(len(padded) - n + 1):
+            counts[_bucket('c' + padded[start:start + n])] += 1
+    for word in _WORD_RE.findall(text):
+        counts[_bucket('w' + word)] += 1
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {bucket: value / norm for bucket, value in counts.items()}
+
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+
+class IntentModel:
+    """Sparse linear classifier: weights[feature] = one weight per label"""
+
+    def __init__(self, labels: List[str], bias: List[float], weights: Dict[int, List[float]],
+                 version: Optional[str] = None):
+        self.labels = labels
+        self.bias = bias
+        self.weights = weights
+        self.version = version
+
+    def probabilities(self, text: str) -> Dict[str, float]:
+        scores = list(self.bias)
+        for feature, value in features(text).items():
+            row = self.weights.get(feature)
+            if row:
+                for i, weight in enumerate(row):
+                    scores[i] += weight * value
+        return dict(zip(self.labels, _softmax(scores)))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self.probabilities(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def to_dict(self, precision: int = 4) -> Dict[str, object]:
+        weights = {str(feature): [round(weight, precision) for weight in row]
+                   for feature, row in sorted(self.weights.items())
+                   if max(abs(weight) for weight in row) >= 10 ** -precision}
+        return {'version': self.version, 'labels': self.labels, 'buckets': BUCKETS, 'ngram_range': list(NGRAM_RANGE),
+                'bias': [round(value, precision) for value in self.bias], 'weights': weights}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'IntentModel':
+        if data.get('buckets') != BUCKETS or list(data.get('ngram_range', [])) != list(NGRAM_RANGE):
+            raise ValueError('Intent model was trained with different feature settings')
+        return cls(list(data['labels']), list(data['bias']),
+                   {int(feature): row for feature, row in data['weights'].items()}, data.get('version'))
+
+    @classmethod
+    def load(cls, path: str) -> 'IntentModel':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def train(examples: Sequence[Tuple[str, str]], epochs: int = 30, learning_rate: float = 2.0,
+          l2: float = 0.0, seed: int = 0) -> IntentModel:
+    """Multinomial logistic regression by SGD over (text, label) examples"""
+    labels = [label for label in LABELS if any(example[1] == label for example in examples)]
+    index = {label: i for i, label in enumerate(labels)}
+    data = [(features(text), index[label]) for text, label in examples]
+    bias = [0.0] * len(labels)
+    weights: Dict[int, List[float]] = {}
+    rng = random.Random(seed)
+
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        rate = learning_rate / (1 + epoch * 0.1)
+        for vector, target in data:
+            scores = list(bias)
+            for feature, value in vector.items():
+                row = weights.get(feature)
+                if row:
+                    for i, weight in enumerate(row):
+                        scores[i] += weight * value
+            probabilities = _softmax(scores)
+            for i, probability in enumerate(probabilities):
+                gradient = probability - (1.0 if i == target else 0.0)
+                bias[i] -= rate * gradient
+                for feature, value in vector.items():
+                    row = weights.setdefault(feature, [0.0] * len(labels))
+                    row[i] -= rate * (gradient * value + l2 * row[i])
+
+    model = IntentModel(labels, bias, weights)
+    digest = zlib.crc32(json.dumps(model.to_dict(), sort_keys=True).encode('utf-8'))
+    model.version = f'{digest:08x}'
+    return model
+
+
+def classify(text: str, model: Optional[IntentModel] = None) -> Intent:
+    """Rules first, then the model; low-confidence predictions default to agronomy"""
+    ruled = rule_intent(text)
+    if ruled:
+        return ruled
+    if model is None:
+        return Intent(AGRONOMY, 0.0, 'default')
+    label, confidence = model.predict(text)
+    if label in (GREETING, THANKS):
+        return Intent(AGRONOMY, confidence, 'default')  # rules only: "mandi bhav kya hai" is not a greeting
+    if label != AGRONOMY and confidence < MIN_CONFIDENCE:
+        return Intent(AGRONOMY, confidence, 'default')
+    if label == OFF_TOPIC and (confidence < OFF_TOPIC_MIN_CONFIDENCE or mentions_farming(text)):
+        return Intent(AGRONOMY, confidence, 'default')
+    if label == ONBOARDING_CORRECTION and not correction_shaped(text):
+        return Intent(AGRONOMY, confidence, 'default')  # a question that mentions a crop or district
+    field = correction_field(text) if label == ONBOARDING_CORRECTION else None
+    if label == ONBOARDING_CORRECTION and field is None:
+        return Intent(HELP, confidence, 'model')  # can't tell what to change: show the options
+    return Intent(label, confidence, 'model', field)
@@ -0,0 +1,132 @@
+"""
+Model Router
+Picks the Bedrock model tier for each generation request
+
+Two tiers:
+- fast: a small, cheap model (Claude 3 Haiku by default) for short factual
+  questions
+- full: Claude 3 Sonnet for complex or multi-part questions, image diagnosis,
+  and whenever a fast-tier answer fails validation (escalation)
+
+Policy (environment):
+    MODEL_ROUTING       tiered (default) | fast | full  - full/fast pin every request to one tier
+    FAST_MODEL_ID       model for the fast tier
+    FULL_MODEL_ID       model for the full tier
+    FAST_MAX_WORDS      longer questions go to the full tier (default 25)
+    VISION_MODEL_TIER   tier for image analysis under tiered routing (default full)
+
+Token counts are estimated (UTF-8 bytes / 4) where Bedrock does not report
+usage (RetrieveAndGenerate); costs use on-demand prices per 1k tokens.
+
+NOTE: This module is copied into the processor and vision packages. Keep the
+copies identical.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+FAST = 'fast'
+FULL = 'full'
+TIERED = 'tiered'
+
+BEDROCK_REGION = 'us-east-1'
+MODEL_IDS = {
+    FAST: os.environ.get('FAST_MODEL_ID', 'anthropic.claude-3-haiku-20240307-v1:0'),
+    FULL: os.environ.get('FULL_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0'),
+}
+MODEL_ROUTING = os.environ.get('MODEL_ROUTING', TIERED)
+FAST_MAX_WORDS = int(os.environ.get('FAST_MAX_WORDS', '25'))
+VISION_MODEL_TIER = os.environ.get('VISION_MODEL_TIER', FULL)
+
+# USD per 1k (input, output) tokens, on-demand us-east-1
+MODEL_PRICES = {
+    'anthropic.claude-3-haiku-20240307-v1:0': (0.00025, 0.00125),
+    'anthropic.claude-3-sonnet-20240229-v1:0': (0.003, 0.015),
+}
+
+# Words that ask a question; two or more usually means a multi-part question.
+# Yes/no particles (kya, क्या) and words that double as grammar (Marathi का) are left out.
+QUESTION_WORDS = ['how', 'what', 'when', 'which', 'why', 'where', 'kaise', 'kab', 'kaun', 'kyon',
+                  'कैसे', 'कब', 'कौन', 'क्यों', 'कितना', 'कसे', 'काय', 'कधी', 'कोणते', 'किती',
+                  'ఎలా', 'ఏమి', 'ఎప్పుడు', 'ఏ', 'ఎందుకు', 'ఎంత']
+# Requests for comparison, explanation or planning need the full model
+COMPLEX_TERMS = ['compare', 'difference', 'versus', ' vs ', 'explain', 'plan', 'schedule', 'step by step',
+                 'तुलना', 'अंतर', 'फर्क', 'समझाइए', 'योजना', 'फरक', 'नियोजन', 'పోల్చ', 'తేడా', 'ప్రణాళిక']
+REFUSAL_MARKERS = ['I cannot answer', "I don't have enough information",
+                   'Sorry, I am unable to assist you with this request']
+# The prompt's own reply to off-topic questions: a correct final answer, not a failure to escalate
+SCOPE_REFUSALS = ['I can only help with farming questions', 'मैं केवल खेती से जुड़े सवालों में मदद कर सकता हूं',
+                  'मी फक्त शेतीविषयक प्रश्नांमध्ये मदत करू शकतो', 'నేను వ్యవసాయ ప్రశ్నలకు మాత్రమే సహాయం చేయగలను']
+MIN_ANSWER_CHARS = 40
+MIN_SCRIPT_SHARE = 0.3
+
+_WORD_RE = re.compile(r'[\wऀ-ॣ०-ॿఀ-౿]+')
+_LIST_ITEM_RE = re.compile(r'(?:^|\n)\s*(?:\d+[.)]|[-•*])\s')
+_SCRIPTS = {
+    'hi': re.compile(r'[ऀ-ॿ]'),
+    'mr': re.compile(r'[ऀ-ॿ]'),
+    'te': re.compile(r'[ఀ-౿]'),
+    'en': re.compile(r'[A-Za-z]'),
+}
+_QUESTION_WORDS = set(QUESTION_WORDS)
+
+
+def model_id(tier: str) -> str:
+    return MODEL_IDS[tier]
+
+
+def model_arn(tier: str) -> str:
+    return f'arn:aws:bedrock:{BEDROCK_REGION}::foundation-model/{MODEL_IDS[tier]}'
+
+
+def is_complex(text: str) -> bool:
+    """Long, multi-part, listed, or comparison/explanation questions"""
+    lowered = f" {text.casefold()} "
+    words = _WORD_RE.findall(lowered)
+    return (len(words) > FAST_MAX_WORDS
+            or text.count('?') > 1
+            or len(_LIST_ITEM_RE.findall(text)) > 1
+            or sum(word in _QUESTION_WORDS for word in words) > 1
+            or any(term in lowered for term in COMPLEX_TERMS))
+
+
+def choose_tier(text: str) -> str:
+    if MODEL_ROUTING in MODEL_IDS:
+        return MODEL_ROUTING
+    return FULL if is_complex(text) else FAST
+
+
+def choose_vision_tier() -> str:
+    return MODEL_ROUTING if MODEL_ROUTING in MODEL_IDS else VISION_MODEL_TIER
+
+
+def _has_references(citations: Optional[List[Dict[str, Any]]]) -> bool:
+    return any(citation.get('retrievedReferences') for citation in citations or [])
+
+
+def validate_answer(text: str, dialect: Optional[str] = None, citations: Optional[List[Dict[str, Any]]] = None,
+                    require_citations: bool = True) -> Optional[str]:
+    """Why an answer is not good enough to send (None if it is)"""
+    text = (text or '').strip()
+    if any(refusal.casefold() in text.casefold() for refusal in SCOPE_REFUSALS):
+        return None
+    if len(text) < MIN_ANSWER_CHARS:
+        return 'too_short'
+    if any(marker.casefold() in text.casefold() for marker in REFUSAL_MARKERS):
+        return 'refusal'
+    if require_citations and not _has_references(citations):
+        return 'no_citations'
+    script = _SCRIPTS.get(dialect or '')
+    letters = [char for char in text if char.isalpha()]
+    if script and letters and sum(bool(script.match(char)) for char in letters) / len(letters) < MIN_SCRIPT_SHARE:
+        return 'wrong_language'
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len((text or '').encode('utf-8')) // 4)
+
+
+def call_cost(tier: str, input_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(MODEL_IDS[tier], (0.0, 0.0))
+    return round(input_tokens / 1000 * input_price + output_tokens / 1000 * output_price, 6)
@@ -1,16 +1,24 @@
 """
 Vision Analyzer
-Uses Claude 3 Sonnet Vision for pest/disease identification from images
+Uses Claude 3 Vision for pest/disease identification from images
+
+The model tier comes from model_router (VISION_MODEL_TIER, Sonnet by default);
+a fast-tier analysis that fails validation is redone on the full model.
 """
-import boto3
 import json
 import base64
 import os
+import time
 from typing import Dict, Any, Optional
 
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
-secrets = boto3.client('secretsmanager', region_name='us-east-1')
+import bedrock_client
+import clients
+import model_router
+from tracing import stage, emit_model_call
+
+bedrock = bedrock_client.wrap(clients.client('bedrock-runtime', region_name='us-east-1'))
+s3 = clients.client('s3', region_name='us-east-1')
+secrets = clients.client('secretsmanager', region_name='us-east-1')
 
 TEMP_BUCKET = os.environ.get('TEMP_AUDIO_BUCKET')
 if not TEMP_BUCKET:
@@ -41,6 +49,49 @@ def download_whatsapp_image(media_id: str) -> bytes:
         return response.read()
 
 
+def invoke_vision_model(tier: str, image_base64: str, prompt: str, dialect: str, crop: str,
+                        escalated: Optional[str] = None) -> str:
+    """One Claude Vision call on the given model tier; returns the analysis text"""
+    started = time.perf_counter()
+    with stage('vision_analyze', dialect=dialect, crop=crop, tier=tier):
+        response = bedrock.invoke_model(
+            modelId=model_router.model_id(tier),
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 2000,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/jpeg",
+                                    "data": image_base64
+                                }
+                            },
+                            {
+                                "type": "text",
+                                "text": prompt
+                            }
+                        ]
+                    }
+                ]
+            })
+        )
+    
+    response_body = json.loads(response['body'].read())
+    analysis = response_body['content'][0]['text']
+    usage = response_body.get('usage') or {}
+    input_tokens = usage.get('input_tokens') or model_router.estimate_tokens(prompt)
+    output_tokens = usage.get('output_tokens') or model_router.estimate_tokens(analysis)
+    emit_model_call(tier, model_router.model_id(tier), (time.perf_counter() - started) * 1000, input_tokens,
+                    output_tokens, model_router.call_cost(tier, input_tokens, output_tokens), escalated=escalated,
+                    kind='vision')
+    return analysis
+
+
 def analyze_crop_image(image_bytes: bytes, dialect: str, crop: str = 'cotton') -> Dict[str, Any]:
     """
     Analyze crop image for pests, diseases, or nutrient deficiencies
@@ -90,40 +141,17 @@ If you cannot identify a specific problem, say so clearly and suggest general cr
 Format your response clearly with sections for Diagnosis, Severity, Recommendations, and Confidence level.
 """
     
-    # Call Claude 3 Sonnet Vision
-    print(f"Analyzing image with Claude 3 Sonnet Vision (dialect: {dialect}, crop: {crop})")
+    tier = model_router.choose_vision_tier()
+    print(f"Analyzing image with {model_router.model_id(tier)} (dialect: {dialect}, crop: {crop})")
     
     try:
-        response = bedrock.invoke_model(
-            modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 2000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": image_base64
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            })
-        )
+        analysis = invoke_vision_model(tier, image_base64, prompt, dialect=dialect, crop=crop)
         
-        # Parse response
-        response_body = json.loads(response['body'].read())
-        analysis = response_body['content'][0]['text']
+        problem = tier == model_router.FAST and model_router.validate_answer(analysis, dialect, require_citations=False)
+        if problem:
+            print(f"Fast-tier analysis failed validation ({problem}); escalating to the full model")
+            analysis = invoke_vision_model(model_router.FULL, image_base64, prompt, dialect=dialect, crop=crop,
+                                           escalated=problem)
         
         print(f"Vision analysis complete: {len(analysis)} characters")
         
@@ -153,6 +181,8 @@ Format your response clearly with sections for Diagnosis, Severity, Recommendati
             'raw_analysis': analysis
         }
         
+    except bedrock_client.BedrockThrottled:
+        raise  # the processor requeues the message rather than apologising
     except Exception as e:
         print(f"Error analyzing image: {e}")
         
@@ -193,7 +223,8 @@ def process_image_message(message: Dict[str, Any], user_profile: Dict[str, Any])
         
         # Download image from WhatsApp
         print("Downloading image from WhatsApp...")
-        image_bytes = download_whatsapp_image(image_id)
+        with stage('media_download', kind='image'):
+            image_bytes = download_whatsapp_image(image_id)
         print(f"Downloaded {len(image_bytes)} bytes")
         
         # Optional: Save to S3 for record-keeping
@@ -202,12 +233,13 @@ def process_image_message(message: Dict[str, Any], user_profile: Dict[str, Any])
         phone = user_profile.get('phone_number', 'unknown')
         s3_key = f"images/{phone}/{timestamp}.jpg"
         
-        s3.put_object(
-            Bucket=TEMP_BUCKET,
-            Key=s3_key,
-            Body=image_bytes,
-            ContentType='image/jpeg'
-        )
+        with stage('s3_upload', kind='image'):
+            s3.put_object(
+                Bucket=TEMP_BUCKET,
+                Key=s3_key,
+                Body=image_bytes,
+                ContentType='image/jpeg'
+            )
         print(f"Saved to S3: s3://{TEMP_BUCKET}/{s3_key}")
         
         # Analyze image
@@ -215,6 +247,8 @@ def process_image_message(message: Dict[str, Any], user_profile: Dict[str, Any])
         
         return result['recommendations']
         
+    except bedrock_client.BedrockThrottled:
+        raise
     except Exception as e:
         print(f"Error processing image message: {e}")
         
@@ -0,0 +1,314 @@
+"""
+Throttling-aware Bedrock Client
+Wraps bedrock-runtime / bedrock-agent-runtime so bursts queue up instead of failing
+
+Three layers, applied to every RetrieveAndGenerate / Retrieve / InvokeModel call:
+
+1. AIMDLimiter: per-container concurrency limit. Each success raises it by
+   1/limit (about +1 per round of calls), each throttle halves it.
+2. TokenBucket: one request budget per model shared by every container, kept
+   in the DynamoDB table (PK RATELIMIT#<model>, SK BUCKET). The refill rate is
+   AIMD-controlled too: successes add to it, a throttle halves it (at most once
+   per cooldown, however many containers saw the throttle) and empties the bucket.
+   Writes are optimistic (conditional on a version number), so taking a token
+   is one PutItem in the common case.
+3. Retries with full-jitter exponential backoff on throttling and transient
+   errors, for as long as the current message's deadline allows (at most
+   BEDROCK_MAX_ATTEMPTS attempts).
+
+When the deadline passes, BedrockThrottled is raised. It looks like a
+ThrottlingException to callers, so the processor's local-KB fallback and
+requeue logic treat it like one. botocore's own retries are turned off for
+Bedrock clients (clients.py) so attempts are not multiplied.
+
+Configuration (environment):
+    BEDROCK_CONCURRENCY        initial per-container limit (default 4; min 1, max BEDROCK_MAX_CONCURRENCY=16)
+    BEDROCK_RATE               initial shared requests/second per model (default 2)
+    BEDROCK_MIN_RATE / BEDROCK_MAX_RATE   bounds for the shared rate (0.2 / 20)
+    BEDROCK_BURST              bucket size (default 10)
+    BEDROCK_SHARED_BUCKET      'false' disables the DynamoDB bucket
+
+NOTE: This module is copied into the processor and vision packages. Keep the
+copies identical.
+"""
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+
+import clients
+from tracing import emit_stage
+
+THROTTLE_ERRORS = ('ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException')
+TRANSIENT_ERRORS = ('ServiceUnavailableException', 'ModelNotReadyException', 'InternalServerException')
+
+INITIAL_CONCURRENCY = float(os.environ.get('BEDROCK_CONCURRENCY', '4'))
+MAX_CONCURRENCY = float(os.environ.get('BEDROCK_MAX_CONCURRENCY', '16'))
+INITIAL_RATE = float(os.environ.get('BEDROCK_RATE', '2'))
+MIN_RATE = float(os.environ.get('BEDROCK_MIN_RATE', '0.2'))
+MAX_RATE = float(os.environ.get('BEDROCK_MAX_RATE', '20'))
+BURST = float(os.environ.get('BEDROCK_BURST', '10'))
+SHARED_BUCKET = os.environ.get('BEDROCK_SHARED_BUCKET', 'true').lower() == 'true'
+MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '8'))
+
+DECREASE_FACTOR = 0.5
+RATE_INCREASE = 0.5          # shared rate: about +0.5 req/s per second of clean traffic
+DECREASE_COOLDOWN_S = 2.0    # one halving per throttle wave, not one per container
+BASE_BACKOFF_S = 0.5
+MAX_BACKOFF_S = 8.0
+DEFAULT_DEADLINE_S = 30.0
+MAX_CONFLICTS = 5
+
+RATE_LIMIT_PREFIX = 'RATELIMIT#'
+BUCKET_SK = 'BUCKET'
+
+# Deadline (epoch seconds) of the message currently being handled; the
+# processor sets it per SQS record, like tracing's correlation ID.
+_deadline: Optional[float] = None
+
+
+def set_deadline(deadline: Optional[float]):
+    """Set the latest time a Bedrock call for the current message may start"""
+    global _deadline
+    _deadline = deadline
+
+
+def time_left(clock: Callable[[], float] = time.time) -> float:
+    deadline = _deadline if _deadline is not None else clock() + DEFAULT_DEADLINE_S
+    return deadline - clock()
+
+
+def error_code(error: Exception) -> Optional[str]:
+    return (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def is_throttle(error: Exception) -> bool:
+    return error_code(error) in THROTTLE_ERRORS or type(error).__name__ in THROTTLE_ERRORS
+
+
+def is_retryable(error: Exception) -> bool:
+    return (is_throttle(error) or error_code(error) in TRANSIENT_ERRORS
+            or type(error).__name__ in TRANSIENT_ERRORS)
+
+
+class BedrockThrottled(Exception):
+    """Bedrock capacity was not available before the message deadline"""
+
+    response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class AIMDLimiter:
+    """In-process concurrency limit: additive increase on success, multiplicative decrease on throttle"""
+
+    def __init__(self, initial: float = INITIAL_CONCURRENCY, minimum: float = 1.0,
+                 maximum: float = MAX_CONCURRENCY, decrease: float = DECREASE_FACTOR):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to `timeout` seconds; False if none freed up"""
+        end = time.monotonic() + max(0.0, timeout)
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, throttled: bool = False, succeeded: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class TokenBucket:
+    """Request budget shared by all containers through one DynamoDB item"""
+
+    def __init__(self, table, name: str, rate: float = INITIAL_RATE, burst: float = BURST,
+                 min_rate: float = MIN_RATE, max_rate: float = MAX_RATE, clock: Callable[[], float] = time.time):
+        self.table = table
+        self.key = {'PK': f'{RATE_LIMIT_PREFIX}{name}', 'SK': BUCKET_SK}
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.clock = clock
+        self._state: Optional[Dict[str, Any]] = None
+        self._increase = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        item = self.table.get_item(Key=self.key, ConsistentRead=True).get('Item')
+        if not item:
+            return {'tokens': self.burst, 'rate': self.initial_rate, 'updated_at': self.clock(),
+                    'decreased_at': 0.0, 'version': 0}
+        return {'tokens': float(item['tokens']), 'rate': float(item['rate']), 'updated_at': float(item['updated_at']),
+                'decreased_at': float(item.get('decreased_at', 0)), 'version': int(item['version'])}
+
+    def _write(self, state: Dict[str, Any], version: int) -> bool:
+        """Conditional put of the new state; False if another container wrote first"""
+        state = {field: round(state[field], 3) for field in ('tokens', 'rate', 'updated_at', 'decreased_at')}
+        item = {**self.key, 'version': version + 1, **{field: Decimal(str(value)) for field, value in state.items()}}
+        if version:
+            condition = {'ConditionExpression': '#version = :version', 'ExpressionAttributeNames': {'#version': 'version'},
+                         'ExpressionAttributeValues': {':version': version}}
+        else:
+            condition = {'ConditionExpression': 'attribute_not_exists(PK)'}
+        try:
+            self.table.put_item(Item=item, **condition)
+        except Exception as e:
+            if 'ConditionalCheckFailed' not in (error_code(e) or type(e).__name__):
+                raise
+            return False
+        self._state = {**state, 'version': version + 1}
+        return True
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one should be available"""
+        with self._lock:
+            state = self._state or self._read()
+            for _ in range(MAX_CONFLICTS):
+                now = self.clock()
+                tokens = min(self.burst, state['tokens'] + max(0.0, now - state['updated_at']) * state['rate'])
+                if tokens < 1:
+                    self._state = state
+                    return (1 - tokens) / state['rate']
+                rate = min(self.max_rate, state['rate'] + self._increase)
+                if self._write({**state, 'tokens': tokens - 1, 'rate': rate, 'updated_at': now}, state['version']):
+                    self._increase = 0.0
+                    return 0.0
+                state = self._read()
+            self._state = None
+            return random.uniform(0.05, 0.2)  # heavy contention: back off briefly
+
+    def acquire(self, deadline: float, sleep: Callable[[float], None] = time.sleep) -> bool:
+        """Wait for a token until `deadline` (epoch seconds); False if the deadline comes first"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if self.clock() + wait > deadline:
+                return False
+            sleep(wait + random.uniform(0, wait * 0.1))
+
+    def on_success(self):
+        """Additive increase, written with the next token taken"""
+        with self._lock:
+            rate = (self._state or {}).get('rate') or self.initial_rate
+            self._increase += RATE_INCREASE / rate
+
+    def on_throttle(self):
+        """Halve the shared rate and empty the bucket (once per cooldown across containers)"""
+        with self._lock:
+            self._increase = 0.0
+            for _ in range(MAX_CONFLICTS):
+                state = self._read()
+                now = self.clock()
+                if now - state['decreased_at'] < DECREASE_COOLDOWN_S:
+                    self._state = state
+                    return
+                rate = max(self.min_rate, state['rate'] * DECREASE_FACTOR)
+                if self._write({**state, 'tokens': 0.0, 'rate': rate, 'updated_at': now, 'decreased_at': now},
+                               state['version']):
+                    print(f"Bedrock throttled: shared rate for {self.key['PK']} cut to {rate:.2f} req/s")
+                    return
+
+
+def _model_name(model: str) -> str:
+    return model.rsplit('/', 1)[-1]
+
+
+class BedrockClient:
+    """bedrock-runtime / bedrock-agent-runtime client with limiter, shared bucket and deadline-bound retries"""
+
+    def __init__(self, client, table=None, limiter: Optional[AIMDLimiter] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.time):
+        self.client = client
+        self.table = table
+        self.limiter = limiter or AIMDLimiter()
+        self.sleep = sleep
+        self.clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+
+    def bucket(self, name: str) -> Optional[TokenBucket]:
+        if self.table is None:
+            return None
+        with self._buckets_lock:
+            if name not in self._buckets:
+                self._buckets[name] = TokenBucket(self.table, name, clock=self.clock)
+            return self._buckets[name]
+
+    def retrieve_and_generate(self, **kwargs):
+        model = kwargs['retrieveAndGenerateConfiguration'].get('knowledgeBaseConfiguration', {}).get('modelArn', '')
+        return self._call('retrieve_and_generate', _model_name(model), kwargs)
+
+    def retrieve(self, **kwargs):
+        return self._call('retrieve', 'retrieve', kwargs)
+
+    def invoke_model(self, **kwargs):
+        return self._call('invoke_model', _model_name(kwargs['modelId']), kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def _call(self, operation: str, resource: str, kwargs: Dict[str, Any]):
+        bucket = self.bucket(resource)
+        deadline = self.clock() + time_left(self.clock)
+        attempt = 0
+        while True:
+            started = self.clock()
+            if not self.limiter.acquire(deadline - started):
+                raise BedrockThrottled(f'{operation}: no free Bedrock slot before the message deadline')
+            throttled = succeeded = False
+            try:
+                if bucket is not None and not bucket.acquire(deadline, self.sleep):
+                    raise BedrockThrottled(f'{operation}: shared {resource} budget exhausted until the message deadline')
+                waited_ms = (self.clock() - started) * 1000
+                if waited_ms >= 1:
+                    emit_stage('bedrock_rate_wait', waited_ms, resource=resource, attempt=attempt)
+                try:
+                    response = getattr(self.client, operation)(**kwargs)
+                except Exception as error:
+                    if not is_retryable(error):
+                        raise
+                    throttled = is_throttle(error)
+                    if throttled and bucket is not None:
+                        bucket.on_throttle()
+                    attempt += 1
+                    delay = random.uniform(0, min(MAX_BACKOFF_S, BASE_BACKOFF_S * 2 ** attempt))
+                    if attempt >= MAX_ATTEMPTS or self.clock() + delay > deadline:
+                        raise BedrockThrottled(f'{operation}: {error_code(error) or type(error).__name__} '
+                                               f'after {attempt} attempts') from error
+                    print(f"Bedrock {operation} {error_code(error) or type(error).__name__}; "
+                          f"retry {attempt} in {delay:.2f}s")
+                else:
+                    succeeded = True
+                    if bucket is not None:
+                        bucket.on_success()
+                    return response
+            finally:
+                self.limiter.release(throttled=throttled, succeeded=succeeded)
+            self.sleep(delay)
+
+
+def shared_table():
+    """The DynamoDB table holding the shared buckets (None when disabled or not configured)"""
+    table_name = os.environ.get('TABLE_NAME')
+    return clients.table(table_name) if SHARED_BUCKET and table_name else None
+
+
+def wrap(client) -> BedrockClient:
+    return BedrockClient(client, shared_table())
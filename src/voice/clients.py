@@ -0,0 +1,109 @@
+"""
+Lazy AWS Clients
+boto3 clients and resources built on first use instead of at import time
+
+Module globals stay assignable (`sqs = clients.client('sqs')`), so tests and
+the load harness can still replace them with fakes; the real client is only
+constructed when an attribute is first accessed. Clients are shared per
+container: two modules asking for the same service get the same instance.
+
+Every client gets a botocore Config with short connect timeouts, standard
+retries and a connection pool sized for threaded fan-out; SERVICE_CONFIG
+overrides that per service (Bedrock calls are slow, DynamoDB ones are not).
+
+NOTE: This module is copied into each Lambda package (webhook, processor,
+voice, vision, nudge, dlq, weather, kb). Keep the copies identical.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25'))
+
+DEFAULT_CONFIG = {
+    'connect_timeout': 2,
+    'read_timeout': 10,
+    'retries': {'mode': 'standard', 'max_attempts': 3},
+    'max_pool_connections': MAX_POOL_CONNECTIONS,
+    'tcp_keepalive': True,
+}
+
+SERVICE_CONFIG = {
+    # Throttling is common under burst; bedrock_client.py retries within the message deadline
+    # against a budget shared across containers, so botocore must not retry on top of it
+    'bedrock-runtime': {'read_timeout': 120, 'retries': {'mode': 'standard', 'max_attempts': 1}},
+    'bedrock-agent-runtime': {'read_timeout': 60, 'retries': {'mode': 'standard', 'max_attempts': 1}},
+    # Single-digit ms calls: fail fast and let retries absorb the odd slow node
+    'dynamodb': {'read_timeout': 3, 'retries': {'mode': 'standard', 'max_attempts': 5}},
+    'sqs': {'read_timeout': 5},
+    'secretsmanager': {'read_timeout': 5},
+    'polly': {'read_timeout': 30},
+}
+
+_registry: Dict[Tuple, 'LazyClient'] = {}
+_registry_lock = threading.Lock()
+
+
+class LazyClient:
+    """Proxy that builds the wrapped client on first attribute access"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+
+def _boto3():
+    # boto3 costs ~100ms to import; only pay for it when a client is first needed
+    import boto3
+    return boto3
+
+
+def config_for(service_name: str):
+    """botocore Config for a service (DEFAULT_CONFIG + SERVICE_CONFIG overrides)"""
+    from botocore.config import Config
+    return Config(**{**DEFAULT_CONFIG, **SERVICE_CONFIG.get(service_name, {})})
+
+
+def _lazy(key: Tuple, factory: Callable[[], Any]) -> LazyClient:
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = LazyClient(factory)
+        return _registry[key]
+
+
+def client(service_name: str, region_name: str = None) -> LazyClient:
+    """Shared lazy boto3 client for a service"""
+    return _lazy(('client', service_name, region_name), lambda: _boto3().client(
+        service_name, region_name=region_name, config=config_for(service_name)))
+
+
+def resource(service_name: str, region_name: str = None) -> LazyClient:
+    """Shared lazy boto3 resource for a service"""
+    return _lazy(('resource', service_name, region_name), lambda: _boto3().resource(
+        service_name, region_name=region_name, config=config_for(service_name)))
+
+
+def table(table_name: str) -> LazyClient:
+    """Lazy DynamoDB Table handle (shares the dynamodb resource)"""
+    return _lazy(('table', table_name), lambda: resource('dynamodb').get().Table(table_name))
+
+
+def built() -> Dict[str, bool]:
+    """Which registered clients have been constructed (for cold-start checks)"""
+    with _registry_lock:
+        return {'/'.join(str(part) for part in key if part): lazy.built for key, lazy in _registry.items()}
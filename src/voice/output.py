@@ -2,12 +2,14 @@
 Voice Output Module
 Converts text responses to speech using Amazon Polly
 """
-import boto3
 import os
 from typing import Optional, Tuple
 
-polly = boto3.client('polly', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
+import clients
+from tracing import stage
+
+polly = clients.client('polly', region_name='us-east-1')
+s3 = clients.client('s3', region_name='us-east-1')
 
 TEMP_BUCKET = os.environ.get('TEMP_AUDIO_BUCKET', 'agrinexus-temp-audio-dev-043624892076')
 
@@ -57,25 +59,28 @@ def text_to_speech(text: str, dialect: str, phone_number: str) -> Optional[str]:
         print(f"Text preview: {text[:100]}...")
         
         # Synthesize speech
-        response = polly.synthesize_speech(
-            Text=text,
-            OutputFormat='mp3',
-            VoiceId=voice_id,
-            LanguageCode=language_code
-            # Note: Using standard engine for Aditi (hi-IN), neural for Kajal (en-IN)
-        )
+        with stage('polly_synthesize', dialect=dialect):
+            response = polly.synthesize_speech(
+                Text=text,
+                OutputFormat='mp3',
+                VoiceId=voice_id,
+                LanguageCode=language_code
+                # Note: Using standard engine for Aditi (hi-IN), neural for Kajal (en-IN)
+            )
+            audio_bytes = response['AudioStream'].read()
         
         # Upload to S3
         import time
         timestamp = int(time.time())
         s3_key = f"voice-output/{phone_number}/{timestamp}.mp3"
         
-        s3.put_object(
-            Bucket=TEMP_BUCKET,
-            Key=s3_key,
-            Body=response['AudioStream'].read(),
-            ContentType='audio/mpeg'
-        )
+        with stage('s3_upload', kind='voice_output'):
+            s3.put_object(
+                Bucket=TEMP_BUCKET,
+                Key=s3_key,
+                Body=audio_bytes,
+                ContentType='audio/mpeg'
+            )
         
         # Generate presigned URL (valid for 1 hour)
         audio_url = s3.generate_presigned_url(
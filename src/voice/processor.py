@@ -4,15 +4,18 @@ Handles WhatsApp voice notes using Amazon Transcribe
 """
 import json
 import os
-import boto3
 import time
 import urllib.request
 from typing import Dict, Any, Optional
 
-transcribe = boto3.client('transcribe')
-s3 = boto3.client('s3')
-secrets = boto3.client('secretsmanager')
-sqs = boto3.client('sqs')
+import clients
+import profiles
+from tracing import stage, emit_stage, start_trace
+
+transcribe = clients.client('transcribe')
+s3 = clients.client('s3')
+secrets = clients.client('secretsmanager')
+sqs = clients.client('sqs')
 
 TEMP_BUCKET = os.environ['TEMP_AUDIO_BUCKET']
 QUEUE_URL = os.environ['QUEUE_URL']
@@ -20,8 +23,8 @@ TABLE_NAME = os.environ['TABLE_NAME']
 ACCESS_TOKEN_SECRET = os.environ.get('ACCESS_TOKEN_SECRET', 'agrinexus/whatsapp/access-token')
 PHONE_NUMBER_ID_SECRET = os.environ.get('PHONE_NUMBER_ID_SECRET', 'agrinexus/whatsapp/phone-number-id')
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(TABLE_NAME)
+dynamodb = clients.resource('dynamodb')
+table = clients.table(TABLE_NAME)
 
 
 def get_whatsapp_credentials():
@@ -114,13 +117,15 @@ def process_voice_note(message: Dict[str, Any], user_profile: Dict[str, Any]) ->
     try:
         # 1. Download audio from WhatsApp
         print("Downloading audio from WhatsApp...")
-        audio_url = get_whatsapp_media_url(audio_id)
-        audio_bytes = download_media(audio_url)
+        with stage('media_download', kind='audio'):
+            audio_url = get_whatsapp_media_url(audio_id)
+            audio_bytes = download_media(audio_url)
         print(f"Downloaded {len(audio_bytes)} bytes")
         
         # 2. Upload to S3
         s3_key = f"voice/{phone}/{timestamp}.ogg"
-        s3.put_object(Bucket=TEMP_BUCKET, Key=s3_key, Body=audio_bytes, ContentType='audio/ogg')
+        with stage('s3_upload', kind='voice_input'):
+            s3.put_object(Bucket=TEMP_BUCKET, Key=s3_key, Body=audio_bytes, ContentType='audio/ogg')
         print(f"Uploaded to S3: s3://{TEMP_BUCKET}/{s3_key}")
         
         # 3. Start transcription
@@ -128,6 +133,7 @@ def process_voice_note(message: Dict[str, Any], user_profile: Dict[str, Any]) ->
         language_code = get_transcribe_language(dialect)
         
         print(f"Starting transcription job: {job_name}, language: {language_code}")
+        transcribe_started = time.perf_counter()
         transcribe.start_transcription_job(
             TranscriptionJobName=job_name,
             Media={'MediaFileUri': f's3://{TEMP_BUCKET}/{s3_key}'},
@@ -155,6 +161,8 @@ def process_voice_note(message: Dict[str, Any], user_profile: Dict[str, Any]) ->
                 confidence = get_average_confidence(transcript_data)
                 
                 print(f"Transcription complete: '{transcript_text}' (confidence: {confidence:.2f})")
+                emit_stage('transcribe', (time.perf_counter() - transcribe_started) * 1000,
+                           language=language_code, polls=attempt + 1)
                 
                 # 5. Cleanup
                 s3.delete_object(Bucket=TEMP_BUCKET, Key=s3_key)
@@ -177,12 +185,16 @@ def process_voice_note(message: Dict[str, Any], user_profile: Dict[str, Any]) ->
             
             elif status == 'FAILED':
                 print(f"Transcription failed: {result}")
+                emit_stage('transcribe', (time.perf_counter() - transcribe_started) * 1000, 'error',
+                           language=language_code, polls=attempt + 1)
                 # Cleanup
                 s3.delete_object(Bucket=TEMP_BUCKET, Key=s3_key)
                 return {'success': False, 'error': 'transcription_failed'}
         
         # Timeout
         print("Transcription timeout")
+        emit_stage('transcribe', (time.perf_counter() - transcribe_started) * 1000, 'timeout',
+                   language=language_code, polls=60)
         s3.delete_object(Bucket=TEMP_BUCKET, Key=s3_key)
         transcribe.delete_transcription_job(TranscriptionJobName=job_name)
         return {'success': False, 'error': 'timeout'}
@@ -200,15 +212,13 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         wamid = body['wamid']
         from_number = body['from']
         message = body['message']
+        trace = start_trace(body)
         
-        # Get user profile
-        response = table.get_item(
-            Key={
-                'PK': f'USER#{from_number}',
-                'SK': 'PROFILE'
-            }
-        )
-        user_profile = response.get('Item', {})
+        # Get user profile (the webhook's snapshot saves a read once onboarding is complete)
+        user_profile = profiles.from_snapshot(from_number, body.get('profile'))
+        if user_profile is None:
+            with stage('profile_read'):
+                user_profile = profiles.get(table, from_number) or {}
         dialect = user_profile.get('dialect', 'hi')
         
         # Process voice note
@@ -216,26 +226,30 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if result['success']:
             # Queue transcribed text for normal processing
-            sqs.send_message(
-                QueueUrl=QUEUE_URL,
-                MessageBody=json.dumps({
-                    'wamid': wamid,
-                    'from': from_number,
-                    'type': 'text',  # Treat as text message
-                    'message': {
+            with stage('sqs_enqueue', queue='messages'):
+                sqs.send_message(
+                    QueueUrl=QUEUE_URL,
+                    MessageBody=json.dumps({
+                        'wamid': wamid,
                         'from': from_number,
-                        'id': wamid,
-                        'timestamp': message['timestamp'],
-                        'type': 'text',
-                        'text': {'body': result['text']},
-                        '_source': 'voice',  # Mark as voice-originated
-                        '_confidence': result['confidence']
-                    },
-                    'metadata': body.get('metadata', {})
-                }),
-                MessageGroupId=from_number,
-                MessageDeduplicationId=f"{wamid}-transcribed"
-            )
+                        'type': 'text',  # Treat as text message
+                        'message': {
+                            'from': from_number,
+                            'id': wamid,
+                            'timestamp': message['timestamp'],
+                            'type': 'text',
+                            'text': {'body': result['text']},
+                            '_source': 'voice',  # Mark as voice-originated
+                            '_confidence': result['confidence']
+                        },
+                        'message_sk': body.get('message_sk'),
+                        'metadata': body.get('metadata', {}),
+                        'profile': body.get('profile'),
+                        'trace': trace
+                    }),
+                    MessageGroupId=from_number,
+                    MessageDeduplicationId=f"{wamid}-transcribed"
+                )
             print(f"Queued transcribed text for processing: {result['text']}")
         else:
             # Send error message
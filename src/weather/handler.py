@@ -5,18 +5,19 @@ DEMO MODE: Mocks perfect weather for Aurangabad for reliable demo
 """
 import json
 import os
-import boto3
 from typing import Dict, Any, List
 import urllib.request
 import urllib.parse
 
-dynamodb = boto3.resource('dynamodb')
-stepfunctions = boto3.client('stepfunctions')
+import clients
+
+dynamodb = clients.resource('dynamodb')
+stepfunctions = clients.client('stepfunctions')
 
 TABLE_NAME = os.environ['TABLE_NAME']
 STATE_MACHINE_ARN = os.environ.get('STATE_MACHINE_ARN')
 
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
 
 # DEMO MODE: Mock perfect weather for Aurangabad
 MOCK_WEATHER = os.environ.get('MOCK_WEATHER', 'false').lower() == 'true'
@@ -96,7 +97,7 @@ def check_weather_real(location: str) -> Dict[str, Any]:
         'appid': WEATHER_API_KEY,
         'units': 'metric'
     })
-    url = f\"{WEATHER_API_BASE}?{query}\"
+    url = f"{WEATHER_API_BASE}?{query}"
 
     try:
         req = urllib.request.Request(url, headers={'Accept': 'application/json'})
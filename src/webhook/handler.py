@@ -6,58 +6,105 @@ import json
 import os
 import hmac
 import hashlib
-import boto3
+import random
+import time
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 from datetime import datetime
 
+import clients
+import profiles
+from keywords import match_keyword
+from tracing import stage, emit_stage, set_correlation_id, trace_context
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-sqs = boto3.client('sqs')
-dynamodb = boto3.resource('dynamodb')
-secrets = boto3.client('secretsmanager')
+# Built on first use: a status-only or duplicate delivery never constructs the SQS client
+sqs = clients.client('sqs')
+dynamodb = clients.resource('dynamodb')
+secrets = clients.client('secretsmanager')
 
 QUEUE_URL = os.environ['QUEUE_URL']
+# DONE/NOT YET replies go straight to the response detector; unset = DynamoDB Stream only
+NUDGE_REPLY_QUEUE_URL = os.environ.get('NUDGE_REPLY_QUEUE_URL', '')
 TABLE_NAME = os.environ['TABLE_NAME']
 VERIFY_TOKEN_SECRET = os.environ.get('VERIFY_TOKEN_SECRET', 'agrinexus/whatsapp/verify-token')
 APP_SECRET_NAME = os.environ.get('APP_SECRET_NAME', 'agrinexus/whatsapp/app-secret')
 VERIFY_SIGNATURE = os.environ.get('VERIFY_SIGNATURE', 'true').lower() == 'true'
+SQS_BATCH_SIZE = 10  # SendMessageBatch limit
+SECRET_CACHE_TTL = float(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+
+# Payload logging: a sampled, size-capped, PII-redacted copy instead of every body in full
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '2000'))
+PHONE_FIELDS = {'from', 'wa_id', 'recipient_id', 'display_phone_number', 'phone_number'}
+TEXT_FIELDS = {'body', 'caption', 'name', 'formatted_name', 'address', 'latitude', 'longitude', 'title'}
 
-table = dynamodb.Table(TABLE_NAME)
+table = clients.table(TABLE_NAME)
 
-# DONE/NOT YET keywords - skip RAG processing for these
-SKIP_RAG_KEYWORDS = [
-    # Hindi
-    'हो गया', 'कर दिया', 'हो गया है', 'कर लिया', 'done', 'completed',
-    'अभी नहीं', 'बाद में', 'नहीं किया', 'not yet', 'later',
-    # Marathi
-    'झाला', 'केला', 'पूर्ण झाला',
-    'नाही झाला', 'नंतर', 'अजून नाही',
-    # Telugu
-    'అయ్యింది', 'చేశాను', 'పూర్తయింది',
-    'ఇంకా లేదు', 'తర్వాత', 'చేయలేదు'
-]
+# secret_id -> (expires_at, value); lives as long as the warm container
+_secret_cache: Dict[str, Tuple[float, str]] = {}
 
 
+# DONE/NOT YET replies skip RAG; the keyword lists live in keywords.py
 def should_skip_rag(text: str) -> bool:
     """Check if message contains DONE/NOT YET keywords that should skip RAG"""
-    if not text:
-        return False
-    text_lower = text.lower().strip()
-    return any(keyword.lower() in text_lower for keyword in SKIP_RAG_KEYWORDS)
+    return match_keyword(text) is not None
+
+
+def get_secret(secret_id: str) -> str:
+    """Retrieve a secret, cached for SECRET_CACHE_TTL_SECONDS (rotations apply within the TTL)"""
+    now = time.monotonic()
+    cached = _secret_cache.get(secret_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    value = secrets.get_secret_value(SecretId=secret_id)['SecretString']
+    _secret_cache[secret_id] = (now + SECRET_CACHE_TTL, value)
+    return value
 
 
 def get_verify_token() -> str:
     """Retrieve WhatsApp verify token from Secrets Manager"""
-    response = secrets.get_secret_value(SecretId=VERIFY_TOKEN_SECRET)
-    return response['SecretString']
+    return get_secret(VERIFY_TOKEN_SECRET)
 
 
 def get_app_secret() -> str:
     """Retrieve WhatsApp app secret from Secrets Manager"""
-    response = secrets.get_secret_value(SecretId=APP_SECRET_NAME)
-    return response['SecretString']
+    return get_secret(APP_SECRET_NAME)
+
+
+def mask_phone(phone: Any) -> str:
+    """Keep the last 4 digits of a phone number for log correlation"""
+    phone = str(phone or '')
+    return '*' * max(len(phone) - 4, 0) + phone[-4:]
+
+
+def redact(data: Any) -> Any:
+    """Copy of a webhook payload with phone numbers masked and free text removed"""
+    if isinstance(data, dict):
+        redacted = {}
+        for key, value in data.items():
+            if key in PHONE_FIELDS and isinstance(value, (str, int)):
+                redacted[key] = mask_phone(value)
+            elif key in TEXT_FIELDS and isinstance(value, (str, int, float)):
+                redacted[key] = f'<redacted {len(str(value))} chars>'
+            else:
+                redacted[key] = redact(value)
+        return redacted
+    if isinstance(data, list):
+        return [redact(item) for item in data]
+    return data
+
+
+def log_payload(payload: Dict[str, Any]):
+    """Log a redacted, size-capped payload for a sample of requests (all of them at DEBUG)"""
+    if not (logger.isEnabledFor(logging.DEBUG) or random.random() < LOG_PAYLOAD_SAMPLE_RATE):
+        return
+    text = json.dumps(redact(payload), ensure_ascii=False)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}...(+{len(text) - LOG_PAYLOAD_MAX_CHARS} chars)"
+    logger.info("Sampled payload: %s", text)
 
 
 def verify_signature(payload: str, signature: str) -> bool:
@@ -88,17 +135,136 @@ def verify_signature(payload: str, signature: str) -> bool:
         return False
 
 
+def iter_payload(payload: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    """
+    Walk every entry -> change -> message/status in a webhook payload
+    
+    Yields ('message' | 'status', change value, item); the value carries the
+    metadata (phone_number_id) the item arrived on.
+    """
+    for entry in payload.get('entry') or ():
+        for change in entry.get('changes') or ():
+            value = change.get('value') or {}
+            for message in value.get('messages') or ():
+                yield 'message', value, message
+            for status in value.get('statuses') or ():
+                yield 'status', value, status
+
+
+def refresh_snapshot(from_number: str, message_item: Dict[str, Any]):
+    """Attach a snapshot of the stored profile to the message record (none if unreadable)"""
+    message_item.pop('profile', None)
+    try:
+        with stage('profile_read'):
+            snapshot = profiles.snapshot(profiles.get(table, from_number))
+    except Exception as e:
+        logger.error(f"Error reading profile: {e}")
+        return
+    if snapshot:
+        message_item['profile'] = snapshot
+
+
+def write_message_records(wamid: str, from_number: str, message_item: Dict[str, Any]) -> bool:
+    """
+    Write the WAMID# dedup record and the MSG# record in one TransactWriteItems
+    
+    The same transaction checks that the profile snapshot on the message is
+    still the stored version. If the processor has changed the profile since
+    this container cached it, the profile is re-read and the snapshot replaced
+    before retrying.
+    
+    Returns False if the wamid was already processed (duplicate delivery).
+    """
+    # Store wamid for deduplication (with 24h TTL)
+    dedup_item = {
+        'PK': f'WAMID#{wamid}',
+        'SK': 'DEDUP',
+        'from': from_number,
+        'processed_at': datetime.utcnow().isoformat(),
+        'ttl': int(time.time()) + (24 * 60 * 60)
+    }
+    client = dynamodb.meta.client
+    for attempt in range(2):
+        transaction = [
+            {'Put': {'TableName': TABLE_NAME, 'Item': dedup_item,
+                     'ConditionExpression': 'attribute_not_exists(PK)'}},
+            {'Put': {'TableName': TABLE_NAME, 'Item': message_item}}
+        ]
+        if message_item.get('profile'):
+            transaction.append(profiles.version_check(TABLE_NAME, from_number, message_item['profile']))
+        try:
+            with stage('ingest_write'):
+                client.transact_write_items(TransactItems=transaction)
+            logger.info("Stored deduplication and message records for wamid: %s", wamid)
+            return True
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+                return False
+            if attempt == 0 and len(reasons) > 2 and reasons[2].get('Code') == 'ConditionalCheckFailed':
+                # Cached profile is older than the stored one (e.g. a correction reopened onboarding)
+                logger.info("Profile changed since it was cached - re-reading: %s", mask_phone(from_number))
+                profiles.invalidate(from_number)
+                refresh_snapshot(from_number, message_item)
+                continue
+            logger.error(f"Dedup/message transaction cancelled: {reasons}")
+        except Exception as e:
+            logger.error(f"Error writing dedup/message records: {e}")
+        break
+    
+    # Continue processing even if the dedup check fails; the response detector still needs MSG#
+    try:
+        with stage('message_write'):
+            table.put_item(Item=message_item)
+    except Exception as e:
+        logger.error(f"Error storing message in DynamoDB: {e}")
+    return True
+
+
+def queue_entry(wamid: str, from_number: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """SendMessageBatch entry (FIFO: group by phone number, dedup by wamid)"""
+    return {
+        'MessageBody': json.dumps(body),
+        'MessageGroupId': from_number,  # Group by phone number to maintain order per user
+        'MessageDeduplicationId': wamid  # Use wamid for deduplication
+    }
+
+
+def send_message_batches(queue_url: str, entries: List[Dict[str, Any]], queue: str) -> List[str]:
+    """
+    Send entries with SendMessageBatch, SQS_BATCH_SIZE at a time
+    
+    Entries keep their order, so per-user FIFO ordering is preserved.
+    Returns the wamids that could not be queued.
+    """
+    failed = []
+    for start in range(0, len(entries), SQS_BATCH_SIZE):
+        chunk = entries[start:start + SQS_BATCH_SIZE]
+        # Batch entry Ids only allow [A-Za-z0-9_-]; wamids do not qualify
+        batch = [{'Id': str(index), **entry} for index, entry in enumerate(chunk)]
+        try:
+            with stage('sqs_enqueue', queue=queue, batch_size=len(batch)):
+                response = sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+        except Exception as e:
+            logger.error(f"Error sending {queue} batch: {e}")
+            failed.extend(entry['MessageDeduplicationId'] for entry in chunk)
+            continue
+        for failure in response.get('Failed', []):
+            wamid = chunk[int(failure['Id'])]['MessageDeduplicationId']
+            logger.error(f"Failed to queue {wamid}: {failure.get('Code')} {failure.get('Message')}")
+            failed.append(wamid)
+    return failed
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Handle WhatsApp webhook events
     - GET: Webhook verification
     - POST: Message processing
     """
-    logger.info(f"Event received: {json.dumps(event)}")
-    
     # Log the HTTP method (support both API Gateway v1 and v2 formats)
     http_method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
-    logger.info(f"HTTP method: {http_method}")
+    logger.info("HTTP method: %s", http_method)
     
     # GET: Webhook verification
     if http_method == 'GET':
@@ -126,11 +292,15 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     # POST: Message processing
     elif http_method == 'POST':
+        received_at = time.time()
+        receive_started = time.perf_counter()
+        set_correlation_id(None)
+        
         # Verify signature
         signature = event.get('headers', {}).get('X-Hub-Signature-256', '')
         body = event.get('body', '')
         
-        logger.info(f"POST request received - body length: {len(body)}")
+        logger.info("POST request received - body length: %d", len(body))
         
         if not verify_signature(body, signature):
             logger.warning("Signature verification failed")
@@ -142,96 +312,81 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Parse webhook payload
         try:
             payload = json.loads(body)
-            logger.info(f"Parsed payload: {json.dumps(payload)}")
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {e}")
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'Invalid JSON'})
             }
+        log_payload(payload)
         
-        # Extract message data
-        entry = payload.get('entry', [{}])[0]
-        changes = entry.get('changes', [{}])[0]
-        value = changes.get('value', {})
-        messages = value.get('messages', [])
+        # SQS sends are collected and flushed in batches after the loop
+        voice_queue_url = os.environ.get('VOICE_QUEUE_URL')
+        message_entries = []
+        voice_entries = []
+        reply_entries = []
+        message_count = 0
+        status_count = 0
         
-        logger.info(f"Processing {len(messages)} message(s)")
-        
-        # Queue each message for async processing
-        for message in messages:
+        # Meta may batch several entries/changes (messages and statuses) into one POST
+        for kind, value, message in iter_payload(payload):
+            if kind == 'status':
+                # Delivery/read receipts for our outbound messages - nothing to process
+                status_count += 1
+                continue
+            message_count += 1
+            
             wamid = message.get('id')
             from_number = message.get('from')
             message_type = message.get('type')
             
-            logger.info(f"Message - wamid: {wamid}, from: {from_number}, type: {message_type}")
+            logger.info("Message - wamid: %s, from: %s, type: %s", wamid, mask_phone(from_number), message_type)
+            set_correlation_id(wamid)
+            trace = trace_context(wamid, received_at)
             
-            # Idempotency check: Conditional write to avoid race
+            # Profile snapshot travels with the message so downstream stages skip the read
+            profile_snapshot = None
             try:
-                # Store wamid for deduplication (with 24h TTL)
-                import time
-                ttl = int(time.time()) + (24 * 60 * 60)
-                table.put_item(
-                    Item={
-                        'PK': f'WAMID#{wamid}',
-                        'SK': 'DEDUP',
-                        'from': from_number,
-                        'processed_at': datetime.utcnow().isoformat(),
-                        'ttl': ttl
-                    },
-                    ConditionExpression='attribute_not_exists(PK)'
-                )
-                logger.info(f"Stored deduplication record for wamid: {wamid}")
-            
-            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-                logger.info(f"Duplicate message detected: {wamid} - skipping")
-                continue
+                with stage('profile_read'):
+                    profile_snapshot = profiles.snapshot(profiles.get(table, from_number))
             except Exception as e:
-                logger.error(f"Error checking idempotency: {e}")
-                # Continue processing even if dedup check fails
+                logger.error(f"Error reading profile: {e}")
             
-            # Store message in DynamoDB for response detector (via DynamoDB Streams)
-            import time
+            # The one MSG# record for this wamid: the response detector reads it from the
+            # stream and the processor adds its reply to it (extending the TTL to 90 days)
             message_ttl = int(time.time()) + (7 * 24 * 60 * 60)  # 7 days
-            try:
-                table.put_item(
-                    Item={
-                        'PK': f'USER#{from_number}',
-                        'SK': f'MSG#{datetime.utcnow().isoformat()}',
-                        'wamid': wamid,
-                        'message': message,
-                        'ttl': message_ttl
-                    }
-                )
-                logger.info(f"Message stored in DynamoDB for response detector")
-            except Exception as e:
-                logger.error(f"Error storing message in DynamoDB: {e}")
+            message_item = {
+                'PK': f'USER#{from_number}',
+                'SK': f'MSG#{datetime.utcnow().isoformat()}',
+                'wamid': wamid,
+                'message': message,
+                'ttl': message_ttl
+            }
+            if profile_snapshot:
+                message_item['profile'] = profile_snapshot
+            
+            # Idempotency check + message record in one conditional transaction
+            if not write_message_records(wamid, from_number, message_item):
+                logger.info("Duplicate message detected: %s - skipping", wamid)
+                continue
+            # The snapshot the version check accepted (re-read if the cached one was stale)
+            profile_snapshot = message_item.get('profile')
             
             # Route audio messages to voice processor queue
             if message_type == 'audio':
-                logger.info(f"Audio message detected - routing to voice processor")
-                try:
-                    voice_queue_url = os.environ.get('VOICE_QUEUE_URL')
-                    if voice_queue_url:
-                        sqs.send_message(
-                            QueueUrl=voice_queue_url,
-                            MessageBody=json.dumps({
-                                'wamid': wamid,
-                                'from': from_number,
-                                'message': message,
-                                'metadata': value.get('metadata', {})
-                            }),
-                            MessageGroupId=from_number,
-                            MessageDeduplicationId=wamid
-                        )
-                        logger.info(f"Audio message queued for voice processing - wamid: {wamid}")
-                        continue
-                    else:
-                        logger.warning("VOICE_QUEUE_URL not configured - skipping audio message")
-                        continue
-                except Exception as e:
-                    logger.error(f"Error queuing audio message: {e}")
-                    continue
+                if voice_queue_url:
+                    voice_entries.append(queue_entry(wamid, from_number, {
+                        'wamid': wamid,
+                        'from': from_number,
+                        'message': message,
+                        'message_sk': message_item['SK'],
+                        'metadata': value.get('metadata', {}),
+                        'profile': profile_snapshot,
+                        'trace': trace
+                    }))
+                else:
+                    logger.warning("VOICE_QUEUE_URL not configured - skipping audio message")
+                continue
             
             # Check if message should skip RAG processing (DONE/NOT YET keywords)
             message_text = ''
@@ -239,31 +394,55 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 message_text = message.get('text', {}).get('body', '')
             
             if should_skip_rag(message_text):
-                logger.info(f"Message contains DONE/NOT YET keyword - skipping RAG, will be handled by response detector: {message_text}")
-                # Don't send to SQS - response detector will handle it via DynamoDB Streams
+                logger.info("Message contains DONE/NOT YET keyword - skipping RAG, routing to response detector: %s", wamid)
+                # Not RAG: the detector gets it directly; the DynamoDB Stream remains the backstop
+                if NUDGE_REPLY_QUEUE_URL:
+                    reply_entries.append(queue_entry(wamid, from_number, {
+                        'wamid': wamid,
+                        'from': from_number,
+                        'message_sk': message_item['SK'],
+                        'text': message_text,
+                        'profile': profile_snapshot,
+                        'trace': trace
+                    }))
                 continue
             
             # Queue message for processing (FIFO queue requires MessageGroupId and MessageDeduplicationId)
-            try:
-                sqs.send_message(
-                    QueueUrl=QUEUE_URL,
-                    MessageBody=json.dumps({
-                        'wamid': wamid,
-                        'from': from_number,
-                        'type': message_type,
-                        'message': message,
-                        'metadata': value.get('metadata', {})
-                    }),
-                    MessageGroupId=from_number,  # Group by phone number to maintain order per user
-                    MessageDeduplicationId=wamid  # Use wamid for deduplication
-                )
-                logger.info(f"Message queued successfully - wamid: {wamid}")
-            except Exception as e:
-                logger.error(f"Error queuing message: {e}")
-                raise
+            message_entries.append(queue_entry(wamid, from_number, {
+                'wamid': wamid,
+                'from': from_number,
+                'type': message_type,
+                'message': message,
+                'message_sk': message_item['SK'],
+                'metadata': value.get('metadata', {}),
+                'profile': profile_snapshot,
+                'trace': trace
+            }))
+        
+        set_correlation_id(None)
+        
+        # Audio failures are logged only (as before); text/image failures fail the request.
+        # Nudge reply failures are logged only: the stream still delivers them to the detector
+        if reply_entries:
+            failed = send_message_batches(NUDGE_REPLY_QUEUE_URL, reply_entries, 'nudge_replies')
+            if failed:
+                logger.error(f"Error queuing nudge replies (stream backstop applies): {failed}")
+        if voice_entries:
+            failed = send_message_batches(voice_queue_url, voice_entries, 'voice')
+            if failed:
+                logger.error(f"Error queuing audio messages: {failed}")
+        if message_entries:
+            failed = send_message_batches(QUEUE_URL, message_entries, 'messages')
+            if failed:
+                raise RuntimeError(f"Error queuing messages: {failed}")
+        logger.info("Processed %d message(s), %d status update(s); queued %d message(s), %d audio message(s), "
+                    "%d nudge reply(s)", message_count, status_count, len(message_entries), len(voice_entries),
+                    len(reply_entries))
         
         # Always return 200 OK within 2 seconds
         logger.info("Webhook processing complete - returning 200 OK")
+        emit_stage('webhook_receive', (time.perf_counter() - receive_started) * 1000,
+                   messages=message_count, statuses=status_count)
         return {
             'statusCode': 200,
             'body': json.dumps({'status': 'queued'})
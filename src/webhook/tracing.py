@@ -0,0 +1,136 @@
+"""
+Stage Tracing
+Times pipeline stages and emits structured logs + CloudWatch EMF metrics
+
+Every line printed here is a CloudWatch Embedded Metric Format (EMF) record,
+so stage latencies become `AgriNexus/StageLatency` metrics (dimension: Stage)
+and model calls `ModelLatency` / token / cost metrics (dimension: Tier)
+without any PutMetricData calls on the hot path.
+
+NOTE: This module is copied into each Lambda package that needs it
+(webhook, processor, voice, vision). Keep the copies identical.
+"""
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+METRIC_NAMESPACE = os.environ.get('METRIC_NAMESPACE', 'AgriNexus')
+TRACING_ENABLED = os.environ.get('STAGE_TRACING', 'true').lower() == 'true'
+SERVICE_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+# Correlation ID (the WhatsApp wamid) of the message currently being handled.
+# Lambda handles one record at a time per container, so a module global is enough.
+_correlation_id: Optional[str] = None
+
+
+def set_correlation_id(correlation_id: Optional[str]):
+    """Set the correlation ID attached to subsequent stage records"""
+    global _correlation_id
+    _correlation_id = correlation_id
+
+
+def get_correlation_id() -> Optional[str]:
+    """Get the current correlation ID"""
+    return _correlation_id
+
+
+def trace_context(correlation_id: str, received_at: Optional[float] = None) -> Dict[str, Any]:
+    """Build the trace block carried in SQS message bodies"""
+    return {
+        'correlation_id': correlation_id,
+        'received_at': received_at if received_at is not None else time.time()
+    }
+
+
+def start_trace(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Adopt the trace block from an SQS body (falls back to the wamid)"""
+    trace = body.get('trace') or trace_context(body.get('wamid'))
+    set_correlation_id(trace.get('correlation_id') or body.get('wamid'))
+    return trace
+
+
+def _emit(metric_name: str, value_ms: float, dimensions: Dict[str, str], fields: Dict[str, Any]):
+    """Print a single EMF record"""
+    _emit_metrics({metric_name: (value_ms, 'Milliseconds')}, dimensions, fields)
+
+
+def _emit_metrics(metrics: Dict[str, Tuple[float, str]], dimensions: Dict[str, str], fields: Dict[str, Any]):
+    """Print one EMF record carrying several metrics ({name: (value, unit)})"""
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRIC_NAMESPACE,
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()]
+            }]
+        },
+        **dimensions,
+        **{name: round(value, 6) if unit == 'None' else round(value, 2) for name, (value, unit) in metrics.items()},
+        'service': SERVICE_NAME,
+        'correlation_id': _correlation_id,
+        **fields
+    }
+    print(json.dumps(record, default=str))
+
+
+def emit_stage(stage_name: str, duration_ms: float, status: str = 'ok', **fields):
+    """Emit a StageLatency record for one pipeline stage"""
+    if not TRACING_ENABLED:
+        return
+    _emit('StageLatency', duration_ms, {'Stage': stage_name}, {'status': status, **fields})
+
+
+def emit_reply_latency(trace: Optional[Dict[str, Any]], **fields):
+    """Emit end-to-end ReplyLatency (webhook receive -> reply sent)"""
+    if not TRACING_ENABLED or not trace or not trace.get('received_at'):
+        return
+    latency_ms = (time.time() - float(trace['received_at'])) * 1000
+    _emit('ReplyLatency', latency_ms, {'Pipeline': 'reply'}, fields)
+
+
+def emit_model_call(tier: str, model_id: str, latency_ms: float, input_tokens: int, output_tokens: int,
+                    cost_usd: float, **fields):
+    """Emit latency, tokens and estimated cost for one foundation-model call"""
+    if not TRACING_ENABLED:
+        return
+    _emit_metrics({
+        'ModelLatency': (latency_ms, 'Milliseconds'),
+        'ModelInputTokens': (input_tokens, 'Count'),
+        'ModelOutputTokens': (output_tokens, 'Count'),
+        'ModelCost': (cost_usd, 'None'),
+    }, {'Tier': tier}, {'model_id': model_id, **fields})
+
+
+@contextmanager
+def stage(stage_name: str, **fields):
+    """
+    Time a block of code as a pipeline stage
+
+    Usage:
+        with stage('bedrock_retrieve_generate', dialect=dialect):
+            response = bedrock_agent.retrieve_and_generate(...)
+    """
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        emit_stage(stage_name, (time.perf_counter() - started) * 1000, status, **fields)
+
+
+def timed(stage_name: str) -> Callable:
+    """Decorator form of stage() for functions that are a stage on their own"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,79 @@
+"""
+Benchmark regression gate
+
+Raw timings are not comparable across machines, so every benchmark median is
+divided by a fixed calibration workload measured in the same session. The
+resulting ratio is compared against tests/benchmarks/baselines.json:
+
+    BENCHMARK_REGRESSION_THRESHOLD=2.0   fail when ratio > baseline * threshold
+    BENCHMARK_UPDATE_BASELINES=1         rewrite baselines.json from this run
+
+Run:
+    pytest tests/benchmarks --benchmark-only
+"""
+import json
+import os
+import timeit
+import warnings
+from pathlib import Path
+
+import pytest
+
+BASELINES_PATH = Path(__file__).with_name('baselines.json')
+THRESHOLD = float(os.environ.get('BENCHMARK_REGRESSION_THRESHOLD', '2.0'))
+UPDATE_BASELINES = os.environ.get('BENCHMARK_UPDATE_BASELINES', '').lower() in ('1', 'true', 'yes')
+
+
+def _calibration_workload():
+    # Same flavour of work as the hot paths: unicode lowering, substring scans, dict building
+    words = ['कपास', 'कापूस', 'పత్తి', 'cotton', 'हो गया', 'अभी नहीं'] * 20
+    text = ' '.join(words)
+    lowered = text.lower()
+    found = sum(1 for word in words if word in lowered)
+    return {str(i): found + i for i in range(200)}
+
+
+@pytest.fixture(scope='session')
+def calibration_seconds() -> float:
+    """Best-of-7 time for one calibration workload"""
+    timer = timeit.Timer(_calibration_workload)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=7, number=loops)) / loops
+
+
+@pytest.fixture(scope='session')
+def baselines():
+    data = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    yield data
+    if UPDATE_BASELINES:
+        BASELINES_PATH.write_text(json.dumps(dict(sorted(data.items())), indent=2) + '\n')
+
+
+@pytest.fixture
+def guarded_benchmark(benchmark, request, calibration_seconds, baselines):
+    """`benchmark` plus the regression check against baselines.json"""
+    def run(func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        if benchmark.disabled or benchmark.stats is None:
+            return result
+
+        name = request.node.name
+        ratio = benchmark.stats.stats.median / calibration_seconds
+        benchmark.extra_info['calibrated_ratio'] = round(ratio, 4)
+
+        if UPDATE_BASELINES:
+            baselines[name] = round(ratio, 4)
+            return result
+
+        baseline = baselines.get(name)
+        if baseline is None:
+            warnings.warn(f'No baseline for {name}; run with BENCHMARK_UPDATE_BASELINES=1')
+            return result
+
+        benchmark.extra_info['baseline_ratio'] = baseline
+        assert ratio <= baseline * THRESHOLD, (
+            f'{name} regressed: {ratio:.2f}x calibration vs baseline {baseline:.2f}x '
+            f'(threshold {THRESHOLD}x)'
+        )
+        return result
+    return run
@@ -0,0 +1,141 @@
+"""
+Fixed corpora for the micro-benchmarks
+
+Realistic farmer messages in Hindi, Marathi, Telugu, English and romanised
+Hinglish, in the proportions we see on the number: mostly questions, some
+DONE/NOT YET replies, a few greetings and commands. Do not edit casually:
+baselines in baselines.json are only comparable against the same corpus.
+"""
+import json
+
+QUESTIONS = [
+    # Hindi
+    'कपास में एफिड कैसे नियंत्रित करें?',
+    'मेरी कपास की पत्तियां पीली हो रही हैं, क्या करूं?',
+    'गुलाबी सुंडी के लिए कौन सी दवा डालें और कितनी मात्रा में?',
+    'गेहूं में यूरिया कब और कितना डालना चाहिए?',
+    'सोयाबीन में पीला मोज़ेक रोग का इलाज बताइए',
+    'कल बारिश होगी तो आज स्प्रे करना ठीक रहेगा क्या?',
+    'सफेद मक्खी बहुत ज्यादा है, नीम का तेल काम करेगा?',
+    'बीटी कपास में बॉलवर्म का ETL क्या है?',
+    # Marathi
+    'कापसावरील मावा कसा नियंत्रित करावा?',
+    'गहू पिकाला खत कधी द्यावे?',
+    'सोयाबीनवरील पिवळा मोझॅक रोगावर उपाय सांगा',
+    'कापसाची पाने लाल होत आहेत, काय करावे?',
+    'गुलाबी बोंडअळीसाठी कोणते कीटकनाशक वापरावे?',
+    'पाऊस पडल्यानंतर फवारणी कधी करावी?',
+    # Telugu
+    'పత్తిలో పేనుబంకను ఎలా నియంత్రించాలి?',
+    'గోధుమకు ఎరువు ఎప్పుడు వేయాలి?',
+    'పత్తి ఆకులు ఎర్రగా మారుతున్నాయి, ఏమి చేయాలి?',
+    'గులాబీ రంగు పురుగు నివారణకు ఏ మందు వాడాలి?',
+    'సోయాబీన్‌లో పసుపు మొజాయిక్ నివారణ ఎలా?',
+    'వర్షం తర్వాత ఎప్పుడు పిచికారీ చేయాలి?',
+    # English
+    'How do I control aphids in cotton?',
+    'When should I apply urea to wheat and how much per acre?',
+    'What is the economic threshold for pink bollworm in Bt cotton?',
+    'My soybean leaves have yellow patches, is it mosaic virus?',
+    'Is it safe to spray imidacloprid if it rains tomorrow?',
+    'Which fungicide works for root rot in cotton seedlings?',
+    # Hinglish / romanised
+    'cotton mein aphids bahut hai kya spray karu',
+    'gehu me khad kab dalna hai',
+    'kapas ke patte peele ho rahe hai',
+    'pink bollworm ka ilaj batao',
+    'kapsavar mava aala aahe kay karave',
+    'patti lo purugu ela niyantrinchali',
+]
+
+REPLIES = [
+    # DONE
+    'हो गया', 'स्प्रे कर दिया', 'हाँ कर लिया है', 'done', 'Done ✅', 'completed today morning',
+    'झाला', 'फवारणी केला', 'पूर्ण झाला', 'అయ్యింది', 'స్ప్రే చేశాను', 'పూర్తయింది',
+    # NOT YET
+    'अभी नहीं', 'बाद में करूंगा', 'नहीं किया अभी', 'not yet', 'will do later',
+    'नाही झाला', 'नंतर करतो', 'अजून नाही', 'ఇంకా లేదు', 'తర్వాత చేస్తాను', 'చేయలేదు',
+]
+
+OTHER = ['HELP', 'मदद', 'मदत', 'సహాయం', 'hi', 'नमस्ते', 'Thanks 🙏', '👍', 'ok', 'धन्यवाद']
+
+MESSAGES = QUESTIONS + REPLIES + OTHER
+
+# (onboarding_state, dialect, input text) as farmers actually answer each step
+ONBOARDING_INPUTS = [
+    ('language', None, 'हिंदी'), ('language', None, 'मराठी'), ('language', None, 'English'),
+    ('language', None, 'telugu please'), ('language', None, 'Hindi'), ('language', None, 'namaste'),
+    ('location', 'hi', 'Aurangabad'), ('location', 'mr', 'jalna'), ('location', 'te', 'Nagpur district'),
+    ('location', 'en', 'Yavatmal'), ('location', 'hi', 'औरंगाबाद'),
+    ('crop', 'hi', 'कपास'), ('crop', 'mr', 'कापूस'), ('crop', 'te', 'పత్తి'), ('crop', 'en', 'Cotton'),
+    ('crop', 'hi', 'गेहूं'), ('crop', 'mr', 'सोयाबीन'), ('crop', 'en', 'maize'), ('crop', 'hi', 'धान'),
+    ('consent', 'hi', 'हाँ ✅'), ('consent', 'mr', 'होय ✅'), ('consent', 'te', 'అవును ✅'),
+    ('consent', 'en', 'No ❌'), ('consent', 'hi', 'नहीं ❌'),
+]
+
+
+def weather_payload() -> dict:
+    """OpenWeatherMap-shaped payload as passed from the weather poller to the sender"""
+    return {
+        'location': 'Aurangabad',
+        'coords': {'lat': 19.8762, 'lon': 75.3433},
+        'wind_speed': 8.5,
+        'rain_probability': 12.5,
+        'temperature': 29.4,
+        'humidity': 61.0,
+        'forecast': [
+            {
+                'dt': 1760000000 + hour * 10800,
+                'main': {'temp': 24.0 + hour * 0.25, 'feels_like': 25.1, 'humidity': 55.0 + hour},
+                'wind': {'speed': 2.1 + hour * 0.1, 'gust': 4.3, 'deg': 270.0},
+                'pop': round(0.05 * (hour % 5), 2),
+                'rain': {'3h': 0.0 if hour % 4 else 1.25}
+            }
+            for hour in range(40)
+        ]
+    }
+
+
+def _text_message(index: int, text: str) -> dict:
+    return {
+        'from': f'9198{index:08d}',
+        'id': f'wamid.HBgMOTE5ODc2NTQzMjEwFQIAEhgg{index:016X}',
+        'timestamp': str(1760000000 + index),
+        'type': 'text',
+        'text': {'body': text}
+    }
+
+
+def webhook_body(messages: list) -> str:
+    """Serialized WhatsApp Cloud API webhook delivery"""
+    return json.dumps({
+        'object': 'whatsapp_business_account',
+        'entry': [{
+            'id': '102290129340398',
+            'changes': [{
+                'field': 'messages',
+                'value': {
+                    'messaging_product': 'whatsapp',
+                    'metadata': {'display_phone_number': '15550783881', 'phone_number_id': '106540352242922'},
+                    'contacts': [{'profile': {'name': 'Farmer'}, 'wa_id': m['from']} for m in messages],
+                    'messages': messages
+                }
+            }]
+        }]
+    }, ensure_ascii=False)
+
+
+WEBHOOK_BODIES = {
+    'single_text': webhook_body([_text_message(1, QUESTIONS[0])]),
+    'single_reply': webhook_body([_text_message(2, REPLIES[0])]),
+    'batch_10': webhook_body([_text_message(i, MESSAGES[i]) for i in range(10)]),
+    'status_update': json.dumps({
+        'object': 'whatsapp_business_account',
+        'entry': [{'id': '102290129340398', 'changes': [{'field': 'messages', 'value': {
+            'messaging_product': 'whatsapp',
+            'metadata': {'display_phone_number': '15550783881', 'phone_number_id': '106540352242922'},
+            'statuses': [{'id': f'wamid.OUT{i:04d}', 'status': 'delivered', 'timestamp': '1760000000',
+                          'recipient_id': f'9198{i:08d}'} for i in range(5)]
+        }}]}]
+    })
+}
@@ -0,0 +1,127 @@
+"""
+Micro-benchmarks for the pure-Python text hot paths
+
+Each benchmark runs over a fixed corpus (tests/benchmarks/corpus.py) and is
+checked against baselines.json by the `guarded_benchmark` fixture.
+"""
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import src.nudge.detector as detector  # noqa: E402
+import src.nudge.sender as sender  # noqa: E402
+import src.processor.handler as processor  # noqa: E402
+import src.webhook.handler as webhook  # noqa: E402
+from tests.benchmarks.corpus import (  # noqa: E402
+    MESSAGES, ONBOARDING_INPUTS, REPLIES, WEBHOOK_BODIES, weather_payload
+)
+
+APP_SECRET = 'benchmark-app-secret'
+
+
+class NullTable:
+    def put_item(self, **kwargs):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+    def get_item(self, **kwargs):
+        return {}
+
+
+class NullDynamoClient:
+    exceptions = SimpleNamespace(TransactionCanceledException=type('TransactionCanceledException', (Exception,), {}))
+
+    def transact_write_items(self, **kwargs):
+        return {}
+
+
+class NullSQS:
+    def send_message_batch(self, QueueUrl, Entries):
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+def test_should_skip_rag(guarded_benchmark):
+    def run():
+        return sum(1 for text in MESSAGES if webhook.should_skip_rag(text))
+
+    skipped = guarded_benchmark(run)
+    assert skipped >= len(REPLIES)
+
+
+def test_detector_keyword_scan(guarded_benchmark):
+    def run():
+        return [match.intent if match else None for match in map(detector.match_keyword, MESSAGES)]
+
+    intents = guarded_benchmark(run)
+    assert intents.count('DONE') + intents.count('NOT_YET') >= len(REPLIES)
+
+
+def test_onboarding_text_matching(guarded_benchmark, monkeypatch):
+    monkeypatch.setattr(processor, 'table', NullTable())
+    profiles = [
+        {'onboarding_state': state, 'dialect': dialect, 'location': 'Jalna', 'crop': 'Cotton'}
+        for state, dialect, _ in ONBOARDING_INPUTS
+    ]
+
+    def run():
+        return [
+            processor.handle_onboarding('919800000000', text, profile)
+            for (_, _, text), profile in zip(ONBOARDING_INPUTS, profiles)
+        ]
+
+    responses = guarded_benchmark(run)
+    assert len(responses) == len(ONBOARDING_INPUTS)
+
+
+def test_convert_floats_to_decimal(guarded_benchmark):
+    payload = weather_payload()
+
+    converted = guarded_benchmark(sender.convert_floats_to_decimal, payload)
+    assert not isinstance(converted['wind_speed'], float)
+
+
+def test_verify_signature(guarded_benchmark, monkeypatch):
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', True)
+    monkeypatch.setattr(webhook, 'get_app_secret', lambda: APP_SECRET)
+    signed = [
+        (body, 'sha256=' + hmac.new(APP_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest())
+        for body in WEBHOOK_BODIES.values()
+    ]
+
+    def run():
+        return all(webhook.verify_signature(body, signature) for body, signature in signed)
+
+    assert guarded_benchmark(run)
+
+
+def test_webhook_payload_parse(guarded_benchmark):
+    bodies = list(WEBHOOK_BODIES.values())
+
+    def run():
+        return sum(1 for body in bodies for _ in webhook.iter_payload(json.loads(body)))
+
+    assert guarded_benchmark(run) == 17  # 12 messages + 5 statuses
+
+
+def test_webhook_post_handler(guarded_benchmark, monkeypatch):
+    """Whole POST path with null clients: parsing, logging, tracing, routing"""
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', False)
+    monkeypatch.setattr(webhook, 'table', NullTable())
+    monkeypatch.setattr(webhook, 'dynamodb', SimpleNamespace(meta=SimpleNamespace(client=NullDynamoClient())))
+    monkeypatch.setattr(webhook, 'sqs', NullSQS())
+    event = {'httpMethod': 'POST', 'headers': {}, 'body': WEBHOOK_BODIES['batch_10']}
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return webhook.lambda_handler(event, None)
+
+    assert guarded_benchmark(run)['statusCode'] == 200
@@ -0,0 +1,42 @@
+"""
+Local KB retrieval benchmark (src/processor/local_kb.py)
+
+Builds a hybrid index over a synthetic multilingual corpus once per session
+and times one `retrieve` per corpus question, checked against baselines.json.
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('numpy')
+
+import local_kb  # noqa: E402
+from tests.benchmarks.corpus import QUESTIONS  # noqa: E402
+
+PESTS = ['aphid', 'whitefly', 'jassid', 'thrips', 'pink bollworm', 'mealybug', 'सफेद मक्खी', 'मावा', 'పేనుబంక']
+CROPS = ['Cotton', 'Wheat', 'Soybean', 'Multiple Crops']
+
+
+def _corpus(size: int = 2000):
+    for n in range(size):
+        pest, crop = PESTS[n % len(PESTS)], CROPS[n % len(CROPS)]
+        text = (f'{crop} advisory {n}: {pest} crosses the ETL at {n % 20 + 1} per leaf. Spray neem oil 5 ml per litre '
+                f'or a recommended insecticide in the evening; scout twice weekly and record counts.')
+        yield text, f's3://kb/chunks/en/bench/{n}.txt', {'crop': crop, 'region': 'India'}
+
+
+@pytest.fixture(scope='module')
+def kb(tmp_path_factory):
+    index_dir = str(tmp_path_factory.mktemp('local_kb'))
+    local_kb.build_index(_corpus(), index_dir)
+    return local_kb.LocalKnowledgeBase(index_dir)
+
+
+def test_local_kb_retrieve(guarded_benchmark, kb):
+    config = {'vectorSearchConfiguration': {'numberOfResults': 5,
+                                            'filter': {'in': {'key': 'crop', 'value': ['Cotton', 'Multiple Crops']}}}}
+
+    def run():
+        return [kb.retrieve(retrievalQuery={'text': question}, retrievalConfiguration=config) for question in QUESTIONS]
+
+    results = guarded_benchmark(run)
+    assert all(len(response['retrievalResults']) == 5 for response in results)
@@ -0,0 +1,39 @@
+"""
+Shared pytest setup for offline unit tests
+
+Lambda packages import their sibling modules flat (e.g. `from tracing import stage`),
+exactly as they run inside Lambda, so each package directory is put on sys.path.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Order matters only for modules copied into several packages (output.py, analyzer.py):
+# the processor copy wins.
+LAMBDA_PACKAGES = ['processor', 'webhook', 'nudge', 'voice', 'dlq', 'weather', 'kb']
+
+for package in reversed(LAMBDA_PACKAGES):
+    path = os.path.join(ROOT, 'src', package)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Minimal environment so Lambda modules can be imported without AWS
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('TABLE_NAME', 'agrinexus-data')
+os.environ.setdefault('QUEUE_URL', 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-messages-test.fifo')
+os.environ.setdefault('KNOWLEDGE_BASE_ID', 'TESTKB')
+os.environ.setdefault('GUARDRAIL_ID', '')
+os.environ.setdefault('GUARDRAIL_VERSION', '1')
+os.environ.setdefault('TEMP_AUDIO_BUCKET', 'agrinexus-temp-audio-test')
+
+
+@pytest.fixture(autouse=True)
+def _clear_profile_cache():
+    """profiles.py keeps a per-container cache in a module global; isolate tests from each other"""
+    yield
+    cache = sys.modules.get('profiles')
+    if cache is not None:
+        cache.invalidate()
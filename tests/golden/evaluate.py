@@ -0,0 +1,417 @@
+"""
+Golden Questions: Concurrent Evaluation Reports
+
+Runs both golden suites against a bounded thread pool and records, per
+question:
+
+- retrieve latency (a separate Retrieve call on the same KB) and the
+  RetrieveAndGenerate latency; generate = RetrieveAndGenerate - retrieve
+  (an estimate: the service does not report its internal split)
+- approximate input/output token counts (RetrieveAndGenerate does not return
+  usage; tokens are estimated from UTF-8 bytes / 4 over question + retrieved
+  chunks, and over the answer)
+- citation and reference counts, pass/fail from the suite's own validator
+- throttling retries (exponential backoff with full jitter)
+
+Each run is written as JSON and HTML to tests/golden/reports/ and diffed
+against the previous run in that directory (or --previous), so RAG latency
+and grounding can be compared across KB syncs.
+
+--model-routing applies the processor's model tier policy
+(src/processor/model_router.py) to every question, including escalation of
+fast-tier answers that fail validation, and records the tier each answer
+came from; compare a `tiered` run against a `full` run to check that routing
+lowers latency without losing golden passes.
+
+Usage:
+    GOLDEN_KB_ID=<kb-id> python -m tests.golden.evaluate --workers 4
+    python -m tests.golden.evaluate --mode replay      # offline, from fixtures
+    python -m tests.golden.evaluate --mode record      # live + refresh fixtures
+    GOLDEN_KB_ID=<kb-id> python -m tests.golden.evaluate --model-routing tiered
+"""
+import argparse
+import html
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.processor import model_router
+from tests.golden.replay import (
+    MODES, RecordingBedrockAgent, ReplayBedrockAgent, _run_case, golden_cases, golden_client, knowledge_base_id
+)
+
+REPORTS_DIR = Path(__file__).resolve().parent / 'reports'
+RETRIEVE_RESULTS = 5
+THROTTLE_CODES = {
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException',
+    'ServiceUnavailableException',
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (UTF-8 bytes / 4); Devanagari and Telugu come out higher than Latin text, as with real tokenizers"""
+    return math.ceil(len(text.encode('utf-8')) / 4) if text else 0
+
+
+def is_throttle(error: Exception) -> bool:
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code in THROTTLE_CODES or type(error).__name__ in THROTTLE_CODES
+
+
+class InstrumentedAgent:
+    """Wraps a bedrock-agent-runtime client: retries throttling and captures each call's timing per thread"""
+
+    def __init__(self, client, max_attempts: int = 6, base_delay: float = 1.0, max_delay: float = 20.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._local = threading.local()
+
+    def _call(self, operation: str, **kwargs):
+        retries = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = getattr(self.client, operation)(**kwargs)
+            except Exception as error:
+                if not is_throttle(error) or retries + 1 >= self.max_attempts:
+                    raise
+                retries += 1
+                self.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries)))
+                continue
+            calls = getattr(self._local, 'calls', {})
+            calls[operation] = {'ms': (time.perf_counter() - started) * 1000, 'retries': retries,
+                                'response': response}
+            self._local.calls = calls
+            return response
+
+    def retrieve_and_generate(self, **kwargs):
+        return self._call('retrieve_and_generate', **kwargs)
+
+    def retrieve(self, **kwargs):
+        return self._call('retrieve', **kwargs)
+
+    def take_calls(self) -> Dict[str, Dict[str, Any]]:
+        """Calls made on this thread since the last take (operation -> ms, retries, response)"""
+        calls = getattr(self._local, 'calls', {})
+        self._local.calls = {}
+        return calls
+
+
+class RoutedAgent:
+    """Wraps a bedrock-agent-runtime client: sends each question to the model tier the processor would use"""
+
+    def __init__(self, client, routing: str = model_router.TIERED):
+        self.client = client
+        self.routing = routing
+        self._local = threading.local()
+
+    def _tier(self, question: str) -> str:
+        return self.routing if self.routing in model_router.MODEL_IDS else (
+            model_router.FULL if model_router.is_complex(question) else model_router.FAST)
+
+    def _generate(self, tier: str, kwargs: Dict[str, Any]):
+        config = kwargs['retrieveAndGenerateConfiguration']
+        kb_config = {**config['knowledgeBaseConfiguration'], 'modelArn': model_router.model_arn(tier)}
+        return self.client.retrieve_and_generate(
+            **{**kwargs, 'retrieveAndGenerateConfiguration': {**config, 'knowledgeBaseConfiguration': kb_config}})
+
+    def retrieve_and_generate(self, **kwargs):
+        tier = self._tier(kwargs['input']['text'])
+        response = self._generate(tier, kwargs)
+        escalated = None
+        if tier == model_router.FAST:
+            escalated = model_router.validate_answer(response['output']['text'], citations=response.get('citations'))
+            if escalated:
+                tier = model_router.FULL
+                response = self._generate(tier, kwargs)
+        self._local.routed = {'tier': tier, 'escalated': escalated}
+        return response
+
+    def retrieve(self, **kwargs):
+        return self.client.retrieve(**kwargs)
+
+    def take_route(self) -> Dict[str, Optional[str]]:
+        """Tier (and escalation reason) of this thread's last answer"""
+        routed = getattr(self._local, 'routed', {})
+        self._local.routed = {}
+        return routed
+
+
+@dataclass
+class QuestionTiming:
+    suite: str
+    id: str
+    question: str
+    passed: bool
+    total_ms: float
+    retrieve_ms: Optional[float]
+    generate_ms: Optional[float]
+    citations: int
+    references: int
+    retrieved: int
+    input_tokens_est: int
+    output_tokens_est: int
+    retries: int
+    error: Optional[str] = None
+    tier: Optional[str] = None
+    escalated: Optional[str] = None
+
+
+@dataclass
+class EvaluationRun:
+    run_id: str
+    mode: str
+    kb_id: str
+    workers: int
+    wall_s: float
+    passed: int
+    failed: int
+    latency_ms: Dict[str, Dict[str, float]]
+    citations_mean: float
+    retries: int
+    questions: List[QuestionTiming]
+    diff: Dict[str, Any] = field(default_factory=dict)
+    model_routing: Optional[str] = None
+    tiers: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        lines = [f"Golden evaluation {self.run_id} ({self.mode}, {self.workers} workers): "
+                 f"{self.passed}/{self.passed + self.failed} passed in {self.wall_s:.1f}s, "
+                 f"{self.citations_mean:.1f} citations/answer, {self.retries} throttling retries"]
+        if self.model_routing:
+            lines.append(f"  model routing {self.model_routing}: " +
+                         ', '.join(f"{tier} {count}" for tier, count in sorted(self.tiers.items())))
+        for stage, dist in self.latency_ms.items():
+            if dist['count']:
+                lines.append(f"  {stage:<9} ms  p50 {dist['p50']:8.1f}  p95 {dist['p95']:8.1f}  max {dist['max']:8.1f}")
+        if self.diff:
+            lines.append(f"  vs {self.diff['previous']}: total p50 {self.diff['total_p50_delta_ms']:+.1f} ms, "
+                         f"passed {self.diff['passed_delta']:+d}, citations {self.diff['citations_mean_delta']:+.2f}")
+            for change in self.diff['status_changes']:
+                lines.append(f"  {change['status'].upper():<9} {change['key']}")
+        for question in self.questions:
+            if not question.passed:
+                lines.append(f"  FAIL {question.suite}/{question.id}: {question.error or 'validation failed'}")
+        return '\n'.join(lines)
+
+
+def _mode_of(client) -> str:
+    if isinstance(client, RoutedAgent):
+        client = client.client
+    return {ReplayBedrockAgent: 'replay', RecordingBedrockAgent: 'record'}.get(type(client), 'live')
+
+
+def _evaluate_case(case: Dict[str, Any], agent: InstrumentedAgent, kb_id: str, retrieve_timing: bool) -> QuestionTiming:
+    question = case['data']['question']
+    agent.take_calls()
+
+    retrieve_error, retrieved_text, retrieved = None, '', 0
+    if retrieve_timing:
+        try:
+            results = agent.retrieve(
+                knowledgeBaseId=kb_id, retrievalQuery={'text': question},
+                retrievalConfiguration={'vectorSearchConfiguration': {'numberOfResults': RETRIEVE_RESULTS}}
+            ).get('retrievalResults', [])
+            retrieved = len(results)
+            retrieved_text = ' '.join(result.get('content', {}).get('text', '') for result in results)
+        except Exception as error:
+            retrieve_error = f'retrieve: {error}'
+
+    result = _run_case(case, agent, kb_id)
+    calls = agent.take_calls()
+    route = agent.client.take_route() if isinstance(agent.client, RoutedAgent) else {}
+    rag = calls.get('retrieve_and_generate')
+    retrieve = calls.get('retrieve')
+
+    total_ms = rag['ms'] if rag else result.latency_ms
+    retrieve_ms = retrieve['ms'] if retrieve else None
+    response = rag['response'] if rag else {}
+    citations = response.get('citations', [])
+    answer = response.get('output', {}).get('text', '')
+    return QuestionTiming(
+        suite=result.suite,
+        id=result.id,
+        question=question,
+        passed=result.passed,
+        total_ms=round(total_ms, 1),
+        retrieve_ms=round(retrieve_ms, 1) if retrieve_ms is not None else None,
+        generate_ms=round(max(0.0, total_ms - retrieve_ms), 1) if retrieve_ms is not None and rag else None,
+        citations=len(citations),
+        references=sum(len(citation.get('retrievedReferences', [])) for citation in citations),
+        retrieved=retrieved,
+        input_tokens_est=estimate_tokens(question) + estimate_tokens(retrieved_text),
+        output_tokens_est=estimate_tokens(answer),
+        retries=sum(call['retries'] for call in calls.values()),
+        error=result.error or retrieve_error,
+        tier=route.get('tier'),
+        escalated=route.get('escalated'),
+    )
+
+
+def diff_runs(previous: Dict[str, Any], current: EvaluationRun) -> Dict[str, Any]:
+    """Aggregate and per-question deltas between a saved run (JSON dict) and this one"""
+    before = {f"{q['suite']}/{q['id']}": q for q in previous.get('questions', [])}
+    after = {f'{q.suite}/{q.id}': q for q in current.questions}
+
+    status_changes, questions = [], {}
+    for key, question in after.items():
+        old = before.get(key)
+        if old is None:
+            status_changes.append({'key': key, 'status': 'new'})
+            continue
+        if old['passed'] != question.passed:
+            status_changes.append({'key': key, 'status': 'fixed' if question.passed else 'regressed'})
+        questions[key] = {
+            'total_ms_delta': round(question.total_ms - old['total_ms'], 1),
+            'citations_delta': question.citations - old['citations'],
+        }
+    status_changes.extend({'key': key, 'status': 'removed'} for key in before if key not in after)
+
+    return {
+        'previous': previous.get('run_id'),
+        'total_p50_delta_ms': round(current.latency_ms['total']['p50'] - previous['latency_ms']['total']['p50'], 1),
+        'total_p95_delta_ms': round(current.latency_ms['total']['p95'] - previous['latency_ms']['total']['p95'], 1),
+        'passed_delta': current.passed - previous.get('passed', 0),
+        'citations_mean_delta': round(current.citations_mean - previous.get('citations_mean', 0.0), 2),
+        'status_changes': status_changes,
+        'questions': questions,
+    }
+
+
+def evaluate(client=None, workers: int = 4, kb_id: Optional[str] = None, retrieve_timing: bool = True,
+             cases: Optional[List[Dict[str, Any]]] = None, max_attempts: int = 6,
+             previous: Optional[Dict[str, Any]] = None, model_routing: Optional[str] = None) -> EvaluationRun:
+    """
+    Evaluate every golden question concurrently; `previous` (a saved run) adds
+    a diff, `model_routing` (tiered, fast or full) routes questions by model tier
+    """
+    from tests.load.harness import _distribution
+
+    client = client or golden_client()
+    if model_routing:
+        client = RoutedAgent(client, model_routing)
+    agent = client if isinstance(client, InstrumentedAgent) else InstrumentedAgent(client, max_attempts)
+    kb_id = kb_id or knowledge_base_id()
+    cases = cases if cases is not None else golden_cases()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        questions = list(pool.map(lambda case: _evaluate_case(case, agent, kb_id, retrieve_timing), cases))
+    wall_s = time.perf_counter() - started
+
+    passed = sum(1 for question in questions if question.passed)
+    run = EvaluationRun(
+        run_id=datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ'),
+        mode=_mode_of(agent.client),
+        kb_id=kb_id,
+        workers=workers,
+        wall_s=round(wall_s, 2),
+        passed=passed,
+        failed=len(questions) - passed,
+        latency_ms={
+            'retrieve': _distribution([q.retrieve_ms for q in questions if q.retrieve_ms is not None]),
+            'generate': _distribution([q.generate_ms for q in questions if q.generate_ms is not None]),
+            'total': _distribution([q.total_ms for q in questions]),
+        },
+        citations_mean=round(sum(q.citations for q in questions) / len(questions), 2) if questions else 0.0,
+        retries=sum(q.retries for q in questions),
+        questions=questions,
+        model_routing=model_routing,
+        tiers=dict(Counter(q.tier for q in questions if q.tier)),
+    )
+    if previous:
+        run.diff = diff_runs(previous, run)
+    return run
+
+
+def render_html(run: EvaluationRun) -> str:
+    deltas = run.diff.get('questions', {})
+    changes = {change['key']: change['status'] for change in run.diff.get('status_changes', [])}
+
+    def cell(value) -> str:
+        return f'<td>{html.escape("" if value is None else str(value))}</td>'
+
+    rows = []
+    for q in run.questions:
+        key = f'{q.suite}/{q.id}'
+        delta = deltas.get(key, {})
+        rows.append(
+            f'<tr class="{"pass" if q.passed else "fail"}">' + ''.join(cell(value) for value in (
+                key, q.question, 'pass' if q.passed else 'FAIL', changes.get(key, ''), q.retrieve_ms, q.generate_ms,
+                q.total_ms, delta.get('total_ms_delta'), q.citations, delta.get('citations_delta'), q.retrieved,
+                q.input_tokens_est, q.output_tokens_est, q.tier, q.escalated, q.retries, q.error)) + '</tr>')
+
+    stages = ''.join(f'<li>{stage}: p50 {dist["p50"]:.1f} ms, p95 {dist["p95"]:.1f} ms (n={dist["count"]})</li>'
+                     for stage, dist in run.latency_ms.items() if dist['count'])
+    diff = (f'<p>vs {html.escape(str(run.diff["previous"]))}: total p50 {run.diff["total_p50_delta_ms"]:+.1f} ms, '
+            f'passed {run.diff["passed_delta"]:+d}, citations/answer {run.diff["citations_mean_delta"]:+.2f}</p>'
+            if run.diff else '')
+    headers = ''.join(f'<th>{name}</th>' for name in (
+        'id', 'question', 'result', 'change', 'retrieve ms', 'generate ms', 'total ms', 'Δ total', 'citations',
+        'Δ citations', 'retrieved', 'in tokens ~', 'out tokens ~', 'tier', 'escalated', 'retries', 'error'))
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Golden evaluation {run.run_id}</title>
+<style>body{{font-family:sans-serif}} table{{border-collapse:collapse}} td,th{{border:1px solid #ccc;padding:4px}}
+tr.fail{{background:#fdd}}</style></head>
+<body><h1>Golden evaluation {run.run_id}</h1>
+<p>{run.mode}, KB {html.escape(run.kb_id)}, {run.workers} workers: {run.passed}/{run.passed + run.failed} passed in
+{run.wall_s:.1f}s, {run.citations_mean:.2f} citations/answer, {run.retries} throttling retries</p>
+<ul>{stages}</ul>{diff}
+<table><tr>{headers}</tr>
+{chr(10).join(rows)}
+</table></body></html>
+"""
+
+
+def latest_report(reports_dir: Path = REPORTS_DIR) -> Optional[Dict[str, Any]]:
+    reports = sorted(Path(reports_dir).glob('golden-*.json'))
+    return json.loads(reports[-1].read_text(encoding='utf-8')) if reports else None
+
+
+def write_report(run: EvaluationRun, reports_dir: Path = REPORTS_DIR) -> Path:
+    """Write golden-<run_id>.json and .html; returns the JSON path"""
+    reports_dir = Path(reports_dir)
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    path = reports_dir / f'golden-{run.run_id}.json'
+    path.write_text(json.dumps(asdict(run), indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+    path.with_suffix('.html').write_text(render_html(run), encoding='utf-8')
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Concurrent golden-question evaluation with timing reports')
+    parser.add_argument('--mode', choices=MODES, default=None, help='client mode (default: GOLDEN_MODE or live)')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent questions (Bedrock quotas are per account)')
+    parser.add_argument('--max-attempts', type=int, default=6, help='attempts per call when throttled')
+    parser.add_argument('--no-retrieve-timing', action='store_true', help='skip the separate Retrieve call')
+    parser.add_argument('--reports-dir', type=Path, default=REPORTS_DIR)
+    parser.add_argument('--previous', type=Path, help='report JSON to diff against (default: latest in reports dir)')
+    parser.add_argument('--model-routing', choices=[model_router.TIERED, model_router.FAST, model_router.FULL],
+                        help='route questions by model tier as the processor does (default: the suites\' own model)')
+    args = parser.parse_args(argv)
+
+    previous = (json.loads(args.previous.read_text(encoding='utf-8')) if args.previous
+                else latest_report(args.reports_dir))
+    run = evaluate(golden_client(args.mode), workers=args.workers, retrieve_timing=not args.no_retrieve_timing,
+                   max_attempts=args.max_attempts, previous=previous, model_routing=args.model_routing)
+    path = write_report(run, args.reports_dir)
+    print(run.summary())
+    print(f'Report: {path} ({path.with_suffix(".html").name})')
+    return 0 if run.failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Golden Questions: Record / Replay
+
+The golden suites (tests/test_golden_questions.py and
+tests/test_golden_questions_realistic.py) call Bedrock RetrieveAndGenerate.
+GOLDEN_MODE selects the client they use:
+
+    live    real bedrock-agent-runtime (default)
+    record  real client; every response, its citations and latency are saved
+            to tests/fixtures/golden_responses.json
+    replay  no AWS: responses come from the fixture file; recorded latency is
+            replayed scaled by GOLDEN_REPLAY_LATENCY_SCALE (default 0)
+
+run_golden_suite() runs every golden question of both suites through the
+suites' own validators on a thread pool and reports pass/fail plus latency,
+so prompt, caching and retrieval changes can be compared locally in seconds.
+
+Usage:
+    GOLDEN_KB_ID=<kb-id> python -m tests.golden.replay --record   # once, needs AWS
+    python -m tests.golden.replay                                  # offline
+    GOLDEN_MODE=replay pytest tests/test_golden_questions.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+FIXTURE_PATH = Path(__file__).resolve().parent.parent / 'fixtures' / 'golden_responses.json'
+MODES = ('live', 'record', 'replay')
+DEFAULT_KB_ID = 'H81XLD3YWY'
+
+
+def golden_mode() -> str:
+    mode = os.environ.get('GOLDEN_MODE', 'live').lower()
+    if mode not in MODES:
+        raise ValueError(f'GOLDEN_MODE must be one of {MODES}, got {mode!r}')
+    return mode
+
+
+def knowledge_base_id() -> str:
+    return os.environ.get('GOLDEN_KB_ID', DEFAULT_KB_ID)
+
+
+def config_fingerprint(config: Optional[Dict[str, Any]]) -> str:
+    """Short hash of the RetrieveAndGenerate configuration (model, inference params, KB)"""
+    return hashlib.sha1(json.dumps(config or {}, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class GoldenFixtures:
+    """Recorded responses keyed by question text"""
+
+    def __init__(self, path: Path = FIXTURE_PATH, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = Path(path)
+        self.entries = entries if entries is not None else {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path = FIXTURE_PATH) -> 'GoldenFixtures':
+        path = Path(path)
+        entries = json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+        return cls(path, entries)
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(question)
+
+    def put(self, question: str, entry: Dict[str, Any]):
+        """Save (merge) fields for a question and rewrite the fixture file"""
+        with self._lock:
+            self.entries[question] = {**self.entries.get(question, {}), **entry}
+            self.path.write_text(json.dumps(dict(sorted(self.entries.items())), indent=2, ensure_ascii=False) + '\n',
+                                 encoding='utf-8')
+
+
+class RecordingBedrockAgent:
+    """Pass-through to the real client that saves each RetrieveAndGenerate response"""
+
+    def __init__(self, client, fixtures: GoldenFixtures):
+        self.client = client
+        self.fixtures = fixtures
+
+    def retrieve_and_generate(self, **kwargs):
+        started = time.perf_counter()
+        response = self.client.retrieve_and_generate(**kwargs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.fixtures.put(kwargs['input']['text'], {
+            'output': {'text': response['output']['text']},
+            # Round-trip through JSON: citations carry botocore types (datetimes in metadata)
+            'citations': json.loads(json.dumps(response.get('citations', []), default=str)),
+            'latency_ms': round(latency_ms, 1),
+            'config': config_fingerprint(kwargs.get('retrieveAndGenerateConfiguration')),
+            'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        })
+        return response
+
+    def retrieve(self, **kwargs):
+        started = time.perf_counter()
+        response = self.client.retrieve(**kwargs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.fixtures.put(kwargs['retrievalQuery']['text'], {'retrieve': {
+            'retrievalResults': json.loads(json.dumps(response.get('retrievalResults', []), default=str)),
+            'latency_ms': round(latency_ms, 1),
+        }})
+        return response
+
+
+class ReplayBedrockAgent:
+    """bedrock-agent-runtime stand-in serving recorded responses"""
+
+    def __init__(self, fixtures: GoldenFixtures, latency_scale: float = 0.0):
+        self.fixtures = fixtures
+        self.latency_scale = latency_scale
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration=None, **kwargs):
+        entry = self.fixtures.get(input['text'])
+        if entry is None:
+            raise LookupError(f"No recorded response for {input['text']!r}; record with GOLDEN_MODE=record")
+        if self.latency_scale:
+            time.sleep(entry.get('latency_ms', 0) * self.latency_scale / 1000)
+        return {
+            'output': {'text': entry['output']['text']},
+            'citations': deepcopy(entry.get('citations', [])),
+            'sessionId': 'golden-replay',
+        }
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, **kwargs):
+        entry = (self.fixtures.get(retrievalQuery['text']) or {}).get('retrieve')
+        if entry is None:
+            raise LookupError(f"No recorded retrieval for {retrievalQuery['text']!r}; record with GOLDEN_MODE=record")
+        if self.latency_scale:
+            time.sleep(entry.get('latency_ms', 0) * self.latency_scale / 1000)
+        return {'retrievalResults': deepcopy(entry['retrievalResults'])}
+
+
+def golden_client(mode: Optional[str] = None, fixtures: Optional[GoldenFixtures] = None):
+    """bedrock-agent-runtime client for the golden suites, per GOLDEN_MODE"""
+    mode = mode or golden_mode()
+    if mode == 'replay':
+        scale = float(os.environ.get('GOLDEN_REPLAY_LATENCY_SCALE', '0'))
+        return ReplayBedrockAgent(fixtures or GoldenFixtures.load(), scale)
+
+    import boto3
+    client = boto3.client('bedrock-agent-runtime')
+    if mode == 'record':
+        return RecordingBedrockAgent(client, fixtures or GoldenFixtures.load())
+    return client
+
+
+# ============================================================================
+# Parallel suite runner
+# ============================================================================
+
+@dataclass
+class GoldenResult:
+    suite: str
+    id: str
+    question: str
+    passed: bool
+    latency_ms: float
+    validation: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class GoldenReport:
+    mode: str
+    workers: int
+    wall_s: float
+    passed: int
+    failed: int
+    latency_ms: Dict[str, float]
+    results: List[GoldenResult]
+
+    def summary(self) -> str:
+        lines = [
+            f"Golden questions ({self.mode}, {self.workers} workers): {self.passed}/{self.passed + self.failed} passed "
+            f"in {self.wall_s:.2f}s",
+            f"  latency ms  p50 {self.latency_ms['p50']:.1f}  p95 {self.latency_ms['p95']:.1f}  "
+            f"max {self.latency_ms['max']:.1f}",
+        ]
+        for result in self.results:
+            if not result.passed:
+                lines.append(f"  FAIL {result.suite}/{result.id}: {result.error or result.validation}")
+        return '\n'.join(lines)
+
+
+def golden_cases() -> List[Dict[str, Any]]:
+    """Every parametrized golden question of both suites, with the validator each suite applies"""
+    from tests import test_golden_questions as golden
+    from tests import test_golden_questions_realistic as realistic
+
+    validators = {
+        'pest_control': golden.validate_pest_control,
+        'guardrail_banned': golden.validate_guardrail_banned,
+        'guardrail_medical': golden.validate_guardrail_medical,
+        'general_advice': golden.validate_general_advice,
+    }
+    cases = []
+    for question in golden.GOLDEN_QUESTIONS:
+        cases.append({'suite': 'golden', 'data': question, 'query': golden.query_knowledge_base,
+                      'validate': validators[question['test_type']]})
+    for question in realistic.GOLDEN_QUESTIONS:
+        def validate(response, question=question):
+            validation = realistic.validate_response(response, question['expected_keywords'],
+                                                     question['banned_keywords'], question.get('min_keywords'))
+            # The realistic suite also requires citations
+            validation['passed'] = validation['passed'] and validation['has_citations']
+            return validation
+        cases.append({'suite': 'realistic', 'data': question, 'query': realistic.query_knowledge_base,
+                      'validate': validate})
+    return cases
+
+
+def _run_case(case: Dict[str, Any], client, kb_id: str) -> GoldenResult:
+    question = case['data']
+    started = time.perf_counter()
+    response = case['query'](question['question'], kb_id, client=client)
+    latency_ms = (time.perf_counter() - started) * 1000
+    if not response['success']:
+        return GoldenResult(case['suite'], question['id'], question['question'], False, latency_ms,
+                            error=response.get('error', 'unknown error'))
+    validation = case['validate'](response)
+    return GoldenResult(case['suite'], question['id'], question['question'], bool(validation['passed']),
+                        latency_ms, validation)
+
+
+def run_golden_suite(client=None, workers: int = 8, kb_id: Optional[str] = None,
+                     cases: Optional[List[Dict[str, Any]]] = None) -> GoldenReport:
+    """Run every golden question concurrently and validate the answers"""
+    from tests.load.harness import _distribution
+
+    client = client or golden_client()
+    mode = {ReplayBedrockAgent: 'replay', RecordingBedrockAgent: 'record'}.get(type(client), 'live')
+    kb_id = kb_id or knowledge_base_id()
+    cases = cases if cases is not None else golden_cases()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda case: _run_case(case, client, kb_id), cases))
+    wall_s = time.perf_counter() - started
+
+    passed = sum(1 for result in results if result.passed)
+    return GoldenReport(mode, workers, round(wall_s, 3), passed, len(results) - passed,
+                        _distribution([result.latency_ms for result in results]), results)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Golden question benchmark (record once, replay offline)')
+    parser.add_argument('--record', action='store_true', help='query live Bedrock and save responses')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    client = golden_client('record' if args.record else 'replay')
+    report = run_golden_suite(client, workers=args.workers)
+    print(json.dumps(asdict(report), indent=2, ensure_ascii=False) if args.json else report.summary())
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Cold-Start Import Profile
+
+Imports each Lambda handler in a fresh interpreter with `python -X importtime`,
+the same way Lambda does (only the function's own package directory on
+sys.path), and reports:
+
+- total import time of the handler module
+- the heaviest direct imports
+- whether boto3 was imported (it should only load when a client is first used)
+- optionally, the time to construct every client the module registered
+
+Usage:
+    python -m tests.load.cold_start
+    python -m tests.load.cold_start --build-clients --json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lambda name -> (package directory under src/, handler module)
+LAMBDAS: Dict[str, Tuple[str, str]] = {
+    'webhook': ('webhook', 'handler'),
+    'processor': ('processor', 'handler'),
+    'voice': ('voice', 'processor'),
+    'nudge-sender': ('nudge', 'sender'),
+    'nudge-reminder': ('nudge', 'reminder'),
+    'response-detector': ('nudge', 'detector'),
+    'dlq': ('dlq', 'handler'),
+    'weather': ('weather', 'handler'),
+}
+
+# Environment each function has in template-week2.yaml (values are placeholders)
+LAMBDA_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'TABLE_NAME': 'agrinexus-data',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-messages.fifo',
+    'KNOWLEDGE_BASE_ID': 'COLDSTARTKB',
+    'GUARDRAIL_ID': '',
+    'GUARDRAIL_VERSION': '1',
+    'TEMP_AUDIO_BUCKET': 'agrinexus-temp-audio',
+}
+
+_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+_CLIENT_BUILD_SNIPPET = '''
+import json, time
+import {module}
+import clients
+started = time.perf_counter()
+for lazy in list(clients._registry.values()):
+    lazy.get()
+print(json.dumps({{"clients_ms": (time.perf_counter() - started) * 1000, "clients": sorted(clients.built())}}))
+'''
+
+
+@dataclass
+class ImportProfile:
+    name: str
+    import_ms: float
+    boto3_imported: bool
+    heaviest: List[Tuple[str, float]]
+    clients_ms: Optional[float] = None
+    clients: List[str] = field(default_factory=list)
+
+
+def _environment(package: str) -> Dict[str, str]:
+    env = {key: value for key, value in os.environ.items() if not key.startswith('PYTHON')}
+    env.update(LAMBDA_ENVIRONMENT)
+    env['PYTHONPATH'] = os.path.join(ROOT, 'src', package)
+    return env
+
+
+def parse_importtime(stderr: str, module: str, top: int = 5) -> Tuple[float, bool, List[Tuple[str, float]]]:
+    """(cumulative ms of `module`, boto3 imported, heaviest direct imports) from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            rows.append((len(match.group(3)), match.group(4), int(match.group(2))))
+
+    # Children are printed before their parent, one indent level deeper
+    total_us, children = None, []
+    for index, (depth, name, cumulative) in enumerate(rows):
+        if depth == 1 and name == module:
+            total_us = cumulative
+            for child_depth, child, child_cumulative in reversed(rows[:index]):
+                if child_depth == 1:
+                    break
+                if child_depth == 3:
+                    children.append((child, child_cumulative / 1000))
+            break
+    if total_us is None:
+        raise RuntimeError(f'{module} not found in -X importtime output')
+    boto3_imported = any(name == 'boto3' for _, name, _ in rows)
+    return total_us / 1000, boto3_imported, sorted(children, key=lambda c: -c[1])[:top]
+
+
+def profile_lambda(name: str, build_clients: bool = False) -> ImportProfile:
+    package, module = LAMBDAS[name]
+    env = _environment(package)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'{name}: import failed\n{result.stderr[-2000:]}')
+    import_ms, boto3_imported, heaviest = parse_importtime(result.stderr, module)
+    profile = ImportProfile(name, round(import_ms, 2), boto3_imported,
+                            [(child, round(ms, 2)) for child, ms in heaviest])
+
+    if build_clients:
+        output = subprocess.run([sys.executable, '-c', _CLIENT_BUILD_SNIPPET.format(module=module)],
+                                cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+        built = json.loads(output.strip().splitlines()[-1])
+        profile.clients_ms = round(built['clients_ms'], 2)
+        profile.clients = built['clients']
+    return profile
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Per-Lambda cold-start import profile')
+    parser.add_argument('lambdas', nargs='*', default=list(LAMBDAS), help='subset of: ' + ', '.join(LAMBDAS))
+    parser.add_argument('--build-clients', action='store_true',
+                        help='also time constructing every client the module registers')
+    parser.add_argument('--json', action='store_true', help='print profiles as JSON')
+    args = parser.parse_args(argv)
+
+    profiles = [profile_lambda(name, args.build_clients) for name in args.lambdas]
+    if args.json:
+        print(json.dumps([asdict(profile) for profile in profiles], indent=2))
+        return 0
+    for profile in profiles:
+        clients = f'  clients {profile.clients_ms:7.1f} ms ({len(profile.clients)})' if profile.clients_ms else ''
+        heaviest = ', '.join(f'{child} {ms:.1f}' for child, ms in profile.heaviest[:3])
+        print(f"{profile.name:<18} import {profile.import_ms:7.1f} ms  boto3 {'yes' if profile.boto3_imported else 'no ':<3}"
+              f"{clients}  [{heaviest}]")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
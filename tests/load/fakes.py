@@ -0,0 +1,822 @@
+"""
+In-memory stand-ins for AWS services and the WhatsApp Graph API
+
+Used by the offline load-test harness. Each fake sleeps for a configurable
+latency per call so queueing behaviour is realistic, and counts its calls so
+reports can show round trips per message.
+"""
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from copy import deepcopy
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+
+@dataclass
+class LatencyProfile:
+    """Simulated per-call latency in milliseconds"""
+    dynamodb: float = 4.0
+    sqs: float = 8.0
+    secrets: float = 3.0
+    bedrock_rag: float = 1200.0
+    bedrock_rag_fast: float = 500.0
+    bedrock_invoke: float = 900.0
+    polly: float = 150.0
+    s3: float = 25.0
+    transcribe_poll: float = 50.0
+    transcribe_job: float = 6000.0
+    cloudwatch: float = 5.0
+    graph_api: float = 120.0
+    scale: float = 1.0
+
+    @classmethod
+    def zero(cls) -> 'LatencyProfile':
+        return cls(scale=0.0)
+
+    def wait(self, service: str):
+        delay = getattr(self, service) * self.scale
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+
+class FakeService:
+    """Base class: latency + call counters"""
+
+    service = ''
+
+    def __init__(self, latency: LatencyProfile):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str, service: Optional[str] = None):
+        with self._lock:
+            self.calls[operation] += 1
+        self.latency.wait(service or self.service)
+
+
+# ============================================================================
+# DynamoDB
+# ============================================================================
+
+class ConditionalCheckFailedException(Exception):
+    """Mirrors botocore's modeled exception name"""
+
+
+class TransactionCanceledException(Exception):
+    def __init__(self, reasons):
+        super().__init__('Transaction cancelled')
+        self.response = {'Error': {'Code': 'TransactionCanceledException'}, 'CancellationReasons': reasons}
+
+
+_TOKEN_RE = re.compile(r'\s*(:[\w]+|#[\w]+|<>|<=|>=|[=<>(),]|[A-Za-z_][\w.]*)')
+
+
+class _Expression:
+    """Tiny evaluator for the DynamoDB expression subset this project uses"""
+
+    def __init__(self, text: str, names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]):
+        self.tokens = _TOKEN_RE.findall(text or '')
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _expect(self, token: str):
+        actual = self._next()
+        if actual != token:
+            raise ValueError(f"Expected {token!r}, got {actual!r}")
+
+    def path(self, token: str) -> str:
+        return self.names.get(token, token)
+
+    def operand(self, item: Dict[str, Any]) -> Any:
+        token = self._next()
+        if token.startswith(':'):
+            return self.values[token]
+        if token == 'size':
+            self._expect('(')
+            value = item.get(self.path(self._next()))
+            self._expect(')')
+            return len(value) if value is not None else 0
+        return item.get(self.path(token))
+
+    # condition := term (OR term)*
+    def condition(self, item: Dict[str, Any]) -> bool:
+        result = self.term(item)
+        while self._peek() and self._peek().upper() == 'OR':
+            self._next()
+            rhs = self.term(item)
+            result = result or rhs
+        return result
+
+    # term := factor (AND factor)*
+    def term(self, item: Dict[str, Any]) -> bool:
+        result = self.factor(item)
+        while self._peek() and self._peek().upper() == 'AND':
+            self._next()
+            rhs = self.factor(item)
+            result = result and rhs
+        return result
+
+    def factor(self, item: Dict[str, Any]) -> bool:
+        token = self._peek()
+        if token.upper() == 'NOT':
+            self._next()
+            return not self.factor(item)
+        if token == '(':
+            self._next()
+            result = self.condition(item)
+            self._expect(')')
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self._next()
+            self._expect('(')
+            attr = self.path(self._next())
+            arg = None
+            if self._peek() == ',':
+                self._next()
+                arg = self.operand(item)
+            self._expect(')')
+            value = item.get(attr)
+            if token == 'attribute_exists':
+                return attr in item
+            if token == 'attribute_not_exists':
+                return attr not in item
+            if token == 'begins_with':
+                return isinstance(value, str) and value.startswith(arg)
+            return value is not None and arg in value
+        lhs = self.operand(item)
+        op = self._next()
+        if op.upper() == 'IN':
+            self._expect('(')
+            options = [self.operand(item)]
+            while self._peek() == ',':
+                self._next()
+                options.append(self.operand(item))
+            self._expect(')')
+            return lhs in options
+        if op.upper() == 'BETWEEN':
+            low = self.operand(item)
+            self._next()  # AND
+            high = self.operand(item)
+            return lhs is not None and low <= lhs <= high
+        rhs = self.operand(item)
+        if op == '=':
+            return lhs == rhs
+        if op == '<>':
+            return lhs != rhs
+        if lhs is None or rhs is None:
+            return False
+        return {'<': lhs < rhs, '<=': lhs <= rhs, '>': lhs > rhs, '>=': lhs >= rhs}[op]
+
+
+def evaluate_condition(text: Optional[str], item: Dict[str, Any], names=None, values=None) -> bool:
+    if not text:
+        return True
+    return _Expression(text, names, values).condition(item)
+
+
+def apply_update(item: Dict[str, Any], text: str, names=None, values=None) -> Dict[str, Any]:
+    """Apply a SET/REMOVE/ADD update expression in place"""
+    names = names or {}
+    values = values or {}
+    resolve = lambda token: names.get(token, token)
+    sections = re.split(r'\b(SET|REMOVE|ADD|DELETE)\b', text)
+    action = None
+    for part in sections:
+        part = part.strip()
+        if part in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+            action = part
+            continue
+        if not part:
+            continue
+        for clause in _split_top_level(part):
+            clause = clause.strip()
+            if action == 'SET':
+                target, expr = [s.strip() for s in clause.split('=', 1)]
+                item[resolve(target)] = _eval_set_value(expr, item, resolve, values)
+            elif action == 'REMOVE':
+                item.pop(resolve(clause), None)
+            elif action == 'ADD':
+                target, value = clause.split()
+                current = item.get(resolve(target))
+                delta = values[value]
+                if isinstance(delta, set):
+                    item[resolve(target)] = (current or set()) | delta
+                else:
+                    item[resolve(target)] = (current or 0) + delta
+            elif action == 'DELETE':
+                target, value = clause.split()
+                item[resolve(target)] = (item.get(resolve(target)) or set()) - values[value]
+    return item
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def _eval_set_value(expr: str, item, resolve, values):
+    match = re.match(r'if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)$', expr)
+    if match:
+        attr = resolve(match.group(1))
+        return item[attr] if attr in item else values[match.group(2)]
+    match = re.match(r'list_append\(\s*([#:\w]+)\s*,\s*([#:\w]+)\s*\)$', expr)
+    if match:
+        get = lambda t: values[t] if t.startswith(':') else (item.get(resolve(t)) or [])
+        return list(get(match.group(1))) + list(get(match.group(2)))
+    match = re.match(r'([#:\w]+)\s*([+-])\s*([#:\w]+)$', expr)
+    if match:
+        get = lambda t: values[t] if t.startswith(':') else (item.get(resolve(t)) or 0)
+        lhs, rhs = get(match.group(1)), get(match.group(3))
+        return lhs + rhs if match.group(2) == '+' else lhs - rhs
+    expr = expr.strip()
+    return values[expr] if expr.startswith(':') else item.get(resolve(expr))
+
+
+def _reject_floats(value: Any):
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        for v in value.values():
+            _reject_floats(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            _reject_floats(v)
+
+
+class FakeTable(FakeService):
+    """Single-table store keyed by (PK, SK) with GSIs inferred from attribute names"""
+
+    service = 'dynamodb'
+
+    def __init__(self, name: str, latency: LatencyProfile, stream: Optional[deque] = None):
+        super().__init__(latency)
+        self.name = name
+        self.items: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.stream = stream if stream is not None else deque()
+        self._serializer = TypeSerializer()
+
+    # -- helpers -------------------------------------------------------------
+    def _key(self, key: Dict[str, Any]) -> Tuple[str, str]:
+        return key['PK'], key['SK']
+
+    def _emit(self, event_name: str, old: Optional[Dict], new: Optional[Dict]):
+        image = new or old
+        record = {
+            'eventID': uuid.uuid4().hex,
+            'eventName': event_name,
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': {k: self._serializer.serialize(image[k]) for k in ('PK', 'SK')},
+                'StreamViewType': 'NEW_AND_OLD_IMAGES'
+            }
+        }
+        if new is not None:
+            record['dynamodb']['NewImage'] = {k: self._serializer.serialize(v) for k, v in new.items()}
+        if old is not None:
+            record['dynamodb']['OldImage'] = {k: self._serializer.serialize(v) for k, v in old.items()}
+        self.stream.append(record)
+
+    # -- writes (caller holds self._lock) -------------------------------------
+    def _check(self, key: Dict[str, Any], condition: Optional[str], names=None, values=None):
+        if not evaluate_condition(condition, self.items.get(self._key(key)) or {}, names, values):
+            raise ConditionalCheckFailedException('The conditional request failed')
+
+    def _put(self, item: Dict[str, Any]):
+        key = self._key(item)
+        old = self.items.get(key)
+        self.items[key] = deepcopy(item)
+        self._emit('MODIFY' if old else 'INSERT', old, item)
+
+    def _update(self, key: Dict[str, Any], expression: str, names=None, values=None):
+        old = self.items.get(self._key(key))
+        new = deepcopy(old) if old else dict(key)
+        apply_update(new, expression, names, values)
+        self.items[self._key(key)] = new
+        self._emit('MODIFY' if old else 'INSERT', old, new)
+        return old, new
+
+    def _delete(self, key: Dict[str, Any]):
+        old = self.items.pop(self._key(key), None)
+        if old is not None:
+            self._emit('REMOVE', old, None)
+
+    # -- item API --------------------------------------------------------------
+    def get_item(self, Key, ConsistentRead=False, **kwargs):
+        self._call('get_item')
+        with self._lock:
+            item = self.items.get(self._key(Key))
+            return {'Item': deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self._call('put_item')
+        _reject_floats(Item)
+        with self._lock:
+            self._check(Item, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self._put(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, ReturnValues=None, **kwargs):
+        self._call('update_item')
+        _reject_floats(ExpressionAttributeValues or {})
+        with self._lock:
+            self._check(Key, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            old, new = self._update(Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            if ReturnValues == 'ALL_NEW':
+                return {'Attributes': deepcopy(new)}
+            if ReturnValues == 'ALL_OLD':
+                return {'Attributes': deepcopy(old) if old else {}}
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._call('delete_item')
+        with self._lock:
+            self._check(Key, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self._delete(Key)
+        return {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues=None, ExpressionAttributeNames=None,
+              IndexName=None, ScanIndexForward=True, Limit=None, FilterExpression=None,
+              ExclusiveStartKey=None, **kwargs):
+        self._call('query')
+        pk_attr = f'{IndexName}PK' if IndexName else 'PK'
+        sk_attr = f'{IndexName}SK' if IndexName else 'SK'
+        with self._lock:
+            matches = [
+                deepcopy(item) for item in self.items.values()
+                if pk_attr in item and evaluate_condition(KeyConditionExpression, item,
+                                                          ExpressionAttributeNames, ExpressionAttributeValues)
+            ]
+        matches.sort(key=lambda item: item.get(sk_attr, ''), reverse=not ScanIndexForward)
+        if Limit is not None:
+            matches = matches[:Limit]
+        if FilterExpression:
+            matches = [item for item in matches if evaluate_condition(
+                FilterExpression, item, ExpressionAttributeNames, ExpressionAttributeValues)]
+        return {'Items': matches, 'Count': len(matches)}
+
+    def scan(self, FilterExpression=None, ExpressionAttributeValues=None, ExpressionAttributeNames=None,
+             ExclusiveStartKey=None, **kwargs):
+        self._call('scan')
+        with self._lock:
+            items = [deepcopy(item) for item in self.items.values()]
+        items = [item for item in items if evaluate_condition(
+            FilterExpression, item, ExpressionAttributeNames, ExpressionAttributeValues)]
+        return {'Items': items, 'Count': len(items)}
+
+
+class FakeDynamoClient(FakeService):
+    """Low-level client (serialized attribute values) backed by FakeTable instances"""
+
+    service = 'dynamodb'
+
+    def __init__(self, resource: 'FakeDynamoResource'):
+        super().__init__(resource.latency)
+        self.resource = resource
+        self.exceptions = SimpleNamespace(
+            ConditionalCheckFailedException=ConditionalCheckFailedException,
+            TransactionCanceledException=TransactionCanceledException
+        )
+
+    def transact_write_items(self, TransactItems):
+        """
+        All-or-nothing Put/Update/Delete/ConditionCheck across tables
+
+        Items use plain Python values, like the resource's meta.client (boto3
+        registers the high-level serializer on it).
+        """
+        self._call('transact_write_items')
+        if len(TransactItems) > 100:
+            raise ValueError('Too many items in transaction (max 100)')
+        operations = []
+        for entry in TransactItems:
+            (action, params), = entry.items()
+            _reject_floats(params)
+            operations.append((action, params, self.resource.Table(params['TableName'])))
+
+        tables = sorted({id(table): table for _, _, table in operations}.values(), key=lambda t: t.name)
+        for table in tables:
+            table._lock.acquire()
+        try:
+            reasons, failed = [], False
+            for action, params, table in operations:
+                try:
+                    table._check(params.get('Item') or params['Key'], params.get('ConditionExpression'),
+                                 params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+                    reasons.append({'Code': 'None'})
+                except ConditionalCheckFailedException:
+                    reasons.append({'Code': 'ConditionalCheckFailed',
+                                    'Message': 'The conditional request failed'})
+                    failed = True
+            if failed:
+                raise TransactionCanceledException(reasons)
+
+            for action, params, table in operations:
+                if action == 'Put':
+                    table._put(params['Item'])
+                elif action == 'Update':
+                    table._update(params['Key'], params['UpdateExpression'],
+                                  params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+                elif action == 'Delete':
+                    table._delete(params['Key'])
+        finally:
+            for table in reversed(tables):
+                table._lock.release()
+        return {}
+
+
+def matches_event_pattern(pattern: Dict[str, Any], event: Dict[str, Any]) -> bool:
+    """Lambda event filtering for the pattern subset our templates use (values, prefix, exists)"""
+    for key, rule in pattern.items():
+        present = isinstance(event, dict) and key in event
+        value = event.get(key) if present else None
+        if isinstance(rule, dict):
+            if not isinstance(value, dict) or not matches_event_pattern(rule, value):
+                return False
+            continue
+        matched = False
+        for option in rule:
+            if isinstance(option, dict) and 'exists' in option:
+                matched = present == option['exists']
+            elif isinstance(option, dict) and 'prefix' in option:
+                matched = isinstance(value, str) and value.startswith(option['prefix'])
+            else:
+                matched = present and value == option
+            if matched:
+                break
+        if not matched:
+            return False
+    return True
+
+
+class FakeDynamoResource:
+    """boto3.resource('dynamodb') stand-in"""
+
+    def __init__(self, latency: LatencyProfile):
+        self.latency = latency
+        self.stream: deque = deque()
+        self.tables: Dict[str, FakeTable] = {}
+        self.meta = SimpleNamespace(client=FakeDynamoClient(self))
+
+    def Table(self, name: str) -> FakeTable:
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, self.latency, self.stream)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        """Plain-value BatchGetItem (projections are ignored; nothing is left unprocessed)"""
+        self.meta.client._call('batch_get_item')
+        responses = {}
+        for name, request in RequestItems.items():
+            if len(request['Keys']) > 100:
+                raise ValueError('Too many items requested for the BatchGetItem call (max 100)')
+            table = self.Table(name)
+            with table._lock:
+                responses[name] = [deepcopy(table.items[table._key(key)]) for key in request['Keys']
+                                   if table._key(key) in table.items]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def drain_stream(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Pop up to `limit` pending stream records (deque pops are atomic)"""
+        records = []
+        while self.stream and len(records) < limit:
+            try:
+                records.append(self.stream.popleft())
+            except IndexError:
+                break
+        return records
+
+    @property
+    def calls(self) -> Counter:
+        total = Counter()
+        for table in self.tables.values():
+            total.update(table.calls)
+        total.update(self.meta.client.calls)
+        return total
+
+
+# ============================================================================
+# SQS / Secrets / CloudWatch
+# ============================================================================
+
+class FakeSQS(FakeService):
+    service = 'sqs'
+
+    def __init__(self, latency: LatencyProfile):
+        super().__init__(latency)
+        self.queues: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call('send_message')
+        with self._lock:
+            self.queues[QueueUrl].append({'body': MessageBody, 'attributes': kwargs})
+        return {'MessageId': uuid.uuid4().hex}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._call('send_message_batch')
+        if len(Entries) > 10:
+            raise ValueError('Too many entries in batch (max 10)')
+        with self._lock:
+            for entry in Entries:
+                self.queues[QueueUrl].append({'body': entry['MessageBody'], 'attributes': entry})
+        return {'Successful': [{'Id': e['Id'], 'MessageId': uuid.uuid4().hex} for e in Entries], 'Failed': []}
+
+    def receive(self, queue_url: str, max_messages: int = 10) -> List[Dict[str, Any]]:
+        """Pop up to max_messages as Lambda SQS event records"""
+        with self._lock:
+            pending = self.queues[queue_url]
+            batch, pending[:] = pending[:max_messages], pending[max_messages:]
+        return [{'messageId': uuid.uuid4().hex, 'body': m['body'], 'eventSource': 'aws:sqs'} for m in batch]
+
+    def depth(self, queue_url: str) -> int:
+        return len(self.queues[queue_url])
+
+
+class FakeSecrets(FakeService):
+    service = 'secrets'
+
+    def __init__(self, latency: LatencyProfile, values: Optional[Dict[str, str]] = None):
+        super().__init__(latency)
+        self.values = values or {}
+
+    def get_secret_value(self, SecretId):
+        self._call('get_secret_value')
+        return {'SecretString': self.values.get(SecretId, 'test-secret')}
+
+
+class FakeCloudWatch(FakeService):
+    service = 'cloudwatch'
+
+    def put_metric_data(self, Namespace, MetricData):
+        self._call('put_metric_data')
+        return {}
+
+
+# ============================================================================
+# Bedrock / Polly / S3 / Transcribe
+# ============================================================================
+
+CANNED_ANSWERS = {
+    'hi': 'कपास में एफिड नियंत्रण के लिए नीम तेल (5 मिली/लीटर) या इमिडाक्लोप्रिड का छिड़काव करें। ETL: 10% पौधे प्रभावित। (स्रोत: ICAR-CICR 2024)',
+    'mr': 'कापसावरील मावा नियंत्रणासाठी निंबोळी तेल (5 मिली/लिटर) फवारा. ETL ओलांडल्यावरच रासायनिक फवारणी करा. (स्रोत: ICAR-CICR 2024)',
+    'te': 'పత్తిలో పేనుబంక నియంత్రణకు వేప నూనె (5 మి.లీ/లీటర్) పిచికారీ చేయండి. (మూలం: ICAR-CICR 2024)',
+    'en': 'For aphids in cotton, spray neem oil (5 ml/litre) or imidacloprid once the ETL is crossed. (Source: ICAR-CICR 2024)'
+}
+
+
+def _dialect_of(text: str) -> str:
+    if re.search(r'[ఀ-౿]', text or ''):
+        return 'te'
+    if 'Marathi' in (text or ''):
+        return 'mr'
+    if re.search(r'[ऀ-ॿ]', text or '') or 'Hindi' in (text or ''):
+        return 'hi'
+    return 'en'
+
+
+class FakeBedrockAgentRuntime(FakeService):
+    service = 'bedrock_rag'
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration, **kwargs):
+        model_arn = retrieveAndGenerateConfiguration.get('knowledgeBaseConfiguration', {}).get('modelArn', '')
+        self._call('retrieve_and_generate', 'bedrock_rag_fast' if 'haiku' in model_arn else None)
+        template = (retrieveAndGenerateConfiguration.get('knowledgeBaseConfiguration', {})
+                    .get('generationConfiguration', {}).get('promptTemplate', {})
+                    .get('textPromptTemplate', ''))
+        dialect = _dialect_of(template)
+        return {
+            'output': {'text': CANNED_ANSWERS[dialect]},
+            'citations': [{
+                'generatedResponsePart': {'textResponsePart': {'text': CANNED_ANSWERS[dialect][:40]}},
+                'retrievedReferences': [{
+                    'content': {'text': 'Aphids: ETL 10% affected plants. Spray neem oil or imidacloprid.'},
+                    'location': {'type': 'S3', 's3Location': {'uri': 's3://kb/icar-cicr-pest-disease-advisory-2024.pdf'}}
+                }]
+            }]
+        }
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration=None, **kwargs):
+        self._call('retrieve', 'bedrock_invoke')
+        return {'retrievalResults': [{
+            'content': {'text': 'Aphids: ETL 10% affected plants. Spray neem oil or imidacloprid.'},
+            'location': {'type': 'S3', 's3Location': {'uri': 's3://kb/icar-cicr-pest-disease-advisory-2024.pdf'}},
+            'score': 0.8
+        }]}
+
+
+class FakeBedrockRuntime(FakeService):
+    service = 'bedrock_invoke'
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self._call('invoke_model')
+        request = json.loads(body)
+        prompt = ''.join(
+            part.get('text', '') for message in request.get('messages', [])
+            for part in (message['content'] if isinstance(message['content'], list) else
+                         [{'text': message['content']}])
+        )
+        text = CANNED_ANSWERS[_dialect_of(prompt)]
+        payload = {
+            'content': [{'type': 'text', 'text': f'Diagnosis: aphid infestation. Severity: medium. {text}'}],
+            'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+        }
+        return {'body': io.BytesIO(json.dumps(payload).encode())}
+
+
+class FakePolly(FakeService):
+    service = 'polly'
+
+    def synthesize_speech(self, Text, **kwargs):
+        self._call('synthesize_speech')
+        return {'AudioStream': io.BytesIO(b'ID3' + Text.encode()[:256])}
+
+
+class NoSuchKey(Exception):
+    def __init__(self, key: str):
+        super().__init__(f'The specified key does not exist: {key}')
+        self.response = {'Error': {'Code': 'NoSuchKey'}}
+
+
+class FakeS3(FakeService):
+    service = 's3'
+
+    def __init__(self, latency: LatencyProfile):
+        super().__init__(latency)
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self._call('put_object')
+        with self._lock:
+            self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else str(Body).encode()
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('get_object')
+        with self._lock:
+            body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise NoSuchKey(Key)
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call('delete_object')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+TRANSCRIPTS = {
+    'hi-IN': 'कपास में कीट कैसे नियंत्रित करें',
+    'mr-IN': 'कापसावरील किडे कसे नियंत्रित करायचे',
+    'te-IN': 'పత్తిలో పురుగులను ఎలా నియంత్రించాలి',
+    'en-IN': 'how to control pests in cotton'
+}
+
+
+class FakeTranscribe(FakeService):
+    service = 'transcribe_poll'
+
+    def __init__(self, latency: LatencyProfile):
+        super().__init__(latency)
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def start_transcription_job(self, TranscriptionJobName, LanguageCode, **kwargs):
+        self._call('start_transcription_job')
+        with self._lock:
+            self.jobs[TranscriptionJobName] = {
+                'language': LanguageCode,
+                'ready_at': time.time() + self.latency.transcribe_job * self.latency.scale / 1000.0
+            }
+        return {}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        self._call('get_transcription_job')
+        job = self.jobs.get(TranscriptionJobName, {})
+        done = time.time() >= job.get('ready_at', 0)
+        return {'TranscriptionJob': {
+            'TranscriptionJobName': TranscriptionJobName,
+            'TranscriptionJobStatus': 'COMPLETED' if done else 'IN_PROGRESS',
+            'Transcript': {'TranscriptFileUri': f'https://fake-transcripts/{TranscriptionJobName}'}
+        }}
+
+    def delete_transcription_job(self, TranscriptionJobName):
+        self._call('delete_transcription_job')
+        with self._lock:
+            self.jobs.pop(TranscriptionJobName, None)
+        return {}
+
+    def transcript_document(self, job_name: str) -> Dict[str, Any]:
+        language = self.jobs.get(job_name, {}).get('language', 'hi-IN')
+        text = TRANSCRIPTS.get(language, TRANSCRIPTS['hi-IN'])
+        return {'results': {
+            'transcripts': [{'transcript': text}],
+            'items': [{'alternatives': [{'confidence': '0.93', 'content': word}]} for word in text.split()]
+        }}
+
+
+# ============================================================================
+# WhatsApp Graph API (requests.post + urllib.request.urlopen)
+# ============================================================================
+
+class _Response:
+    """Quacks like both requests.Response and an urlopen() response"""
+
+    def __init__(self, payload: Any, status_code: int = 200):
+        self._body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.status_code = status_code
+        self.text = self._body.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self._body)
+
+    def read(self):
+        return self._body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeGraphAPI(FakeService):
+    """Records outbound WhatsApp messages and serves media downloads"""
+
+    service = 'graph_api'
+
+    def __init__(self, latency: LatencyProfile, transcribe: Optional[FakeTranscribe] = None):
+        super().__init__(latency)
+        self.transcribe = transcribe
+        self.sent: List[Dict[str, Any]] = []
+
+    def _record(self, payload: Dict[str, Any]) -> _Response:
+        self._call('send_message')
+        with self._lock:
+            self.sent.append({'to': payload.get('to'), 'type': payload.get('type'),
+                              'payload': payload, 'sent_at': time.time()})
+        return _Response({'messages': [{'id': f'wamid.OUT{uuid.uuid4().hex[:12]}'}]})
+
+    def post(self, url, headers=None, json=None, timeout=None, **kwargs):
+        """requests.post replacement"""
+        return self._record(json or {})
+
+    def urlopen(self, request, timeout=None, **kwargs):
+        """urllib.request.urlopen replacement"""
+        url = request if isinstance(request, str) else request.full_url
+        if url.startswith('https://fake-transcripts/'):
+            return _Response(self.transcribe.transcript_document(url.rsplit('/', 1)[-1]))
+        if url.endswith('/messages'):
+            return self._record(json_loads(request.data))
+        self._call('media', 'graph_api')
+        if 'lookaside' in url:
+            return _Response(b'\xff\xd8\xff\xe0' + b'\x00' * 2048)
+        media_id = url.rstrip('/').rsplit('/', 1)[-1]
+        return _Response({'url': f'https://lookaside.fbsbx.com/whatsapp_business/attachments/?mid={media_id}'})
+
+    def messages_to(self, phone_number: str) -> List[Dict[str, Any]]:
+        return [m for m in self.sent if m['to'] == phone_number]
+
+
+def json_loads(data: Optional[bytes]) -> Dict[str, Any]:
+    return json.loads(data.decode()) if data else {}
+
+
+def deserialize_image(image: Dict[str, Any]) -> Dict[str, Any]:
+    """DynamoDB JSON -> python (for assertions on stream records)"""
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in image.items()}
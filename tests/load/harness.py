@@ -0,0 +1,605 @@
+"""
+Offline End-to-End Load Test
+
+Replays synthetic WhatsApp webhook traffic (text, image, audio and button
+replies in Hindi, Marathi, Telugu and English) through the real Lambda
+handlers:
+
+    webhook/handler.py -> processor/handler.py
+                       -> voice/processor.py -> processor/handler.py
+                       -> nudge reply queue -> nudge/detector.py
+                       -> (DynamoDB Stream, filtered backstop) -> nudge/detector.py
+    nudge/sender.py -> nudge/reminder.py (before traffic starts)
+
+AWS and the WhatsApp Graph API are replaced with the in-memory stand-ins in
+tests/load/fakes.py, each with configurable latency. The report covers
+messages/sec, reply latency percentiles, per-stage latency (from the EMF
+records printed by tracing.py), AWS call counts and process resource usage.
+
+Usage:
+    python -m tests.load.harness --messages 200 --concurrency 8
+    python -m tests.load.harness --messages 100 --latency-scale 0 --json
+"""
+import argparse
+import contextlib
+import hashlib
+import hmac
+import importlib
+import io
+import json
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Same layout as tests/conftest.py: Lambda packages import siblings flat
+for _package in reversed(['processor', 'webhook', 'nudge', 'voice', 'dlq']):
+    _path = os.path.join(ROOT, 'src', _package)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'TABLE_NAME': 'agrinexus-data',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-messages-load.fifo',
+    'VOICE_QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-voice-load.fifo',
+    'KNOWLEDGE_BASE_ID': 'LOADTESTKB',
+    'GUARDRAIL_ID': '',
+    'GUARDRAIL_VERSION': '1',
+    'TEMP_AUDIO_BUCKET': 'agrinexus-temp-audio-load',
+}
+for _key, _value in ENVIRONMENT.items():
+    os.environ.setdefault(_key, _value)
+
+from tests.load.fakes import (  # noqa: E402
+    FakeBedrockAgentRuntime, FakeBedrockRuntime, FakeCloudWatch, FakeDynamoResource,
+    FakeGraphAPI, FakePolly, FakeS3, FakeSecrets, FakeSQS, FakeTranscribe,
+    LatencyProfile, matches_event_pattern
+)
+import targeting  # noqa: E402
+
+APP_SECRET = 'load-test-app-secret'
+TEMPLATE = os.path.join(ROOT, 'template-week2.yaml')
+DIALECTS = ['hi', 'mr', 'te', 'en']
+NUDGE_LOCATION = 'Jalna'
+DEFAULT_MIX = {'text': 0.45, 'image': 0.15, 'audio': 0.15, 'button': 0.10, 'reply': 0.15}
+
+QUESTIONS = {
+    'hi': ['कपास में एफिड कैसे नियंत्रित करें?', 'गेहूं में खाद कब डालें?', 'सोयाबीन में पीला मोज़ेक का इलाज?'],
+    'mr': ['कापसावरील मावा कसा नियंत्रित करावा?', 'गहू पिकाला खत कधी द्यावे?', 'सोयाबीनवरील पिवळा मोझॅक उपाय?'],
+    'te': ['పత్తిలో పేనుబంకను ఎలా నియంత్రించాలి?', 'గోధుమకు ఎరువు ఎప్పుడు వేయాలి?', 'సోయాబీన్‌లో పసుపు మొజాయిక్ నివారణ?'],
+    'en': ['How do I control aphids in cotton?', 'When should I apply urea to wheat?', 'Pink bollworm ETL for cotton?'],
+}
+DONE_REPLIES = {'hi': 'हो गया', 'mr': 'झाला', 'te': 'అయ్యింది', 'en': 'done'}
+NOT_YET_REPLIES = {'hi': 'अभी नहीं', 'mr': 'अजून नाही', 'te': 'ఇంకా లేదు', 'en': 'not yet'}
+CROP_BUTTONS = {'hi': 'कपास', 'mr': 'कापूस', 'te': 'పత్తి', 'en': 'Cotton'}
+
+
+@dataclass
+class SyntheticMessage:
+    """One inbound WhatsApp message and the farmer who sends it"""
+    kind: str
+    dialect: str
+    phone: str
+    wamid: str
+    message: Dict[str, Any]
+
+
+@dataclass
+class LoadReport:
+    messages: int
+    concurrency: int
+    latency_scale: float
+    duration_s: float
+    throughput_msgs_per_s: float
+    reply_latency_ms: Dict[str, float]
+    first_response_ms: Dict[str, float]
+    by_kind: Dict[str, Dict[str, float]]
+    stages_ms: Dict[str, Dict[str, float]]
+    unanswered: int
+    errors: List[str]
+    aws_calls: Dict[str, Dict[str, int]]
+    calls_per_message: float
+    cpu_seconds: float
+    peak_rss_mb: float
+    tracemalloc_peak_mb: Optional[float]
+    nudge_cycle: Dict[str, Any] = field(default_factory=dict)
+    stream: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        lines = [
+            f"Messages:        {self.messages} (concurrency {self.concurrency}, latency x{self.latency_scale})",
+            f"Duration:        {self.duration_s:.2f}s",
+            f"Throughput:      {self.throughput_msgs_per_s:.1f} msgs/sec",
+            f"Reply latency:   p50 {self.reply_latency_ms['p50']:.0f}ms  p95 {self.reply_latency_ms['p95']:.0f}ms"
+            f"  p99 {self.reply_latency_ms['p99']:.0f}ms",
+            f"First response:  p50 {self.first_response_ms['p50']:.0f}ms  p95 {self.first_response_ms['p95']:.0f}ms",
+            f"Unanswered:      {self.unanswered}   Errors: {len(self.errors)}",
+            f"AWS calls/msg:   {self.calls_per_message:.1f}",
+            f"CPU:             {self.cpu_seconds:.2f}s   Peak RSS: {self.peak_rss_mb:.0f}MB"
+            + (f"   tracemalloc peak: {self.tracemalloc_peak_mb:.1f}MB" if self.tracemalloc_peak_mb is not None else ''),
+            '',
+            'By kind (count / p95 reply ms):'
+        ]
+        for kind, stats in sorted(self.by_kind.items()):
+            lines.append(f"  {kind:<8} {int(stats['count']):>5} / {stats['p95']:.0f}")
+        lines.append('')
+        lines.append('Stages (count / p50 / p95 ms):')
+        for stage_name, stats in sorted(self.stages_ms.items(), key=lambda kv: -kv[1]['p95']):
+            lines.append(f"  {stage_name:<28} {int(stats['count']):>5} / {stats['p50']:.1f} / {stats['p95']:.1f}")
+        if self.nudge_cycle:
+            lines.append('')
+            lines.append(f"Nudge cycle:     {self.nudge_cycle}")
+        if self.stream:
+            lines.append(f"Detector stream: {self.stream}")
+        return '\n'.join(lines)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for empty input)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0
+    }
+
+
+# ============================================================================
+# Synthetic traffic
+# ============================================================================
+
+def build_traffic(count: int, seed: int = 7, mix: Optional[Dict[str, float]] = None,
+                  users: Optional[int] = None) -> List[SyntheticMessage]:
+    """
+    Deterministic message mix across the four dialects.
+
+    Questions (text/image/audio) come from a pool of `users` farmers so warm
+    caches are exercised; by default every message has its own farmer.
+    Onboarding button replies and nudge replies always come from their own
+    farmer, since each only makes sense once.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*mix.items())
+    traffic = []
+    base_ts = int(time.time())
+    for index in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        farmer = index % users if users and kind in ('text', 'image', 'audio') else count + index
+        dialect = DIALECTS[farmer % len(DIALECTS)]
+        phone = f'9190{farmer:08d}'
+        wamid = f'wamid.LOAD{seed:03d}{index:08d}'
+        message: Dict[str, Any] = {'from': phone, 'id': wamid, 'timestamp': str(base_ts + index), 'type': kind}
+        if kind == 'text':
+            message['text'] = {'body': rng.choice(QUESTIONS[dialect])}
+        elif kind == 'image':
+            message['image'] = {'id': f'media-img-{index}', 'mime_type': 'image/jpeg', 'caption': ''}
+        elif kind == 'audio':
+            message['audio'] = {'id': f'media-aud-{index}', 'mime_type': 'audio/ogg; codecs=opus', 'voice': True}
+        elif kind == 'button':
+            message['type'] = 'interactive'
+            message['interactive'] = {'type': 'button_reply', 'button_reply': {
+                'id': f'btn-{index}', 'title': CROP_BUTTONS[dialect]}}
+        elif kind == 'reply':
+            message['type'] = 'text'
+            replies = NOT_YET_REPLIES if rng.random() < 0.25 else DONE_REPLIES
+            message['text'] = {'body': replies[dialect]}
+        traffic.append(SyntheticMessage(kind, dialect, phone, wamid, message))
+    return traffic
+
+
+def webhook_event(item: SyntheticMessage) -> Dict[str, Any]:
+    """API Gateway event carrying one signed WhatsApp webhook delivery"""
+    payload = {
+        'object': 'whatsapp_business_account',
+        'entry': [{
+            'id': 'WABA-LOAD',
+            'changes': [{
+                'field': 'messages',
+                'value': {
+                    'messaging_product': 'whatsapp',
+                    'metadata': {'display_phone_number': '15550000000', 'phone_number_id': 'PNID-LOAD'},
+                    'contacts': [{'profile': {'name': 'Farmer'}, 'wa_id': item.phone}],
+                    'messages': [item.message]
+                }
+            }]
+        }]
+    }
+    body = json.dumps(payload, ensure_ascii=False)
+    signature = hmac.new(APP_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+    return {
+        'httpMethod': 'POST',
+        'headers': {'X-Hub-Signature-256': f'sha256={signature}', 'Content-Type': 'application/json'},
+        'body': body
+    }
+
+
+# ============================================================================
+# Harness
+# ============================================================================
+
+class _StdoutSink(io.TextIOBase):
+    """Captures handler prints; keeps only EMF stage records"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._buffer = ''
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer += text
+            lines = self._buffer.split('\n')
+            self._buffer = lines.pop()
+        for line in lines:
+            if line.startswith('{"_aws"'):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                with self._lock:
+                    self.records.append(record)
+        return len(text)
+
+
+def detector_filters(template: str = TEMPLATE) -> List[Dict[str, Any]]:
+    """FilterCriteria patterns of the detector's stream mapping in the SAM template"""
+    with open(template, encoding='utf-8') as f:
+        return [json.loads(pattern) for pattern in re.findall(r"^\s*- Pattern: '(.*)'\s*$", f.read(), re.M)]
+
+
+class LoadHarness:
+    """Wires the Lambda modules to in-memory fakes and drives traffic through them"""
+
+    def __init__(self, latency: Optional[LatencyProfile] = None):
+        self.latency = latency or LatencyProfile()
+        self.dynamodb = FakeDynamoResource(self.latency)
+        self.table = self.dynamodb.Table(os.environ['TABLE_NAME'])
+        self.sqs = FakeSQS(self.latency)
+        self.secrets = FakeSecrets(self.latency, {'agrinexus/whatsapp/app-secret': APP_SECRET})
+        self.cloudwatch = FakeCloudWatch(self.latency)
+        self.bedrock_agent = FakeBedrockAgentRuntime(self.latency)
+        self.bedrock = FakeBedrockRuntime(self.latency)
+        self.polly = FakePolly(self.latency)
+        self.s3 = FakeS3(self.latency)
+        self.transcribe = FakeTranscribe(self.latency)
+        self.graph = FakeGraphAPI(self.latency, self.transcribe)
+        self.queue_url = os.environ['QUEUE_URL']
+        self.voice_queue_url = os.environ['VOICE_QUEUE_URL']
+        self.reply_queue_url = 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-nudge-replies-load.fifo'
+        self._stream_lock = threading.Lock()
+        self.stream_filters = detector_filters()
+        self.stream_stats: Counter = Counter()
+        self._patches: List[tuple] = []
+        self.modules = SimpleNamespace()
+
+    # -- wiring ----------------------------------------------------------------
+    def _patch(self, target: Any, name: str, value: Any):
+        self._patches.append((target, name, getattr(target, name)))
+        setattr(target, name, value)
+
+    def install(self):
+        """Import the Lambda modules and point their clients at the fakes"""
+        import requests
+
+        m = self.modules
+        m.webhook = importlib.import_module('src.webhook.handler')
+        m.processor = importlib.import_module('src.processor.handler')
+        m.output = importlib.import_module('output')
+        m.analyzer = importlib.import_module('analyzer')
+        m.voice = importlib.import_module('src.voice.processor')
+        m.sender = importlib.import_module('src.nudge.sender')
+        m.reminder = importlib.import_module('src.nudge.reminder')
+        m.detector = importlib.import_module('src.nudge.detector')
+        # Flat modules shared by every package on sys.path (one process = one "container")
+        m.profiles = importlib.import_module('profiles')
+        m.profiles.invalidate()
+
+        clients = {
+            m.webhook: {'sqs': self.sqs, 'dynamodb': self.dynamodb, 'table': self.table, 'secrets': self.secrets},
+            m.processor: {'dynamodb': self.dynamodb, 'table': self.table, 'secrets': self.secrets,
+                          'bedrock_agent': self.bedrock_agent},
+            m.output: {'polly': self.polly, 's3': self.s3},
+            m.analyzer: {'bedrock': self.bedrock, 's3': self.s3, 'secrets': self.secrets},
+            m.voice: {'transcribe': self.transcribe, 's3': self.s3, 'secrets': self.secrets, 'sqs': self.sqs,
+                      'dynamodb': self.dynamodb, 'table': self.table},
+            m.sender: {'dynamodb': self.dynamodb, 'table': self.table, 'secrets': self.secrets,
+                       'cloudwatch': self.cloudwatch},
+            m.reminder: {'dynamodb': self.dynamodb, 'table': self.table, 'secrets': self.secrets},
+            m.detector: {'dynamodb': self.dynamodb, 'table': self.table, 'secrets': self.secrets,
+                         'cloudwatch': self.cloudwatch},
+        }
+        for module, attributes in clients.items():
+            for name, value in attributes.items():
+                if hasattr(module, name):
+                    self._patch(module, name, value)
+
+        self._patch(m.webhook, 'VERIFY_SIGNATURE', True)
+        self._patch(m.webhook, '_secret_cache', {})
+        self._patch(m.detector, '_secret_cache', {})
+        self._patch(m.voice, 'QUEUE_URL', self.queue_url)
+        self._patch(m.webhook, 'NUDGE_REPLY_QUEUE_URL', self.reply_queue_url)
+        self._patch(m.processor, 'NUDGE_REPLY_QUEUE_URL', self.reply_queue_url)
+        # Transcribe polling sleeps 1s between polls; scale it with the latency profile
+        scale = self.latency.scale
+        self._patch(m.voice, 'time', SimpleNamespace(
+            sleep=lambda seconds: time.sleep(seconds * scale) if scale else None,
+            time=time.time, perf_counter=time.perf_counter
+        ))
+        self._patch(requests, 'post', self.graph.post)
+        self._patch(urllib.request, 'urlopen', self.graph.urlopen)
+        return self
+
+    def uninstall(self):
+        while self._patches:
+            target, name, original = self._patches.pop()
+            setattr(target, name, original)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+        return False
+
+    # -- fixtures ----------------------------------------------------------------
+    def seed_farmers(self, traffic: List[SyntheticMessage]):
+        """Create profiles so each synthetic message exercises its intended path"""
+        seeded = set()
+        for item in traffic:
+            if item.phone in seeded:
+                continue
+            seeded.add(item.phone)
+            location = NUDGE_LOCATION if item.kind == 'reply' else 'Aurangabad'
+            if item.kind == 'button':
+                # Mid-onboarding farmer answering the crop question
+                profile = {'onboarding_state': 'crop', 'onboarding_complete': False, 'location': location}
+            else:
+                profile = {
+                    'crop': 'Cotton', 'consent': True, 'onboarding_complete': True,
+                    'GSI1PK': f'LOCATION#{location}', 'GSI1SK': 'CROP#Cotton',
+                    'voicePreference': item.kind == 'audio'
+                }
+            profile = {'PK': f'USER#{item.phone}', 'SK': 'PROFILE', 'phone_number': item.phone,
+                       'dialect': item.dialect, 'location': location, **profile}
+            self.table.items[(f'USER#{item.phone}', 'PROFILE')] = {**profile, **targeting.index_keys(profile)}
+
+    def run_nudge_cycle(self) -> Dict[str, Any]:
+        """Weather nudge fan-out plus the reminder sweep that runs a day later"""
+        started = time.perf_counter()
+        result = self.modules.sender.lambda_handler({
+            'location': NUDGE_LOCATION,
+            'weather': {'wind_speed': 8.5, 'rain_probability': 10.0, 'temperature': 29.0},
+            'activity': 'spray'
+        }, None)
+        fanout_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        sweep_at = datetime.utcnow() + timedelta(hours=24, minutes=1)  # every T+24h reminder is due
+        sweep = self.modules.reminder.lambda_handler({'time': sweep_at.strftime('%Y-%m-%dT%H:%M:%SZ')}, None)
+        reminders = sweep.get('sent', 0)
+        self.dynamodb.stream.clear()
+        return {
+            'nudges_sent': result.get('nudges_sent', 0),
+            'fanout_s': round(fanout_s, 3),
+            'reminders_sent': reminders,
+            'reminders_s': round(time.perf_counter() - started, 3)
+        }
+
+    # -- pumps -------------------------------------------------------------------
+    def _pump_queue(self, queue_url: str, handler) -> int:
+        processed = 0
+        while True:
+            records = self.sqs.receive(queue_url, max_messages=10)
+            if not records:
+                return processed
+            handler({'Records': records}, None)
+            processed += len(records)
+
+    def _pump_stream(self) -> int:
+        # One consumer at a time, like a single stream shard
+        if not self._stream_lock.acquire(blocking=False):
+            return 0
+        try:
+            processed = 0
+            while True:
+                records = self.dynamodb.drain_stream(limit=100)
+                if not records:
+                    return processed
+                # The event source mapping's FilterCriteria, applied before invoking
+                matched = [record for record in records
+                           if any(matches_event_pattern(pattern, record) for pattern in self.stream_filters)]
+                self.stream_stats.update(records=len(records), delivered=len(matched))
+                if matched:
+                    self.stream_stats['detector_invocations'] += 1
+                    self.modules.detector.lambda_handler({'Records': matched}, None)
+                processed += len(records)
+        finally:
+            self._stream_lock.release()
+
+    def pump(self):
+        """Deliver everything queued so far (nudge replies, voice, text, spoken replies, then the stream)"""
+        self._pump_queue(self.reply_queue_url, self.modules.detector.lambda_handler)
+        self._pump_queue(self.voice_queue_url, self.modules.voice.lambda_handler)
+        self._pump_queue(self.queue_url, self.modules.processor.lambda_handler)
+        self._pump_queue(self.reply_queue_url, self.modules.detector.lambda_handler)
+        self._pump_stream()
+
+    def _deliver(self, item: SyntheticMessage) -> float:
+        sent_at = time.time()
+        response = self.modules.webhook.lambda_handler(webhook_event(item), None)
+        if response['statusCode'] != 200:
+            raise RuntimeError(f"webhook returned {response['statusCode']} for {item.wamid}")
+        self.pump()
+        return sent_at
+
+    # -- run ---------------------------------------------------------------------
+    def run(self, traffic: List[SyntheticMessage], concurrency: int = 4, rate: Optional[float] = None,
+            nudges: bool = True, trace_memory: bool = False) -> LoadReport:
+        self.seed_farmers(traffic)
+        sink = _StdoutSink()
+        errors: List[str] = []
+        sent_at: Dict[str, float] = {}  # wamid -> webhook delivery time
+
+        with contextlib.redirect_stdout(sink):
+            nudge_cycle = self.run_nudge_cycle() if nudges else {}
+            self.graph.sent.clear()
+            self.stream_stats.clear()
+
+            if trace_memory:
+                tracemalloc.start()
+            usage_before = resource.getrusage(resource.RUSAGE_SELF)
+            started = time.perf_counter()
+
+            def deliver(item: SyntheticMessage):
+                try:
+                    sent_at[item.wamid] = self._deliver(item)
+                except Exception as e:
+                    errors.append(f'{item.kind}/{item.dialect} {item.wamid}: {type(e).__name__}: {e}')
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for index, item in enumerate(traffic):
+                    if rate:
+                        delay = started + index / rate - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    pool.submit(deliver, item)
+            # Anything left behind by a worker that lost a race for the queues
+            self.pump()
+
+            duration = time.perf_counter() - started
+            usage_after = resource.getrusage(resource.RUSAGE_SELF)
+            tracemalloc_peak = None
+            if trace_memory:
+                tracemalloc_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+
+        return self._report(traffic, concurrency, duration, sent_at, sink.records, errors,
+                            usage_before, usage_after, tracemalloc_peak, nudge_cycle)
+
+    def _report(self, traffic, concurrency, duration, sent_at, records, errors,
+                usage_before, usage_after, tracemalloc_peak, nudge_cycle) -> LoadReport:
+        # Attribute each outbound message to the latest message that farmer had
+        # delivered before it was sent (farmers may have several in flight)
+        delivered = defaultdict(list)
+        for item in traffic:
+            if item.wamid in sent_at:
+                delivered[item.phone].append((sent_at[item.wamid], item.wamid))
+        replies = defaultdict(list)
+        for sent in self.graph.sent:
+            candidates = [d for d in delivered.get(sent['to'], []) if d[0] <= sent['sent_at']]
+            if candidates:
+                replies[max(candidates)[1]].append(sent['sent_at'])
+
+        reply_ms, first_ms = [], []
+        by_kind = defaultdict(list)
+        unanswered = 0
+        for item in traffic:
+            times = replies.get(item.wamid)
+            if not times:
+                unanswered += 1
+                continue
+            latency = (max(times) - sent_at[item.wamid]) * 1000
+            reply_ms.append(latency)
+            first_ms.append((min(times) - sent_at[item.wamid]) * 1000)
+            by_kind[item.kind].append(latency)
+
+        stages = defaultdict(list)
+        for record in records:
+            if 'Stage' in record:
+                stages[record['Stage']].append(record['StageLatency'])
+
+        aws_calls = {
+            name: dict(service.calls) for name, service in {
+                'dynamodb': self.dynamodb, 'sqs': self.sqs, 'secretsmanager': self.secrets,
+                'cloudwatch': self.cloudwatch,
+                'bedrock-agent-runtime': self.bedrock_agent, 'bedrock-runtime': self.bedrock,
+                'polly': self.polly, 's3': self.s3, 'transcribe': self.transcribe, 'graph': self.graph
+            }.items() if service.calls
+        }
+        total_calls = sum(sum(calls.values()) for calls in aws_calls.values())
+        cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss_divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+
+        return LoadReport(
+            messages=len(traffic),
+            concurrency=concurrency,
+            latency_scale=self.latency.scale,
+            duration_s=round(duration, 3),
+            throughput_msgs_per_s=round(len(traffic) / duration, 2) if duration else 0.0,
+            reply_latency_ms=_distribution(reply_ms),
+            first_response_ms=_distribution(first_ms),
+            by_kind={kind: _distribution(values) for kind, values in by_kind.items()},
+            stages_ms={name: _distribution(values) for name, values in stages.items()},
+            unanswered=unanswered,
+            errors=errors,
+            aws_calls=aws_calls,
+            calls_per_message=round(total_calls / len(traffic), 2) if traffic else 0.0,
+            cpu_seconds=round(cpu, 3),
+            peak_rss_mb=round(usage_after.ru_maxrss / rss_divisor, 1),
+            tracemalloc_peak_mb=round(tracemalloc_peak, 2) if tracemalloc_peak is not None else None,
+            nudge_cycle=nudge_cycle,
+            stream=dict(self.stream_stats)
+        )
+
+
+def run_load_test(messages: int = 100, concurrency: int = 4, latency_scale: float = 1.0,
+                  rate: Optional[float] = None, seed: int = 7, nudges: bool = True,
+                  trace_memory: bool = False, users: Optional[int] = None) -> LoadReport:
+    """Build traffic, run it through a fresh harness and return the report"""
+    latency = LatencyProfile(scale=latency_scale)
+    traffic = build_traffic(messages, seed=seed, users=users)
+    with LoadHarness(latency) as harness:
+        return harness.run(traffic, concurrency=concurrency, rate=rate, nudges=nudges,
+                           trace_memory=trace_memory)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline end-to-end load test for the AgriNexus pipeline')
+    parser.add_argument('--messages', type=int, default=100, help='number of inbound messages')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel Lambda containers to simulate')
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='multiplier for simulated AWS/Graph latency (0 = CPU-only)')
+    parser.add_argument('--rate', type=float, default=None, help='open-loop arrival rate in msgs/sec')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--users', type=int, default=None,
+                        help='farmers asking questions (default: one per message)')
+    parser.add_argument('--no-nudges', action='store_true', help='skip the nudge fan-out/reminder cycle')
+    parser.add_argument('--trace-memory', action='store_true', help='report tracemalloc peak (slower)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args.messages, args.concurrency, args.latency_scale, args.rate, args.seed,
+                           nudges=not args.no_nudges, trace_memory=args.trace_memory, users=args.users)
+    print(json.dumps(asdict(report), indent=2) if args.json else report.summary())
+    return 1 if report.errors or report.unanswered else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
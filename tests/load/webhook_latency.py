@@ -0,0 +1,160 @@
+"""
+Webhook Acknowledgment Latency (cold vs warm)
+
+WhatsApp expects the webhook to answer within 2 seconds. This measures how
+long the webhook takes to return 200 on:
+
+- cold: a fresh interpreter per run. It times the module import, building
+  the real boto3 clients the first POST needs (no network), and the first
+  invocation against the in-memory fakes.
+- warm: repeated invocations in one process after a warm-up request.
+
+Simulated AWS latency comes from tests/load/fakes.py (LatencyProfile).
+
+Usage:
+    python -m tests.load.webhook_latency --cold-runs 10 --warm-runs 500
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACK_BUDGET_MS = 2000.0
+# Clients the first POST touches: signature secret, dedup/message transaction, enqueue
+FIRST_REQUEST_CLIENTS = ('secrets', 'dynamodb', 'table', 'sqs')
+
+
+@dataclass
+class WebhookLatencyReport:
+    latency_scale: float
+    budget_ms: float
+    cold_ms: Dict[str, float]
+    cold_import_ms: Dict[str, float]
+    cold_clients_ms: Dict[str, float]
+    warm_ms: Dict[str, float]
+
+    @property
+    def within_budget(self) -> bool:
+        return self.cold_ms['p99'] <= self.budget_ms and self.warm_ms['p99'] <= self.budget_ms
+
+    def summary(self) -> str:
+        def row(label: str, dist: Dict[str, float]) -> str:
+            return (f"  {label:<14} p50 {dist['p50']:8.1f}  p99 {dist['p99']:8.1f}  "
+                    f"max {dist['max']:8.1f}  (n={dist['count']})")
+        return '\n'.join([
+            f"Webhook ack latency (ms), latency scale {self.latency_scale}, budget {self.budget_ms:.0f} ms",
+            row('cold total', self.cold_ms),
+            row('  import', self.cold_import_ms),
+            row('  clients', self.cold_clients_ms),
+            row('warm', self.warm_ms),
+            f"  within budget: {'yes' if self.within_budget else 'NO'}",
+        ])
+
+
+def _cold_child(latency_scale: float) -> Dict[str, float]:
+    """Runs in a fresh interpreter: nothing project-related may be imported before the timer starts"""
+    sys.path[:0] = [os.path.join(ROOT, 'src', 'webhook'), ROOT]
+
+    started = time.perf_counter()
+    webhook = importlib.import_module('src.webhook.handler')
+    imported = time.perf_counter()
+    for name in FIRST_REQUEST_CLIENTS:
+        getattr(webhook, name).get()
+    built = time.perf_counter()
+
+    from tests.load.fakes import LatencyProfile
+    from tests.load.harness import LoadHarness, build_traffic, webhook_event
+
+    event = webhook_event(build_traffic(1, mix={'text': 1.0})[0])
+    with LoadHarness(LatencyProfile(scale=latency_scale)), contextlib.redirect_stdout(io.StringIO()):
+        invoke_started = time.perf_counter()
+        response = webhook.lambda_handler(event, None)
+        invoked = time.perf_counter()
+    if response['statusCode'] != 200:
+        raise RuntimeError(f"webhook returned {response['statusCode']}")
+
+    import_ms = (imported - started) * 1000
+    clients_ms = (built - imported) * 1000
+    return {
+        'import_ms': import_ms,
+        'clients_ms': clients_ms,
+        'total_ms': import_ms + clients_ms + (invoked - invoke_started) * 1000
+    }
+
+
+def measure_cold(runs: int, latency_scale: float) -> List[Dict[str, float]]:
+    from tests.load.harness import ENVIRONMENT
+
+    env = {**os.environ, **ENVIRONMENT, 'PYTHONPATH': ROOT}
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'tests.load.webhook_latency', '--child', '--latency-scale', str(latency_scale)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def measure_warm(runs: int, latency_scale: float) -> List[float]:
+    from tests.load.fakes import LatencyProfile
+    from tests.load.harness import LoadHarness, build_traffic, webhook_event
+
+    events = [webhook_event(item) for item in build_traffic(runs + 1, mix={'text': 1.0}, users=50)]
+    timings = []
+    with LoadHarness(LatencyProfile(scale=latency_scale)) as harness, \
+            contextlib.redirect_stdout(io.StringIO()):
+        webhook = harness.modules.webhook
+        webhook.lambda_handler(events[0], None)  # warm-up: secret fetch, profile cache
+        for event in events[1:]:
+            started = time.perf_counter()
+            webhook.lambda_handler(event, None)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run_webhook_latency(cold_runs: int = 5, warm_runs: int = 200, latency_scale: float = 1.0) -> WebhookLatencyReport:
+    from tests.load.harness import _distribution
+
+    cold = measure_cold(cold_runs, latency_scale)
+    return WebhookLatencyReport(
+        latency_scale=latency_scale,
+        budget_ms=ACK_BUDGET_MS,
+        cold_ms=_distribution([run['total_ms'] for run in cold]),
+        cold_import_ms=_distribution([run['import_ms'] for run in cold]),
+        cold_clients_ms=_distribution([run['clients_ms'] for run in cold]),
+        warm_ms=_distribution(measure_warm(warm_runs, latency_scale)),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Cold and warm webhook acknowledgment latency')
+    parser.add_argument('--cold-runs', type=int, default=10)
+    parser.add_argument('--warm-runs', type=int, default=500)
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='multiplier for simulated AWS latency (0 = CPU-only)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_cold_child(args.latency_scale)))
+        return 0
+
+    report = run_webhook_latency(args.cold_runs, args.warm_runs, args.latency_scale)
+    print(json.dumps({**asdict(report), 'within_budget': report.within_budget}, indent=2)
+          if args.json else report.summary())
+    return 0 if report.within_budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
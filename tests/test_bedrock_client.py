@@ -0,0 +1,254 @@
+import filecmp
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import bedrock_client
+import src.processor.handler as processor
+from tests.load.fakes import FakeBedrockAgentRuntime, FakeDynamoResource, FakeSQS, LatencyProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_CONFIG = {'type': 'KNOWLEDGE_BASE', 'knowledgeBaseConfiguration': {
+    'knowledgeBaseId': 'KB', 'modelArn': 'arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-haiku-20240307-v1:0'}}
+
+
+class ThrottlingException(Exception):
+    response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class ValidationException(Exception):
+    response = {'Error': {'Code': 'ValidationException'}}
+
+
+class Clock:
+    """Fake epoch clock; sleeping advances it"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class Flaky:
+    """Raises the given errors in turn, then answers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def retrieve_and_generate(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'output': {'text': 'ok'}, 'citations': []}
+
+
+class ConcurrencyQuota:
+    """Throttles any call beyond `quota` in flight, like a Bedrock concurrency limit"""
+
+    def __init__(self, quota: int, latency_s: float = 0.01):
+        self.quota = quota
+        self.latency_s = latency_s
+        self.in_flight = self.peak = self.throttles = self.answered = 0
+        self.lock = threading.Lock()
+
+    def retrieve_and_generate(self, **kwargs):
+        with self.lock:
+            if self.in_flight >= self.quota:
+                self.throttles += 1
+                raise ThrottlingException('Too many requests')
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency_s)
+        with self.lock:
+            self.in_flight -= 1
+            self.answered += 1
+        return {'output': {'text': 'ok'}, 'citations': []}
+
+
+@pytest.fixture(autouse=True)
+def no_deadline():
+    yield
+    bedrock_client.set_deadline(None)
+
+
+@pytest.fixture
+def table():
+    return FakeDynamoResource(LatencyProfile.zero()).Table('agrinexus-test')
+
+
+def test_limiter_adds_on_success_and_halves_on_throttle():
+    limiter = bedrock_client.AIMDLimiter(initial=4, minimum=1, maximum=6)
+
+    assert all(limiter.acquire(0) for _ in range(4)) and not limiter.acquire(0.01)
+    limiter.release(succeeded=True)
+    assert limiter.limit == pytest.approx(4.25)
+    limiter.release(throttled=True)
+    limiter.release(throttled=True)
+    assert limiter.limit == pytest.approx(1.0625) and limiter.in_flight == 1
+    limiter.release(throttled=True)
+    assert limiter.limit == 1
+
+
+def test_bucket_is_shared_between_containers(table):
+    clock = Clock()
+    first = bedrock_client.TokenBucket(table, 'model', rate=1, burst=3, clock=clock)
+    second = bedrock_client.TokenBucket(table, 'model', rate=1, burst=3, clock=clock)
+
+    assert [first.try_acquire(), second.try_acquire(), first.try_acquire()] == [0, 0, 0]
+    assert second.try_acquire() == pytest.approx(1.0, abs=0.01)
+    clock.sleep(1.01)
+    assert second.try_acquire() == 0 and first.try_acquire() > 0
+    assert table.items[('RATELIMIT#model', 'BUCKET')]['version'] == 4
+
+
+def test_bucket_waits_until_the_deadline_only(table):
+    clock = Clock()
+    bucket = bedrock_client.TokenBucket(table, 'model', rate=0.5, burst=1, clock=clock)
+
+    assert bucket.acquire(clock() + 1, clock.sleep)
+    assert not bucket.acquire(clock() + 1, clock.sleep)
+    assert bucket.acquire(clock() + 3, clock.sleep)
+
+
+def test_throttle_halves_the_shared_rate_once_per_cooldown(table):
+    clock = Clock()
+    first = bedrock_client.TokenBucket(table, 'model', rate=4, burst=10, clock=clock)
+    second = bedrock_client.TokenBucket(table, 'model', rate=4, burst=10, clock=clock)
+    first.try_acquire()
+
+    first.on_throttle()
+    second.on_throttle()  # same throttle wave, seen by another container
+
+    item = table.items[('RATELIMIT#model', 'BUCKET')]
+    assert float(item['rate']) == 2 and float(item['tokens']) == 0
+    clock.sleep(bedrock_client.DECREASE_COOLDOWN_S + 0.01)
+    second.on_throttle()
+    assert float(table.items[('RATELIMIT#model', 'BUCKET')]['rate']) == 1
+
+
+def test_successes_raise_the_shared_rate_with_the_next_token(table):
+    clock = Clock()
+    bucket = bedrock_client.TokenBucket(table, 'model', rate=2, burst=10, max_rate=2.4, clock=clock)
+    bucket.try_acquire()
+
+    bucket.on_success()
+    bucket.try_acquire()
+    assert float(table.items[('RATELIMIT#model', 'BUCKET')]['rate']) == pytest.approx(2.25)
+    bucket.on_success()
+    bucket.try_acquire()
+    assert float(table.items[('RATELIMIT#model', 'BUCKET')]['rate']) == pytest.approx(2.4)
+
+
+def test_client_retries_throttles_and_transient_errors(table):
+    clock = Clock()
+    service = Flaky(ThrottlingException('slow down'), bedrock_client.BedrockThrottled('x'))
+    client = bedrock_client.BedrockClient(service, table, sleep=clock.sleep, clock=clock)
+
+    assert client.retrieve_and_generate(input={'text': 'q'}, retrieveAndGenerateConfiguration=RAG_CONFIG)
+    assert service.calls == 3 and client.limiter.in_flight == 0
+    assert ('RATELIMIT#anthropic.claude-3-haiku-20240307-v1:0', 'BUCKET') in table.items
+
+
+def test_client_gives_up_at_the_message_deadline():
+    clock = Clock()
+    service = Flaky(*[ThrottlingException('slow down')] * 50)
+    client = bedrock_client.BedrockClient(service, sleep=clock.sleep, clock=clock)
+    bedrock_client.set_deadline(clock() + 3)
+
+    with pytest.raises(bedrock_client.BedrockThrottled) as raised:
+        client.retrieve_and_generate(input={'text': 'q'}, retrieveAndGenerateConfiguration=RAG_CONFIG)
+
+    assert processor.bedrock_client.is_throttle(raised.value)
+    assert 1 <= service.calls < bedrock_client.MAX_ATTEMPTS and clock() <= bedrock_client._deadline
+    assert client.limiter.in_flight == 0 and client.limiter.limit < bedrock_client.INITIAL_CONCURRENCY
+
+
+def test_client_does_not_retry_request_errors():
+    service = Flaky(ValidationException('bad request'))
+    client = bedrock_client.BedrockClient(service, sleep=lambda seconds: None)
+
+    with pytest.raises(ValidationException):
+        client.retrieve_and_generate(input={'text': 'q'}, retrieveAndGenerateConfiguration=RAG_CONFIG)
+    assert service.calls == 1 and client.limiter.in_flight == 0
+
+
+def test_burst_converges_on_the_quota_without_failures():
+    service = ConcurrencyQuota(quota=3)
+    client = bedrock_client.BedrockClient(service, limiter=bedrock_client.AIMDLimiter(initial=8))
+    bedrock_client.set_deadline(time.time() + 30)
+
+    def ask(i):
+        return client.retrieve_and_generate(input={'text': f'q{i}'}, retrieveAndGenerateConfiguration=RAG_CONFIG)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        answers = list(pool.map(ask, range(120)))
+
+    assert len(answers) == service.answered == 120
+    assert service.peak == 3
+    assert service.throttles < 60  # the limiter settles near the quota instead of hammering it
+
+
+@pytest.fixture
+def throttled_processor(monkeypatch):
+    sqs, sent = FakeSQS(LatencyProfile.zero()), []
+    service = FakeBedrockAgentRuntime(LatencyProfile.zero())
+    service.retrieve_and_generate = Flaky(*[ThrottlingException('slow down')] * 100).retrieve_and_generate
+    monkeypatch.setattr(processor, 'bedrock_agent', bedrock_client.BedrockClient(service, sleep=lambda seconds: None))
+    monkeypatch.setattr(processor, 'sqs', sqs)
+    monkeypatch.setattr(processor, 'QUEUE_URL', 'https://sqs/agrinexus-messages.fifo')
+    monkeypatch.setattr(processor, 'get_local_kb', lambda: None)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda phone, text, **kwargs: sent.append(text))
+    monkeypatch.setattr(processor, 'save_message', lambda *args: None)
+
+    def deliver(body):
+        processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    body = {'wamid': 'wamid.T1', 'from': '+911', 'type': 'text',
+            'message': {'text': {'body': 'कपास में एफिड का नियंत्रण कैसे करें?'}},
+            'profile': {'onboarding_complete': True, 'dialect': 'hi', 'crop': 'Cotton', 'location': 'Jalna'}}
+    return deliver, body, sqs, sent
+
+
+def test_throttled_message_is_requeued_not_failed(throttled_processor):
+    deliver, body, sqs, sent = throttled_processor
+
+    deliver(body)
+
+    requeued = sqs.receive('https://sqs/agrinexus-messages.fifo')
+    assert len(requeued) == 1 and len(sent) == 1  # the ack only
+    assert json.loads(requeued[0]['body'])['requeues'] == 1
+
+    deliver(json.loads(requeued[0]['body']))  # second pass: no second ack
+    assert len(sent) == 1
+    assert json.loads(sqs.receive('https://sqs/agrinexus-messages.fifo')[0]['body'])['requeues'] == 2
+
+
+def test_requeue_limit_hands_the_message_to_the_dlq_path(throttled_processor):
+    deliver, body, sqs, _ = throttled_processor
+
+    with pytest.raises(bedrock_client.BedrockThrottled):
+        deliver({**body, 'requeues': processor.MAX_REQUEUES})
+    assert sqs.receive('https://sqs/agrinexus-messages.fifo') == []
+
+
+def test_message_deadline_leaves_time_to_answer():
+    class Context:
+        def get_remaining_time_in_millis(self):
+            return 40_000
+
+    assert processor.message_deadline(Context()) == pytest.approx(time.time() + 40 - processor.ANSWER_RESERVE_S, abs=1)
+    assert processor.message_deadline(None) == pytest.approx(time.time() + processor.MESSAGE_DEADLINE_S, abs=1)
+
+
+def test_bedrock_client_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'bedrock_client.py') for package in ('processor', 'vision')]
+    assert filecmp.cmp(copies[0], copies[1], shallow=False)
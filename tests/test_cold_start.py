@@ -0,0 +1,64 @@
+"""
+Cold-start budgets: every Lambda handler must import quickly and without boto3
+
+Budgets are generous multiples of what the handlers take today; scale them for
+slow CI machines with COLD_START_BUDGET_SCALE.
+"""
+import filecmp
+import os
+
+import pytest
+
+import clients
+from tests.load.cold_start import LAMBDAS, profile_lambda
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_SCALE = float(os.environ.get('COLD_START_BUDGET_SCALE', '1.0'))
+
+IMPORT_BUDGETS_MS = {
+    'webhook': 120,
+    'processor': 120,
+    'voice': 150,
+    'nudge-sender': 80,
+    'nudge-reminder': 80,
+    'response-detector': 80,
+    'dlq': 80,
+    'weather': 150,
+}
+
+
+@pytest.mark.parametrize('name', sorted(LAMBDAS))
+def test_handler_import_within_budget(name):
+    profile = profile_lambda(name)
+
+    assert not profile.boto3_imported, f'{name} imports boto3 at module load'
+    budget = IMPORT_BUDGETS_MS[name] * BUDGET_SCALE
+    assert profile.import_ms <= budget, (
+        f'{name} import took {profile.import_ms:.1f} ms (budget {budget:.0f} ms); heaviest: {profile.heaviest}'
+    )
+
+
+def test_clients_are_shared_and_built_on_first_use():
+    lazy = clients.client('sts')
+
+    assert clients.client('sts') is lazy
+    assert clients.client('sts', region_name='eu-west-1') is not lazy
+    assert not lazy.built
+    assert lazy.meta.service_model.service_name == 'sts'
+    assert lazy.built
+
+
+def test_service_config_overrides_defaults():
+    bedrock = clients.config_for('bedrock-runtime')
+    dynamodb = clients.config_for('dynamodb')
+    default = clients.config_for('transcribe')
+
+    assert bedrock.read_timeout == 120 and bedrock.retries['max_attempts'] == 1  # bedrock_client.py retries
+    assert dynamodb.read_timeout == 3 and dynamodb.retries['max_attempts'] == 5
+    assert default.connect_timeout == 2 and default.max_pool_connections == clients.MAX_POOL_CONNECTIONS
+
+
+def test_client_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'clients.py')
+              for package in ('webhook', 'processor', 'voice', 'vision', 'nudge', 'dlq', 'weather', 'kb')]
+    assert all(filecmp.cmp(copies[0], other, shallow=False) for other in copies[1:])
@@ -0,0 +1,153 @@
+import filecmp
+import json
+import os
+
+import pytest
+
+import etl_table
+import extract_etl
+import ingest
+import src.processor.handler as processor
+from tests.load.fakes import FakeBedrockAgentRuntime, LatencyProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ICAR_PAGES = [
+    (5, 'Do not repeat same insecticide more than twice.\n\nEconomic Threshold Levels (ETLs)\n'
+        'The ETLs for major pests are as under.\n'
+        'Insect ETL: Pest count in a sample of 20 plants per acre\n'
+        'Jassid  25% plants showing infestation grade II/ III/ IV 2 nymphs per\nleaf\n'
+        'Whitefly  50%  out of 20 observed  plants/acre showing\nHoney dew appearance\n6 whitefly/ leaf\n'
+        'Aphids  10% plants showing symptoms cupping / crumpling\n'),
+    (6, 'ICAR-Central Institute for Cotton Research, Nagpur\nPage 6 of 8\n\n'
+        'Pink \nbollworm \nMore than 8 moths / trap per night for 3 consecutive\nnights\n\n'
+        'E. ADVISORY FOR CROP WINDOW BASED DISEASE MANAGEMENT\nThrips appear later in the season.\n'),
+    (7, 'Whitefly nymphs: Pyriproxyfen 10%EC @ 20ml/10L.\n'),
+]
+
+
+@pytest.fixture
+def table_path(tmp_path, monkeypatch):
+    thresholds = {
+        'cotton|whitefly|india': [
+            {'pest': 'whitefly', 'label': 'Whitefly', 'threshold': '6 whitefly/ leaf', 'page': 5,
+             'document': 'en/new-sources/icar.pdf', 'title': 'ICAR-CICR Advisory', 'year': 2024,
+             'url': 'https://example.org/icar.pdf'},
+        ],
+        'cotton|whitefly|punjab': [
+            {'pest': 'whitefly', 'label': 'Whitefly', 'threshold': '6 adults per leaf', 'page': 40,
+             'document': 'en/new-sources/pau.pdf', 'title': 'PAU Package of Practices', 'year': 2024,
+             'url': 'https://example.org/pau.pdf'},
+        ],
+    }
+    path = tmp_path / 'etl_thresholds.json'
+    path.write_text(json.dumps({'version': 'abc123', 'sources': {}, 'thresholds': thresholds}), encoding='utf-8')
+    monkeypatch.setattr(processor, 'ETL_TABLE_PATH', str(path))
+    monkeypatch.setattr(processor, '_etl_table', None)
+    return path
+
+
+def test_extracts_table_rows_across_a_page_break():
+    rows = extract_etl.extract_rows(ICAR_PAGES)
+
+    assert [(row['pest'], row['page']) for row in rows] == [
+        ('jassid', 5), ('whitefly', 5), ('aphid', 5), ('pink_bollworm', 6)]
+    assert rows[1]['threshold'] == '50% out of 20 observed plants/acre showing Honey dew appearance 6 whitefly/ leaf'
+    assert rows[3]['label'] == 'Pink bollworm'
+    assert rows[3]['threshold'] == 'More than 8 moths / trap per night for 3 consecutive nights'  # stops at "E. ADVISORY"
+
+
+def test_mentions_of_etl_outside_a_table_are_ignored():
+    pages = [(1, 'Economic Threshold Levels (ETLs) are used by Whitefly scouts in every district.')]
+
+    assert extract_etl.extract_rows(pages) == []
+
+
+def test_build_table_is_versioned_and_keyed_by_crop_pest_region(tmp_path):
+    (tmp_path / 'en').mkdir()
+    (tmp_path / 'en' / 'kb_manifest.csv').write_text(
+        'filename,title,source_url,year,license,region,crop,pests,etl_thresholds\n'
+        'icar.txt,ICAR-CICR Advisory,https://example.org/icar,2024,Public Domain,India,Cotton,Multiple,'
+        'Comprehensive ETLs\n'
+        'ipm.txt,IPM Guide,https://example.org/ipm,2020,Public Domain,Global,Cotton,Multiple,General IPM\n',
+        encoding='utf-8')
+    (tmp_path / 'en' / 'icar.txt').write_text(ICAR_PAGES[0][1], encoding='utf-8')
+    (tmp_path / 'en' / 'ipm.txt').write_text(ICAR_PAGES[0][1], encoding='utf-8')
+
+    table = extract_etl.build_table(ingest.discover_documents(tmp_path))
+
+    assert sorted(table['thresholds']) == ['cotton|aphid|india', 'cotton|jassid|india', 'cotton|whitefly|india']
+    assert list(table['sources']) == ['en/icar.txt']  # no ETL note in the manifest: not read
+    row = table['thresholds']['cotton|whitefly|india'][0]
+    assert (row['document'], row['year'], row['url']) == ('en/icar.txt', 2024, 'https://example.org/icar')
+    assert table['version'] == extract_etl.build_table(ingest.discover_documents(tmp_path))['version']
+
+
+@pytest.mark.parametrize('question, pest', [
+    ('How many whiteflies per leaf before I spray?', 'whitefly'),
+    ('सफेद मक्खी कितनी होने पर छिड़काव करें?', 'whitefly'),
+    ('गुलाबी बोंडअळी किती असल्यावर फवारणी करावी?', 'pink_bollworm'),
+    ('పచ్చ దోమ ETL ఎంత?', 'jassid'),
+])
+def test_threshold_questions_in_every_language(question, pest):
+    assert etl_table.is_threshold_question(question) and etl_table.find_pest(question) == pest
+
+
+@pytest.mark.parametrize('question', [
+    'How do I control whitefly organically?',
+    'कपास में कितना यूरिया डालें?',
+    'Which pesticide should I use and when?',
+    'When should I spray for whitefly?',
+    'Which spray for whitefly? And how many days before picking can I spray?',
+    'सफेद मक्खी के लिए कौन सी दवा कब छिड़कें?',
+    'गुलाबी बोंडअळीसाठी फवारणी कधी करावी?',
+])
+def test_open_ended_questions_are_not_threshold_questions(question):
+    assert not etl_table.is_threshold_question(question)
+
+
+def test_threshold_question_answered_from_table_with_citation(table_path):
+    result = processor.answer_from_etl_table('सफेद मक्खी कितनी होने पर छिड़काव करें?', 'hi',
+                                             {'crop': 'Cotton', 'location': 'Jalna'})
+
+    assert result['text'].startswith('कपास में सफेद मक्खी')
+    assert '6 whitefly/ leaf' in result['text'] and 'ICAR-CICR Advisory (2024), p. 5' in result['text']
+    reference = result['citations'][0]['retrievedReferences'][0]
+    assert reference['location']['webLocation']['url'] == 'https://example.org/icar.pdf'
+    assert reference['metadata']['etl_table_version'] == 'abc123'
+
+
+def test_lookup_prefers_the_farmers_region():
+    table = etl_table.ETLTable.load(os.path.join(ROOT, 'src', 'processor', 'etl_thresholds.json'))
+    rows = table.lookup('Cotton', 'whitefly', ['Punjab', 'India', 'Global'])
+
+    assert rows and all(row['pest'] == 'whitefly' for row in rows)
+    assert table.lookup('Wheat', 'whitefly', ['India', 'Global']) == []
+
+
+def test_unanswerable_questions_fall_through_to_rag(table_path):
+    assert processor.answer_from_etl_table('How do I control whitefly organically?', 'en', {'crop': 'Cotton'}) is None
+    assert processor.answer_from_etl_table('Whitefly ETL?', 'en', {'crop': 'Wheat'}) is None
+    assert processor.answer_from_etl_table('Whitefly ETL?', 'en', None) is None
+
+
+def test_processor_skips_bedrock_for_threshold_questions(table_path, monkeypatch):
+    agent = FakeBedrockAgentRuntime(LatencyProfile.zero())
+    sent = []
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda phone, text, **kwargs: sent.append(text))
+    monkeypatch.setattr(processor, 'save_message', lambda *args: None)
+    profile = {'onboarding_complete': True, 'dialect': 'en', 'crop': 'Cotton', 'location': 'Nagpur'}
+
+    for text in ('How many whiteflies per leaf before I spray?', 'When should I spray for whitefly?'):
+        body = {'wamid': 'wamid.E1', 'from': '+911', 'type': 'text', 'message': {'text': {'body': text}},
+                'profile': profile}
+        processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    assert agent.calls['retrieve_and_generate'] == 1  # the bare 'when to spray' question reached RAG
+    assert '6 whitefly/ leaf' in sent[0] and sent[1].startswith('✓')
+
+
+def test_etl_table_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'etl_table.py') for package in ('processor', 'kb')]
+    assert filecmp.cmp(copies[0], copies[1], shallow=False)
@@ -7,17 +7,17 @@ Philosophy: Validate that responses are grounded in KB sources, not that they ma
 Accept ANY valid method from authoritative sources (ICAR-CICR, PAU, Rajendran, NIPHM).
 """
 
-import boto3
 import json
 import pytest
 from typing import Dict, List
 from tests.fixtures.valid_pesticides import ALL_VALID_METHODS, BANNED_PESTICIDES
+from tests.golden.replay import golden_client, knowledge_base_id
 
-# Initialize Bedrock client
-bedrock_agent = boto3.client('bedrock-agent-runtime')
+# Initialize Bedrock client (GOLDEN_MODE=live|record|replay, see tests/golden/replay.py)
+bedrock_agent = golden_client()
 
-# Get KB ID from environment or CloudFormation
-KNOWLEDGE_BASE_ID = "H81XLD3YWY"
+# Get KB ID from environment (GOLDEN_KB_ID)
+KNOWLEDGE_BASE_ID = knowledge_base_id()
 
 # 20 Golden Questions across 3 dialects
 GOLDEN_QUESTIONS = [
@@ -173,10 +173,10 @@ GOLDEN_QUESTIONS = [
 ]
 
 
-def query_knowledge_base(question: str, kb_id: str) -> Dict:
+def query_knowledge_base(question: str, kb_id: str, client=None) -> Dict:
     """Query Bedrock Knowledge Base with RetrieveAndGenerate"""
     try:
-        response = bedrock_agent.retrieve_and_generate(
+        response = (client or bedrock_agent).retrieve_and_generate(
             input={'text': question},
             retrieveAndGenerateConfiguration={
                 'type': 'KNOWLEDGE_BASE',
@@ -3,16 +3,17 @@ Realistic Golden Questions Test Suite for RAG Quality Assurance
 Updated based on actual document content (Rajendran 2018, NIPHM, IPM papers)
 """
 
-import boto3
 import json
 import pytest
 from typing import Dict, List
 
-# Initialize Bedrock client
-bedrock_agent = boto3.client('bedrock-agent-runtime')
+from tests.golden.replay import golden_client, knowledge_base_id
 
-# Get KB ID from environment or CloudFormation
-KNOWLEDGE_BASE_ID = "H81XLD3YWY"
+# Initialize Bedrock client (GOLDEN_MODE=live|record|replay, see tests/golden/replay.py)
+bedrock_agent = golden_client()
+
+# Get KB ID from environment (GOLDEN_KB_ID)
+KNOWLEDGE_BASE_ID = knowledge_base_id()
 
 # Realistic Golden Questions based on actual document content
 GOLDEN_QUESTIONS = [
@@ -96,10 +97,10 @@ GOLDEN_QUESTIONS = [
 ]
 
 
-def query_knowledge_base(question: str, kb_id: str) -> Dict:
+def query_knowledge_base(question: str, kb_id: str, client=None) -> Dict:
     """Query Bedrock Knowledge Base with RetrieveAndGenerate"""
     try:
-        response = bedrock_agent.retrieve_and_generate(
+        response = (client or bedrock_agent).retrieve_and_generate(
             input={'text': question},
             retrieveAndGenerateConfiguration={
                 'type': 'KNOWLEDGE_BASE',
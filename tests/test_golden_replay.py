@@ -0,0 +1,141 @@
+"""
+Offline checks for the golden-question record/replay machinery (tests/golden/replay.py)
+
+The answers below are synthetic stand-ins shaped like Bedrock responses; real
+recordings live in tests/fixtures/golden_responses.json once recorded.
+"""
+import threading
+import time
+
+import pytest
+
+from tests.golden.evaluate import InstrumentedAgent, evaluate, latest_report, write_report
+from tests.golden.replay import (
+    FIXTURE_PATH, GoldenFixtures, RecordingBedrockAgent, ReplayBedrockAgent, golden_cases, run_golden_suite
+)
+
+CITATION = {'retrievedReferences': [{
+    'content': {'text': 'Apply neem seed kernel extract 5% at ETL.'},
+    'location': {'s3Location': {'uri': 's3://agrinexus-kb/en/ipm-guide.pdf'}}
+}]}
+
+
+class SyntheticBedrockAgent:
+    """Answers like the knowledge base would, per question category"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        question = input['text'].lower()
+        if any(name in question for name in ('paraquat', 'monocrotophos', 'endosulfan', 'phorate')):
+            text = 'Nahi, yeh pesticide banned aur toxic hai. Iske badle IPM aur neem apnayein.'
+        elif 'bukhar' in question:
+            text = 'Kripya doctor ya health centre se sampark karein; hum sirf kheti ki jaankari dete hain.'
+        else:
+            text = ('Aphid, jassid, whitefly aur bollworm ke liye IPM apnayein: neem oil, predator (coccinella), '
+                    'ETL par imidacloprid spray, flowering par pheromone trap.')
+        return {'output': {'text': text}, 'citations': [CITATION], 'sessionId': 'synthetic'}
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, **kwargs):
+        time.sleep(self.latency_ms / 2000)
+        return {'retrievalResults': CITATION['retrievedReferences'] * 3}
+
+
+class ThrottlingException(Exception):
+    response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class ThrottledOnce(SyntheticBedrockAgent):
+    """Throttles the first RetrieveAndGenerate of every question"""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def retrieve_and_generate(self, input, **kwargs):
+        with self.lock:
+            first = input['text'] not in self.seen
+            self.seen.add(input['text'])
+        if first:
+            raise ThrottlingException('Rate exceeded')
+        return super().retrieve_and_generate(input, **kwargs)
+
+
+def test_record_then_replay_round_trip(tmp_path):
+    path = tmp_path / 'golden.json'
+    recorder = RecordingBedrockAgent(SyntheticBedrockAgent(latency_ms=5), GoldenFixtures(path))
+    config = {'type': 'KNOWLEDGE_BASE', 'knowledgeBaseConfiguration': {'knowledgeBaseId': 'KB1'}}
+
+    live = recorder.retrieve_and_generate(input={'text': 'Neem oil kasa vaparaycha?'},
+                                          retrieveAndGenerateConfiguration=config)
+    replayed = ReplayBedrockAgent(GoldenFixtures.load(path)).retrieve_and_generate(
+        input={'text': 'Neem oil kasa vaparaycha?'})
+
+    entry = GoldenFixtures.load(path).get('Neem oil kasa vaparaycha?')
+    assert replayed['output'] == live['output']
+    assert replayed['citations'] == live['citations']
+    assert entry['latency_ms'] >= 5 and len(entry['config']) == 12
+
+
+def test_unrecorded_question_fails_that_case_only(tmp_path):
+    report = run_golden_suite(ReplayBedrockAgent(GoldenFixtures(tmp_path / 'empty.json')), workers=4)
+
+    assert report.passed == 0 and report.failed == len(golden_cases())
+    assert 'No recorded response' in report.results[0].error
+
+
+def test_parallel_replay_validates_both_suites(tmp_path):
+    fixtures = GoldenFixtures(tmp_path / 'golden.json')
+    live = SyntheticBedrockAgent(latency_ms=20)
+    run_golden_suite(RecordingBedrockAgent(live, fixtures), workers=8)
+
+    report = run_golden_suite(ReplayBedrockAgent(GoldenFixtures.load(fixtures.path)), workers=8)
+
+    assert report.mode == 'replay'
+    assert {result.suite for result in report.results} == {'golden', 'realistic'}
+    assert report.failed == 0, report.summary()
+    assert live.calls == len(golden_cases())  # replay never touched the live client
+    assert report.wall_s < 2.0
+
+
+@pytest.mark.skipif(not FIXTURE_PATH.exists(), reason='record with: python -m tests.golden.replay --record')
+def test_recorded_golden_responses_pass_validation():
+    report = run_golden_suite(ReplayBedrockAgent(GoldenFixtures.load()), workers=8)
+
+    assert report.failed == 0, report.summary()
+
+
+def test_evaluation_times_stages_and_retries_throttling():
+    sleeps = []
+    agent = InstrumentedAgent(ThrottledOnce(), sleep=sleeps.append)
+
+    run = evaluate(agent, workers=4)
+
+    cases = len(golden_cases())
+    questions = len({case['data']['question'] for case in golden_cases()})  # the suites share some questions
+    assert run.failed == 0, run.summary()
+    assert run.retries == questions and len(sleeps) == questions
+    first = run.questions[0]
+    assert first.retrieve_ms is not None and first.generate_ms is not None
+    assert (first.citations, first.references, first.retrieved) == (1, 1, 3)
+    assert first.input_tokens_est > first.output_tokens_est > 0
+    assert run.latency_ms['retrieve']['count'] == cases
+
+
+def test_evaluation_reports_diff_against_previous_run(tmp_path):
+    first = evaluate(SyntheticBedrockAgent(), workers=4)
+    write_report(first, tmp_path)
+
+    second = evaluate(ReplayBedrockAgent(GoldenFixtures(tmp_path / 'empty.json')), workers=4,
+                      previous=latest_report(tmp_path))
+    path = write_report(second, tmp_path)
+
+    assert second.diff['previous'] == first.run_id
+    assert second.diff['passed_delta'] == -len(golden_cases())
+    assert {change['status'] for change in second.diff['status_changes']} == {'regressed'}
+    assert 'regressed' in path.with_suffix('.html').read_text(encoding='utf-8')
@@ -0,0 +1,229 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+import intents
+import src.processor.handler as processor
+from tests.load.fakes import FakeBedrockAgentRuntime, FakeDynamoResource, LatencyProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXAMPLES = [
+    ('How do I control aphids in cotton?', intents.AGRONOMY),
+    ('कपास में यूरिया कब डालें?', intents.AGRONOMY),
+    ('whitefly spray dose for cotton', intents.AGRONOMY),
+    ('Who won the cricket match?', intents.OFF_TOPIC),
+    ('आज का क्रिकेट स्कोर क्या है?', intents.OFF_TOPIC),
+    ('tell me a cricket joke', intents.OFF_TOPIC),
+]
+
+
+def _script():
+    spec = importlib.util.spec_from_file_location('train_intent_model',
+                                                  os.path.join(ROOT, 'scripts', 'train-intent-model.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('text, label', [
+    ('🙏', intents.THANKS),
+    ('👋', intents.GREETING),
+    ('नमस्ते जी', intents.GREETING),
+    ('good morning sir', intents.GREETING),
+    ('ok thank you ji', intents.THANKS),
+    ('ధన్యవాదాలు', intents.THANKS),
+    ('help', intents.HELP),
+    ('मदत', intents.HELP),
+    ('हो गया', intents.NUDGE_REPLY),
+    ('not yet, tomorrow', intents.NUDGE_REPLY),
+])
+def test_rules(text, label):
+    assert intents.classify(text).label == label
+
+
+def test_onboarding_correction_names_the_field():
+    assert intents.classify('मेरी फसल बदलनी है') == (intents.ONBOARDING_CORRECTION, 1.0, 'rule', 'crop')
+    assert intents.classify('change my district').field == 'location'
+    assert intents.classify('मेरी भाषा बदलो').field == 'dialect'
+    assert intents.classify('నా పంట మార్చండి').field == 'crop'
+
+
+@pytest.mark.parametrize('text', [
+    'मौसम बदल रहा है, फसल में क्या करें?',
+    'I sprayed the wrong pesticide on my crop, what should I do?',
+    'फसल में गलत दवाई डाल दी, क्या करूं?',
+    'how to change crop rotation in cotton',
+    'my crop leaves changed colour after the wrong spray yesterday',
+])
+def test_agronomy_questions_mentioning_a_field_are_not_corrections(text):
+    assert intents.rule_intent(text) is None
+    assert intents.classify(text, processor.get_intent_model()).label != intents.ONBOARDING_CORRECTION
+
+
+def test_questions_containing_reply_or_greeting_words_are_not_routed_by_rules():
+    assert intents.rule_intent('बारिश के बाद में छिड़काव करें?') is None
+    assert intents.rule_intent('hello, which fertilizer for wheat?') is None
+    assert intents.classify('Should I spray now or later when the rain stops?').label == intents.AGRONOMY
+
+
+def test_trained_model_round_trips_and_defaults_to_agronomy():
+    model = intents.train(EXAMPLES)
+    loaded = intents.IntentModel.from_dict(json.loads(json.dumps(model.to_dict())))
+
+    assert loaded.version == model.version and loaded.labels == [intents.AGRONOMY, intents.OFF_TOPIC]
+    assert loaded.predict('cricket match score?')[0] == intents.OFF_TOPIC
+    assert intents.classify('aphids on my cotton', loaded).label == intents.AGRONOMY
+    assert intents.classify('cricket match score?', None) == (intents.AGRONOMY, 0.0, 'default', None)
+
+
+def test_low_confidence_prediction_goes_to_rag(monkeypatch):
+    model = intents.train(EXAMPLES)
+    monkeypatch.setattr(model, 'predict', lambda text: (intents.OFF_TOPIC, 0.55))
+
+    assert intents.classify('something unclear', model).label == intents.AGRONOMY
+
+
+def test_packaged_model_routes_off_topic_and_keeps_farming_questions():
+    model = intents.IntentModel.load(os.path.join(ROOT, 'src', 'processor', 'intent_model.json'))
+
+    assert intents.classify('Mujhe bukhar hai, kya medicine loon?', model).label == intents.OFF_TOPIC
+    for question in ('Cotton mein aphids ka control kaise karein?', 'Aphid control kashe karayche?',
+                     'Cotton lo aphids ni ela control cheyali?', 'Pink bollworm ETL for cotton?'):
+        assert intents.classify(question, model).label == intents.AGRONOMY
+
+
+@pytest.mark.parametrize('question', [
+    'gehu me rust aa gaya',
+    'potato me late blight',
+    'tomato me blight',
+    'mango me fruit fly',
+    'mandi bhav kya hai',
+])
+def test_packaged_model_keeps_code_mixed_crop_questions(question):
+    model = intents.IntentModel.load(os.path.join(ROOT, 'src', 'processor', 'intent_model.json'))
+
+    assert intents.classify(question, model).label == intents.AGRONOMY
+
+
+def test_model_alone_never_routes_greetings_or_farming_texts_off_topic(monkeypatch):
+    model = intents.train(EXAMPLES)
+    monkeypatch.setattr(model, 'predict', lambda text: (intents.GREETING, 0.99))
+    assert intents.classify('mandi bhav kya hai', model).label == intents.AGRONOMY
+
+    monkeypatch.setattr(model, 'predict', lambda text: (intents.OFF_TOPIC, 0.99))
+    assert intents.classify('aloo me jhulsa rog', model).label == intents.AGRONOMY
+    assert intents.classify('गेहूं में गेरुआ', model).label == intents.AGRONOMY
+    assert intents.classify('cricket match score?', model).label == intents.OFF_TOPIC
+
+    monkeypatch.setattr(model, 'predict', lambda text: (intents.OFF_TOPIC, 0.8))
+    assert intents.classify('cricket match score?', model).label == intents.AGRONOMY
+
+
+def test_log_items_get_weak_labels():
+    script = _script()
+    refusal = 'I can only help with farming questions. Please ask about crops, pests, fertilizers, or farm management.'
+
+    assert script.label_from_log({'message': {'text': {'body': 'IPL score?'}}, 'response': refusal}) == \
+        ('IPL score?', intents.OFF_TOPIC)
+    assert script.label_from_log({'message': {'text': {'body': 'aphids?'}}, 'response': 'Spray neem oil'}) == \
+        ('aphids?', intents.AGRONOMY)
+    assert script.label_from_log({'message': {'text': {'body': 'नमस्ते'}}, 'response': 'x'})[1] == intents.GREETING
+    assert script.label_from_log({'message': {'text': {'body': 'hi'}}, 'source_citation': 'intent:greeting'}) is None
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    agent = FakeBedrockAgentRuntime(LatencyProfile.zero())
+    sent, updates = [], []
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda phone, text, **kwargs: sent.append(text))
+    monkeypatch.setattr(processor, 'send_whatsapp_buttons', lambda phone, text, buttons: sent.append(buttons))
+    monkeypatch.setattr(processor, 'save_message', lambda *args: None)
+    monkeypatch.setattr(processor, 'update_user_profile', lambda phone, fields: updates.append(fields))
+
+    def deliver(text):
+        body = {'wamid': 'wamid.I1', 'from': '+911', 'type': 'text', 'message': {'text': {'body': text}},
+                'profile': {'onboarding_complete': True, 'dialect': 'hi', 'crop': 'Cotton', 'location': 'Jalna'}}
+        processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    return deliver, agent, sent, updates
+
+
+def test_greeting_and_off_topic_get_templates_without_bedrock(routed):
+    deliver, agent, sent, _ = routed
+
+    deliver('नमस्ते')
+    deliver('Mujhe bukhar hai, kya medicine loon?')
+
+    assert agent.calls['retrieve_and_generate'] == 0
+    assert sent == [processor.INTENT_REPLIES[intents.GREETING]['hi'], processor.INTENT_REPLIES[intents.OFF_TOPIC]['hi']]
+
+
+def test_crop_correction_asks_before_touching_the_profile(routed):
+    deliver, agent, sent, updates = routed
+
+    deliver('मेरी फसल बदलनी है')
+
+    assert updates == [{'pending_correction': 'crop'}]
+    assert sent == [processor.CORRECTION_BUTTONS['hi']] and agent.calls['retrieve_and_generate'] == 0
+
+
+@pytest.fixture
+def corrected(monkeypatch):
+    table = FakeDynamoResource(LatencyProfile.zero()).Table(processor.TABLE_NAME)
+    table.items[('USER#+911', 'PROFILE')] = {
+        'PK': 'USER#+911', 'SK': 'PROFILE', 'phone_number': '+911', 'dialect': 'hi', 'crop': 'Cotton',
+        'location': 'Jalna', 'consent': True, 'onboarding_complete': True,
+        'GSI5PK': 'TARGET#Jalna', 'GSI5SK': 'CROP#Cotton#+911'
+    }
+    sent = []
+    monkeypatch.setattr(processor, 'table', table)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda phone, text, **kwargs: sent.append(text))
+    monkeypatch.setattr(processor, 'send_whatsapp_buttons', lambda phone, text, buttons: sent.append(text))
+
+    def deliver(message_type, content):
+        message = {'type': message_type}
+        if message_type == 'text':
+            message['text'] = {'body': content}
+        else:
+            message['interactive'] = {'type': 'button_reply', 'button_reply': {'id': 'btn_0', 'title': content}}
+        body = {'wamid': f'wamid.{len(sent)}', 'from': '+911', 'type': message_type, 'message': message,
+                'profile': {'onboarding_complete': True, 'dialect': 'hi', 'crop': 'Cotton', 'location': 'Jalna'}}
+        processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    return deliver, table, sent
+
+
+def test_confirmed_correction_reopens_onboarding_at_the_crop_step(corrected):
+    deliver, table, sent = corrected
+
+    deliver('text', 'मेरी फसल बदलनी है')
+    deliver('interactive', processor.CORRECTION_BUTTONS['hi'][0])
+
+    profile = table.items[('USER#+911', 'PROFILE')]
+    assert profile['onboarding_state'] == 'crop' and profile['onboarding_complete'] is False
+    assert 'pending_correction' not in profile and 'GSI5PK' not in profile
+    assert processor.ONBOARDING_MESSAGES['ask_crop']['hi'] in sent[-1]
+
+
+def test_declined_correction_keeps_the_profile(corrected):
+    deliver, table, sent = corrected
+
+    deliver('text', 'मेरी फसल बदलनी है')
+    deliver('interactive', processor.CORRECTION_BUTTONS['hi'][1])
+
+    profile = table.items[('USER#+911', 'PROFILE')]
+    assert profile['onboarding_complete'] is True and profile['GSI5PK'] == 'TARGET#Jalna'
+    assert 'pending_correction' not in profile
+    assert sent[-1] == processor.CORRECTION_KEPT['hi']
+
+
+def test_agronomy_question_reaches_rag(routed):
+    deliver, agent, sent, _ = routed
+
+    deliver('कपास में एफिड का नियंत्रण कैसे करें?')
+
+    assert agent.calls['retrieve_and_generate'] == 1 and sent[0].startswith('✓')
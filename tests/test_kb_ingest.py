@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+import ingest
+from tests.load.fakes import FakeS3, LatencyProfile
+
+BUCKET = 'agrinexus-kb-test'
+MANIFEST = (
+    'filename,title,source_url,year,license,region,crop,pests,etl_thresholds\n'
+    'aphid-advisory.txt,Aphid Advisory,https://example.org/aphid,2024,Public Domain,Punjab,Cotton,Aphids;Jassids,'
+    'ETL tables included\n'
+    '#,,,,,,,,\n'
+    '# TODO - Manual Download Required:,,,,,,,,\n'
+)
+
+
+class FakeBedrockAgent:
+    def __init__(self):
+        self.jobs = []
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId, **kwargs):
+        self.jobs.append((knowledgeBaseId, dataSourceId))
+        return {'ingestionJob': {'ingestionJobId': f'JOB{len(self.jobs)}'}}
+
+
+def _advisory(pest: str, paragraphs: int = 12) -> str:
+    return '\n\n'.join(f'{pest} paragraph {n}: spray neem oil 5 ml per litre when counts cross the ETL of '
+                       f'{n} {pest.lower()} per leaf; scout fields twice a week and keep records.'
+                       for n in range(paragraphs))
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    root = tmp_path / 'docs'
+    (root / 'en' / 'new-sources').mkdir(parents=True)
+    (root / 'en' / 'new-sources' / 'kb_manifest.csv').write_text(MANIFEST, encoding='utf-8')
+    (root / 'en' / 'new-sources' / 'aphid-advisory.txt').write_text(_advisory('Aphid'), encoding='utf-8')
+    (root / 'en' / 'whitefly-guide.md').write_text(_advisory('Whitefly'), encoding='utf-8')
+    s3, agent = FakeS3(LatencyProfile.zero()), FakeBedrockAgent()
+    monkeypatch.setattr(ingest, 's3', s3)
+    monkeypatch.setattr(ingest, 'bedrock_agent', agent)
+    monkeypatch.setattr(ingest, 'CHUNK_CHARS', 600)
+    monkeypatch.setattr(ingest, 'CHUNK_OVERLAP_CHARS', 80)
+    return root, s3, agent
+
+
+def _sync(root):
+    return ingest.sync(BUCKET, root, 'KB1', 'DS1')
+
+
+def _chunk_keys(s3):
+    return {key for _, key in s3.objects if key.startswith(ingest.CHUNK_PREFIX) and key.endswith('.txt')}
+
+
+def test_manifest_skips_comment_rows_and_splits_pests(kb):
+    root, _, _ = kb
+    manifest = ingest.load_manifest(root / 'en' / 'new-sources' / 'kb_manifest.csv')
+
+    assert list(manifest) == ['aphid-advisory.txt']
+    assert manifest['aphid-advisory.txt']['pests'] == ['Aphids', 'Jassids']
+    assert manifest['aphid-advisory.txt']['year'] == 2024
+
+
+def test_chunks_respect_size_overlap_and_pages():
+    pages = [(1, _advisory('Aphid', 4)), (2, _advisory('Jassid', 4))]
+    chunks = list(ingest.chunk_pages(pages, chunk_chars=400, overlap_chars=60))
+
+    assert all(len(chunk.text) <= 400 for chunk in chunks)
+    assert chunks[0].page_start == 1 and chunks[-1].page_end == 2
+    assert chunks[1].text.split()[0] in chunks[0].text[-60:]  # starts with the previous chunk's tail
+
+
+def test_first_sync_uploads_chunks_with_metadata_sidecars(kb):
+    root, s3, agent = kb
+    result = _sync(root)
+
+    keys = _chunk_keys(s3)
+    assert result.changed == ['en/new-sources/aphid-advisory.txt', 'en/whitefly-guide.md']
+    assert result.uploaded == len(keys) > 2 and agent.jobs == [('KB1', 'DS1')]
+
+    aphid_key = next(key for key in keys if '/aphid-advisory/' in key)
+    metadata = json.loads(s3.objects[(BUCKET, aphid_key + '.metadata.json')])['metadataAttributes']
+    assert metadata['crop'] == 'Cotton' and metadata['region'] == 'Punjab' and metadata['year'] == 2024
+    assert metadata['pests'] == ['Aphids', 'Jassids'] and metadata['has_etl'] is True
+    assert metadata['language'] == 'en' and metadata['page_start'] == 1
+
+    # Not in any manifest: tagged crop/region-general so filtered retrieval still sees it
+    whitefly_key = next(key for key in keys if '/whitefly-guide/' in key)
+    metadata = json.loads(s3.objects[(BUCKET, whitefly_key + '.metadata.json')])['metadataAttributes']
+    assert (metadata['crop'], metadata['region']) == ('Multiple Crops', 'Global')
+
+
+def test_resync_without_changes_touches_nothing(kb):
+    root, s3, agent = kb
+    _sync(root)
+    s3.calls.clear()
+
+    result = _sync(root)
+
+    assert result.changed == [] and len(result.skipped) == 2
+    assert set(s3.calls) == {'get_object'} and len(agent.jobs) == 1
+
+
+def test_adding_one_advisory_only_uploads_its_chunks(kb):
+    root, s3, agent = kb
+    _sync(root)
+    before = _chunk_keys(s3)
+
+    (root / 'en' / 'bollworm-alert.txt').write_text(_advisory('Bollworm', 3), encoding='utf-8')
+    result = _sync(root)
+
+    added = _chunk_keys(s3) - before
+    assert result.changed == ['en/bollworm-alert.txt'] and result.deleted == 0
+    assert result.uploaded == len(added) and all('/bollworm-alert/' in key for key in added)
+    assert len(agent.jobs) == 2
+
+
+def test_editing_a_document_replaces_only_changed_chunks(kb):
+    root, s3, _ = kb
+    _sync(root)
+    path = root / 'en' / 'whitefly-guide.md'
+    path.write_text(path.read_text(encoding='utf-8') + '\n\nNew: yellow sticky traps at 10 per acre.',
+                    encoding='utf-8')
+
+    result = _sync(root)
+
+    assert result.changed == ['en/whitefly-guide.md']
+    assert result.uploaded == result.deleted == 1 and result.unchanged_chunks > 0
+
+
+def test_removed_document_chunks_are_deleted(kb):
+    root, s3, _ = kb
+    _sync(root)
+    (root / 'en' / 'whitefly-guide.md').unlink()
+
+    result = _sync(root)
+
+    assert result.removed == ['en/whitefly-guide.md']
+    assert not any('/whitefly-guide/' in key for _, key in s3.objects)
@@ -0,0 +1,52 @@
+import filecmp
+import os
+
+import pytest
+
+import keywords
+from keywords import DONE, NOT_YET, match_keyword
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('text, intent, dialect', [
+    ('हो गया', DONE, 'hi'),
+    ('हो गया है भाई', DONE, 'hi'),
+    ('फवारणी केला', DONE, 'mr'),
+    ('స్ప్రే చేశాను', DONE, 'te'),
+    ('Done ✅', DONE, None),
+    ('अभी नहीं', NOT_YET, 'hi'),
+    ('नाही झाला', NOT_YET, 'mr'),         # contains DONE keyword 'झाला'
+    ('अभी नहीं, कल हो गया', NOT_YET, 'hi'),  # NOT YET wins wherever it appears
+    ('ఇంకా లేదు.', NOT_YET, 'te'),
+    ('will do it later', NOT_YET, None),
+])
+def test_match_keyword_intent_and_dialect(text, intent, dialect):
+    match = match_keyword(text)
+
+    assert match is not None
+    assert (match.intent, match.dialect) == (intent, dialect)
+
+
+@pytest.mark.parametrize('text', [
+    'कपास में एफिड कैसे नियंत्रित करें?',
+    'पाऊस पडल्यानंतर फवारणी कधी करावी?',  # 'नंतर' inside a word
+    'अकेला',                                # 'केला' inside a word
+    'abandoned field',                      # 'done' inside a word
+    '',
+    None,
+])
+def test_match_keyword_respects_word_boundaries(text):
+    assert match_keyword(text) is None
+
+
+def test_normalization_variants():
+    assert match_keyword('नहीँ किया').keyword == 'नहीं किया'     # chandrabindu
+    assert match_keyword('हो  गया').keyword == 'हो गया'            # extra whitespace
+    assert match_keyword('DONE').intent == DONE                     # case
+    assert keywords.normalize('ज़रूर') == keywords.normalize('जरूर')  # nukta (precomposed)
+
+
+def test_keyword_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'keywords.py') for package in ('webhook', 'nudge', 'processor')]
+    assert all(filecmp.cmp(copies[0], other, shallow=False) for other in copies[1:])
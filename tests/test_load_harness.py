@@ -0,0 +1,53 @@
+"""
+Smoke test for the offline load-test harness (tests/load/)
+Runs a small zero-latency replay so regressions in any Lambda path show up as errors.
+"""
+from tests.load.fakes import LatencyProfile
+from tests.load.harness import LoadHarness, build_traffic, run_load_test, webhook_event
+from tests.load.webhook_latency import run_webhook_latency
+
+
+def test_load_harness_replays_all_kinds_and_dialects():
+    report = run_load_test(messages=60, concurrency=4, latency_scale=0.0, seed=3)
+
+    assert report.errors == []
+    assert report.unanswered == 0
+    assert set(report.by_kind) == {'text', 'image', 'audio', 'button', 'reply'}
+    assert report.throughput_msgs_per_s > 0
+    assert report.reply_latency_ms['p95'] >= report.reply_latency_ms['p50']
+    assert {'webhook_receive', 'bedrock_retrieve_generate', 'transcribe', 'vision_analyze'} <= set(report.stages_ms)
+    assert report.nudge_cycle['nudges_sent'] > 0
+    # Only text messages pass the detector's stream filter
+    assert 0 < report.stream['delivered'] < report.stream['records']
+
+
+def test_load_harness_done_reply_completes_nudge():
+    traffic = [item for item in build_traffic(40, seed=5) if item.kind == 'reply'][:1]
+    traffic[0].message['text']['body'] = 'हो गया'
+
+    with LoadHarness(LatencyProfile.zero()) as harness:
+        harness.run(traffic, concurrency=1)
+        nudges = [item for (pk, sk), item in harness.table.items.items()
+                  if pk == f'USER#{traffic[0].phone}' and sk.startswith('NUDGE#')]
+
+    assert [nudge['status'] for nudge in nudges] == ['DONE']
+
+
+def test_load_harness_duplicate_delivery_is_deduplicated():
+    traffic = [item for item in build_traffic(20, seed=9) if item.kind == 'text'][:1]
+
+    with LoadHarness(LatencyProfile.zero()) as harness:
+        harness.run(traffic, concurrency=1, nudges=False)
+        replies = len(harness.graph.sent)
+        harness.modules.webhook.lambda_handler(webhook_event(traffic[0]), None)
+        harness.pump()
+
+        assert len(harness.graph.sent) == replies
+
+
+def test_webhook_ack_latency_within_budget():
+    report = run_webhook_latency(cold_runs=2, warm_runs=20, latency_scale=0.0)
+
+    assert report.cold_ms['count'] == 2 and report.warm_ms['count'] == 20
+    assert report.cold_import_ms['p50'] < report.cold_ms['p50']
+    assert report.within_budget
@@ -0,0 +1,113 @@
+import filecmp
+import os
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import local_kb  # noqa: E402
+import src.processor.handler as processor  # noqa: E402
+from tests.load.fakes import FakeBedrockAgentRuntime, LatencyProfile  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHUNKS = [
+    ('Aphids on cotton: ETL is 10% affected plants. Spray neem oil 5 ml per litre or imidacloprid.',
+     's3://kb/chunks/en/icar/aphid.txt', {'crop': 'Cotton', 'region': 'India', 'pests': ['Aphids']}),
+    ('Pink bollworm: install pheromone traps at 5 per hectare; ETL is 8 moths per trap for three nights.',
+     's3://kb/chunks/en/icar/bollworm.txt', {'crop': 'Cotton', 'region': 'India', 'pests': ['Bollworms']}),
+    ('Wheat nitrogen: apply urea in two splits, half at sowing and half at first irrigation.',
+     's3://kb/chunks/en/pau/wheat.txt', {'crop': 'Wheat', 'region': 'Punjab', 'pests': []}),
+    ('कपास में सफेद मक्खी: पीले चिपचिपे ट्रैप लगाएं और नीम तेल का छिड़काव करें।',
+     's3://kb/chunks/hi/niphm/whitefly.txt', {'crop': 'Cotton', 'region': 'India', 'pests': ['Whitefly']}),
+]
+
+
+class ThrottlingException(Exception):
+    response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class ThrottledAgent(FakeBedrockAgentRuntime):
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration, **kwargs):
+        raise ThrottlingException('Rate exceeded')
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    local_kb.build_index(CHUNKS, str(tmp_path))
+    return str(tmp_path)
+
+
+def _uris(response):
+    return [result['location']['s3Location']['uri'] for result in response['retrievalResults']]
+
+
+def test_retrieve_matches_bedrock_shape_and_ranks_lexical_match_first(index_dir):
+    kb = local_kb.LocalKnowledgeBase(index_dir)
+
+    response = kb.retrieve(retrievalQuery={'text': 'pheromone traps for bollworm'},
+                           retrievalConfiguration={'vectorSearchConfiguration': {'numberOfResults': 2}})
+
+    results = response['retrievalResults']
+    assert len(results) == 2 and _uris(response)[0].endswith('bollworm.txt')
+    assert results[0]['content']['text'] == CHUNKS[1][0]
+    assert results[0]['metadata']['pests'] == ['Bollworms'] and results[0]['score'] > 0
+
+
+def test_devanagari_query_and_dense_only_search(index_dir):
+    kb = local_kb.LocalKnowledgeBase(index_dir)
+
+    hybrid = kb.retrieve(retrievalQuery={'text': 'सफेद मक्खी का इलाज'})
+    dense = kb.retrieve(retrievalQuery={'text': 'सफेद मक्खी'},
+                        retrievalConfiguration={'vectorSearchConfiguration': {'overrideSearchType': 'SEMANTIC'}})
+
+    assert _uris(hybrid)[0].endswith('whitefly.txt')
+    assert _uris(dense)[0].endswith('whitefly.txt') and len(dense['retrievalResults']) == len(CHUNKS)
+
+
+def test_metadata_filter_uses_bedrock_syntax(index_dir):
+    kb = local_kb.LocalKnowledgeBase(index_dir)
+    wheat_only = {'andAll': [{'in': {'key': 'crop', 'value': ['Wheat', 'Multiple Crops']}},
+                             {'equals': {'key': 'region', 'value': 'Punjab'}}]}
+
+    response = kb.retrieve(retrievalQuery={'text': 'ETL spray'},
+                           retrievalConfiguration={'vectorSearchConfiguration': {'filter': wheat_only}})
+
+    assert _uris(response) == ['s3://kb/chunks/en/pau/wheat.txt']
+    assert local_kb.matches_filter({'pests': ['Aphids']}, {'listContains': {'key': 'pests', 'value': 'Aphids'}})
+
+
+def test_index_loads_memory_mapped(index_dir):
+    started = time.perf_counter()
+    kb = local_kb.LocalKnowledgeBase(index_dir)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    assert isinstance(kb.vectors, np.memmap) and kb.vectors.dtype == np.float16
+    assert kb.size == len(CHUNKS) and elapsed_ms < 200
+
+
+def test_processor_answers_from_local_kb_when_bedrock_throttles(index_dir, monkeypatch):
+    monkeypatch.setattr(processor, 'bedrock_agent', ThrottledAgent(LatencyProfile.zero()))
+    monkeypatch.setattr(processor, 'LOCAL_KB_DIR', index_dir)
+    monkeypatch.setattr(processor, '_local_kb', None)
+
+    result = processor.query_bedrock('aphids neem oil ETL', 'hi', {'crop': 'Cotton', 'location': 'Jalna'})
+
+    assert result['text'].startswith(processor.LOCAL_ANSWER_INTRO['hi'])
+    assert 'neem oil' in result['text']
+    assert result['citations'][0]['retrievedReferences'][0]['location']['s3Location']['uri'].endswith('aphid.txt')
+
+
+def test_throttling_without_local_index_still_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(processor, 'bedrock_agent', ThrottledAgent(LatencyProfile.zero()))
+    monkeypatch.setattr(processor, 'LOCAL_KB_DIR', str(tmp_path / 'missing'))
+    monkeypatch.setattr(processor, '_local_kb', None)
+
+    with pytest.raises(ThrottlingException):
+        processor.query_bedrock('aphids', 'hi')
+
+
+def test_local_kb_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'local_kb.py') for package in ('processor', 'kb')]
+    assert filecmp.cmp(copies[0], copies[1], shallow=False)
@@ -0,0 +1,214 @@
+import filecmp
+import io
+import json
+import os
+import sys
+
+import pytest
+
+import model_router
+import src.processor.handler as processor
+import tracing
+from tests.golden.evaluate import evaluate
+from tests.golden.replay import golden_cases
+from tests.load.fakes import FakeBedrockAgentRuntime, FakeBedrockRuntime, LatencyProfile
+from tests.test_golden_replay import SyntheticBedrockAgent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HAIKU = 'anthropic.claude-3-haiku-20240307-v1:0'
+SONNET = 'anthropic.claude-3-sonnet-20240229-v1:0'
+
+
+def _records(capsys, metric):
+    return [record for record in (json.loads(line) for line in capsys.readouterr().out.splitlines()
+                                  if line.startswith('{')) if metric in record]
+
+
+@pytest.mark.parametrize('question', [
+    'कपास में एफिड का नियंत्रण कैसे करें?',
+    'Pink bollworm ETL for cotton?',
+    'Cotton lo aphids ni ela control cheyali?',
+])
+def test_short_factual_questions_go_to_the_fast_tier(question):
+    assert model_router.choose_tier(question) == model_router.FAST
+
+
+@pytest.mark.parametrize('question', [
+    'Which spray for whitefly? And how many days before picking can I spray?',
+    'Compare neem oil and imidacloprid for aphids',
+    'कपास में सफेद मक्खी कब आती है और उसका नियंत्रण कैसे करें',
+    '1. whitefly dose\n2. jassid dose',
+    ' '.join(['word'] * 30),
+])
+def test_complex_or_multi_part_questions_go_to_the_full_tier(question):
+    assert model_router.choose_tier(question) == model_router.FULL
+
+
+def test_routing_can_be_pinned_to_one_tier(monkeypatch):
+    monkeypatch.setattr(model_router, 'MODEL_ROUTING', model_router.FULL)
+    assert model_router.choose_tier('aphids?') == model_router.FULL
+    assert model_router.model_arn(model_router.FULL).endswith(f'foundation-model/{SONNET}')
+
+    monkeypatch.setattr(model_router, 'MODEL_ROUTING', model_router.FAST)
+    assert model_router.choose_vision_tier() == model_router.FAST
+
+
+def test_validation_reasons():
+    citations = [{'retrievedReferences': [{'content': {'text': 'ETL 10%'}}]}]
+    answer = 'कपास में एफिड के लिए नीम तेल 5 मिली प्रति लीटर पानी में मिलाकर छिड़काव करें।'
+
+    assert model_router.validate_answer(answer, 'hi', citations) is None
+    assert model_router.validate_answer('ठीक है', 'hi', citations) == 'too_short'
+    assert model_router.validate_answer(answer, 'hi', []) == 'no_citations'
+    assert model_router.validate_answer(answer, 'te', citations) == 'wrong_language'
+    assert model_router.validate_answer('I cannot answer that from the documents provided, sorry.', 'en',
+                                        citations) == 'refusal'
+    assert model_router.validate_answer(answer, 'hi', require_citations=False) is None
+    # The prompt's off-topic reply is final, whatever the dialect and with nothing retrieved
+    assert model_router.validate_answer('I can only help with farming questions. Please ask about crops, pests, '
+                                        'fertilizers, or farm management.', 'hi', []) is None
+
+
+def test_fast_tier_is_cheaper():
+    assert model_router.call_cost(model_router.FAST, 2000, 300) < model_router.call_cost(model_router.FULL, 2000, 300)
+    assert model_router.call_cost(model_router.FULL, 1000, 1000) == pytest.approx(0.018)
+
+
+def test_model_call_emits_latency_tokens_and_cost(capsys):
+    tracing.emit_model_call('fast', HAIKU, 412.345, 900, 120, 0.000375, escalated=None)
+
+    record = _records(capsys, 'ModelLatency')[-1]
+    assert (record['Tier'], record['model_id']) == ('fast', HAIKU)
+    assert (record['ModelLatency'], record['ModelInputTokens'], record['ModelOutputTokens']) == (412.35, 900, 120)
+    assert record['ModelCost'] == 0.000375
+    metric = record['_aws']['CloudWatchMetrics'][0]
+    assert metric['Dimensions'] == [['Tier']]
+    assert {'Name': 'ModelInputTokens', 'Unit': 'Count'} in metric['Metrics']
+
+
+class WeakFastModel(FakeBedrockAgentRuntime):
+    """Fast-tier answers come back without citations"""
+
+    def __init__(self):
+        super().__init__(LatencyProfile.zero())
+        self.models = []
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration, **kwargs):
+        model_arn = retrieveAndGenerateConfiguration['knowledgeBaseConfiguration']['modelArn']
+        self.models.append(model_arn.rsplit('/', 1)[1])
+        response = super().retrieve_and_generate(input, retrieveAndGenerateConfiguration, **kwargs)
+        if 'haiku' in model_arn:
+            response['citations'] = []
+        return response
+
+
+def test_query_bedrock_answers_on_the_fast_tier(monkeypatch, capsys):
+    agent = FakeBedrockAgentRuntime(LatencyProfile.zero())
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+
+    result = processor.query_bedrock('कपास में एफिड का नियंत्रण कैसे करें?', 'hi')
+
+    assert result['model_tier'] == model_router.FAST and result['citations']
+    assert agent.calls['retrieve_and_generate'] == 1
+    record = _records(capsys, 'ModelLatency')[-1]
+    assert record['Tier'] == 'fast' and record['ModelInputTokens'] > record['ModelOutputTokens'] > 0
+
+
+def test_query_bedrock_escalates_a_failed_fast_answer(monkeypatch, capsys):
+    agent = WeakFastModel()
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+    monkeypatch.setattr(processor, 'RETRIEVAL_FILTERS', False)
+
+    result = processor.query_bedrock('कपास में एफिड का नियंत्रण कैसे करें?', 'hi')
+
+    assert agent.models == [HAIKU, SONNET]
+    assert result['model_tier'] == model_router.FULL and result['citations']
+    assert [(record['Tier'], record['escalated']) for record in _records(capsys, 'ModelLatency')] == \
+        [('fast', None), ('full', 'no_citations')]
+
+
+class OffTopicModel(FakeBedrockAgentRuntime):
+    """Every model answers with the prompt's off-topic refusal and no citations"""
+
+    def __init__(self):
+        super().__init__(LatencyProfile.zero())
+        self.models = []
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration, **kwargs):
+        model_arn = retrieveAndGenerateConfiguration['knowledgeBaseConfiguration']['modelArn']
+        self.models.append(model_arn.rsplit('/', 1)[1])
+        return {'output': {'text': processor.INTENT_REPLIES[processor.intents.OFF_TOPIC]['en']}, 'citations': []}
+
+
+def test_query_bedrock_does_not_escalate_an_off_topic_refusal(monkeypatch, capsys):
+    agent = OffTopicModel()
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+
+    result = processor.query_bedrock('Mujhe bukhar hai, kaunsi dawai lun?', 'hi')
+
+    assert agent.models == [HAIKU]
+    assert result['model_tier'] == model_router.FAST
+    assert [record['escalated'] for record in _records(capsys, 'ModelLatency')] == [None]
+
+
+def test_query_bedrock_sends_multi_part_questions_straight_to_the_full_tier(monkeypatch):
+    agent = WeakFastModel()
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+
+    processor.query_bedrock('Which spray for whitefly? And when should I spray?', 'en')
+
+    assert agent.models == [SONNET]
+
+
+class TruncatingFastVision(FakeBedrockRuntime):
+    def __init__(self):
+        super().__init__(LatencyProfile.zero())
+        self.models = []
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self.models.append(modelId)
+        if 'haiku' in modelId:
+            return {'body': io.BytesIO(json.dumps({'content': [{'type': 'text', 'text': 'Aphids.'}]}).encode())}
+        return super().invoke_model(modelId, body, **kwargs)
+
+
+def test_vision_escalates_when_the_fast_tier_analysis_fails(monkeypatch, capsys):
+    analyzer = sys.modules[processor.process_image_message.__module__]
+    vision = TruncatingFastVision()
+    monkeypatch.setattr(analyzer, 'bedrock', vision)
+    monkeypatch.setattr(model_router, 'VISION_MODEL_TIER', model_router.FAST)
+
+    result = analyzer.analyze_crop_image(b'\xff\xd8jpeg', 'hi', 'cotton')
+
+    assert vision.models == [HAIKU, SONNET]
+    assert result['raw_analysis'].startswith('Diagnosis: aphid infestation')
+    usage = [(r['Tier'], r['escalated']) for r in _records(capsys, 'ModelLatency')]
+    assert usage == [('fast', None), ('full', 'too_short')]
+
+
+class ModelRecordingAgent(SyntheticBedrockAgent):
+    def __init__(self):
+        super().__init__()
+        self.models = {}
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration=None, **kwargs):
+        model_arn = retrieveAndGenerateConfiguration['knowledgeBaseConfiguration']['modelArn']
+        self.models[input['text']] = model_arn.rsplit('/', 1)[1]
+        return super().retrieve_and_generate(input, retrieveAndGenerateConfiguration, **kwargs)
+
+
+def test_golden_evaluation_routes_by_tier_and_records_it():
+    agent = ModelRecordingAgent()
+
+    run = evaluate(agent, workers=4, model_routing=model_router.TIERED)
+
+    assert run.failed == 0, run.summary()
+    assert sum(run.tiers.values()) == len(golden_cases()) and run.tiers.get('fast')
+    for question in run.questions:
+        assert agent.models[question.question] == model_router.model_id(question.tier)
+    assert 'model routing tiered' in run.summary()
+
+
+def test_model_router_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'model_router.py') for package in ('processor', 'vision')]
+    assert filecmp.cmp(copies[0], copies[1], shallow=False)
@@ -1,16 +1,25 @@
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import types
 
 import importlib
 
+import pytest
+
 os.environ.setdefault("TABLE_NAME", "agrinexus-data")
 
 import src.nudge.sender as sender
 import src.nudge.reminder as reminder
 import src.nudge.detector as detector
+import active_nudges
+import nudge_timeline
+import profiles
+import reminder_queue
+import targeting
+from tests.load.fakes import FakeDynamoResource, LatencyProfile, matches_event_pattern
+from tests.load.harness import detector_filters
 
 sender = importlib.reload(sender)
 reminder = importlib.reload(reminder)
@@ -90,7 +99,7 @@ def test_template_language_code_selection(monkeypatch):
 
     monkeypatch.setattr(sender, "send_whatsapp_template", fake_template)
     monkeypatch.setattr(sender, "send_whatsapp_message", lambda *args, **kwargs: None)
-    monkeypatch.setattr(sender, "create_reminder_schedule", lambda *args, **kwargs: None)
+    monkeypatch.setattr(sender, "queue_reminders", lambda *args, **kwargs: None)
 
     sender.lambda_handler({"location": "Aurangabad", "weather": {"wind_speed": 8.5}, "activity": "spray"}, None)
 
@@ -104,8 +113,11 @@ def test_reminder_sender_updates_status(monkeypatch):
         "Item": {"status": "SENT"}
     }
     monkeypatch.setattr(reminder, "table", fake_table)
+    monkeypatch.setattr(reminder, "_secret_cache", {})
+    secret_reads = []
 
     def fake_get_secret_value(SecretId):
+        secret_reads.append(SecretId)
         return {"SecretString": "dummy"}
 
     monkeypatch.setattr(reminder.secrets, "get_secret_value", fake_get_secret_value)
@@ -128,22 +140,17 @@ def test_reminder_sender_updates_status(monkeypatch):
     assert result["statusCode"] == 200
     assert fake_table.updated, "Expected update_item to be called"
 
+    reminder.lambda_handler(event, None)
+    assert len(secret_reads) == 2  # access token and phone number id, cached for the second send
+
 
-def test_detector_marks_done_and_deletes_schedule(monkeypatch):
+def test_detector_marks_done_without_touching_reminders(monkeypatch):
     fake_table = FakeTable()
     fake_table.items = [
         {"SK": "NUDGE#2026-02-19T00:00:00#spray", "status": "SENT"}
     ]
     monkeypatch.setattr(detector, "table", fake_table)
 
-    delete_calls = []
-
-    class FakeScheduler:
-        def delete_schedule(self, Name):
-            delete_calls.append(Name)
-
-    monkeypatch.setattr(detector, "scheduler", FakeScheduler())
-
     def fake_get_secret_value(SecretId):
         return {"SecretString": "dummy"}
 
@@ -176,5 +183,415 @@ def test_detector_marks_done_and_deletes_schedule(monkeypatch):
 
     detector.lambda_handler(event, None)
 
-    assert fake_table.updated, "Expected update_item to be called"
-    assert delete_calls, "Expected scheduled reminders to be deleted"
+    assert [update["ExpressionAttributeValues"][":done"] for update in fake_table.updated
+            if ":done" in update["ExpressionAttributeValues"]] == ["DONE"]
+    assert not hasattr(detector, "scheduler")
+
+
+def _queue_nudge(table, phone, status, sent_at, dialect="hi"):
+    nudge_id = f"{sent_at.isoformat()}#spray"
+    table.items[(f"USER#{phone}", f"NUDGE#{nudge_id}")] = {
+        "PK": f"USER#{phone}", "SK": f"NUDGE#{nudge_id}", "status": status
+    }
+    for hours in reminder_queue.REMINDER_OFFSETS_H:
+        item = reminder_queue.reminder_item(phone, nudge_id, hours, dialect, sent_at)
+        table.items[(item["PK"], item["SK"])] = item
+    return nudge_id
+
+
+@pytest.fixture
+def swept(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(reminder.TABLE_NAME)
+    sent = []
+    monkeypatch.setattr(reminder, "dynamodb", dynamodb)
+    monkeypatch.setattr(reminder, "table", table)
+    monkeypatch.setattr(reminder, "send_whatsapp_message",
+                        lambda phone, message: sent.append((phone, message)) or True)
+
+    def sweep(at):
+        return reminder.lambda_handler({"time": at.strftime("%Y-%m-%dT%H:%M:%SZ")}, None)
+
+    return dynamodb, table, sent, sweep
+
+
+def test_reminder_item_lands_in_its_due_bucket():
+    sent_at = datetime(2026, 10, 19, 6, 17, 42)
+    item = reminder_queue.reminder_item("+911", "n1", 24, "mr", sent_at)
+
+    assert item["GSI3PK"] == f"REMINDER#2026-10-20T06:15#{reminder_queue.shard_of('+911')}"
+    assert item["GSI3SK"].startswith("2026-10-20T06:17:42#+911")
+    assert item["GSI3PK"] in reminder_queue.partition_keys(sent_at + timedelta(hours=24, minutes=1))
+    assert item["GSI3PK"] not in reminder_queue.partition_keys(sent_at + timedelta(hours=23))
+
+
+def test_sender_queues_reminders_instead_of_schedules(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(sender.TABLE_NAME)
+    table.items[("USER#+911", "PROFILE")] = {"PK": "USER#+911", "SK": "PROFILE", "phone_number": "+911",
+                                             "dialect": "te", "GSI5PK": "TARGET#Jalna", "GSI5SK": "CROP#Cotton#+911"}
+    monkeypatch.setattr(sender, "table", table)
+    monkeypatch.setattr(sender, "USE_NUDGE_TEMPLATE", False)
+    monkeypatch.setattr(sender, "send_whatsapp_message", lambda *args: None)
+    monkeypatch.setattr(sender, "emit_metric", lambda *args: None)
+
+    sender.lambda_handler({"location": "Jalna", "weather": {"wind_speed": 8.5}, "activity": "spray"}, None)
+
+    reminders = [item for key, item in table.items.items() if key[1].startswith("REMINDER#")]
+    assert sorted(item["reminder_type"] for item in reminders) == ["T+24h", "T+48h"]
+    assert all(item["dialect"] == "te" and item["GSI3PK"].startswith("REMINDER#") for item in reminders)
+    assert not hasattr(sender, "scheduler")
+
+
+def test_sender_spreads_timeline_writes_over_shards(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(sender.TABLE_NAME)
+    for i in range(40):
+        table.items[(f"USER#+91{i:03d}", "PROFILE")] = {"PK": f"USER#+91{i:03d}", "SK": "PROFILE",
+                                                        "phone_number": f"+91{i:03d}", "GSI5PK": "TARGET#Jalna",
+                                                        "GSI5SK": f"CROP#Cotton#+91{i:03d}"}
+    monkeypatch.setattr(sender, "table", table)
+    monkeypatch.setattr(sender, "USE_NUDGE_TEMPLATE", False)
+    monkeypatch.setattr(sender, "send_whatsapp_message", lambda *args: None)
+    monkeypatch.setattr(sender, "emit_metric", lambda *args: None)
+
+    sender.lambda_handler({"location": "Jalna", "weather": {"wind_speed": 8.5}, "activity": "spray"}, None)
+
+    nudges = [item for key, item in table.items.items() if key[1].startswith("NUDGE#")]
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    assert len(nudges) == 40
+    assert all(item["GSI2PK"].startswith(f"NUDGE#{today}#") for item in nudges)
+    assert len({item["GSI2PK"] for item in nudges}) == nudge_timeline.SHARDS
+
+
+def test_timeline_query_merges_shards_in_time_order():
+    table = FakeDynamoResource(LatencyProfile.zero()).Table(sender.TABLE_NAME)
+    start = datetime(2026, 10, 18, 23, 0, 0)
+    for i in range(30):
+        sent_at = start + timedelta(minutes=7 * i)  # crosses midnight
+        phone = f"+91{(i * 37) % 100:03d}"
+        table.items[(f"USER#{phone}", f"NUDGE#{sent_at.isoformat()}#spray")] = {
+            "PK": f"USER#{phone}", "SK": f"NUDGE#{sent_at.isoformat()}#spray",
+            **nudge_timeline.index_keys(phone, sent_at)
+        }
+
+    nudges = nudge_timeline.query(table, start + timedelta(minutes=30), start + timedelta(hours=3))
+
+    times = [item["GSI2SK"] for item in nudges]
+    assert times == sorted(times) and len(times) == 21  # minutes 35, 42, ... 175
+    assert times[0] == "2026-10-18T23:35:00" and times[-1] == "2026-10-19T01:55:00"
+    assert table.calls["query"] == 2 * nudge_timeline.SHARDS
+
+
+def test_sender_targets_consented_farmers_by_crop(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(sender.TABLE_NAME)
+    farmers = [("+911", "Cotton", True, True), ("+912", "Soybean", True, True),
+               ("+913", "Cotton", False, True), ("+914", "Cotton", True, False), ("+915", "Cotton", True, True)]
+    for phone, crop, consent, onboarded in farmers:
+        profile = {"PK": f"USER#{phone}", "SK": "PROFILE", "phone_number": phone, "dialect": "mr",
+                   "location": "Jalna", "crop": crop, "consent": consent, "onboarding_complete": onboarded}
+        table.items[(profile["PK"], "PROFILE")] = {**profile, **targeting.index_keys(profile)}
+    templates = []
+    monkeypatch.setattr(sender, "table", table)
+    monkeypatch.setattr(sender, "NUDGE_TEMPLATE_NAME", "weather_nudge_spray")
+    monkeypatch.setattr(sender, "USE_NUDGE_TEMPLATE", True)
+    monkeypatch.setattr(sender, "send_whatsapp_template", lambda phone, name, code: templates.append((phone, code)) or True)
+    monkeypatch.setattr(sender, "emit_metric", lambda *args: None)
+
+    result = sender.lambda_handler({"location": "Jalna", "crop": "Cotton", "weather": {"wind_speed": 8.5}}, None)
+
+    assert result["nudges_sent"] == 2
+    assert sorted(templates) == [("+911", "mr"), ("+915", "mr")]
+    assert table.calls["query"] == 1 + 2  # targeting, then each farmer's open-nudge check
+
+
+def test_sweep_sends_due_reminders_and_skips_done_nudges(swept):
+    dynamodb, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    pending = [_queue_nudge(table, f"+91{i}", "SENT", sent_at) for i in range(6)]
+    _queue_nudge(table, "+91done", "DONE", sent_at)
+
+    result = sweep(sent_at + timedelta(hours=24, minutes=2))
+
+    assert (result["due"], result["sent"], result["cancelled"]) == (7, 6, 1)
+    assert sorted(phone for phone, _ in sent) == [f"+91{i}" for i in range(6)]
+    assert all(message == reminder.REMINDER_TEMPLATES["hi"]["T+24h"] for _, message in sent)
+    assert table.items[("USER#+910", f"NUDGE#{pending[0]}")]["lastReminder"] == "T+24h"
+    assert dynamodb.meta.client.calls["batch_get_item"] == 1
+    # Due T+24h items are consumed; every T+48h reminder waits for its own bucket
+    remaining = [item for key, item in table.items.items() if key[1].startswith("REMINDER#")]
+    assert {item["reminder_type"] for item in remaining} == {"T+48h"} and len(remaining) == 7
+
+
+def test_sweep_is_idempotent_and_waits_for_due_time(swept):
+    _, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    _queue_nudge(table, "+911", "REMINDED", sent_at)
+
+    assert sweep(sent_at + timedelta(hours=23, minutes=59))["due"] == 0
+    assert sweep(sent_at + timedelta(hours=24, minutes=30))["sent"] == 1
+    assert sweep(sent_at + timedelta(hours=24, minutes=35))["due"] == 0
+    assert sweep(sent_at + timedelta(hours=48, minutes=5))["sent"] == 1
+    assert [message for _, message in sent] == [reminder.REMINDER_TEMPLATES["hi"]["T+24h"],
+                                                reminder.REMINDER_TEMPLATES["hi"]["T+48h"]]
+
+
+def test_sweep_catches_up_from_the_watermark_after_an_outage(swept):
+    _, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    _queue_nudge(table, "+911", "SENT", sent_at)
+
+    assert sweep(sent_at + timedelta(hours=23, minutes=55))["due"] == 0
+    # No sweep ran for three hours, well past the one-hour lookback
+    assert sweep(sent_at + timedelta(hours=27))["sent"] == 1
+    assert table.items[reminder_queue.WATERMARK_KEY["PK"], reminder_queue.WATERMARK_KEY["SK"]]["swept_to"] == \
+        "2026-10-20T09:00"
+    assert [message for _, message in sent] == [reminder.REMINDER_TEMPLATES["hi"]["T+24h"]]
+
+
+def test_sweep_logs_buckets_past_the_catch_up_window(swept, monkeypatch, capsys):
+    _, table, sent, sweep = swept
+    monkeypatch.setattr(reminder_queue, "MAX_CATCHUP_BUCKETS", 24)
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    _queue_nudge(table, "+911", "SENT", sent_at)
+
+    sweep(sent_at + timedelta(hours=23, minutes=55))
+    sweep(sent_at + timedelta(hours=27))
+
+    assert sent == []
+    assert "reminder sweep is 13 buckets past the catch-up window" in capsys.readouterr().out
+
+
+def test_done_nudge_cancels_reminders_with_one_update(swept):
+    _, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    nudge_id = _queue_nudge(table, "+911", "SENT", sent_at)
+
+    table.update_item(Key={"PK": "USER#+911", "SK": f"NUDGE#{nudge_id}"},
+                      UpdateExpression="SET #status = :status",
+                      ExpressionAttributeNames={"#status": "status"},
+                      ExpressionAttributeValues={":status": "DONE"})
+
+    assert sweep(sent_at + timedelta(hours=24, minutes=1))["cancelled"] == 1
+    assert sweep(sent_at + timedelta(hours=48, minutes=1))["cancelled"] == 1
+    assert sent == []
+
+
+def test_failed_send_is_requeued_for_the_next_sweep(swept, monkeypatch):
+    _, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    _queue_nudge(table, "+911", "SENT", sent_at)
+    monkeypatch.setattr(reminder, "send_whatsapp_message", lambda phone, message: False)
+
+    assert sweep(sent_at + timedelta(hours=24, minutes=2))["sent"] == 0
+    requeued = table.items[("USER#+911", f"REMINDER#{sent_at.isoformat()}#spray#T+24h")]
+    assert requeued["GSI3PK"].startswith("REMINDER#2026-10-20T06:00#")
+    assert requeued["due_at"] == "2026-10-20T06:00:00"
+
+    monkeypatch.setattr(reminder, "send_whatsapp_message",
+                        lambda phone, message: sent.append((phone, message)) or True)
+    assert sweep(sent_at + timedelta(hours=24, minutes=7))["sent"] == 1
+    assert [phone for phone, _ in sent] == ["+911"]
+
+
+def test_nudge_done_during_the_sweep_gets_no_reminder(swept, monkeypatch):
+    _, table, sent, sweep = swept
+    sent_at = datetime(2026, 10, 19, 6, 0, 0)
+    nudge_id = _queue_nudge(table, "+911", "DONE", sent_at)
+    # Statuses read before the farmer's DONE landed
+    monkeypatch.setattr(reminder, "get_nudge_statuses",
+                        lambda due: {(f"USER#{r['phone_number']}", f"NUDGE#{r['nudge_id']}"): "SENT" for r in due})
+
+    result = sweep(sent_at + timedelta(hours=24, minutes=2))
+
+    assert (result["due"], result["sent"]) == (1, 0)
+    assert sent == []
+    assert table.items[("USER#+911", f"NUDGE#{nudge_id}")]["status"] == "DONE"
+
+
+def _done_reply(phone, at="2026-10-19T09:00:00"):
+    return {"eventName": "INSERT", "dynamodb": {"NewImage": {
+        "PK": {"S": f"USER#{phone}"}, "SK": {"S": f"MSG#{at}"},
+        "message": {"M": {"text": {"M": {"body": {"S": "हो गया"}}}}}
+    }}}
+
+
+def test_detector_completes_the_newest_open_nudge_with_one_read(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    phone = "+911"
+    # Two seasons of completed history plus two open nudges
+    for day in range(1, 120):
+        nudge_id = f"2026-{6 + day // 30:02d}-{day % 28 + 1:02d}T06:00:00#spray"
+        table.items[(f"USER#{phone}", f"NUDGE#{nudge_id}")] = {
+            "PK": f"USER#{phone}", "SK": f"NUDGE#{nudge_id}", "status": "DONE"}
+    for nudge_id in ("2026-10-17T06:00:00#spray", "2026-10-18T06:00:00#spray"):
+        table.items[(f"USER#{phone}", f"NUDGE#{nudge_id}")] = {
+            "PK": f"USER#{phone}", "SK": f"NUDGE#{nudge_id}", "status": "SENT",
+            **active_nudges.index_keys(phone, nudge_id)}
+    confirmations = []
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: confirmations.append(text))
+    monkeypatch.setattr(detector, "emit_metric", lambda *args: None)
+
+    detector.lambda_handler({"Records": [_done_reply(phone)]}, None)
+
+    newest = table.items[(f"USER#{phone}", "NUDGE#2026-10-18T06:00:00#spray")]
+    assert newest["status"] == "DONE" and newest["completedAt"] == "2026-10-19T09:00:00"
+    assert "GSI4PK" not in newest
+    assert table.items[(f"USER#{phone}", "NUDGE#2026-10-17T06:00:00#spray")]["status"] == "SENT"
+    assert (table.calls["query"], table.calls["update_item"]) == (1, 2)  # reply claim + nudge completion
+    assert len(confirmations) == 1
+
+    # The next DONE goes to the older open nudge; a third finds nothing open
+    detector.lambda_handler({"Records": [_done_reply(phone, "2026-10-19T09:05:00")]}, None)
+    detector.lambda_handler({"Records": [_done_reply(phone, "2026-10-19T09:10:00")]}, None)
+    assert table.items[(f"USER#{phone}", "NUDGE#2026-10-17T06:00:00#spray")]["status"] == "DONE"
+    assert len(confirmations) == 2
+
+
+def test_stale_active_index_read_does_not_confirm_twice(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    nudge_id = "2026-10-18T06:00:00#spray"
+    table.items[("USER#+911", f"NUDGE#{nudge_id}")] = {
+        "PK": "USER#+911", "SK": f"NUDGE#{nudge_id}", "status": "DONE",
+        **active_nudges.index_keys("+911", nudge_id)}  # index not yet caught up
+    confirmations = []
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: confirmations.append(text))
+
+    detector.lambda_handler({"Records": [_done_reply("+911")]}, None)
+
+    assert confirmations == []
+    assert "completedAt" not in table.items[("USER#+911", f"NUDGE#{nudge_id}")]
+
+
+def test_stream_filter_passes_only_new_text_messages():
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    text = {"text": {"body": "हो गया"}}
+    table.put_item(Item={"PK": "WAMID#w1", "SK": "DEDUP"})
+    table.put_item(Item={"PK": "USER#+911", "SK": "MSG#2026-10-19T09:00:00", "message": text})
+    table.put_item(Item={"PK": "USER#+911", "SK": "MSG#2026-10-19T09:01:00", "message": {"image": {"id": "m1"}}})
+    table.put_item(Item={"PK": "USER#+911", "SK": "MSG#2026-10-19T09:00:00", "message": text, "response": "ok"})
+    table.put_item(Item={"PK": "USER#+911", "SK": "PROFILE", "dialect": "hi"})
+    table.put_item(Item={"PK": "USER#+911", "SK": "NUDGE#2026-10-19T06:00:00#spray", "status": "SENT"})
+    table.put_item(Item={"PK": "RATELIMIT#model", "SK": "BUCKET", "tokens": 1})
+
+    patterns = detector_filters()
+    delivered = [record for record in dynamodb.drain_stream()
+                 if any(matches_event_pattern(pattern, record) for pattern in patterns)]
+
+    assert [(r["eventName"], r["dynamodb"]["Keys"]["SK"]["S"]) for r in delivered] == \
+        [("INSERT", "MSG#2026-10-19T09:00:00")]
+
+
+def test_detector_batches_profile_reads_and_confirms_concurrently(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    phones = [f"+91{i:03d}" for i in range(30)]
+    for i, phone in enumerate(phones):
+        nudge_id = "2026-10-18T06:00:00#spray"
+        table.items[(f"USER#{phone}", f"NUDGE#{nudge_id}")] = {
+            "PK": f"USER#{phone}", "SK": f"NUDGE#{nudge_id}", "status": "SENT",
+            **active_nudges.index_keys(phone, nudge_id)}
+        table.items[(f"USER#{phone}", "PROFILE")] = {
+            "PK": f"USER#{phone}", "SK": "PROFILE", "dialect": ["mr", "te"][i % 2], "onboarding_complete": True}
+    sent, metrics = [], []
+    monkeypatch.setattr(detector, "dynamodb", dynamodb)
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: sent.append((phone, text)))
+    monkeypatch.setattr(detector, "emit_metric", lambda name, value=1.0: metrics.append((name, value)))
+    profiles.invalidate()
+
+    def reply(phone, body):
+        record = _done_reply(phone)
+        record["dynamodb"]["NewImage"]["message"]["M"]["text"]["M"]["body"]["S"] = body
+        return record
+
+    records = [reply(phone, "done") for phone in phones]  # 'done' names no dialect
+    records += [{"eventName": "MODIFY", "dynamodb": {"NewImage": {"SK": {"S": "PROFILE"}}}},
+                reply(phones[0], "what is the ETL for aphids?")]
+
+    detector.lambda_handler({"Records": records}, None)
+
+    assert dynamodb.meta.client.calls["batch_get_item"] == 1 and table.calls["get_item"] == 0
+    assert dict(sent)[phones[0]] == detector.CONFIRMATION_MESSAGES["mr"]
+    assert dict(sent)[phones[1]] == detector.CONFIRMATION_MESSAGES["te"]
+    assert len(sent) == 30 and metrics == [("NudgesCompleted", 30)]
+
+
+def test_detector_keeps_each_farmers_replies_in_order(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    sent = []
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: sent.append(text))
+    monkeypatch.setattr(detector, "emit_metric", lambda *args: None)
+    nudge_id = "2026-10-18T06:00:00#spray"
+    table.items[("USER#+911", f"NUDGE#{nudge_id}")] = {
+        "PK": "USER#+911", "SK": f"NUDGE#{nudge_id}", "status": "SENT", **active_nudges.index_keys("+911", nudge_id)}
+
+    first = _done_reply("+911", "2026-10-19T09:00:00")
+    first["dynamodb"]["NewImage"]["message"]["M"]["text"]["M"]["body"]["S"] = "अभी नहीं"
+    detector.lambda_handler({"Records": [first, _done_reply("+911", "2026-10-19T09:30:00")]}, None)
+
+    assert sent == [detector.NOT_YET_MESSAGES["hi"], detector.CONFIRMATION_MESSAGES["hi"]]
+
+
+def test_queued_reply_is_confirmed_once_across_queue_and_stream(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    sent = []
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: sent.append(text))
+    monkeypatch.setattr(detector, "emit_metric", lambda *args: None)
+    for nudge_id in ("2026-10-17T06:00:00#spray", "2026-10-18T06:00:00#spray"):
+        table.items[("USER#+911", f"NUDGE#{nudge_id}")] = {
+            "PK": "USER#+911", "SK": f"NUDGE#{nudge_id}", "status": "SENT",
+            **active_nudges.index_keys("+911", nudge_id)}
+    table.items[("USER#+911", "MSG#2026-10-19T09:00:00")] = {"PK": "USER#+911", "SK": "MSG#2026-10-19T09:00:00"}
+    queued = {"eventSource": "aws:sqs", "body": json.dumps({
+        "wamid": "wamid.R1", "from": "+911", "message_sk": "MSG#2026-10-19T09:00:00",
+        "text": "झाला", "profile": {"dialect": "hi"}})}
+
+    detector.lambda_handler({"Records": [queued]}, None)
+    detector.lambda_handler({"Records": [queued]}, None)  # SQS redelivery
+    detector.lambda_handler({"Records": [_done_reply("+911")]}, None)  # stream backstop, same message
+
+    assert sent == [detector.CONFIRMATION_MESSAGES["mr"]]
+    assert table.items[("USER#+911", "NUDGE#2026-10-18T06:00:00#spray")]["status"] == "DONE"
+    assert table.items[("USER#+911", "NUDGE#2026-10-17T06:00:00#spray")]["status"] == "SENT"
+    assert "reply_handled_at" in table.items[("USER#+911", "MSG#2026-10-19T09:00:00")]
+
+
+def test_failed_reply_is_released_for_redelivery(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(detector.TABLE_NAME)
+    sent = []
+    monkeypatch.setattr(detector, "table", table)
+    monkeypatch.setattr(detector, "send_whatsapp_message", lambda phone, text: sent.append(text))
+    monkeypatch.setattr(detector, "emit_metric", lambda *args: None)
+    nudge_id = "2026-10-18T06:00:00#spray"
+    table.items[("USER#+911", f"NUDGE#{nudge_id}")] = {
+        "PK": "USER#+911", "SK": f"NUDGE#{nudge_id}", "status": "SENT", **active_nudges.index_keys("+911", nudge_id)}
+    table.items[("USER#+911", "MSG#2026-10-19T09:00:00")] = {"PK": "USER#+911", "SK": "MSG#2026-10-19T09:00:00"}
+    queued = {"eventSource": "aws:sqs", "body": json.dumps({
+        "wamid": "wamid.R1", "from": "+911", "message_sk": "MSG#2026-10-19T09:00:00", "text": "done"})}
+    complete = active_nudges.complete
+
+    def throttled_once(*args):
+        monkeypatch.setattr(active_nudges, "complete", complete)
+        raise RuntimeError("ProvisionedThroughputExceededException")
+
+    monkeypatch.setattr(active_nudges, "complete", throttled_once)
+    with pytest.raises(RuntimeError):
+        detector.lambda_handler({"Records": [queued]}, None)
+    assert "reply_handled_at" not in table.items[("USER#+911", "MSG#2026-10-19T09:00:00")]
+
+    detector.lambda_handler({"Records": [queued]}, None)  # SQS redelivery
+
+    assert table.items[("USER#+911", f"NUDGE#{nudge_id}")]["status"] == "DONE"
+    assert sent == [detector.CONFIRMATION_MESSAGES["hi"]]
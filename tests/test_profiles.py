@@ -0,0 +1,129 @@
+import filecmp
+import json
+import os
+
+import profiles
+import src.processor.handler as processor
+import src.webhook.handler as webhook
+from tests.load.fakes import FakeDynamoResource, FakeSQS, LatencyProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPLETE = {'PK': 'USER#+911', 'SK': 'PROFILE', 'phone_number': '+911', 'dialect': 'mr', 'crop': 'Cotton',
+            'location': 'Jalna', 'onboarding_complete': True, 'voicePreference': False, 'consent': True}
+
+
+def _table(*items):
+    table = FakeDynamoResource(LatencyProfile.zero()).Table(webhook.TABLE_NAME)
+    for item in items:
+        table.items[(item['PK'], item['SK'])] = dict(item)
+    return table
+
+
+def test_completed_profile_is_read_once():
+    table = _table(COMPLETE)
+
+    assert profiles.get(table, '+911')['dialect'] == 'mr'
+    assert profiles.get(table, '+911')['dialect'] == 'mr'
+    assert table.calls['get_item'] == 1
+
+
+def test_onboarding_profile_is_never_cached():
+    table = _table({'PK': 'USER#+912', 'SK': 'PROFILE', 'onboarding_state': 'crop', 'onboarding_complete': False})
+
+    profiles.get(table, '+912')
+    profiles.get(table, '+912')
+    profiles.get(table, '+999')  # no profile at all
+    profiles.get(table, '+999')
+    assert table.calls['get_item'] == 4
+
+
+def test_ttl_expiry(monkeypatch):
+    table = _table(COMPLETE)
+    monkeypatch.setattr(profiles, 'PROFILE_CACHE_TTL', 0)
+
+    profiles.get(table, '+911')
+    profiles.get(table, '+911')
+    assert table.calls['get_item'] == 2
+
+
+def test_snapshot_round_trip():
+    snap = profiles.snapshot(COMPLETE)
+
+    assert set(snap) <= set(profiles.SNAPSHOT_FIELDS)
+    assert 'PK' not in snap and 'consent' not in snap
+    assert profiles.from_snapshot('+911', snap)['phone_number'] == '+911'
+    assert profiles.from_snapshot('+911', {'dialect': 'hi', 'onboarding_complete': False}) is None
+    assert profiles.from_snapshot('+911', None) is None
+
+
+def test_webhook_attaches_snapshot_and_processor_skips_read(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(webhook.TABLE_NAME)
+    table.items[(COMPLETE['PK'], COMPLETE['SK'])] = dict(COMPLETE)
+    sqs = FakeSQS(LatencyProfile.zero())
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', False)
+    monkeypatch.setattr(webhook, 'dynamodb', dynamodb)
+    monkeypatch.setattr(webhook, 'table', table)
+    monkeypatch.setattr(webhook, 'sqs', sqs)
+
+    payload = {'entry': [{'changes': [{'value': {'messages': [{
+        'id': 'wamid.P1', 'from': '+911', 'type': 'text', 'text': {'body': 'कापसावरील मावा?'}
+    }]}}]}]}
+    webhook.lambda_handler({'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(payload)}, None)
+
+    body = json.loads(sqs.receive(webhook.QUEUE_URL)[0]['body'])
+    assert body['profile']['dialect'] == 'mr'
+    message_items = [item for (pk, sk), item in table.items.items() if sk.startswith('MSG#')]
+    assert message_items[0]['profile']['dialect'] == 'mr'
+
+    processor_table = _table()
+    monkeypatch.setattr(processor, 'table', processor_table)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda *args, **kwargs: None)
+    monkeypatch.setattr(processor, 'query_bedrock', lambda text, dialect, profile=None: {'text': 'उत्तर', 'citations': []})
+    processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    assert processor_table.calls['get_item'] == 0
+
+
+def test_profile_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'profiles.py')
+              for package in ('webhook', 'processor', 'voice', 'nudge', 'dlq')]
+    assert all(filecmp.cmp(copies[0], other, shallow=False) for other in copies[1:])
+
+
+def test_get_many_batches_uncached_profiles():
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    table = dynamodb.Table(webhook.TABLE_NAME)
+    for i in range(150):
+        table.items[(f'USER#+9{i}', 'PROFILE')] = {**COMPLETE, 'PK': f'USER#+9{i}', 'phone_number': f'+9{i}'}
+    profiles.invalidate()
+    profiles.get(table, '+90')
+
+    found = profiles.get_many(dynamodb, webhook.TABLE_NAME, [f'+9{i}' for i in range(150)] + ['+8', '+90'])
+
+    assert len(found) == 151 and found['+8'] is None and found['+9149']['dialect'] == 'mr'
+    assert dynamodb.meta.client.calls['batch_get_item'] == 2  # 149 uncached keys, 100 per call
+    assert profiles.get(table, '+9149') is found['+9149'] and table.calls['get_item'] == 1
+
+
+def test_targeting_index_holds_only_consented_complete_profiles(monkeypatch):
+    table = _table()
+    monkeypatch.setattr(processor, 'table', table)
+
+    processor.create_user_profile('+911', 'mr', 'Jalna', 'Cotton', True)
+    processor.create_user_profile('+912', 'hi', 'Jalna', 'Cotton', False)
+
+    indexed = table.items[('USER#+911', 'PROFILE')]
+    assert (indexed['GSI5PK'], indexed['GSI5SK'], indexed['language_code']) == ('TARGET#Jalna', 'CROP#Cotton#+911', 'mr')
+    assert 'GSI5PK' not in table.items[('USER#+912', 'PROFILE')]
+
+    processor.update_user_profile('+911', {'onboarding_state': 'crop', 'onboarding_complete': False})
+
+    assert 'GSI5PK' not in table.items[('USER#+911', 'PROFILE')]
+    assert table.items[('USER#+911', 'PROFILE')]['GSI1PK'] == 'LOCATION#Jalna'
+
+
+def test_targeting_module_copies_are_identical():
+    copies = [os.path.join(ROOT, 'src', package, 'targeting.py') for package in ('processor', 'nudge')]
+    assert filecmp.cmp(copies[0], copies[1], shallow=False)
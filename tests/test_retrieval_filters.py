@@ -0,0 +1,61 @@
+import src.processor.handler as processor
+from tests.load.fakes import FakeBedrockAgentRuntime, LatencyProfile
+
+
+class FilterAwareAgent(FakeBedrockAgentRuntime):
+    """Returns no references while a metadata filter is applied (no documents tagged for the crop)"""
+
+    def __init__(self, matches_filtered: bool):
+        super().__init__(LatencyProfile.zero())
+        self.matches_filtered = matches_filtered
+        self.configs = []
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration, **kwargs):
+        self.configs.append(retrieveAndGenerateConfiguration['knowledgeBaseConfiguration'])
+        response = super().retrieve_and_generate(input, retrieveAndGenerateConfiguration, **kwargs)
+        if 'retrievalConfiguration' in self.configs[-1] and not self.matches_filtered:
+            response['citations'] = [{'retrievedReferences': []}]
+        return response
+
+
+def test_filter_from_crop_and_district():
+    metadata_filter = processor.retrieval_filter({'crop': 'Cotton', 'location': 'Jalna'})
+
+    assert metadata_filter == {'andAll': [
+        {'in': {'key': 'crop', 'value': ['Cotton', 'Multiple Crops']}},
+        {'in': {'key': 'region', 'value': ['Maharashtra', 'India', 'Global']}},
+    ]}
+
+
+def test_unknown_district_only_filters_crop():
+    assert processor.retrieval_filter({'crop': 'Wheat', 'location': 'Ludhiana'}) == \
+        {'in': {'key': 'crop', 'value': ['Wheat', 'Multiple Crops']}}
+    assert processor.retrieval_filter({'location': 'Ludhiana'}) is None
+    assert processor.retrieval_filter(None) is None
+
+
+def test_query_passes_profile_filter(monkeypatch):
+    agent = FilterAwareAgent(matches_filtered=True)
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+
+    result = processor.query_bedrock('कापसावरील मावा?', 'mr', {'crop': 'Cotton', 'location': 'Nagpur'})
+
+    assert len(agent.configs) == 1 and result['citations']
+    search = agent.configs[0]['retrievalConfiguration']['vectorSearchConfiguration']
+    assert search['filter']['andAll'][0]['in']['value'][0] == 'Cotton'
+
+
+def test_query_falls_back_to_whole_kb_when_filter_matches_nothing(monkeypatch):
+    agent = FilterAwareAgent(matches_filtered=False)
+    monkeypatch.setattr(processor, 'bedrock_agent', agent)
+
+    result = processor.query_bedrock('Soybean rust?', 'en', {'crop': 'Soybean', 'location': 'Jalna'})
+
+    assert len(agent.configs) == 2 and 'retrievalConfiguration' not in agent.configs[1]
+    assert result['citations'][0]['retrievedReferences']
+
+
+def test_filters_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(processor, 'RETRIEVAL_FILTERS', False)
+
+    assert processor.retrieval_filter({'crop': 'Cotton', 'location': 'Jalna'}) is None
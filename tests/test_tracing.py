@@ -0,0 +1,86 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import src.webhook.handler as webhook
+import tracing
+
+
+def _records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+
+def test_stage_emits_emf_record(capsys):
+    tracing.set_correlation_id('wamid.ABC')
+
+    with tracing.stage('profile_read', dialect='hi'):
+        pass
+
+    record = _records(capsys)[-1]
+    assert record['Stage'] == 'profile_read'
+    assert record['StageLatency'] >= 0
+    assert record['status'] == 'ok'
+    assert record['correlation_id'] == 'wamid.ABC'
+    assert record['dialect'] == 'hi'
+    metric = record['_aws']['CloudWatchMetrics'][0]
+    assert metric['Namespace'] == 'AgriNexus'
+    assert metric['Dimensions'] == [['Stage']]
+    assert metric['Metrics'][0] == {'Name': 'StageLatency', 'Unit': 'Milliseconds'}
+
+
+def test_stage_marks_errors_and_reraises(capsys):
+    with pytest.raises(ValueError):
+        with tracing.stage('bedrock_retrieve_generate'):
+            raise ValueError('throttled')
+
+    assert _records(capsys)[-1]['status'] == 'error'
+
+
+def test_start_trace_falls_back_to_wamid():
+    trace = tracing.start_trace({'wamid': 'wamid.XYZ'})
+
+    assert trace['correlation_id'] == 'wamid.XYZ'
+    assert tracing.get_correlation_id() == 'wamid.XYZ'
+
+
+class FakeTable:
+    def put_item(self, **kwargs):
+        return {}
+
+
+class FakeDynamoClient:
+    exceptions = SimpleNamespace(TransactionCanceledException=type('TransactionCanceledException', (Exception,), {}))
+
+    def transact_write_items(self, **kwargs):
+        return {}
+
+
+class FakeSQS:
+    def __init__(self):
+        self.sent = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.sent.extend(Entries)
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+def test_webhook_propagates_wamid_as_correlation_id(monkeypatch, capsys):
+    fake_sqs = FakeSQS()
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', False)
+    monkeypatch.setattr(webhook, 'table', FakeTable())
+    monkeypatch.setattr(webhook, 'dynamodb', SimpleNamespace(meta=SimpleNamespace(client=FakeDynamoClient())))
+    monkeypatch.setattr(webhook, 'sqs', fake_sqs)
+
+    payload = {'entry': [{'changes': [{'value': {'messages': [{
+        'id': 'wamid.TRACE1', 'from': '+911', 'type': 'text', 'text': {'body': 'Cotton mein aphids?'}
+    }]}}]}]}
+    result = webhook.lambda_handler({'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(payload)}, None)
+
+    assert result['statusCode'] == 200
+    body = json.loads(fake_sqs.sent[0]['MessageBody'])
+    assert body['trace']['correlation_id'] == 'wamid.TRACE1'
+    assert body['trace']['received_at'] > 0
+
+    stages = {r['Stage'] for r in _records(capsys) if 'Stage' in r}
+    assert {'ingest_write', 'sqs_enqueue', 'webhook_receive'} <= stages
@@ -0,0 +1,243 @@
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import src.processor.handler as processor
+import src.webhook.handler as webhook
+from tests.load.fakes import FakeDynamoResource, FakeSecrets, FakeSQS, LatencyProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _payload(*messages):
+    return {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(
+        {'entry': [{'changes': [{'value': {'messages': list(messages)}}]}]}
+    )}
+
+
+def _text(wamid, phone='+911', body='Kapas mein safed makhi?'):
+    return {'id': wamid, 'from': phone, 'type': 'text', 'text': {'body': body}}
+
+
+def _install(monkeypatch):
+    dynamodb = FakeDynamoResource(LatencyProfile.zero())
+    sqs = FakeSQS(LatencyProfile.zero())
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', False)
+    monkeypatch.setattr(webhook, 'dynamodb', dynamodb)
+    monkeypatch.setattr(webhook, 'table', dynamodb.Table(webhook.TABLE_NAME))
+    monkeypatch.setattr(webhook, 'sqs', sqs)
+    return dynamodb, sqs
+
+
+def test_dedup_and_message_written_in_one_transaction(monkeypatch):
+    dynamodb, _ = _install(monkeypatch)
+
+    webhook.lambda_handler(_payload(_text('wamid.T1')), None)
+
+    keys = set(dynamodb.Table(webhook.TABLE_NAME).items)
+    assert ('WAMID#wamid.T1', 'DEDUP') in keys
+    assert any(pk == 'USER#+911' and sk.startswith('MSG#') for pk, sk in keys)
+    assert dynamodb.calls['transact_write_items'] == 1
+    assert dynamodb.calls['put_item'] == 0
+
+
+def test_duplicate_delivery_writes_nothing_and_is_not_queued(monkeypatch):
+    dynamodb, sqs = _install(monkeypatch)
+
+    webhook.lambda_handler(_payload(_text('wamid.D1')), None)
+    webhook.lambda_handler(_payload(_text('wamid.D1')), None)
+
+    table = dynamodb.Table(webhook.TABLE_NAME)
+    assert sum(1 for pk, sk in table.items if sk.startswith('MSG#')) == 1
+    assert sqs.depth(webhook.QUEUE_URL) == 1
+
+
+def test_sqs_sends_are_batched_in_order(monkeypatch):
+    _, sqs = _install(monkeypatch)
+    monkeypatch.setenv('VOICE_QUEUE_URL', 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-voice-test.fifo')
+    messages = [_text(f'wamid.B{i}', phone=f'+91{i % 3}') for i in range(12)]
+    messages.append({'id': 'wamid.A1', 'from': '+910', 'type': 'audio', 'audio': {'id': 'media-1'}})
+    messages.append(_text('wamid.R1', body='हो गया'))
+
+    result = webhook.lambda_handler(_payload(*messages), None)
+
+    assert result['statusCode'] == 200
+    assert sqs.calls['send_message_batch'] == 3  # 10 + 2 text, 1 audio
+    assert sqs.calls['send_message'] == 0
+    queued = [json.loads(record['body'])['wamid'] for record in sqs.receive(webhook.QUEUE_URL, 20)]
+    assert queued == [f'wamid.B{i}' for i in range(12)]
+    assert sqs.depth('https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-voice-test.fifo') == 1
+
+
+def test_nudge_replies_go_straight_to_the_detector_queue(monkeypatch):
+    dynamodb, sqs = _install(monkeypatch)
+    reply_queue = 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-nudge-replies-test.fifo'
+    monkeypatch.setattr(webhook, 'NUDGE_REPLY_QUEUE_URL', reply_queue)
+
+    webhook.lambda_handler(_payload(_text('wamid.R1', body='हो गया'), _text('wamid.Q1')), None)
+    webhook.lambda_handler(_payload(_text('wamid.R1', body='हो गया')), None)  # redelivery
+
+    replies = sqs.receive(reply_queue)
+    assert len(replies) == 1 and sqs.depth(webhook.QUEUE_URL) == 1
+    body = json.loads(replies[0]['body'])
+    assert (body['wamid'], body['from'], body['text']) == ('wamid.R1', '+911', 'हो गया')
+    assert ('USER#+911', body['message_sk']) in dynamodb.Table(webhook.TABLE_NAME).items
+
+
+def test_processor_answer_updates_the_ingested_message_record(monkeypatch):
+    dynamodb, sqs = _install(monkeypatch)
+    table = dynamodb.Table(webhook.TABLE_NAME)
+    table.items[('USER#+911', 'PROFILE')] = {'PK': 'USER#+911', 'SK': 'PROFILE', 'phone_number': '+911',
+                                             'dialect': 'hi', 'crop': 'Cotton', 'location': 'Jalna',
+                                             'onboarding_complete': True}
+    monkeypatch.setattr(processor, 'table', table)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda *args, **kwargs: None)
+    monkeypatch.setattr(processor, 'query_bedrock', lambda text, dialect, profile=None: {'text': 'उत्तर', 'citations': []})
+
+    webhook.lambda_handler(_payload(_text('wamid.C1')), None)
+    processor.lambda_handler({'Records': sqs.receive(webhook.QUEUE_URL)}, None)
+
+    messages = [item for (pk, sk), item in table.items.items() if sk.startswith('MSG#')]
+    assert len(messages) == 1
+    assert messages[0]['wamid'] == 'wamid.C1' and messages[0]['response'] == 'उत्तर'
+    assert messages[0]['ttl'] > time.time() + 30 * 24 * 60 * 60  # answered: kept for 90 days
+    events = [(r['eventName'], r['dynamodb']['Keys']['SK']['S'][:4]) for r in dynamodb.drain_stream()]
+    assert events.count(('INSERT', 'MSG#')) == 1 and events.count(('MODIFY', 'MSG#')) == 1
+
+
+def test_stale_cached_profile_is_reread_before_queueing(monkeypatch):
+    dynamodb, sqs = _install(monkeypatch)
+    table = dynamodb.Table(webhook.TABLE_NAME)
+    completed = {'PK': 'USER#+911', 'SK': 'PROFILE', 'phone_number': '+911', 'dialect': 'hi',
+                 'crop': 'Cotton', 'location': 'Jalna', 'onboarding_complete': True, 'profile_version': 1}
+    table.items[('USER#+911', 'PROFILE')] = dict(completed)
+    monkeypatch.setattr(processor, 'table', table)
+    # A correction reopened onboarding while this container still caches the completed profile
+    processor.update_user_profile('+911', {'onboarding_complete': False, 'onboarding_state': 'crop'})
+    webhook.profiles.put('+911', completed)
+
+    webhook.lambda_handler(_payload(_text('wamid.S1', body='Wheat')), None)
+
+    body = json.loads(sqs.receive(webhook.QUEUE_URL)[0]['body'])
+    assert body['profile']['onboarding_complete'] is False
+    assert body['profile']['onboarding_state'] == 'crop'
+    assert dynamodb.calls['transact_write_items'] == 2
+    message = next(item for (pk, sk), item in table.items.items() if sk.startswith('MSG#'))
+    assert message['profile'] == body['profile']
+
+
+def test_spoken_nudge_reply_is_forwarded_to_the_detector(monkeypatch):
+    sqs = FakeSQS(LatencyProfile.zero())
+    reply_queue = 'https://sqs.us-east-1.amazonaws.com/000000000000/agrinexus-nudge-replies-test.fifo'
+    sent = []
+    monkeypatch.setattr(processor, 'sqs', sqs)
+    monkeypatch.setattr(processor, 'NUDGE_REPLY_QUEUE_URL', reply_queue)
+    monkeypatch.setattr(processor, 'send_whatsapp_message', lambda phone, text, **kwargs: sent.append(text))
+    body = {'wamid': 'wamid.V1', 'from': '+911', 'type': 'text', 'message_sk': 'MSG#2026-10-19T09:00:00',
+            'message': {'type': 'text', 'text': {'body': 'हो गया'}, '_source': 'voice', '_confidence': 0.93},
+            'profile': {'onboarding_complete': True, 'dialect': 'hi', 'crop': 'Cotton', 'location': 'Jalna'}}
+
+    processor.lambda_handler({'Records': [{'body': json.dumps(body)}]}, None)
+
+    forwarded = json.loads(sqs.receive(reply_queue)[0]['body'])
+    assert (forwarded['message_sk'], forwarded['text']) == ('MSG#2026-10-19T09:00:00', 'हो गया')
+    assert sent == []
+
+
+def test_failed_batch_entries_fail_the_request(monkeypatch):
+    _, sqs = _install(monkeypatch)
+    monkeypatch.setattr(sqs, 'send_message_batch', lambda QueueUrl, Entries: {
+        'Successful': [], 'Failed': [{'Id': entry['Id'], 'Code': 'InternalError'} for entry in Entries]
+    })
+
+    with pytest.raises(RuntimeError, match='wamid.F1'):
+        webhook.lambda_handler(_payload(_text('wamid.F1')), None)
+
+
+def test_every_entry_and_change_is_processed(monkeypatch):
+    _, sqs = _install(monkeypatch)
+    payload = {'entry': [
+        {'changes': [
+            {'value': {'metadata': {'phone_number_id': 'PN1'}, 'messages': [_text('wamid.M1'), _text('wamid.M2')]}},
+            {'value': {'metadata': {'phone_number_id': 'PN1'},
+                       'statuses': [{'id': 'wamid.OUT1', 'status': 'delivered'}]}}
+        ]},
+        {'changes': [
+            {'value': {'metadata': {'phone_number_id': 'PN2'}, 'messages': [_text('wamid.M3', phone='+912')]}}
+        ]},
+        {'changes': []}
+    ]}
+
+    result = webhook.lambda_handler({'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(payload)}, None)
+
+    assert result['statusCode'] == 200
+    bodies = [json.loads(record['body']) for record in sqs.receive(webhook.QUEUE_URL, 10)]
+    assert [(b['wamid'], b['metadata']['phone_number_id']) for b in bodies] == [
+        ('wamid.M1', 'PN1'), ('wamid.M2', 'PN1'), ('wamid.M3', 'PN2')
+    ]
+    assert sqs.calls['send_message_batch'] == 1
+
+
+def test_iter_payload_tolerates_missing_sections():
+    assert list(webhook.iter_payload({})) == []
+    assert list(webhook.iter_payload({'entry': [{}, {'changes': [{}]}]})) == []
+    items = list(webhook.iter_payload({'entry': [{'changes': [{'value': {'statuses': [{'id': 's1'}]}}]}]}))
+    assert [(kind, item['id']) for kind, _, item in items] == [('status', 's1')]
+
+
+def test_app_secret_is_cached_across_requests(monkeypatch):
+    _install(monkeypatch)
+    secrets = FakeSecrets(LatencyProfile.zero(), {webhook.APP_SECRET_NAME: 'app-secret'})
+    monkeypatch.setattr(webhook, 'secrets', secrets)
+    monkeypatch.setattr(webhook, '_secret_cache', {})
+    monkeypatch.setattr(webhook, 'VERIFY_SIGNATURE', True)
+
+    for i in range(3):
+        event = _payload(_text(f'wamid.S{i}'))
+        digest = hmac.new(b'app-secret', event['body'].encode(), hashlib.sha256).hexdigest()
+        event['headers'] = {'X-Hub-Signature-256': f'sha256={digest}'}
+        assert webhook.lambda_handler(event, None)['statusCode'] == 200
+
+    assert secrets.calls['get_secret_value'] == 1
+
+
+def test_payload_log_is_redacted_and_capped(monkeypatch, caplog):
+    monkeypatch.setattr(webhook, 'LOG_PAYLOAD_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(webhook, 'LOG_PAYLOAD_MAX_CHARS', 120)
+    payload = {'entry': [{'changes': [{'value': {
+        'contacts': [{'profile': {'name': 'Ramesh Patil'}, 'wa_id': '919876543210'}],
+        'messages': [_text('wamid.L1', phone='919876543210', body='माझ्या कापसावर मावा आहे')]
+    }}]}]}
+
+    with caplog.at_level('INFO'):
+        webhook.log_payload(payload)
+
+    logged = caplog.records[-1].getMessage()
+    assert '919876543210' not in logged and '********3210' in logged
+    assert 'Ramesh' not in logged and 'मावा' not in logged
+    assert logged.endswith('chars)')
+
+
+def test_payload_log_is_sampled(monkeypatch, caplog):
+    monkeypatch.setattr(webhook, 'LOG_PAYLOAD_SAMPLE_RATE', 0.0)
+
+    with caplog.at_level('INFO'):
+        webhook.log_payload({'entry': []})
+
+    assert not caplog.records
+
+
+def test_import_builds_no_aws_clients():
+    code = ('import sys, src.webhook.handler as w; '
+            'print(int("boto3" in sys.modules), int(any(c.built for c in (w.sqs, w.dynamodb, w.table, w.secrets))))')
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([ROOT, os.path.join(ROOT, 'src', 'webhook')])}
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True,
+                            text=True, check=True).stdout.split()
+
+    assert output == ['0', '0']